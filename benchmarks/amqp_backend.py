@@ -0,0 +1,200 @@
+"""
+Message bus latency, RabbitMQ ('amqp.backend: external') against the in-process
+broker ('amqp.backend: memory').
+
+- keystroke: 'GameBG._recv' publishes to the keystroke fanout exchange and
+  'KeystrokeConsumer' broadcasts it to every player of the game, measured from
+  publish to the last player's websocket send. One at a time for latency, then
+  all at once for throughput.
+- timer: a lobby countdown through its wait queue (TTL + dead-letter), measured
+  as the delay past the countdown.
+
+RabbitMQ is read from the setting file, and skipped when it can't be reached.
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from statistics import quantiles
+from time import perf_counter
+
+from aio_pika import Message
+from fastapi.websockets import WebSocketDisconnect, WebSocketState
+
+from typephoon_api.consumers.keystroke import KeystrokeConsumer
+from typephoon_api.lib.amqp_manager import AMQPManager
+from typephoon_api.lib.backends import connect_amqp
+from typephoon_api.lib.background_tasks.base import BGManager
+from typephoon_api.lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from typephoon_api.lib.util import load_setting
+from typephoon_api.types.amqp import LobbyCountdownMsg
+from typephoon_api.types.enums import BackendType
+from typephoon_api.types.setting import Setting
+
+PLAYERS = 5
+
+
+class RecordingWebSocket:
+    """
+    Stands in for a player's connection, sends are only counted
+    """
+
+    def __init__(self, counter: "SendCounter") -> None:
+        self._counter = counter
+        self.client_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str):
+        self._counter.sent()
+
+    async def receive_text(self) -> str:
+        # players only listen, stopping the BG reads as a disconnect
+        try:
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            raise WebSocketDisconnect()
+        return ""
+
+    async def close(self, *_, **__):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+class SendCounter:
+    """
+    'done' is set once the expected number of sends is reached
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def expect(self, count: int):
+        self.count = 0
+        self.expected = count
+        self.done.clear()
+
+    def sent(self):
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+
+
+def describe(name: str, values: list[float]):
+    p = quantiles(values, n=100, method="inclusive")
+    print(
+        f"{name:<28}{p[49] * 1000:>10.3f}{p[94] * 1000:>10.3f}"
+        f"{p[98] * 1000:>10.3f}{max(values) * 1000:>10.3f}"
+    )
+
+
+async def bench_keystroke(setting: Setting, conn, args) -> None:
+    bg_manager = BGManager[GameBGMsg, GameBG]()
+    consumer = KeystrokeConsumer(setting=setting, amqp_conn=conn, bg_manager=bg_manager)
+    await consumer.prepare()
+    await consumer.start()
+
+    channel = await conn.channel()
+    exchange = await channel.get_exchange(setting.amqp.game_keystroke_fanout_exchange)
+
+    counter = SendCounter()
+    bgs = [
+        GameBG(
+            ws=RecordingWebSocket(counter),  # type: ignore
+            user_id=f"user-{i}",
+            exchange=exchange,
+            setting=setting,
+            game_id=1,
+        )
+        for i in range(PLAYERS)
+    ]
+    for bg in bgs:
+        await bg_manager.add(game_id=1, bg=bg)
+
+    msg = GameBGMsg(
+        event=GameBGMsgEvent.KEY_STOKE, game_id=1, word_index=1, char_index=1
+    )
+    # own keystrokes are not sent back
+    receivers = PLAYERS - 1
+
+    latencies: list[float] = []
+    for _ in range(args.number):
+        counter.expect(receivers)
+        start = perf_counter()
+        await bgs[0]._recv(msg)
+        await counter.done.wait()
+        latencies.append(perf_counter() - start)
+    describe("keystroke latency", latencies)
+
+    counter.expect(receivers * args.number)
+    start = perf_counter()
+    await asyncio.gather(*[bgs[0]._recv(msg) for _ in range(args.number)])
+    await counter.done.wait()
+    elapsed = perf_counter() - start
+    print(f"{'keystroke throughput':<28}{args.number / elapsed:>10.0f} msg/s")
+
+    await bg_manager.cleanup()
+    await consumer.stop()
+    await channel.close()
+
+
+async def bench_timer(setting: Setting, conn, args) -> None:
+    channel = await conn.channel()
+    queue = await channel.get_queue(setting.amqp.lobby_countdown_queue)
+    delays: list[float] = []
+    received = asyncio.Event()
+    sent_at: dict[int, float] = {}
+
+    async def on_message(amqp_msg):
+        msg = LobbyCountdownMsg.model_validate_json(amqp_msg.body)
+        delays.append(perf_counter() - sent_at[msg.game_id] - args.countdown)
+        await amqp_msg.ack()
+        if len(delays) == args.timers:
+            received.set()
+
+    consumer_tag = await queue.consume(on_message)
+    for i in range(args.timers):
+        sent_at[i] = perf_counter()
+        await channel.default_exchange.publish(
+            Message(LobbyCountdownMsg(game_id=i).model_dump_json().encode()),
+            routing_key=setting.amqp.lobby_multi_countdown_wait_queue,
+        )
+    await asyncio.wait_for(received.wait(), timeout=args.countdown + 30)
+    describe("timer delay past countdown", delays)
+
+    await queue.cancel(consumer_tag)
+    await channel.close()
+
+
+async def run(backend: BackendType, args) -> None:
+    setting = load_setting(args.setting)
+    setting.amqp.backend = backend
+    setting.game.lobby_countdown = args.countdown
+
+    try:
+        conn = await asyncio.wait_for(connect_amqp(setting), timeout=5)
+    except Exception as ex:
+        print(f"{backend}: skipped, {type(ex).__name__}: {ex}")
+        return
+
+    names = await AMQPManager(setting=setting, amqp_conn=conn).setup()
+    setting.amqp.lobby_multi_countdown_wait_queue = names.lobby_multi_wait
+
+    print(f"{backend} (ms){'p50':>15}{'p95':>10}{'p99':>10}{'max':>10}")
+    await bench_keystroke(setting, conn, args)
+    await bench_timer(setting, conn, args)
+    await conn.close()
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000, help="keystrokes")
+    parser.add_argument("--timers", type=int, default=200)
+    parser.add_argument("--countdown", type=int, default=1, help="seconds")
+    parser.add_argument("-c", "--setting", default="setting.yaml")
+    args = parser.parse_args()
+
+    for backend in (BackendType.EXTERNAL, BackendType.MEMORY):
+        await run(backend, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,187 @@
+"""
+Requests per second on '/profile/history' and '/game/players'.
+
+Compares the current response path ('PydanticResponse', models serialized
+straight to bytes) against the previous one ('jsonable_encoder' + 'JSONResponse').
+Services are replaced with canned data, so only routing, dependency injection
+and serialization are measured.
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from datetime import UTC, datetime, timedelta
+from time import perf_counter
+
+from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from typephoon_api.lib.dependencies import (
+    GetAccessTokenInfoRet,
+    get_access_token_info,
+    get_game_service,
+    get_profile_service,
+)
+from typephoon_api.lib.server_setup import create_server
+from typephoon_api.orm.game import GameType
+from typephoon_api.repositories.game_result import GameResultWithGameType
+from typephoon_api.services.base import ServiceRet
+from typephoon_api.services.game import GetPlayersRet
+from typephoon_api.services.profile import HistoryRet
+from typephoon_api.types.common import GameUserInfo
+from typephoon_api.types.enums import UserType
+from typephoon_api.types.jwt import JWTPayload
+from typephoon_api.types.responses.game import GamePlayersResponse
+from typephoon_api.types.responses.profile import ProfileHistoryResponse
+from typephoon_api.types.setting import Setting
+
+NOW = datetime.now(UTC)
+
+
+class FakeProfileService:
+    def __init__(self, size: int) -> None:
+        self._ret = HistoryRet(
+            total=size * 10,
+            has_prev_page=False,
+            has_next_page=True,
+            next_cursor="eyJmaW5pc2hlZF9hdCI6IjIwMjUifQ",
+            data=[
+                GameResultWithGameType(
+                    game_type=GameType.MULTI,
+                    game_id=i,
+                    wpm=80 + i % 20,
+                    wpm_raw=90 + i % 20,
+                    accuracy=95.5,
+                    finished_at=NOW - timedelta(minutes=i),
+                    rank=i % 5 + 1,
+                )
+                for i in range(size)
+            ],
+        )
+
+    async def history(self, **_) -> ServiceRet[HistoryRet]:
+        return ServiceRet(ok=True, data=self._ret)
+
+
+class FakeGameService:
+    def __init__(self, player_limit: int) -> None:
+        players = [
+            GameUserInfo(
+                id=f"user-{i}",
+                name=f"name-{i}",
+                finished=NOW.isoformat(),
+                rank=i + 1,
+                wpm=100 - i,
+                wpm_raw=110 - i,
+                acc=97.5,
+            )
+            for i in range(player_limit)
+        ]
+        self._ret = GetPlayersRet(me=players[0], others={i.id: i for i in players[1:]})
+
+    async def get_players(self, **_) -> ServiceRet[GetPlayersRet]:
+        return ServiceRet(ok=True, data=self._ret)
+
+
+def fake_access_token_info() -> GetAccessTokenInfoRet:
+    ts = int(NOW.timestamp())
+    return GetAccessTokenInfoRet(
+        payload=JWTPayload(
+            sub="user-0",
+            name="name-0",
+            exp=ts + 3600,
+            nbf=ts,
+            iat=ts,
+            user_type=UserType.REGISTERED,
+        )
+    )
+
+
+def legacy_router() -> APIRouter:
+    """
+    previous response path, 'jsonable_encoder' then stdlib 'JSONResponse'
+    """
+    router = APIRouter(prefix="/legacy")
+
+    @router.get("/profile/history")
+    async def history(service=Depends(get_profile_service)):
+        ret = await service.history()
+        msg = jsonable_encoder(
+            ProfileHistoryResponse(
+                total=ret.data.total,
+                has_prev_page=ret.data.has_prev_page,
+                has_next_page=ret.data.has_next_page,
+                next_cursor=ret.data.next_cursor,
+                data=ret.data.data,
+            )
+        )
+        return JSONResponse(msg, status_code=200)
+
+    @router.get("/game/players")
+    async def players(game_id: int, service=Depends(get_game_service)):
+        ret = await service.get_players()
+        msg = jsonable_encoder(
+            GamePlayersResponse(me=ret.data.me, others=ret.data.others)
+        )
+        return JSONResponse(msg, status_code=200)
+
+    return router
+
+
+async def run(client: AsyncClient, path: str, requests: int, concurrency: int):
+    per_worker = requests // concurrency
+
+    async def worker():
+        for _ in range(per_worker):
+            ret = await client.get(path)
+            assert ret.status_code == 200, ret.text
+
+    # warm up
+    await client.get(path)
+
+    start = perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = perf_counter() - start
+    return per_worker * concurrency / elapsed
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--history-size", type=int, default=50)
+    args = parser.parse_args()
+
+    setting = Setting()
+    app = create_server(setting)
+    app.include_router(legacy_router())
+    app.dependency_overrides[get_access_token_info] = fake_access_token_info
+    app.dependency_overrides[get_profile_service] = lambda: FakeProfileService(
+        args.history_size
+    )
+    app.dependency_overrides[get_game_service] = lambda: FakeGameService(
+        setting.game.player_limit
+    )
+
+    paths = {
+        "/profile/history": f"/api/v1/profile/history?size={args.history_size}",
+        "/game/players": "/api/v1/game/players?game_id=1",
+    }
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'endpoint':<20}{'legacy req/s':>15}{'current req/s':>15}{'gain':>8}")
+        for name, path in paths.items():
+            legacy = await run(
+                client,
+                path.replace("/api/v1", "/legacy"),
+                args.requests,
+                args.concurrency,
+            )
+            current = await run(client, path, args.requests, args.concurrency)
+            print(f"{name:<20}{legacy:>15.0f}{current:>15.0f}{current / legacy:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,311 @@
+"""
+Load generation for the lobby and game flows.
+
+Every simulated client:
+1. queues in on '/lobby/queue-in/ws' as a guest and exchanges its guest token
+2. waits for 'GAME_START'
+3. connects to '/game/ws', waits for 'START' or the countdown and streams keystrokes
+4. posts '/game/statistics'
+
+The server is built with 'create_server' and served in-process by default,
+using the backends in the setting file, or the in-process ones with '--memory'.
+Use '--url' to load an external server.
+
+Reported:
+- matchmaking latency: queue in -> 'INIT' (game assigned), 'INIT' -> 'GAME_START'
+- keystroke fan-out latency: sender's send -> every other player's receive
+- statistics latency
+- memory per connection: RSS growth divided by connections, when in-process
+  this includes both the client and the server side of each connection
+"""
+
+import asyncio
+import json
+import os
+import resource
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.cookies import SimpleCookie
+from statistics import quantiles
+from time import perf_counter
+
+import httpx
+import jwt
+import uvicorn
+from websockets.asyncio.client import ClientConnection, connect
+
+from typephoon_api.lib.server_setup import create_server
+from typephoon_api.lib.util import load_setting
+from typephoon_api.types.enums import BackendType, CookieNames
+
+API = "/api/v1"
+
+
+@dataclass
+class Report:
+    """
+    latencies in seconds
+    """
+
+    queue_in: list[float] = field(default_factory=list)
+    lobby_wait: list[float] = field(default_factory=list)
+    fanout: list[float] = field(default_factory=list)
+    statistics: list[float] = field(default_factory=list)
+    keystrokes_sent: int = 0
+    finished: int = 0
+    errors: Counter[str] = field(default_factory=Counter)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak instead of current, in KB on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def get_guest_token(http: httpx.AsyncClient, key: str) -> str:
+    ret = await http.get(f"{API}/auth/guest-token", params={"key": key})
+    ret.raise_for_status()
+    for header in ret.headers.get_list("set-cookie"):
+        cookie = SimpleCookie(header)
+        if CookieNames.ACCESS_TOKEN in cookie:
+            return cookie[CookieNames.ACCESS_TOKEN].value
+    raise ValueError("guest token not found in response")
+
+
+async def lobby(
+    ws_base: str, http: httpx.AsyncClient, report: Report
+) -> tuple[int, str]:
+    start = perf_counter()
+    game_id: int | None = None
+    token: str | None = None
+    init_at = start
+
+    async with connect(f"{ws_base}{API}/lobby/queue-in/ws") as ws:
+        async for raw in ws:
+            msg = json.loads(raw)
+            match msg["event"]:
+                case "INIT":
+                    init_at = perf_counter()
+                    game_id = msg["game_id"]
+                    report.queue_in.append(init_at - start)
+                case "GET_TOKEN":
+                    token = await get_guest_token(http, msg["guest_token_key"])
+                case "GAME_START":
+                    report.lobby_wait.append(perf_counter() - init_at)
+                    break
+
+    if game_id is None or token is None:
+        raise RuntimeError("lobby closed before game start")
+    return game_id, token
+
+
+async def stream_keystrokes(
+    ws: ClientConnection,
+    args: Namespace,
+    game_id: int,
+    user_id: str,
+    sent: dict[tuple[int, str, int, int], float],
+    report: Report,
+):
+    for i in range(args.keystrokes):
+        word_index, char_index = divmod(i, 5)
+        sent[(game_id, user_id, word_index, char_index)] = perf_counter()
+        await ws.send(
+            json.dumps(
+                {
+                    "event": "KEY_STOKE",
+                    "game_id": game_id,
+                    "word_index": word_index,
+                    "char_index": char_index,
+                }
+            )
+        )
+        report.keystrokes_sent += 1
+        await asyncio.sleep(args.interval)
+
+
+async def receive_keystrokes(
+    ws: ClientConnection,
+    args: Namespace,
+    sent: dict[tuple[int, str, int, int], float],
+    report: Report,
+    sending: asyncio.Task,
+):
+    """
+    receive until the sender is done and nothing arrives for 'drain' seconds
+    """
+    while True:
+        try:
+            raw = await asyncio.wait_for(ws.recv(), timeout=args.drain)
+        except TimeoutError:
+            if sending.done():
+                return
+            continue
+
+        msg = json.loads(raw)
+        if msg["event"] != "KEY_STOKE":
+            continue
+        key = (msg["game_id"], msg["user_id"], msg["word_index"], msg["char_index"])
+        if key in sent:
+            report.fanout.append(perf_counter() - sent[key])
+
+
+async def game(
+    ws_base: str,
+    http: httpx.AsyncClient,
+    args: Namespace,
+    game_id: int,
+    token: str,
+    sent: dict[tuple[int, str, int, int], float],
+    report: Report,
+):
+    user_id = jwt.decode(token, options={"verify_signature": False})["sub"]
+    headers = {"Cookie": f"{CookieNames.ACCESS_TOKEN}={token}"}
+
+    async with connect(
+        f"{ws_base}{API}/game/ws?game_id={game_id}", additional_headers=headers
+    ) as ws:
+        # full lobbies start on their countdown, without a 'START' message
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg["event"] == "START":
+                break
+            if msg["event"] == "COUNTDOWN":
+                start_at = datetime.fromisoformat(msg["start_at"])
+                server_time = datetime.fromisoformat(msg["server_time"])
+                await asyncio.sleep((start_at - server_time).total_seconds())
+                break
+
+        sending = asyncio.create_task(
+            stream_keystrokes(ws, args, game_id, user_id, sent, report)
+        )
+        await receive_keystrokes(ws, args, sent, report, sending)
+        await sending
+
+    start = perf_counter()
+    ret = await http.post(
+        f"{API}/game/statistics",
+        json={"game_id": game_id, "wpm": 80, "wpm_raw": 90, "acc": 97.5},
+        headers=headers,
+    )
+    ret.raise_for_status()
+    report.statistics.append(perf_counter() - start)
+
+
+async def client(
+    ws_base: str,
+    http: httpx.AsyncClient,
+    args: Namespace,
+    sent: dict[tuple[int, str, int, int], float],
+    report: Report,
+):
+    try:
+        game_id, token = await lobby(ws_base, http, report)
+        await game(ws_base, http, args, game_id, token, sent, report)
+        report.finished += 1
+    except Exception as ex:
+        report.errors[type(ex).__name__] += 1
+
+
+def describe(name: str, values: list[float]):
+    if len(values) < 2:
+        print(f"{name:<22}{len(values):>8} samples")
+        return
+    p = quantiles(values, n=100, method="inclusive")
+    print(
+        f"{name:<22}{len(values):>8}"
+        f"{p[49] * 1000:>10.2f}{p[94] * 1000:>10.2f}{p[98] * 1000:>10.2f}"
+        f"{max(values) * 1000:>10.2f}"
+    )
+
+
+async def main(args: Namespace):
+    server: uvicorn.Server | None = None
+    if args.url is None:
+        setting = load_setting(args.setting)
+        if args.memory:
+            setting.db.backend = BackendType.MEMORY
+            setting.redis.backend = BackendType.MEMORY
+            setting.amqp.backend = BackendType.MEMORY
+        config = uvicorn.Config(
+            create_server(setting),
+            host="127.0.0.1",
+            port=args.port,
+            log_level="warning",
+            ws_max_queue=1024,
+        )
+        server = uvicorn.Server(config)
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.05)
+        base_url = f"http://127.0.0.1:{args.port}"
+    else:
+        base_url = args.url.rstrip("/")
+
+    ws_base = base_url.replace("http", "ws", 1)
+    report = Report()
+    sent: dict[tuple[int, str, int, int], float] = {}
+    limits = httpx.Limits(max_connections=args.http_connections)
+    base_rss = rss_bytes()
+    peak_rss = base_rss
+
+    start = perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as http:
+        tasks: list[asyncio.Task] = []
+        for _ in range(args.clients):
+            tasks.append(asyncio.create_task(client(ws_base, http, args, sent, report)))
+            await asyncio.sleep(1 / args.rate)
+
+        while not all(i.done() for i in tasks):
+            peak_rss = max(peak_rss, rss_bytes())
+            await asyncio.sleep(0.2)
+    elapsed = perf_counter() - start
+
+    if server is not None:
+        server.should_exit = True
+        await serving
+
+    print(
+        f"clients: {args.clients}, finished: {report.finished}, "
+        f"errors: {dict(report.errors)}, elapsed: {elapsed:.1f}s"
+    )
+    print(f"keystrokes sent: {report.keystrokes_sent}, delivered: {len(report.fanout)}")
+    print(
+        f"{'latency (ms)':<22}{'samples':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    )
+    describe("queue in -> INIT", report.queue_in)
+    describe("INIT -> GAME_START", report.lobby_wait)
+    describe("keystroke fan-out", report.fanout)
+    describe("statistics", report.statistics)
+    print(
+        f"memory per connection: ~{(peak_rss - base_rss) / args.clients / 1024:.1f} KiB "
+        f"(RSS {base_rss / 2**20:.0f} -> {peak_rss / 2**20:.0f} MiB)"
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200, help="new clients/s")
+    parser.add_argument("--keystrokes", type=int, default=100, help="per client")
+    parser.add_argument(
+        "--interval", type=float, default=0.05, help="seconds between keystrokes"
+    )
+    parser.add_argument(
+        "--drain", type=float, default=2, help="idle seconds before leaving a game"
+    )
+    parser.add_argument("--http-connections", type=int, default=200)
+    parser.add_argument("-c", "--setting", default="setting.yaml")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--url", help="load an external server instead")
+    parser.add_argument(
+        "--memory", action="store_true", help="in-process backends, no services needed"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,155 @@
+"""
+Logging overhead on hot paths with the logger at INFO.
+
+- statement: an unguarded 'logger.debug("...%s", msg)' against the guarded form
+- write_statistics: 'model_dump_json()' as an eager log argument against 'Lazy'
+- keystroke: one keystroke through 'GameBG._recv' -> 'BGManager.broadcast' ->
+  'GameBG._send' for every player, with logging at INFO against logging disabled
+  (the floor, no logging cost at all)
+"""
+
+import asyncio
+import logging
+from argparse import ArgumentParser
+from logging import DEBUG, getLogger
+from time import perf_counter
+from timeit import timeit
+
+from pamqp.commands import Basic
+
+from typephoon_api.lib.background_tasks.base import BGManager
+from typephoon_api.lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from typephoon_api.lib.log import Lazy
+from typephoon_api.types.amqp import KeystrokeMsg
+from typephoon_api.types.requests.game import GameStatistics
+from typephoon_api.types.setting import Setting
+
+PLAYERS = 5
+
+logger = getLogger("typephoon_api.benchmark")
+
+
+class NullWebSocket:
+    async def send_text(self, data: str):
+        pass
+
+
+class LoopbackExchange:
+    def __init__(self, bg_manager: BGManager[GameBGMsg, GameBG]) -> None:
+        self._bg_manager = bg_manager
+
+    async def publish(self, message, routing_key: str):
+        msg = KeystrokeMsg.model_validate_json(message.body)
+        await self._bg_manager.broadcast(
+            game_id=msg.game_id,
+            msg=GameBGMsg(
+                game_id=msg.game_id,
+                event=GameBGMsgEvent.KEY_STOKE,
+                user_id=msg.user_id,
+                word_index=msg.word_index,
+                char_index=msg.char_index,
+            ),
+        )
+        return Basic.Ack()
+
+
+def ns(seconds: float, number: int) -> float:
+    return seconds / number * 1e9
+
+
+def bench_statement(number: int):
+    msg = GameBGMsg(
+        event=GameBGMsgEvent.KEY_STOKE,
+        game_id=1,
+        user_id="user-0",
+        word_index=1,
+        char_index=1,
+    )
+
+    def unguarded():
+        logger.debug("got msg: %s", msg)
+
+    def guarded():
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("got msg: %s", msg)
+
+    before = ns(timeit(unguarded, number=number), number)
+    after = ns(timeit(guarded, number=number), number)
+    print(f"{'statement':<18}{before:>12.0f}{after:>12.0f}")
+    return before - after
+
+
+def bench_write_statistics(number: int):
+    statistics = GameStatistics(game_id=1, wpm=100, wpm_raw=110, acc=98.5)
+
+    def eager():
+        logger.debug("statistics: %s", statistics.model_dump_json())
+
+    def lazy():
+        logger.debug("statistics: %s", Lazy(statistics.model_dump_json))
+
+    before = ns(timeit(eager, number=number), number)
+    after = ns(timeit(lazy, number=number), number)
+    print(f"{'write_statistics':<18}{before:>12.0f}{after:>12.0f}")
+
+
+async def keystroke_path(number: int) -> float:
+    setting = Setting()
+    bg_manager = BGManager[GameBGMsg, GameBG]()
+    exchange = LoopbackExchange(bg_manager)
+    bgs = [
+        GameBG(
+            ws=NullWebSocket(),  # type: ignore
+            user_id=f"user-{i}",
+            exchange=exchange,  # type: ignore
+            setting=setting,
+            game_id=1,
+        )
+        for i in range(PLAYERS)
+    ]
+    for bg in bgs:
+        bg_manager._pool[1][bg.user_id] = bg
+
+    msg = GameBGMsg(
+        event=GameBGMsgEvent.KEY_STOKE, game_id=1, word_index=1, char_index=1
+    )
+
+    start = perf_counter()
+    for _ in range(number):
+        await bgs[0]._recv(msg)
+        for bg in bgs:
+            await bg._send(bg._queue.get_nowait())
+    return ns(perf_counter() - start, number)
+
+
+def bench_keystroke(number: int):
+    info = asyncio.run(keystroke_path(number))
+    logging.disable()
+    try:
+        floor = asyncio.run(keystroke_path(number))
+    finally:
+        logging.disable(logging.NOTSET)
+    print(f"{'keystroke (floor)':<18}{'':>12}{floor:>12.0f}")
+    print(f"{'keystroke (INFO)':<18}{'':>12}{info:>12.0f}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    getLogger("typephoon_api").setLevel(logging.INFO)
+
+    print(f"{'ns per call':<18}{'before':>12}{'after':>12}")
+    saved = bench_statement(args.number)
+    bench_write_statistics(args.number)
+    bench_keystroke(args.number // 10)
+
+    # per keystroke: recv, broadcast, a send per player, consumer 'on message' + 'ack'
+    statements = 1 + 1 + PLAYERS + 2
+    print(f"saved per keystroke: ~{saved * statements:.0f}ns ({statements} statements)")
+
+
+if __name__ == "__main__":
+    main()
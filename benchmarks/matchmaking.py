@@ -0,0 +1,137 @@
+"""
+Match making simulation, any lobby with a free seat against skill buckets.
+
+Players arrive at random ('--rate' per second) with a recent WPM drawn from a
+normal distribution, and join through 'GameRepo.get_one_available' on the
+in-memory backend like 'QueueInService' does: a free lobby, otherwise a new
+one. A lobby starts when it's full or when its countdown ends. Time is real,
+use a short countdown to keep the run short.
+
+Reports per mode:
+- wait: from joining until the game starts
+- players: per game
+- spread: WPM difference between the fastest and slowest player of a game
+- match: time spent in 'get_one_available' per joiner
+"""
+
+import asyncio
+import random
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from math import ceil
+from statistics import fmean, quantiles
+from time import perf_counter
+
+from typephoon_api.orm.game import GameStatus, GameType
+from typephoon_api.repositories.game import GameRepo
+from typephoon_api.repositories.memory import MemorySessionmaker
+
+PLAYER_LIMIT = 5
+
+
+@dataclass(slots=True)
+class Lobby:
+    wpms: list[float] = field(default_factory=list)
+    joined_at: list[float] = field(default_factory=list)
+    started_at: float | None = None
+
+
+def p(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0
+    return quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+async def run(mode: str, args) -> None:
+    random.seed(args.seed)
+    sessionmaker = MemorySessionmaker()
+    loop = asyncio.get_running_loop()
+    lobbies: dict[int, Lobby] = {}
+    match_times: list[float] = []
+    max_distance = ceil(args.countdown / args.widen_interval)
+
+    async def start(game_id: int):
+        async with sessionmaker() as session:
+            repo = GameRepo(session=session, player_limit=PLAYER_LIMIT)  # type: ignore
+            game = await repo.get(game_id, lock=True)
+            if game is None or game.status != GameStatus.LOBBY:
+                return
+            await repo.start_game(game_id)
+            await session.commit()
+        lobbies[game_id].started_at = perf_counter()
+
+    async def join(wpm: float):
+        bucket = int(wpm // args.bucket_width) if mode == "buckets" else None
+        async with sessionmaker() as session:
+            repo = GameRepo(session=session, player_limit=PLAYER_LIMIT)  # type: ignore
+            match_start = perf_counter()
+            game = await repo.get_one_available(
+                lock=True,
+                skill_bucket=bucket,
+                widen_interval=args.widen_interval,
+                max_distance=max_distance,
+            )
+            match_times.append(perf_counter() - match_start)
+
+            if game is None:
+                game = await repo.create(
+                    GameType.MULTI, GameStatus.LOBBY, skill_bucket=bucket
+                )
+                lobbies[game.id] = Lobby()
+                loop.call_later(
+                    args.countdown,
+                    lambda game_id=game.id: loop.create_task(start(game_id)),
+                )
+
+            game = await repo.increase_player_count(game.id)
+            assert game
+            lobbies[game.id].wpms.append(wpm)
+            lobbies[game.id].joined_at.append(perf_counter())
+            await session.commit()
+
+        if game.player_count >= PLAYER_LIMIT:
+            await start(game.id)
+
+    tasks: list[asyncio.Task] = []
+    end = perf_counter() + args.duration
+    while perf_counter() < end:
+        await asyncio.sleep(random.expovariate(args.rate))
+        wpm = min(max(random.gauss(args.wpm_mean, args.wpm_sd), 10), 200)
+        tasks.append(loop.create_task(join(wpm)))
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(args.countdown + 0.1)
+
+    games = [i for i in lobbies.values() if i.started_at is not None]
+    waits = [g.started_at - t for g in games for t in g.joined_at]  # type: ignore
+    spreads = [max(g.wpms) - min(g.wpms) for g in games]
+    sizes = [len(g.wpms) for g in games]
+    print(
+        f"{mode:<10}{len(games):>8}{fmean(sizes):>10.2f}"
+        f"{p(waits, 50):>10.2f}{p(waits, 95):>10.2f}"
+        f"{fmean(spreads):>10.1f}{p(spreads, 95):>10.1f}"
+        f"{fmean(match_times) * 1e6:>10.1f}"
+    )
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--rate", type=float, default=50, help="players per second")
+    parser.add_argument("--countdown", type=float, default=2, help="seconds")
+    parser.add_argument("--bucket-width", type=float, default=20, help="WPM")
+    parser.add_argument("--widen-interval", type=float, default=0.4, help="seconds")
+    parser.add_argument("--wpm-mean", type=float, default=65)
+    parser.add_argument("--wpm-sd", type=float, default=25)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<10}{'games':>8}{'players':>10}{'wait p50':>10}{'p95':>10}"
+        f"{'spread':>10}{'p95':>10}{'match us':>10}"
+    )
+    for mode in ("any", "buckets"):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,236 @@
+"""
+Cross-node keystroke traffic, with and without game to node affinity.
+
+Several API nodes run in one process on the in-process broker, each with its
+own keystroke queue bound to the fanout exchange, like servers with different
+SERVER_NAMEs.
+
+- fanout: players land on random nodes, every keystroke is delivered to every
+  node, including the ones without players of that game
+- affinity: players land on the node owning their game (what the 'REDIRECT'
+  events achieve), keystrokes stay on that node
+
+Also shows how many games change owner when a node joins, against 'game_id % nodes'.
+"""
+
+import asyncio
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+from fastapi.websockets import WebSocketDisconnect, WebSocketState
+
+from typephoon_api.consumers.keystroke import KeystrokeConsumer
+from typephoon_api.lib.amqp_manager import AMQPManager
+from typephoon_api.lib.background_tasks.base import BGManager
+from typephoon_api.lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from typephoon_api.lib.hash_ring import HashRing
+from typephoon_api.lib.memory.amqp import MemoryBroker, MemoryConnection
+from typephoon_api.lib.memory.redis import MemoryRedis
+from typephoon_api.lib.metrics import KEYSTROKE_ROUTES
+from typephoon_api.lib.node_affinity import NodeAffinity
+from typephoon_api.types.setting import Setting
+
+PLAYERS = 5
+
+
+class RecordingWebSocket:
+    """
+    Stands in for a player's connection, sends are only counted
+    """
+
+    def __init__(self, counter: "SendCounter") -> None:
+        self._counter = counter
+        self.client_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str):
+        self._counter.sent()
+
+    async def receive_text(self) -> str:
+        # players only listen, stopping the BG reads as a disconnect
+        try:
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            raise WebSocketDisconnect()
+        return ""
+
+    async def close(self, *_, **__):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+class SendCounter:
+    """
+    'done' is set once the expected number of sends is reached
+    """
+
+    def __init__(self, expected: int) -> None:
+        self.count = 0
+        self.expected = expected
+        self.done = asyncio.Event()
+
+    def sent(self):
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+
+
+class CountingBGManager(BGManager[GameBGMsg, GameBG]):
+    """
+    Counts deliveries, and the ones for games without players on this node
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.deliveries = 0
+        self.wasted = 0
+
+    async def broadcast(self, game_id: int, msg: GameBGMsg):
+        self.deliveries += 1
+        if game_id not in self._pool:
+            self.wasted += 1
+        await super().broadcast(game_id=game_id, msg=msg)
+
+
+class Node:
+    def __init__(self, setting: Setting, conn: MemoryConnection, redis: MemoryRedis):
+        self.setting = setting
+        self.conn = conn
+        self.bg_manager = CountingBGManager()
+        self.affinity = NodeAffinity(setting=setting, redis_conn=redis)  # type: ignore
+
+    async def start(self):
+        await AMQPManager(setting=self.setting, amqp_conn=self.conn).setup()  # type: ignore
+        self.consumer = KeystrokeConsumer(
+            setting=self.setting,
+            amqp_conn=self.conn,  # type: ignore
+            bg_manager=self.bg_manager,
+        )
+        await self.consumer.prepare()
+        await self.consumer.start()
+
+        self.channel = await self.conn.channel()
+        self.exchange = await self.channel.get_exchange(
+            self.setting.amqp.game_keystroke_fanout_exchange
+        )
+        await self.affinity.refresh()
+
+    async def stop(self):
+        await self.bg_manager.cleanup()
+        await self.consumer.stop()
+
+
+def node_setting(base: Setting, name: str) -> Setting:
+    setting = base.model_copy(deep=True)
+    setting.server_name = name
+    setting.amqp.game_keystroke_queue = f"game.keystroke.{name}"
+    setting.affinity.enabled = True
+    setting.affinity.url = f"ws://{name}:8080"
+    return setting
+
+
+def counter_value(route: str) -> float:
+    return KEYSTROKE_ROUTES.labels(route).value
+
+
+async def run(mode: str, args) -> None:
+    base = Setting()
+    conn = MemoryConnection(MemoryBroker())
+    redis = MemoryRedis()
+    nodes = [
+        Node(node_setting(base, f"node-{i}"), conn, redis) for i in range(args.nodes)
+    ]
+    for node in nodes:
+        await node.start()
+    # every node sees the whole ring
+    for node in nodes:
+        await node.affinity.refresh()
+    by_name = {node.setting.server_name: node for node in nodes}
+
+    keystrokes = args.games * PLAYERS * args.keystrokes
+    counter = SendCounter(expected=keystrokes * (PLAYERS - 1))
+    players: list[GameBG] = []
+    for game_id in range(1, args.games + 1):
+        for idx in range(PLAYERS):
+            if mode == "affinity":
+                node = by_name[nodes[0].affinity.owner(game_id).name]
+            else:
+                node = random.choice(nodes)
+            bg = GameBG(
+                ws=RecordingWebSocket(counter),  # type: ignore
+                user_id=f"user-{idx}",
+                exchange=node.exchange,  # type: ignore
+                setting=node.setting,
+                game_id=game_id,
+                server_name=node.setting.server_name,
+                local_pool=node.bg_manager if mode == "affinity" else None,
+                player_count=PLAYERS,
+            )
+            await node.bg_manager.add(game_id=game_id, bg=bg)
+            players.append(bg)
+
+    async def type_words(bg: GameBG):
+        msg = GameBGMsg(
+            event=GameBGMsgEvent.KEY_STOKE,
+            game_id=bg.game_id,
+            word_index=1,
+            char_index=1,
+        )
+        for _ in range(args.keystrokes):
+            await bg._recv(msg)
+
+    local_before = counter_value("local")
+    broker_before = counter_value("broker")
+    start = perf_counter()
+    await asyncio.gather(*[type_words(bg) for bg in players])
+    await asyncio.wait_for(counter.done.wait(), timeout=60)
+    elapsed = perf_counter() - start
+
+    local = counter_value("local") - local_before
+    published = counter_value("broker") - broker_before
+    deliveries = sum(node.bg_manager.deliveries for node in nodes) - local
+    wasted = sum(node.bg_manager.wasted for node in nodes)
+    print(
+        f"{mode:<10}{keystrokes:>12}{published:>12.0f}{deliveries:>12.0f}"
+        f"{wasted:>12}{keystrokes / elapsed:>12.0f}"
+    )
+
+    for node in nodes:
+        await node.stop()
+    await conn.close()
+
+
+def rebalance(args):
+    nodes = [f"node-{i}" for i in range(args.nodes)]
+    games = range(1, 100001)
+    ring = HashRing(nodes=nodes, vnodes=Setting().affinity.vnodes)
+    before = {game_id: ring.get(game_id) for game_id in games}
+    ring.add(f"node-{args.nodes}")
+    moved = sum(ring.get(game_id) != before[game_id] for game_id in games)
+    moved_modulo = sum(
+        game_id % args.nodes != game_id % (args.nodes + 1) for game_id in games
+    )
+    print(
+        f"games moved when node {args.nodes + 1} joins: "
+        f"{moved / len(games):.1%} (modulo: {moved_modulo / len(games):.1%}, "
+        f"ideal: {1 / (args.nodes + 1):.1%})"
+    )
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--keystrokes", type=int, default=50, help="per player")
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<10}{'keystrokes':>12}{'published':>12}{'node recv':>12}"
+        f"{'wasted':>12}{'per second':>12}"
+    )
+    for mode in ("fanout", "affinity"):
+        await run(mode, args)
+    rebalance(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Lobby to game cache transition ('GameCacheRepo.populate_with_lobby_cache'),
+Redis from the setting file ('redis.backend: external', skipped when it can't be
+reached) and the in-memory backend.
+
+- sequential: GET players, decode and re-encode, write, GET start time, SET,
+  DEL the lobby keys, one round trip each (the original flow)
+- pipelined: one pipeline to read, one transaction to write
+- script: one server-side script, the roster is never decoded in Python
+"""
+
+import asyncio
+import json
+from argparse import ArgumentParser
+from datetime import UTC, datetime, timedelta
+from statistics import quantiles
+from time import perf_counter
+
+from typephoon_api.lib.backends import create_redis
+from typephoon_api.lib.util import load_setting
+from typephoon_api.repositories.game_cache import (
+    GameCacheRepo,
+    GameCacheType,
+    encode_player,
+)
+from typephoon_api.repositories.lobby_cache import LobbyCacheRepo
+from typephoon_api.types.common import GameUserInfo, LobbyUserInfo
+from typephoon_api.types.enums import BackendType
+from typephoon_api.types.setting import Setting
+
+
+def game_keys(repo: GameCacheRepo, game_id: int) -> tuple[str, str]:
+    return (
+        repo._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS),
+        repo._gen_cache_key(game_id=game_id, cache_type=GameCacheType.LOBBY_END),
+    )
+
+
+async def sequential(
+    repo: GameCacheRepo, lobby_repo: LobbyCacheRepo, setting: Setting, game_id: int
+):
+    redis_conn = repo._redis_conn
+    player_key, lobby_end_key = game_keys(repo, game_id)
+    expire = setting.redis.in_game_cache_expire_time
+
+    players = await lobby_repo.get_players(game_id)
+    assert players
+    async with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.delete(player_key)
+        pipe.hset(
+            player_key,
+            mapping={
+                k: encode_player(GameUserInfo.from_lobby_cache(v))
+                for k, v in players.items()
+            },
+        )
+        pipe.expire(player_key, expire)
+        await pipe.execute()
+
+    start_time = await lobby_repo.get_start_time(game_id)
+    assert start_time
+    await redis_conn.set(lobby_end_key, start_time.isoformat(), ex=expire)
+    await lobby_repo.clear_cache(game_id)
+
+
+async def pipelined(
+    repo: GameCacheRepo, lobby_repo: LobbyCacheRepo, setting: Setting, game_id: int
+):
+    redis_conn = repo._redis_conn
+    player_key, lobby_end_key = game_keys(repo, game_id)
+    lobby_keys = lobby_repo.cache_keys(game_id)
+    expire = setting.redis.in_game_cache_expire_time
+
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.get(lobby_keys.players)
+        pipe.get(lobby_keys.countdown)
+        raw_players, raw_start_time = await pipe.execute()
+
+    players = {
+        k: LobbyUserInfo.model_validate(v) for k, v in json.loads(raw_players).items()
+    }
+    async with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.delete(player_key)
+        pipe.hset(
+            player_key,
+            mapping={
+                k: encode_player(GameUserInfo.from_lobby_cache(v))
+                for k, v in players.items()
+            },
+        )
+        pipe.expire(player_key, expire)
+        pipe.set(lobby_end_key, raw_start_time, ex=expire)
+        pipe.delete(*lobby_keys)
+        await pipe.execute()
+
+
+async def script(
+    repo: GameCacheRepo, lobby_repo: LobbyCacheRepo, setting: Setting, game_id: int
+):
+    await repo.populate_with_lobby_cache(
+        game_id=game_id, lobby_cache_repo=lobby_repo, auto_clean=True
+    )
+
+
+def describe(name: str, values: list[float]):
+    p = quantiles(values, n=100, method="inclusive")
+    print(
+        f"{name:<14}{p[49] * 1000:>10.3f}{p[94] * 1000:>10.3f}"
+        f"{p[98] * 1000:>10.3f}{len(values) / sum(values):>12.0f}"
+    )
+
+
+async def run(backend: BackendType, args) -> None:
+    setting = load_setting(args.setting)
+    setting.redis.backend = backend
+    redis_conn = create_redis(setting)
+    try:
+        await asyncio.wait_for(redis_conn.ping(), timeout=5)
+    except Exception as ex:
+        print(f"{backend}: skipped, {type(ex).__name__}: {ex}")
+        return
+
+    repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    lobby_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    players = [
+        LobbyUserInfo(id=f"user-{i}", name=f"player-{i}")
+        for i in range(setting.game.player_limit)
+    ]
+
+    print(f"{backend} (ms){'p50':>7}{'p95':>10}{'p99':>10}{'per second':>12}")
+    for name, func in (
+        ("sequential", sequential),
+        ("pipelined", pipelined),
+        ("script", script),
+    ):
+        latencies: list[float] = []
+        for i in range(args.number):
+            game_id = args.game_id_base + i
+            for player in players:
+                await lobby_repo.add_player(game_id=game_id, user_info=player)
+            await lobby_repo.set_start_time(
+                game_id=game_id, start_time=datetime.now(UTC) + timedelta(seconds=5)
+            )
+
+            start = perf_counter()
+            await func(repo, lobby_repo, setting, game_id)
+            latencies.append(perf_counter() - start)
+
+            assert len(await repo.get_players(game_id) or {}) == len(players)
+            await repo.clear_cache(game_id)
+        describe(name, latencies)
+
+    await redis_conn.aclose()
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument(
+        "--game-id-base", type=int, default=10_000_000, help="keys used by the run"
+    )
+    parser.add_argument("-c", "--setting", default="setting.yaml")
+    args = parser.parse_args()
+
+    for backend in (BackendType.EXTERNAL, BackendType.MEMORY):
+        await run(backend, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Per-step latency of the last player entering a full lobby, serial against
+concurrent side effects.
+
+Runs 'QueueInService' on the in-memory backends, with a simulated round trip
+added to every Redis command / pipeline, RabbitMQ publish and database
+statement / commit.
+
+- serial: the steps awaited one after another, cache population reading and
+  writing key by key (the flow before the side effects were parallelized)
+- concurrent: 'QueueInService._enter_lobby'
+
+Prints a trace of one run (offset and duration of each step) and the p50 / p95
+of the whole flow.
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from functools import wraps
+from statistics import quantiles
+from time import perf_counter
+from typing import Any
+
+from fastapi.websockets import WebSocketDisconnect, WebSocketState
+from pamqp.commands import Basic
+
+from typephoon_api.lib.background_tasks.base import BGManager
+from typephoon_api.lib.background_tasks.lobby import LobbyBG, LobbyBGMsg
+from typephoon_api.lib.memory.redis import MemoryRedis
+from typephoon_api.lib.token_generator import TokenGenerator
+from typephoon_api.lib.token_validator import TokenValidator
+from typephoon_api.orm.game import GameStatus, GameType
+from typephoon_api.repositories.game import GameRepo
+from typephoon_api.repositories.game_cache import GameCacheRepo, GameCacheType
+from typephoon_api.repositories.guest_token import GuestTokenRepo
+from typephoon_api.repositories.lobby_cache import LobbyCacheRepo
+from typephoon_api.repositories.memory import (
+    MemoryGameRepo,
+    MemorySession,
+    MemorySessionmaker,
+)
+from typephoon_api.services.queue_in import QueueInService
+from typephoon_api.types.common import LobbyUserInfo
+from typephoon_api.types.setting import Setting
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.start = perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    def reset(self):
+        self.start = perf_counter()
+        self.spans = []
+
+    def wrap[**P, R](
+        self, name: str, func: Callable[P, Awaitable[R]]
+    ) -> Callable[P, Awaitable[R]]:
+        @wraps(func)
+        async def traced(*args: P.args, **kwargs: P.kwargs) -> R:
+            start = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.spans.append((name, start - self.start, perf_counter() - start))
+
+        return traced
+
+    def print(self, total: float):
+        print(f"{'step':<16}{'start ms':>10}{'ms':>8}")
+        scale = 40 / total
+        for name, offset, duration in sorted(self.spans, key=lambda i: i[1]):
+            bar = " " * int(offset * scale) + "#" * max(1, int(duration * scale))
+            print(f"{name:<16}{offset * 1000:>10.2f}{duration * 1000:>8.2f}  |{bar}")
+
+
+def delayed[**P, R](
+    func: Callable[P, Awaitable[R]], delay: float
+) -> Callable[P, Awaitable[R]]:
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        await asyncio.sleep(delay)
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class DelayedRedis:
+    """
+    Every command and pipeline execution costs one round trip
+    """
+
+    def __init__(self, redis: Any, delay: float) -> None:
+        self._redis = redis
+        self._delay = delay
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._redis, name)
+        if name == "pipeline":
+            return lambda *args, **kwargs: DelayedRedis(
+                attr(*args, **kwargs), self._delay
+            )
+        if asyncio.iscoroutinefunction(attr):
+            return delayed(attr, self._delay)
+        return attr
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+
+class DelayedExchange:
+    def __init__(self, delay: float) -> None:
+        self._delay = delay
+
+    async def publish(self, *_, **__):
+        await asyncio.sleep(self._delay)
+        return Basic.Ack()
+
+
+class DelayedSession(MemorySession):
+    delay = 0.0
+
+    async def commit(self):
+        await asyncio.sleep(self.delay)
+        await super().commit()
+
+
+class DelayedSessionmaker(MemorySessionmaker):
+    def __call__(self) -> MemorySession:
+        return DelayedSession(self.store)
+
+
+class NullWebSocket:
+    def __init__(self) -> None:
+        self.client_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str):
+        pass
+
+    async def receive_text(self) -> str:
+        try:
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            raise WebSocketDisconnect()
+        return ""
+
+    async def close(self, *_, **__):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+async def populate_serial(
+    redis: DelayedRedis,
+    game_cache_repo: GameCacheRepo,
+    lobby_cache_repo: LobbyCacheRepo,
+    game_id: int,
+):
+    """
+    The cache population before it was pipelined, one round trip per step
+    """
+    players = await lobby_cache_repo.get_players(game_id) or {}
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            game_cache_repo._gen_cache_key(game_id, GameCacheType.PLAYERS),
+            mapping={k: v.model_dump_json() for k, v in players.items()},
+        )
+        await pipe.execute()
+
+    start_time = await lobby_cache_repo.get_start_time(game_id)
+    assert start_time
+    await redis.set(
+        game_cache_repo._gen_cache_key(game_id, GameCacheType.LOBBY_END),
+        start_time.isoformat(),
+    )
+    await lobby_cache_repo.clear_cache(game_id)
+
+
+async def enter_serial(
+    service: QueueInService,
+    sessionmaker: MemorySessionmaker,
+    populate: Callable[[int], Awaitable[None]],
+    ws: NullWebSocket,
+    user_info: LobbyUserInfo,
+    game_id: int,
+):
+    await service._add_bg_event_loop(
+        websocket=ws, user_info=user_info, game_id=game_id  # type: ignore
+    )
+    await service._notify_user_join(game_id)
+
+    async with sessionmaker() as session:
+        await GameRepo(session).start_game(game_id)  # type: ignore
+        await session.commit()
+
+    await populate(game_id)
+    await service._send_start_msg(game_id)
+
+
+async def run(mode: str, args) -> None:
+    setting = Setting()
+    rtt = {
+        "redis": args.redis_rtt / 1000,
+        "amqp": args.amqp_rtt / 1000,
+        "db": args.db_rtt / 1000,
+    }
+    tracer = Tracer()
+
+    raw_redis = MemoryRedis()
+    redis = DelayedRedis(raw_redis, rtt["redis"])
+    DelayedSession.delay = rtt["db"]
+    sessionmaker = DelayedSessionmaker()
+    bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis, setting=setting)  # type: ignore
+    game_cache_repo = GameCacheRepo(redis_conn=redis, setting=setting)  # type: ignore
+
+    service = QueueInService(
+        setting=setting,
+        token_generator=TokenGenerator(setting),
+        token_validator=TokenValidator(setting),
+        bg_manager=bg_manager,
+        guest_token_repo=GuestTokenRepo(redis_conn=redis, setting=setting),  # type: ignore
+        sessionmaker=sessionmaker,  # type: ignore
+        amqp_notify_exchange=DelayedExchange(rtt["amqp"]),  # type: ignore
+        amqp_default_exchange=DelayedExchange(rtt["amqp"]),  # type: ignore
+        game_cache_repo=game_cache_repo,
+        lobby_cache_repo=lobby_cache_repo,
+    )
+
+    # trace the steps
+    service._add_bg_event_loop = tracer.wrap("register", service._add_bg_event_loop)
+    service._notify_user_join = tracer.wrap("user joined", service._notify_user_join)
+    service._send_start_msg = tracer.wrap("game start", service._send_start_msg)
+    populate = tracer.wrap(
+        "populate cache",
+        lambda game_id: populate_serial(
+            redis, game_cache_repo, lobby_cache_repo, game_id
+        ),
+    )
+    game_cache_repo.populate_with_lobby_cache = tracer.wrap(
+        "populate cache", game_cache_repo.populate_with_lobby_cache
+    )
+    lobby_cache_repo.clear_cache = tracer.wrap(
+        "clear lobby", lobby_cache_repo.clear_cache
+    )
+    start_game = MemoryGameRepo.start_game
+    MemoryGameRepo.start_game = tracer.wrap(  # type: ignore
+        "start game", delayed(start_game, rtt["db"])
+    )
+    DelayedSession.commit = tracer.wrap("commit", DelayedSession.commit)  # type: ignore
+
+    # seated players, set up without delays
+    setup_cache_repo = LobbyCacheRepo(redis_conn=raw_redis, setting=setting)  # type: ignore
+    totals: list[float] = []
+    for _ in range(args.number):
+        async with MemorySessionmaker(sessionmaker.store)() as session:
+            game = await GameRepo(session).create(GameType.MULTI, GameStatus.LOBBY)  # type: ignore
+            game.player_count = setting.game.player_limit
+        players = [
+            LobbyUserInfo(id=f"user-{i}", name=f"user-{i}")
+            for i in range(setting.game.player_limit)
+        ]
+        for player in players:
+            await setup_cache_repo.add_player(game_id=game.id, user_info=player)
+        await setup_cache_repo.set_start_time(
+            game_id=game.id, start_time=datetime.now(UTC)
+        )
+
+        ws = NullWebSocket()
+        tracer.reset()
+        start = perf_counter()
+        if mode == "serial":
+            await enter_serial(
+                service, sessionmaker, populate, ws, players[-1], game.id
+            )
+        else:
+            await service._enter_lobby(
+                websocket=ws,  # type: ignore
+                user_info=players[-1],
+                game_id=game.id,
+                guest_token_key=None,
+                game_full=True,
+            )
+        totals.append(perf_counter() - start)
+        await bg_manager.cleanup()
+
+    MemoryGameRepo.start_game = start_game  # type: ignore
+    DelayedSession.commit = DelayedSession.commit.__wrapped__  # type: ignore
+
+    print(f"\n{mode}")
+    tracer.print(totals[-1])
+    p = quantiles(totals, n=100, method="inclusive")
+    print(f"total p50 {p[49] * 1000:.2f} ms, p95 {p[94] * 1000:.2f} ms")
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--redis-rtt", type=float, default=0.5, help="ms")
+    parser.add_argument("--amqp-rtt", type=float, default=1, help="ms")
+    parser.add_argument("--db-rtt", type=float, default=1, help="ms")
+    args = parser.parse_args()
+
+    print(
+        f"round trips: redis {args.redis_rtt} ms, amqp {args.amqp_rtt} ms, "
+        f"db {args.db_rtt} ms"
+    )
+    for mode in ("serial", "concurrent"):
+        await run(mode, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+"""
+Keystroke replay log size per race and encode / decode throughput.
+
+Races are simulated: every player types the 25 words of a game ('--word-length'
+characters and a space each) at a WPM drawn from a normal distribution, with
+random jitter between keystrokes and a typo ('--typo-rate') now and then
+costing a backspace.
+
+Sizes per race:
+- json: the keystroke messages as published on the broker, one per line
+- rows: varints, keystroke by keystroke (delta time, slot, word, char)
+- columns: 'ReplayLog', each field in its own column
+- +zlib: the same compressed, for reference, logs are stored uncompressed
+
+Throughput: 'ReplayLog.append' per keystroke, 'encode' / 'decode_segment' per
+race, and 'ReplayRecorder.record' on the broadcast path.
+"""
+
+import json
+import random
+import zlib
+from argparse import ArgumentParser
+from statistics import fmean
+from time import perf_counter
+
+from typephoon_api.lib.replay import (
+    ReplayLog,
+    ReplayRecorder,
+    decode_segment,
+    write_varint,
+)
+from typephoon_api.repositories.memory import MemorySessionmaker
+from typephoon_api.types.setting import Setting
+
+WORDS = 25
+
+# (at, user_id, word_index, char_index)
+Race = list[tuple[float, str, int, int]]
+
+
+def simulate(args, started_at: float) -> Race:
+    keystrokes: Race = []
+    for _ in range(args.players):
+        user_id = f"{random.getrandbits(128):032x}"
+        wpm = max(random.gauss(args.wpm_mean, args.wpm_sd), 15)
+        interval = 60 / (wpm * 5)
+        at = started_at + random.uniform(0.2, 0.8)
+        for word_index in range(WORDS):
+            char_index = 0
+            while char_index <= args.word_length:
+                at += max(random.gauss(interval, interval / 3), 0.01)
+                if char_index and random.random() < args.typo_rate:
+                    # typo then backspace
+                    keystrokes.append((at, user_id, word_index, char_index + 1))
+                    at += interval
+                keystrokes.append((at, user_id, word_index, char_index))
+                char_index += 1
+    keystrokes.sort()
+    return keystrokes
+
+
+def encode_json(race: Race) -> bytes:
+    return b"".join(
+        json.dumps(
+            {
+                "game_id": 12345678,
+                "user_id": user_id,
+                "word_index": word_index,
+                "char_index": char_index,
+                "sent_at": at,
+            }
+        ).encode()
+        + b"\n"
+        for at, user_id, word_index, char_index in race
+    )
+
+
+def encode_rows(race: Race, started_at: float) -> bytes:
+    buf = bytearray()
+    slots: dict[str, int] = {}
+    for user_id in dict.fromkeys(i[1] for i in race):
+        slots[user_id] = len(slots)
+        encoded = user_id.encode()
+        write_varint(buf, len(encoded))
+        buf += encoded
+
+    last = int(started_at * 1000)
+    for at, user_id, word_index, char_index in race:
+        at_ms = int(at * 1000)
+        write_varint(buf, max(at_ms - last, 0))
+        write_varint(buf, slots[user_id])
+        write_varint(buf, word_index)
+        write_varint(buf, char_index)
+        last = max(at_ms, last)
+    return bytes(buf)
+
+
+def encode_columns(race: Race, started_at: float) -> bytes:
+    log = ReplayLog(started_at=started_at)
+    for at, user_id, word_index, char_index in race:
+        log.append(user_id=user_id, word_index=word_index, char_index=char_index, at=at)
+    return log.encode()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--races", type=int, default=200)
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--word-length", type=int, default=5)
+    parser.add_argument("--wpm-mean", type=float, default=65)
+    parser.add_argument("--wpm-sd", type=float, default=25)
+    parser.add_argument("--typo-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    started_at = 1_800_000_000.0
+    races = [simulate(args, started_at) for _ in range(args.races)]
+    keystrokes = sum(len(i) for i in races)
+
+    sizes: dict[str, list[int]] = {
+        "json": [],
+        "json+zlib": [],
+        "rows": [],
+        "rows+zlib": [],
+        "columns": [],
+        "columns+zlib": [],
+    }
+    encoded: list[bytes] = []
+    for race in races:
+        for name, data in (
+            ("json", encode_json(race)),
+            ("rows", encode_rows(race, started_at)),
+            ("columns", encode_columns(race, started_at)),
+        ):
+            sizes[name].append(len(data))
+            sizes[f"{name}+zlib"].append(len(zlib.compress(data)))
+        encoded.append(encode_columns(race, started_at))
+
+    print(
+        f"{args.races} races, {keystrokes / args.races:.0f} keystrokes per race\n"
+        f"{'format':<14}{'bytes/race':>12}{'bytes/key':>12}{'vs json':>10}"
+    )
+    json_size = fmean(sizes["json"])
+    for name, values in sizes.items():
+        size = fmean(values)
+        print(
+            f"{name:<14}{size:>12.0f}{size * args.races / keystrokes:>12.2f}"
+            f"{json_size / size:>9.1f}x"
+        )
+
+    # throughput
+    start = perf_counter()
+    logs: list[ReplayLog] = []
+    for race in races:
+        log = ReplayLog(started_at=started_at)
+        for at, user_id, word_index, char_index in race:
+            log.append(
+                user_id=user_id, word_index=word_index, char_index=char_index, at=at
+            )
+        logs.append(log)
+    append = perf_counter() - start
+
+    start = perf_counter()
+    for log in logs:
+        log.encode()
+    encode = perf_counter() - start
+
+    start = perf_counter()
+    for data in encoded:
+        decode_segment(data)
+    decode = perf_counter() - start
+
+    recorder = ReplayRecorder(setting=Setting(), sessionmaker=MemorySessionmaker())  # type: ignore
+    start = perf_counter()
+    for game_id, race in enumerate(races):
+        for at, user_id, word_index, char_index in race:
+            recorder.record(
+                game_id=game_id,
+                user_id=user_id,
+                word_index=word_index,
+                char_index=char_index,
+                at=at,
+            )
+    record = perf_counter() - start
+
+    print(
+        f"\nappend  {keystrokes / append:>12,.0f} keystrokes/s\n"
+        f"record  {keystrokes / record:>12,.0f} keystrokes/s\n"
+        f"encode  {args.races / encode:>12,.0f} races/s\n"
+        f"decode  {args.races / decode:>12,.0f} races/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
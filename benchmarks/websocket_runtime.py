@@ -0,0 +1,254 @@
+"""
+Websocket throughput for each event loop / HTTP parser combination.
+
+A server is started in a subprocess per combination, with the real 'GameBG' /
+'LobbyBG' background tasks. AMQP is replaced by a loopback exchange that
+broadcasts straight to the 'BGManager', the same work 'KeystrokeConsumer'
+and 'LobbyNotifyConsumer' do.
+
+- keystroke: every player of every game sends keystrokes, each one is
+  delivered to the other players in the same game
+- lobby: lobby notifications are posted over HTTP and pushed to every player
+  in the lobby
+"""
+
+import asyncio
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from itertools import product
+from time import perf_counter
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, WebSocket
+from pamqp.commands import Basic
+from websockets.asyncio.client import connect
+
+from typephoon_api.lib.background_tasks.base import BGManager
+from typephoon_api.lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from typephoon_api.lib.background_tasks.lobby import (
+    LobbyBG,
+    LobbyBGMsg,
+    LobbyBGMsgEvent,
+)
+from typephoon_api.lib.runtime import resolve_runtime
+from typephoon_api.types.amqp import KeystrokeMsg
+from typephoon_api.types.enums import EventLoopType, HTTPImplType
+from typephoon_api.types.setting import ServerSetting, Setting
+
+PLAYERS = 5
+
+
+class LoopbackExchange:
+    def __init__(self, bg_manager: BGManager[GameBGMsg, GameBG]) -> None:
+        self._bg_manager = bg_manager
+
+    async def publish(self, message, routing_key: str):
+        msg = KeystrokeMsg.model_validate_json(message.body)
+        await self._bg_manager.broadcast(
+            game_id=msg.game_id,
+            msg=GameBGMsg(
+                game_id=msg.game_id,
+                event=GameBGMsgEvent.KEY_STOKE,
+                user_id=msg.user_id,
+                word_index=msg.word_index,
+                char_index=msg.char_index,
+            ),
+        )
+        return Basic.Ack()
+
+
+def build_app() -> FastAPI:
+    setting = Setting()
+    app = FastAPI()
+    game_bg_manager = BGManager[GameBGMsg, GameBG]()
+    lobby_bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+    exchange = LoopbackExchange(game_bg_manager)
+
+    @app.websocket("/game/{game_id}/{user_id}")
+    async def game(ws: WebSocket, game_id: int, user_id: str):
+        await ws.accept()
+        bg = GameBG(
+            ws=ws,
+            user_id=user_id,
+            exchange=exchange,  # type: ignore
+            setting=setting,
+            game_id=game_id,
+        )
+        await game_bg_manager.add(game_id, bg)
+        await bg.close_wait()
+
+    @app.websocket("/lobby/{game_id}/{user_id}")
+    async def lobby(ws: WebSocket, game_id: int, user_id: str):
+        await ws.accept()
+        bg = LobbyBG(ws=ws, user_id=user_id, game_id=game_id)
+        await lobby_bg_manager.add(game_id, bg)
+        await bg.close_wait()
+
+    @app.post("/lobby/{game_id}/notify")
+    async def notify(game_id: int, user_id: str):
+        await lobby_bg_manager.broadcast(
+            game_id,
+            LobbyBGMsg(
+                event=LobbyBGMsgEvent.USER_JOINED, game_id=game_id, user_id=user_id
+            ),
+        )
+
+    return app
+
+
+def serve(port: int, loop: str, http: str):
+    setting = Setting(server=ServerSetting(loop=loop, http=http))
+    runtime = resolve_runtime(setting)
+    uvicorn.run(
+        build_app(),
+        port=port,
+        loop=runtime.loop.value,
+        http=runtime.http.value,
+        log_level="warning",
+    )
+
+
+async def receive(ws, count: int):
+    for _ in range(count):
+        await ws.recv()
+
+
+async def keystroke_workload(base: str, games: int, keystrokes: int) -> float:
+    """
+    returns delivered messages per second
+    """
+    conns = [
+        [await connect(f"{base}/game/{g}/user-{p}") for p in range(PLAYERS)]
+        for g in range(games)
+    ]
+
+    msg = '{"event":"KEY_STOKE","game_id":%s,"word_index":%s,"char_index":%s}'
+
+    async def send(ws, game_id: int):
+        for i in range(keystrokes):
+            await ws.send(msg % (game_id, i // 5, i % 5))
+
+    expected = keystrokes * (PLAYERS - 1)
+    start = perf_counter()
+    await asyncio.gather(
+        *[send(ws, g) for g, players in enumerate(conns) for ws in players],
+        *[receive(ws, expected) for players in conns for ws in players],
+    )
+    elapsed = perf_counter() - start
+
+    for players in conns:
+        for ws in players:
+            await ws.close()
+
+    return games * PLAYERS * expected / elapsed
+
+
+async def lobby_workload(base: str, http_base: str, lobbies: int, notifies: int):
+    """
+    returns delivered messages per second
+    """
+    conns = [
+        [await connect(f"{base}/lobby/{g}/user-{p}") for p in range(PLAYERS)]
+        for g in range(lobbies)
+    ]
+
+    async with httpx.AsyncClient(base_url=http_base) as client:
+
+        async def post(game_id: int):
+            for i in range(notifies):
+                await client.post(
+                    f"/lobby/{game_id}/notify", params={"user_id": f"joined-{i}"}
+                )
+
+        start = perf_counter()
+        await asyncio.gather(
+            *[post(g) for g in range(lobbies)],
+            *[receive(ws, notifies) for players in conns for ws in players],
+        )
+        elapsed = perf_counter() - start
+
+    for players in conns:
+        for ws in players:
+            await ws.close()
+
+    return lobbies * PLAYERS * notifies / elapsed
+
+
+async def wait_started(http_base: str):
+    async with httpx.AsyncClient(base_url=http_base) as client:
+        for _ in range(100):
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def bench(args, loop: str, http: str) -> tuple[float, float]:
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            "--port",
+            str(args.port),
+            "--loop",
+            loop,
+            "--http",
+            http,
+        ]
+    )
+    http_base = f"http://127.0.0.1:{args.port}"
+    ws_base = f"ws://127.0.0.1:{args.port}"
+    try:
+        await wait_started(http_base)
+        keystroke = await keystroke_workload(ws_base, args.games, args.keystrokes)
+        lobby = await lobby_workload(ws_base, http_base, args.games, args.notifies)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return keystroke, lobby
+
+
+async def main(args):
+    setting = Setting()
+    available = {
+        (i.loop, i.http)
+        for i in [
+            resolve_runtime(
+                setting.model_copy(
+                    update={"server": ServerSetting(loop=loop, http=http)}
+                )
+            )
+            for loop, http in product(
+                [EventLoopType.UVLOOP, EventLoopType.ASYNCIO],
+                [HTTPImplType.HTTPTOOLS, HTTPImplType.H11],
+            )
+        ]
+    }
+
+    print(f"{'loop':<10}{'http':<12}{'keystroke msg/s':>18}{'lobby msg/s':>14}")
+    for loop, http in sorted(available, reverse=True):
+        keystroke, lobby = await bench(args, loop.value, http.value)
+        print(f"{loop:<10}{http:<12}{keystroke:>18.0f}{lobby:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--keystrokes", type=int, default=200)
+    parser.add_argument("--notifies", type=int, default=100)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--serve", action="store_true", help=SUPPRESS)
+    parser.add_argument("--loop", default="auto")
+    parser.add_argument("--http", default="auto")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.loop, args.http)
+    else:
+        asyncio.run(main(args))
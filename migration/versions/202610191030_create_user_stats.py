@@ -0,0 +1,60 @@
+"""create_user_stats
+
+Revision ID: 5b1f0c7a9d42
+Revises: e73c920ce493
+Create Date: 2026-10-19 10:30:12.418305
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1f0c7a9d42"
+down_revision: Union[str, None] = "e73c920ce493"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Text(), nullable=False),
+        sa.Column(
+            "total_games", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+        sa.Column("wpm_sum", sa.Float(), server_default=sa.text("0"), nullable=False),
+        sa.Column(
+            "wpm_raw_sum", sa.Float(), server_default=sa.text("0"), nullable=False
+        ),
+        sa.Column("acc_sum", sa.Float(), server_default=sa.text("0"), nullable=False),
+        sa.Column("wpm_best", sa.Float(), server_default=sa.text("0"), nullable=False),
+        sa.Column("acc_best", sa.Float(), server_default=sa.text("0"), nullable=False),
+        sa.Column(
+            "recent_wpm",
+            postgresql.ARRAY(sa.Float()),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+        sa.Column(
+            "recent_wpm_raw",
+            postgresql.ARRAY(sa.Float()),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+        sa.Column(
+            "recent_acc",
+            postgresql.ARRAY(sa.Float()),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_stats")
@@ -0,0 +1,76 @@
+"""add_game_and_game_result_indexes
+
+Revision ID: 9c3e4a71b0d8
+Revises: 5b1f0c7a9d42
+Create Date: 2026-10-19 11:30:47.902114
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3e4a71b0d8"
+down_revision: Union[str, None] = "5b1f0c7a9d42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # build indexes without locking out writes on existing deployments
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_game_results_user_id_finished_at",
+            "game_results",
+            ["user_id", sa.text("finished_at DESC")],
+            postgresql_include=[
+                "game_id",
+                "rank",
+                "wpm_raw",
+                "wpm_correct",
+                "accuracy",
+            ],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_game_results_user_id_wpm_correct",
+            "game_results",
+            ["user_id", sa.text("wpm_correct DESC")],
+            postgresql_include=["accuracy"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # 0: GameStatus.LOBBY
+        op.create_index(
+            "ix_games_lobby_player_count",
+            "games",
+            ["player_count"],
+            postgresql_where=sa.text("status = 0"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_games_lobby_player_count",
+            table_name="games",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_game_results_user_id_wpm_correct",
+            table_name="game_results",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_game_results_user_id_finished_at",
+            table_name="game_results",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,41 @@
+"""add_games_pool_index
+
+Revision ID: 3f8d2b6e1c57
+Revises: 9c3e4a71b0d8
+Create Date: 2026-10-19 12:30:12.480391
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f8d2b6e1c57"
+down_revision: Union[str, None] = "9c3e4a71b0d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # 3: GameStatus.POOL
+        op.create_index(
+            "ix_games_pool",
+            "games",
+            ["id"],
+            postgresql_where=sa.text("status = 3"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_games_pool",
+            table_name="games",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
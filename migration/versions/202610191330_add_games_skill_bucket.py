@@ -0,0 +1,46 @@
+"""add_games_skill_bucket
+
+Revision ID: 6a1e9d4c2b83
+Revises: 3f8d2b6e1c57
+Create Date: 2026-10-19 13:30:41.215907
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6a1e9d4c2b83"
+down_revision: Union[str, None] = "3f8d2b6e1c57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable without default, no table rewrite
+    op.add_column("games", sa.Column("skill_bucket", sa.Integer(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        # 0: GameStatus.LOBBY
+        op.create_index(
+            "ix_games_lobby_skill_bucket",
+            "games",
+            ["skill_bucket", "created_at"],
+            postgresql_where=sa.text("status = 0"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_games_lobby_skill_bucket",
+            table_name="games",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.drop_column("games", "skill_bucket")
@@ -0,0 +1,45 @@
+"""create_game_replays
+
+Revision ID: 9c4b7e2a1d60
+Revises: 6a1e9d4c2b83
+Create Date: 2026-10-19 14:30:12.538104
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from typephoon_api.orm.custom import BigSerial
+
+# revision identifiers, used by Alembic.
+revision: str = "9c4b7e2a1d60"
+down_revision: Union[str, None] = "6a1e9d4c2b83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "game_replays",
+        sa.Column("id", BigSerial(), nullable=False),
+        sa.Column("game_id", sa.BigInteger(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["game_id"], ["games.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_game_replays_game_id", "game_replays", ["game_id", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_game_replays_game_id", table_name="game_replays")
+    op.drop_table("game_replays")
@@ -0,0 +1,63 @@
+"""alter_game_results_history_index
+
+Revision ID: 2d7f5a9c3e14
+Revises: 9c4b7e2a1d60
+Create Date: 2026-10-19 15:30:08.417352
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2d7f5a9c3e14"
+down_revision: Union[str, None] = "9c4b7e2a1d60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 'game_id' as a key column, history pages are ordered by it on ties.
+    # the new index is built before the old one is dropped, so history
+    # queries are never left without one
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_game_results_user_id_finished_at_game_id",
+            "game_results",
+            ["user_id", sa.text("finished_at DESC"), sa.text("game_id DESC")],
+            postgresql_include=["rank", "wpm_raw", "wpm_correct", "accuracy"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_game_results_user_id_finished_at",
+            table_name="game_results",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_game_results_user_id_finished_at",
+            "game_results",
+            ["user_id", sa.text("finished_at DESC")],
+            postgresql_include=[
+                "game_id",
+                "rank",
+                "wpm_raw",
+                "wpm_correct",
+                "accuracy",
+            ],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_game_results_user_id_finished_at_game_id",
+            table_name="game_results",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,44 @@
+"""add_user_stats_recent_finished_at
+
+Revision ID: 8e3a6d1f4b27
+Revises: 2d7f5a9c3e14
+Create Date: 2026-10-19 16:30:41.205718
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "8e3a6d1f4b27"
+down_revision: Union[str, None] = "2d7f5a9c3e14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user_stats",
+        sa.Column(
+            "recent_finished_at",
+            postgresql.ARRAY(sa.DateTime(timezone=True)),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+    )
+    # existing rings are the newest results of each user
+    op.execute("""
+        UPDATE user_stats SET recent_finished_at = ARRAY(
+            SELECT finished_at FROM game_results
+            WHERE game_results.user_id = user_stats.user_id
+            ORDER BY finished_at DESC
+            LIMIT cardinality(user_stats.recent_wpm)
+        )
+        """)
+
+
+def downgrade() -> None:
+    op.drop_column("user_stats", "recent_finished_at")
@@ -1,9 +1,7 @@
 from argparse import ArgumentParser
 
-import uvicorn
-
-from .lib.server_setup import create_server
-from .lib.util import db_migration, init_logger, load_setting
+from .lib.supervisor import Supervisor, serve
+from .lib.util import backfill_user_stats, db_migration, init_logger, load_setting
 from .types.cli import CLIArgs
 
 
@@ -33,6 +31,12 @@ def main():
         dest="init",
         action="store_true",
     )
+    parser.add_argument(
+        "--backfill-user-stats",
+        help="Rebuild user statistics from existing game results and exit",
+        dest="backfill_user_stats",
+        action="store_true",
+    )
     args = parser.parse_args(namespace=CLIArgs)
 
     setting = load_setting(args.setting)
@@ -41,11 +45,15 @@ def main():
     if args.init:
         db_migration(setting)
 
+    if args.backfill_user_stats:
+        backfill_user_stats(setting)
+        return
+
     # start the server
-    app = create_server(setting)
-    uvicorn.run(
-        app, host="0.0.0.0", port=setting.server.port, log_config=setting.logger
-    )
+    if setting.server.workers > 1:
+        Supervisor(setting=setting, setting_path=args.setting).run()
+    else:
+        serve(setting)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, Query
+
+from ..lib.dependencies import get_admin_service
+from ..lib.response import PydanticResponse
+from ..lib.util import catch_error_async
+from ..services.admin import AdminService
+from ..services.base import ServiceRet
+from ..types.enums import ErrorCode
+from ..types.responses.admin import ProfilerResponse
+from ..types.responses.base import ErrorResponse
+
+router = APIRouter(tags=["Admin"], prefix="/admin")
+
+ADMIN_RESPONSES: dict[int | str, dict] = {
+    200: {"model": ProfilerResponse},
+    403: {"model": ErrorResponse},
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse},
+}
+
+
+def _profiler_response(ret: ServiceRet) -> PydanticResponse:
+    if not ret.ok:
+        assert ret.error
+        if ret.error.code == ErrorCode.INVALID_TOKEN:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=403)
+        elif ret.error.code == ErrorCode.PROFILER_DISABLED:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
+        elif ret.error.code == ErrorCode.PROFILER_RUNNING:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=409)
+        else:
+            raise ValueError(f"unknown error code: {ret.error.code}")
+
+    assert ret.data is not None
+    msg = ProfilerResponse(running=ret.data.running, output=ret.data.output)
+    return PydanticResponse(msg, status_code=200)
+
+
+@router.post("/profiler/start", responses=ADMIN_RESPONSES)
+@catch_error_async
+async def start_profiler(
+    x_admin_token: Annotated[str | None, Header()] = None,
+    duration: Annotated[float | None, Query(gt=0)] = None,
+    service: AdminService = Depends(get_admin_service),
+):
+    """
+    Start sampling the event loop, samples are written when 'duration' passes
+    or on '/profiler/stop'.
+    - duration: seconds, defaults to 'profiler.duration'
+    """
+    ret = await service.start_profiler(token=x_admin_token, duration=duration)
+    return _profiler_response(ret)
+
+
+@router.post("/profiler/stop", responses=ADMIN_RESPONSES)
+@catch_error_async
+async def stop_profiler(
+    x_admin_token: Annotated[str | None, Header()] = None,
+    service: AdminService = Depends(get_admin_service),
+):
+    """
+    Stop sampling and return the collapsed stack file path
+    """
+    ret = await service.stop_profiler(token=x_admin_token)
+    return _profiler_response(ret)
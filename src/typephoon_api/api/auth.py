@@ -1,8 +1,7 @@
 from urllib.parse import quote
 
 from fastapi import APIRouter, Depends
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import RedirectResponse
 
 from typephoon_api.types.errors import TokenNotProvided
 
@@ -13,6 +12,7 @@ from ..lib.dependencies import (
     get_setting,
     refresh_cookie,
 )
+from ..lib.response import PydanticResponse
 from ..lib.util import catch_error_async
 from ..services.auth import AuthService
 from ..types.enums import CookieNames, ErrorCode
@@ -95,8 +95,8 @@ async def logout(
         ret = await service.logout(access_token=access_token)
         assert ret.ok
 
-    msg = jsonable_encoder(SuccessResponse())
-    response = JSONResponse(msg, status_code=200)
+    msg = SuccessResponse()
+    response = PydanticResponse(msg, status_code=200)
 
     response.delete_cookie(CookieNames.ACCESS_TOKEN)
     response.delete_cookie(
@@ -134,14 +134,14 @@ async def token_refresh(
             ErrorCode.REFRESH_TOKEN_MISSMATCH,
             ErrorCode.INVALID_TOKEN,
         }:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(SuccessResponse())
-    response = JSONResponse(msg, status_code=200)
+    msg = SuccessResponse()
+    response = PydanticResponse(msg, status_code=200)
     response.set_cookie(
         CookieNames.ACCESS_TOKEN,
         ret.data,
@@ -167,14 +167,14 @@ async def get_guest_token(
     if not ret.ok:
         assert ret.error is not None
         if ret.error.code == ErrorCode.KEY_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(SuccessResponse())
-    response = JSONResponse(msg, status_code=200)
+    msg = SuccessResponse()
+    response = PydanticResponse(msg, status_code=200)
     response.set_cookie(
         CookieNames.ACCESS_TOKEN,
         ret.data,
@@ -1,8 +1,8 @@
 from logging import getLogger
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, WebSocket
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query, WebSocket
+from fastapi.responses import StreamingResponse
 
 from ..lib.dependencies import (
     GetAccessTokenInfoRet,
@@ -10,6 +10,7 @@ from ..lib.dependencies import (
     get_game_event_service,
     get_game_service,
 )
+from ..lib.response import PydanticResponse
 from ..lib.util import catch_error_async
 from ..services.game import GameService
 from ..services.game_event import GameEventService
@@ -32,13 +33,17 @@ router = APIRouter(tags=["Game"], prefix="/game")
 async def ws(
     websocket: WebSocket,
     game_id: int,
+    redirected: bool = False,
     service: GameEventService = Depends(get_game_event_service),
 ):
     """
     - send and recive each key stroke
+    - redirected: the client followed a 'REDIRECT' event here
     """
     try:
-        bg = await service.subscribe(websocket=websocket, game_id=game_id)
+        bg = await service.subscribe(
+            websocket=websocket, game_id=game_id, redirected=redirected
+        )
         if bg is not None:
             await service.close_wait(bg)
     except Exception as ex:
@@ -49,25 +54,27 @@ async def ws(
 @router.get(
     "/countdown",
     responses={200: {"model": GameCountdownResponse}, 400: {"model": ErrorResponse}},
+    deprecated=True,
 )
 @catch_error_async
 async def countdown(game_id: int, service: GameService = Depends(get_game_service)):
     """
     game countdown in seconds
+    - Deprecated: start time is pushed with the 'COUNTDOWN' event on the game websocket
     """
     ret = await service.get_countdown(game_id)
 
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.GAME_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(GameCountdownResponse(seconds_left=ret.data))
-    return JSONResponse(msg, status_code=200)
+    msg = GameCountdownResponse(seconds_left=ret.data)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.post(
@@ -103,13 +110,13 @@ async def write_statistics(
     if not ret.ok:
         assert ret.error
         if ret.error.code in {ErrorCode.GAME_NOT_FOUND, ErrorCode.NOT_A_PARTICIPANT}:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
-    msg = jsonable_encoder(SuccessResponse())
-    return JSONResponse(msg, status_code=200)
+    msg = SuccessResponse()
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
@@ -136,17 +143,17 @@ async def players(
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.GAME_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
         elif ret.error.code == ErrorCode.NOT_A_PARTICIPANT:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(GamePlayersResponse(me=ret.data.me, others=ret.data.others))
-    return JSONResponse(msg, status_code=200)
+    msg = GamePlayersResponse(me=ret.data.me, others=ret.data.others)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
@@ -154,24 +161,69 @@ async def players(
     responses={200: {"model": GameResultResponse}, 404: {"model": ErrorResponse}},
 )
 @catch_error_async
-async def result(game_id: int, service: GameService = Depends(get_game_service)):
+async def result(
+    game_id: int,
+    since: Annotated[int | None, Query(ge=0)] = None,
+    service: GameService = Depends(get_game_service),
+):
     """
     information for the result of this game
     - ranking, wpm, acc ... etc
+    - since: 'version' of a previous response, only players updated after it are returned
     """
-    ret = await service.get_result(game_id)
+    ret = await service.get_result(game_id=game_id, since=since)
 
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.GAME_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
+        else:
+            raise ValueError(f"unknown error code: {ret.error.code}")
+
+    assert ret.data is not None
+    msg = GameResultResponse(ranking=ret.data.ranking, version=ret.data.version)
+    return PydanticResponse(msg, status_code=200)
+
+
+@router.get(
+    "/replay",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/octet-stream": {}}},
+        400: {"model": ErrorResponse},
+        401: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+    },
+)
+@catch_error_async
+async def replay(
+    game_id: int,
+    current_user: GetAccessTokenInfoRet = Depends(get_access_token_info),
+    service: GameService = Depends(get_game_service),
+):
+    """
+    Keystroke logs of a finished game, streamed in chunks
+    - one log per server the players typed on, each prefixed by its length (varint)
+    - log format: see 'lib.replay'
+    """
+    if current_user.error:
+        raise current_user.error
+
+    ret = await service.get_replay(game_id=game_id)
+    if not ret.ok:
+        assert ret.error
+        if ret.error.code in {ErrorCode.GAME_NOT_FOUND, ErrorCode.REPLAY_NOT_FOUND}:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
+        elif ret.error.code == ErrorCode.GAME_NOT_FINISHED:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(GameResultResponse(ranking=ret.data.ranking))
-    return JSONResponse(msg, status_code=200)
+    return StreamingResponse(ret.data, media_type="application/octet-stream")
 
 
 @router.get(
@@ -190,11 +242,11 @@ async def words(
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.WORDS_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(GameWordsResponse(words=ret.data))
-    return JSONResponse(msg, status_code=200)
+    msg = GameWordsResponse(words=ret.data)
+    return PydanticResponse(msg, status_code=200)
@@ -1,28 +1,33 @@
 from fastapi import APIRouter, Depends
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 from ..lib.dependencies import get_health_check_service
+from ..lib.response import PydanticResponse
 from ..lib.util import catch_error_async
 from ..services.health_check import HealthCheckService
-from ..types.responses.base import ErrorResponse, SuccessResponse
+from ..types.responses.base import SuccessResponse
+from ..types.responses.health_check import ReadyResponse
 
 router = APIRouter(tags=["Health Check"], prefix="/healthcheck")
 
 
 @router.get(
-    "/ready", responses={200: {"model": SuccessResponse}, 500: {"model": ErrorResponse}}
+    "/ready",
+    responses={200: {"model": ReadyResponse}, 500: {"model": ReadyResponse}},
 )
 @catch_error_async
 async def ready(service: HealthCheckService = Depends(get_health_check_service)):
+    """
+    Served from the cached result of the background dependency checks
+    """
     result = await service.ready()
 
-    if result.ok:
-        msg = jsonable_encoder(SuccessResponse())
-        return JSONResponse(msg, status_code=200)
-
-    msg = jsonable_encoder(ErrorResponse())
-    return JSONResponse(msg, status_code=500)
+    assert result.data is not None
+    msg = ReadyResponse(
+        ok=result.ok,
+        draining=result.data.draining,
+        dependencies=result.data.dependencies,
+    )
+    return PydanticResponse(msg, status_code=200 if result.ok else 500)
 
 
 @router.get("/alive", responses={200: {"model": SuccessResponse}})
@@ -31,7 +36,7 @@ async def alive(service: HealthCheckService = Depends(get_health_check_service))
     result = await service.alive()
 
     if result.ok:
-        msg = jsonable_encoder(SuccessResponse())
-        return JSONResponse(msg, status_code=200)
+        msg = SuccessResponse()
+        return PydanticResponse(msg, status_code=200)
 
     raise ValueError("this should never happen !!")
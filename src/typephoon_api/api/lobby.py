@@ -2,8 +2,6 @@ from logging import getLogger
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query, WebSocket
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 from ..lib.dependencies import (
     GetAccessTokenInfoRet,
@@ -11,6 +9,7 @@ from ..lib.dependencies import (
     get_lobby_service,
     get_queue_in_service,
 )
+from ..lib.response import PydanticResponse
 from ..lib.util import catch_error_async
 from ..services.lobby import LobbyService
 from ..services.queue_in import QueueInService
@@ -28,15 +27,20 @@ async def queue_in(
     websocket: WebSocket,
     prev_game_id: int | None = None,
     queue_in_type: Annotated[QueueInType, Query()] = QueueInType.NEW,
+    redirected: bool = False,
     service: QueueInService = Depends(get_queue_in_service),
 ):
     """
     [Game mode: Multi]
     This endpoint is reponsible for sending lobby related events to users.
+    - redirected: the client followed a 'REDIRECT' event here
     """
     try:
         bg = await service.queue_in(
-            websocket=websocket, queue_in_type=queue_in_type, prev_game_id=prev_game_id
+            websocket=websocket,
+            queue_in_type=queue_in_type,
+            prev_game_id=prev_game_id,
+            redirected=redirected,
         )
         if bg is not None:
             await service.close_wait(bg)
@@ -69,22 +73,23 @@ async def players(
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.GAME_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
         elif ret.error.code == ErrorCode.NOT_A_PARTICIPANT:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(LobbyPlayersResponse(me=ret.data.me, others=ret.data.others))
-    return JSONResponse(msg, status_code=200)
+    msg = LobbyPlayersResponse(me=ret.data.me, others=ret.data.others)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
     "/countdown",
     responses={200: {"model": LobbyCountdownResponse}, 404: {"model": ErrorResponse}},
+    deprecated=True,
 )
 @catch_error_async
 async def get_countdown(
@@ -92,6 +97,7 @@ async def get_countdown(
 ):
     """
     lobby countdown in seconds
+    - Deprecated: start time is pushed with the 'COUNTDOWN' event on the lobby websocket
     """
 
     ret = await service.get_countdown(game_id=game_id)
@@ -99,11 +105,11 @@ async def get_countdown(
     if not ret.ok:
         assert ret.error
         if ret.error.code == ErrorCode.GAME_NOT_FOUND:
-            msg = jsonable_encoder(ErrorResponse(error=ret.error))
-            return JSONResponse(msg, status_code=404)
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=404)
         else:
             raise ValueError(f"unknown error code: {ret.error.code}")
 
     assert ret.data is not None
-    msg = jsonable_encoder(LobbyCountdownResponse(seconds_left=ret.data))
-    return JSONResponse(msg, status_code=200)
+    msg = LobbyCountdownResponse(seconds_left=ret.data)
+    return PydanticResponse(msg, status_code=200)
@@ -2,16 +2,16 @@ from logging import getLogger
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
 
 from ..lib.dependencies import (
     GetAccessTokenInfoRet,
     get_access_token_info,
     get_profile_service,
 )
+from ..lib.response import PydanticResponse
 from ..lib.util import catch_error_async
 from ..services.profile import ProfileService
+from ..types.enums import ErrorCode
 from ..types.responses.base import ErrorResponse
 from ..types.responses.profile import (
     ProfileGraphResponse,
@@ -48,18 +48,16 @@ async def statistics(
     )
 
     assert ret.data is not None
-    msg = jsonable_encoder(
-        ProfileStatisticsResponse(
-            total_games=ret.data.total,
-            wpm_best=ret.data.wpm_best,
-            wpm_avg_10=ret.data.wpm_avg_10,
-            wpm_avg_all=ret.data.wpm_avg_all,
-            acc_best=ret.data.acc_best,
-            acc_avg_10=ret.data.acc_avg_10,
-            acc_avg_all=ret.data.acc_avg_all,
-        )
+    msg = ProfileStatisticsResponse(
+        total_games=ret.data.total,
+        wpm_best=ret.data.wpm_best,
+        wpm_avg_10=ret.data.wpm_avg_10,
+        wpm_avg_all=ret.data.wpm_avg_all,
+        acc_best=ret.data.acc_best,
+        acc_avg_10=ret.data.acc_avg_10,
+        acc_avg_all=ret.data.acc_avg_all,
     )
-    return JSONResponse(msg, status_code=200)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
@@ -88,8 +86,8 @@ async def graph(
     )
 
     assert ret.data is not None
-    msg = jsonable_encoder(ProfileGraphResponse(data=ret.data))
-    return JSONResponse(msg, status_code=200)
+    msg = ProfileGraphResponse(data=ret.data)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
@@ -105,9 +103,14 @@ async def graph(
 async def history(
     page: Annotated[int, Query(gt=0)] = 1,
     size: Annotated[int, Query(ge=0, le=200)] = 50,
+    cursor: Annotated[str | None, Query()] = None,
     current_user: GetAccessTokenInfoRet = Depends(get_access_token_info),
     service: ProfileService = Depends(get_profile_service),
 ):
+    """
+    - cursor: 'next_cursor' of the previous response, takes precedence over 'page'.
+              Prefer it over 'page', its cost does not grow with the page depth
+    """
     if current_user.error:
         raise current_user.error
 
@@ -117,18 +120,26 @@ async def history(
         user_type=current_user.payload.user_type,
         size=size,
         page=page,
+        cursor=cursor,
     )
 
+    if not ret.ok:
+        assert ret.error
+        if ret.error.code == ErrorCode.INVALID_CURSOR:
+            msg = ErrorResponse(error=ret.error)
+            return PydanticResponse(msg, status_code=400)
+        else:
+            raise ValueError(f"unknown error code: {ret.error.code}")
+
     assert ret.data is not None
-    msg = jsonable_encoder(
-        ProfileHistoryResponse(
-            total=ret.data.total,
-            has_prev_page=ret.data.has_prev_page,
-            has_next_page=ret.data.has_next_page,
-            data=ret.data.data,
-        )
+    msg = ProfileHistoryResponse(
+        total=ret.data.total,
+        has_prev_page=ret.data.has_prev_page,
+        has_next_page=ret.data.has_next_page,
+        next_cursor=ret.data.next_cursor,
+        data=ret.data.data,
     )
-    return JSONResponse(msg, status_code=200)
+    return PydanticResponse(msg, status_code=200)
 
 
 @router.get(
@@ -147,9 +158,7 @@ async def user_info(
         raise current_user.error
 
     assert current_user.payload
-    msg = jsonable_encoder(
-        ProfileUserInfoResponse(
-            id=current_user.payload.sub, name=current_user.payload.name
-        )
+    msg = ProfileUserInfoResponse(
+        id=current_user.payload.sub, name=current_user.payload.name
     )
-    return JSONResponse(msg, status_code=200)
+    return PydanticResponse(msg, status_code=200)
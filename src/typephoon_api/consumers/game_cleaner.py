@@ -1,3 +1,4 @@
+from datetime import datetime
 from logging import getLogger
 
 from aio_pika.abc import AbstractIncomingMessage, AbstractRobustConnection
@@ -5,6 +6,7 @@ from pydantic import ValidationError
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from ..lib.metrics import observe_consumer
 from ..repositories.game import GameRepo
 from ..repositories.game_cache import GameCacheRepo
 from ..repositories.lobby_cache import LobbyCacheRepo
@@ -30,9 +32,11 @@ class GameCleanerConsumer(AbstractConsumer):
     def _load_message(self, amqp_msg: AbstractIncomingMessage) -> GameCleanupMsg:
         return GameCleanupMsg.model_validate_json(amqp_msg.body)
 
+    @observe_consumer
     async def _process(self, msg: GameCleanupMsg):
         """
-        set game status to FINISHED, and clear all cache
+        set game status to FINISHED, persist finish count, and clear all cache.
+        Timers armed for an earlier claim of a pooled game are ignored
         """
         lobby_cache_repo = LobbyCacheRepo(
             redis_conn=self._redis_conn, setting=self._setting
@@ -40,14 +44,27 @@ class GameCleanerConsumer(AbstractConsumer):
         game_cache_repo = GameCacheRepo(
             redis_conn=self._redis_conn, setting=self._setting
         )
-        await lobby_cache_repo.clear_cache(msg.game_id)
-        await game_cache_repo.clear_cache(msg.game_id)
+
+        # ranks are assigned in cache, persist them before the cache is gone
+        finish_count = await game_cache_repo.get_finish_count(msg.game_id)
 
         async with self._sessionmaker() as session:
             game_repo = GameRepo(session)
+            if msg.claimed_at is not None:
+                game = await game_repo.get(msg.game_id)
+                if game and datetime.fromisoformat(msg.claimed_at) != game.created_at:
+                    logger.debug("stale timer, claimed_at: %s", msg.claimed_at)
+                    return
             await game_repo.set_finish(msg.game_id)
+            if finish_count is not None:
+                await game_repo.update_finish_count(
+                    id=msg.game_id, finish_count=finish_count
+                )
             await session.commit()
 
+        await lobby_cache_repo.clear_cache(msg.game_id)
+        await game_cache_repo.clear_cache(msg.game_id)
+
     async def on_message(self, amqp_msg: AbstractIncomingMessage):
         logger.debug("on message")
         try:
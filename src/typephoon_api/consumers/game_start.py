@@ -5,6 +5,7 @@ from pydantic import ValidationError
 
 from ..lib.background_tasks.base import BGManager
 from ..lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from ..lib.metrics import observe_consumer
 from ..types.amqp import GameStartMsg
 from ..types.setting import Setting
 from .base import AbstractConsumer
@@ -25,6 +26,7 @@ class GameStartConsumer(AbstractConsumer):
     def _load_message(self, amqp_msg: AbstractIncomingMessage) -> GameStartMsg:
         return GameStartMsg.model_validate_json(amqp_msg.body)
 
+    @observe_consumer
     async def _process(self, msg: GameStartMsg):
         # notify all users
         bg_msg = GameBGMsg(event=GameBGMsgEvent.START, game_id=msg.game_id)
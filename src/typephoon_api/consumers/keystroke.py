@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 from logging import getLogger
+from time import time
 
 from aio_pika.abc import AbstractIncomingMessage, AbstractRobustConnection
 from pydantic import ValidationError
 
 from ..lib.background_tasks.base import BGManager
 from ..lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from ..lib.metrics import KEYSTROKE_DELIVER_SECONDS, observe_consumer
 from ..types.amqp import KeystrokeHeader, KeystrokeMsg
 from ..types.setting import Setting
 from .base import AbstractConsumer
@@ -38,6 +40,7 @@ class KeystrokeConsumer(AbstractConsumer):
 
         return result
 
+    @observe_consumer
     async def _process(self, msg: KeystrokeMsg):
         bg_msg = GameBGMsg(
             game_id=msg.game_id,
@@ -45,9 +48,13 @@ class KeystrokeConsumer(AbstractConsumer):
             user_id=msg.user_id,
             word_index=msg.word_index,
             char_index=msg.char_index,
+            sent_at=msg.sent_at,
         )
         await self._bg_manager.broadcast(game_id=msg.game_id, msg=bg_msg)
 
+        if msg.sent_at is not None:
+            KEYSTROKE_DELIVER_SECONDS.observe(time() - msg.sent_at)
+
     async def on_message(self, amqp_msg: AbstractIncomingMessage):
         logger.debug("on message")
         try:
@@ -1,3 +1,4 @@
+from datetime import datetime
 from logging import getLogger
 
 from aio_pika import Message
@@ -12,7 +13,9 @@ from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ..lib.background_tasks.lobby import LobbyBGMsgEvent
+from ..lib.metrics import observe_consumer
 from ..lib.word_generator import WordGenerator
+from ..orm.game import GameStatus
 from ..repositories.game import GameRepo
 from ..repositories.game_cache import GameCacheRepo
 from ..repositories.lobby_cache import LobbyCacheRepo
@@ -54,7 +57,7 @@ class LobbyCountdownConsumer(AbstractConsumer):
         if not isinstance(confirm, Basic.Ack):
             raise PublishNotAcknowledged("game start notify publish failed")
 
-    async def _set_game_status(self, game_id: int) -> bool:
+    async def _set_game_status(self, game_id: int, claimed_at: str | None) -> bool:
         async with self._sessionmaker() as session:
             game_repo = GameRepo(
                 session=session, player_limit=self._setting.game.player_limit
@@ -68,6 +71,17 @@ class LobbyCountdownConsumer(AbstractConsumer):
             if game.start_at is not None:
                 logger.debug("game already started")
                 return False
+            # a claim that failed to commit returns its game to the pool
+            if game.status != GameStatus.LOBBY:
+                logger.debug("game not in lobby, status: %s", game.status)
+                return False
+            # armed for an earlier claim of a pooled game
+            if (
+                claimed_at is not None
+                and datetime.fromisoformat(claimed_at) != game.created_at
+            ):
+                logger.debug("stale timer, claimed_at: %s", claimed_at)
+                return False
 
             await game_repo.start_game(game_id)
             await session.commit()
@@ -101,10 +115,11 @@ class LobbyCountdownConsumer(AbstractConsumer):
         if not isinstance(confirm, Basic.Ack):
             raise PublishNotAcknowledged("publish game start countdown failed")
 
+    @observe_consumer
     async def _process(self, msg: LobbyCountdownMsg):
         # NOTE: word count sould be customizable
         words = self._word_generator.generate(25)
-        ok = await self._set_game_status(msg.game_id)
+        ok = await self._set_game_status(msg.game_id, msg.claimed_at)
         if not ok:
             return
         await self._populate_game_cache(game_id=msg.game_id, words=words)
@@ -1,3 +1,4 @@
+from datetime import UTC, datetime
 from logging import getLogger
 
 from aio_pika.abc import AbstractIncomingMessage, AbstractRobustConnection
@@ -5,6 +6,7 @@ from pydantic import ValidationError
 
 from ..lib.background_tasks.base import BGManager
 from ..lib.background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from ..lib.metrics import observe_consumer
 from ..types.amqp import LobbyNotifyMsg
 from ..types.setting import Setting
 from .base import AbstractConsumer
@@ -30,10 +32,15 @@ class LobbyNotifyConsumer(AbstractConsumer):
     def _load_message(self, amqp_msg: AbstractIncomingMessage) -> LobbyNotifyMsg:
         return LobbyNotifyMsg.model_validate_json(amqp_msg.body)
 
+    @observe_consumer
     async def _process(self, msg: LobbyNotifyMsg):
         bg_notify_msg = LobbyBGMsg(
             event=msg.notify_type, user_id=msg.user_id, game_id=msg.game_id
         )
+        if bg_notify_msg.event == LobbyBGMsgEvent.COUNTDOWN:
+            # the clock offset is taken against this server
+            bg_notify_msg.start_at = msg.start_at
+            bg_notify_msg.server_time = datetime.now(UTC).isoformat()
 
         if bg_notify_msg.event == LobbyBGMsgEvent.GAME_START:
             logger.debug("game started, game_id: %s", msg.game_id)
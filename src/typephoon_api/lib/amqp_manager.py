@@ -47,6 +47,12 @@ class AMQPManager:
             durable=True,
         )
 
+        game_result_exchange = await channel.declare_exchange(
+            name=self._setting.amqp.game_result_fanout_exchange,
+            type=ExchangeType.FANOUT,
+            durable=True,
+        )
+
         game_cleanup_exchange = await channel.declare_exchange(
             name=self._setting.amqp.game_cleanup_direct_exchange,
             type=ExchangeType.DIRECT,
@@ -71,6 +77,13 @@ class AMQPManager:
         )
         await game_keystroke_queue.bind(exchange=game_keystroke_exchange)
 
+        game_result_queue = await channel.declare_queue(
+            name=self._setting.amqp.game_result_queue,
+            durable=True,
+            arguments={"x-queue-type": "quorum"},
+        )
+        await game_result_queue.bind(exchange=game_result_exchange)
+
         lobby_notify_queue = await channel.declare_queue(
             name=self._setting.amqp.lobby_notify_queue,
             durable=True,
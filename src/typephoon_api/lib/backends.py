@@ -0,0 +1,69 @@
+"""
+Connections to the database, cache and message broker, each picked by its
+'backend' setting. The memory backends run in process, see 'lib.memory'
+and 'repositories.memory'.
+"""
+
+from typing import cast
+
+from aio_pika import connect_robust
+from aio_pika.abc import AbstractRobustConnection
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from ..repositories.memory import MemorySessionmaker
+from ..types.enums import BackendType
+from ..types.setting import Setting
+from .memory.amqp import MemoryConnection
+from .memory.redis import MemoryRedis
+
+
+def create_sessionmaker(
+    setting: Setting,
+) -> tuple[AsyncEngine | None, async_sessionmaker[AsyncSession]]:
+    """
+    Returns:
+        - engine to dispose on cleanup, None for the memory backend
+        - sessionmaker
+    """
+    if setting.db.backend == BackendType.MEMORY:
+        return None, cast(async_sessionmaker[AsyncSession], MemorySessionmaker())
+
+    engine = create_async_engine(
+        url=setting.db.async_dsn,
+        echo=setting.db.echo,
+        pool_size=setting.db.pool_size,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        isolation_level="READ COMMITTED",
+    )
+    return engine, async_sessionmaker(engine)
+
+
+def create_redis(setting: Setting) -> Redis:
+    if setting.redis.backend == BackendType.MEMORY:
+        return cast(Redis, MemoryRedis())
+
+    return Redis(
+        host=setting.redis.host,
+        port=setting.redis.port,
+        db=setting.redis.db,
+    )
+
+
+async def connect_amqp(setting: Setting) -> AbstractRobustConnection:
+    if setting.amqp.backend == BackendType.MEMORY:
+        return cast(AbstractRobustConnection, MemoryConnection())
+
+    return await connect_robust(
+        host=setting.amqp.host,
+        login=setting.amqp.user,
+        password=setting.amqp.password,
+        virtualhost=setting.amqp.vhost,
+        client_properties={"connection_name": "typephoon"},
+    )
@@ -15,7 +15,7 @@ from asyncio import (
 )
 from collections import defaultdict
 from enum import StrEnum
-from logging import getLogger
+from logging import DEBUG, getLogger
 from typing import Type
 
 from fastapi import WebSocket, WebSocketDisconnect
@@ -36,6 +36,33 @@ class BGManager[MT: BGMsg, BT: BG]:
     def __init__(self) -> None:
         self._pool: defaultdict[int, dict[str, BT]] = defaultdict(dict)
 
+    @property
+    def game_count(self) -> int:
+        return len(self._pool)
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(i) for i in self._pool.values())
+
+    def game_ids(self) -> list[int]:
+        return list(self._pool.keys())
+
+    def user_ids(self, game_id: int) -> list[str]:
+        """
+        Users of a game connected to this server
+        """
+        return list(self._pool.get(game_id, {}))
+
+    def connections(self, game_id: int) -> int:
+        """
+        Open connections of a game on this server
+        """
+        bgs = self._pool.get(game_id)
+        return len(bgs) if bgs else 0
+
+    def queue_depths(self) -> list[int]:
+        return [bg.queue_depth for bgs in self._pool.values() for bg in bgs.values()]
+
     async def add(self, game_id: int, bg: BT, init_msg: MT | None = None):
         logger.debug("game_id: %s", game_id)
         await bg.start(init_msg)
@@ -90,7 +117,8 @@ class BGManager[MT: BGMsg, BT: BG]:
         await asyncio.gather(*stop_tasks)
 
     async def broadcast(self, game_id: int, msg: MT):
-        logger.debug("game_id: %s, msg: %s", game_id, msg)
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("game_id: %s, msg: %s", game_id, msg)
         if game_id not in self._pool:
             return
 
@@ -141,6 +169,13 @@ class BG[T: BGMsg](ABC):
     def game_id(self) -> int:
         return self._game_id
 
+    @property
+    def queue_depth(self) -> int:
+        """
+        messages waiting to be sent
+        """
+        return self._queue.qsize()
+
     @property
     def _name(self) -> str:
         return type(self).__name__
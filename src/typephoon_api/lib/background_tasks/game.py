@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 from enum import StrEnum
-from logging import getLogger
+from logging import DEBUG, getLogger
+from time import time
 from typing import Type
 
 from aio_pika import DeliveryMode, Message
 from aio_pika.abc import AbstractExchange
 from fastapi import WebSocket
 from pamqp.commands import Basic
+from pydantic import Field
 
 from ...types.amqp import KeystrokeHeader, KeystrokeMsg
 from ...types.errors import PublishNotAcknowledged
 from ...types.setting import Setting
-from .base import BG, BGMsg
+from ..metrics import KEYSTROKE_ROUTES
+from ..positions import PositionTable
+from ..replay import ReplayRecorder
+from .base import BG, BGManager, BGMsg
 
 logger = getLogger(__name__)
 
@@ -24,13 +29,51 @@ class GameBGMsgEvent(StrEnum):
 
     KEY_STOKE = "KEY_STOKE"
     START = "START"
+    RESULT_UPDATE = "RESULT_UPDATE"
+    COUNTDOWN = "COUNTDOWN"
+    REDIRECT = "REDIRECT"
+    SNAPSHOT = "SNAPSHOT"
 
 
 class GameBGMsg(BGMsg[GameBGMsgEvent]):
+    """
+    - KEY_STOKE: word_index, char_index
+    - RESULT_UPDATE: rank, wpm, wpm_raw, acc, finished, version
+    - COUNTDOWN: start_at, server_time (ISO 8061 format timestamp),
+                 clients count down locally with 'server_time' as clock offset
+    - REDIRECT: node (base url), the game lives on another node. Clients connect
+                to the game websocket there with 'redirected=true'
+    - SNAPSHOT: positions ({user_id: [word_index, char_index]}), latest position
+                of every player who has typed, the first message on reconnect
+
+    - sent_at: (unix timestamp) KEY_STOKE, when the keystroke was sent, for the
+               replay. Never sent to clients
+    """
+
     user_id: str | None = None
     word_index: int | None = None
     char_index: int | None = None
 
+    rank: int | None = None
+    wpm: float | None = None
+    wpm_raw: float | None = None
+    acc: float | None = None
+    finished: str | None = None
+    version: int | None = None
+
+    start_at: str | None = None
+    server_time: str | None = None
+
+    node: str | None = None
+
+    positions: dict[str, tuple[int, int]] | None = None
+
+    sent_at: float | None = Field(default=None, exclude=True)
+
+
+_ROUTE_LOCAL = KEYSTROKE_ROUTES.labels("local")
+_ROUTE_BROKER = KEYSTROKE_ROUTES.labels("broker")
+
 
 class GameBG(BG[GameBGMsg]):
     def __init__(
@@ -42,11 +85,25 @@ class GameBG(BG[GameBGMsg]):
         game_id: int,
         server_name: str | None = None,
         msg_type: Type[GameBGMsg] = GameBGMsg,
+        local_pool: BGManager[GameBGMsg, GameBG] | None = None,
+        player_count: int = 0,
     ) -> None:
+        """
+        - local_pool / player_count: keystrokes skip the broker while all
+          'player_count' players are connected to 'local_pool'
+        """
         super().__init__(ws, msg_type, user_id, game_id)
         self._exchange = exchange
         self._setting = setting
         self._server_name = server_name
+        self._local_pool = local_pool
+        self._player_count = player_count
+
+    def _all_players_local(self) -> bool:
+        return (
+            self._local_pool is not None
+            and self._local_pool.connections(self._game_id) >= self._player_count
+        )
 
     async def _recv(self, msg: GameBGMsg):
         """
@@ -54,16 +111,35 @@ class GameBG(BG[GameBGMsg]):
         players in the same game
         """
         if msg.event == GameBGMsgEvent.KEY_STOKE:
-            logger.debug("broadcast keystroke, %s", msg)
+            if logger.isEnabledFor(DEBUG):
+                logger.debug("broadcast keystroke, %s", msg)
 
             assert msg.word_index is not None
             assert msg.char_index is not None
 
+            if self._all_players_local():
+                assert self._local_pool is not None
+                _ROUTE_LOCAL.inc()
+                await self._local_pool.broadcast(
+                    game_id=self._game_id,
+                    msg=GameBGMsg(
+                        game_id=self._game_id,
+                        event=GameBGMsgEvent.KEY_STOKE,
+                        user_id=self._user_id,
+                        word_index=msg.word_index,
+                        char_index=msg.char_index,
+                        sent_at=time(),
+                    ),
+                )
+                return
+
+            _ROUTE_BROKER.inc()
             keystroke_msg = KeystrokeMsg(
                 game_id=self._game_id,
                 user_id=self._user_id,
                 word_index=msg.word_index,
                 char_index=msg.char_index,
+                sent_at=time(),
             )
 
             amqp_msg = Message(
@@ -84,10 +160,85 @@ class GameBG(BG[GameBGMsg]):
         """
         send message to user
         """
-        logger.debug("got msg: %s", msg)
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("got msg: %s", msg)
 
-        # ignore messages from same user
-        if msg.user_id == self._user_id:
+        # ignore keystrokes from same user
+        if msg.event == GameBGMsgEvent.KEY_STOKE and msg.user_id == self._user_id:
             return
 
         await self._ws.send_text(msg.slim_dump_json())
+
+
+class GameBGManager(BGManager[GameBGMsg, GameBG]):
+    """
+    Feeds the keystrokes of the games with connections here to 'positions'
+    and 'recorder'
+    """
+
+    def __init__(
+        self,
+        positions: PositionTable | None = None,
+        recorder: ReplayRecorder | None = None,
+    ) -> None:
+        super().__init__()
+        self._positions = positions
+        self._recorder = recorder
+
+    def _forget(self, game_id: int, reconnect: bool = False):
+        """
+        - reconnect: players may come back, the replay log is kept open a while
+        """
+        if self._positions is not None:
+            self._positions.forget(game_id)
+        if self._recorder is None:
+            return
+        if reconnect:
+            self._recorder.close_later(game_id)
+        else:
+            self._recorder.close(game_id)
+
+    def _track(self, game_id: int, msg: GameBGMsg):
+        assert msg.user_id is not None
+        assert msg.word_index is not None
+        assert msg.char_index is not None
+
+        # mirrored and recorded by the node the player is connected to only
+        local = msg.user_id in self._pool[game_id]
+        if self._positions is not None:
+            self._positions.update(
+                game_id=game_id,
+                user_id=msg.user_id,
+                word_index=msg.word_index,
+                char_index=msg.char_index,
+                mirror=local,
+            )
+        if self._recorder is not None and local:
+            self._recorder.record(
+                game_id=game_id,
+                user_id=msg.user_id,
+                word_index=msg.word_index,
+                char_index=msg.char_index,
+                at=msg.sent_at,
+            )
+
+    async def add(self, game_id: int, bg: GameBG, init_msg: GameBGMsg | None = None):
+        await super().add(game_id=game_id, bg=bg, init_msg=init_msg)
+        if self._recorder is not None:
+            self._recorder.keep(game_id)
+
+    async def remove_user(
+        self, game_id: int, user_id: str, final_msg: GameBGMsg | None = None
+    ):
+        await super().remove_user(game_id=game_id, user_id=user_id, final_msg=final_msg)
+        if game_id not in self._pool:
+            self._forget(game_id, reconnect=True)
+
+    async def remove_game(self, game_id: int, final_msg: GameBGMsg | None = None):
+        await super().remove_game(game_id=game_id, final_msg=final_msg)
+        self._forget(game_id)
+
+    async def broadcast(self, game_id: int, msg: GameBGMsg):
+        if msg.event == GameBGMsgEvent.KEY_STOKE and game_id in self._pool:
+            self._track(game_id=game_id, msg=msg)
+        await super().broadcast(game_id=game_id, msg=msg)
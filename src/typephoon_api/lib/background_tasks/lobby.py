@@ -22,11 +22,24 @@ class LobbyBGMsgEvent(StrEnum):
     USER_LEFT = "USER_LEFT"
     GET_TOKEN = "GET_TOKEN"
     GAME_START = "GAME_START"
+    COUNTDOWN = "COUNTDOWN"
+    REDIRECT = "REDIRECT"
 
 
 class LobbyBGMsg(BGMsg[LobbyBGMsgEvent]):
+    """
+    - COUNTDOWN: start_at, server_time (ISO 8061 format timestamp),
+                 clients count down locally with 'server_time' as clock offset
+    - REDIRECT: node (base url), the game lives on another node. Clients queue in
+                again there with 'queue_in_type=reconnect', 'prev_game_id' and
+                'redirected=true'
+    """
+
     guest_token_key: str | None = None
     user_id: str | None = None
+    start_at: str | None = None
+    server_time: str | None = None
+    node: str | None = None
 
 
 class LobbyBG(BG[LobbyBGMsg]):
@@ -38,18 +51,31 @@ class LobbyBG(BG[LobbyBGMsg]):
         msg_type: Type[LobbyBGMsg] = LobbyBGMsg,
     ) -> None:
         super().__init__(ws, msg_type, user_id, game_id)
+        self._redirected = False
+
+    @property
+    def redirected(self) -> bool:
+        """
+        The player was sent to another node, their seat is kept
+        """
+        return self._redirected
 
     async def _recv(self, msg: LobbyBGMsg):
-        logger.log(TRACE, "recv msg: %s", msg)
+        if logger.isEnabledFor(TRACE):
+            logger.log(TRACE, "recv msg: %s", msg)
 
     async def _send(self, msg: LobbyBGMsg):
         """
         send lobby events to user
         """
-        logger.log(TRACE, "send msg: %s", msg)
+        if logger.isEnabledFor(TRACE):
+            logger.log(TRACE, "send msg: %s", msg)
         if msg.event == LobbyBGMsgEvent.USER_LEFT and msg.user_id == self._user_id:
             logger.debug("stop bg, user_id: %s", self._user_id)
             await self.stop()
             return
 
+        if msg.event == LobbyBGMsgEvent.REDIRECT:
+            self._redirected = True
+
         await self._ws.send_text(msg.slim_dump_json())
@@ -13,6 +13,7 @@ from ..repositories.game_cache import GameCacheRepo
 from ..repositories.guest_token import GuestTokenRepo
 from ..repositories.lobby_cache import LobbyCacheRepo
 from ..repositories.oauth_state import OAuthStateRepo
+from ..services.admin import AdminService
 from ..services.auth import AuthService
 from ..services.game import GameService
 from ..services.game_event import GameEventService
@@ -43,6 +44,12 @@ refresh_cookie = APIKeyCookie(
 logger = getLogger(__name__)
 
 
+async def get_admin_service(request: Request) -> AdminService:
+    app: TypephoonServer = request.app
+    service = AdminService(app)
+    return service
+
+
 async def get_health_check_service(request: Request) -> HealthCheckService:
     app: TypephoonServer = request.app
     service = HealthCheckService(app)
@@ -126,6 +133,8 @@ async def get_queue_in_service(ws: WebSocket) -> QueueInService:
         amqp_default_exchange=app.amqp_default_exchange,
         game_cache_repo=game_cache_repo,
         lobby_cache_repo=lobby_cache_repo,
+        node_affinity=app.node_affinity,
+        lobby_pool=app.lobby_pool,
     )
     return service
 
@@ -142,6 +151,8 @@ async def get_game_event_service(ws: WebSocket) -> GameEventService:
         bg_manager=app.game_bg_manager,
         keystroke_exchange=app.amqp_keystroke_exchange,
         setting=app.setting,
+        node_affinity=app.node_affinity,
+        position_table=app.position_table,
     )
     return service
 
@@ -152,7 +163,10 @@ async def get_game_service(request: Request) -> GameService:
     game_cache_repo = GameCacheRepo(redis_conn=app.redis_conn, setting=app.setting)
 
     service = GameService(
-        sessionmaker=app.sessionmaker, game_cache_repo=game_cache_repo
+        sessionmaker=app.sessionmaker,
+        game_cache_repo=game_cache_repo,
+        result_exchange=app.amqp_result_exchange,
+        result_writer=app.result_writer,
     )
     return service
 
@@ -0,0 +1,58 @@
+"""
+Consistent hashing of games over nodes.
+"""
+
+from bisect import bisect
+from hashlib import md5
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Every node is placed on the ring 'vnodes' times, a key belongs to the first
+    node point after its hash. Adding or removing a node only moves the
+    keys between its points and their predecessors, about 1/N of all keys.
+    """
+
+    def __init__(self, nodes: list[str] | None = None, vnodes: int = 64) -> None:
+        self._vnodes = vnodes
+        self._nodes: set[str] = set(nodes or [])
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self._build()
+
+    @property
+    def nodes(self) -> set[str]:
+        return set(self._nodes)
+
+    def _build(self):
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self._nodes
+            for i in range(self._vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add(self, node: str):
+        if node not in self._nodes:
+            self._nodes.add(node)
+            self._build()
+
+    def remove(self, node: str):
+        if node in self._nodes:
+            self._nodes.discard(node)
+            self._build()
+
+    def get(self, key: str | int) -> str | None:
+        """
+        Returns:
+            - None if there are no nodes
+        """
+        if not self._points:
+            return None
+        idx = bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[idx]
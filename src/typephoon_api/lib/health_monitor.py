@@ -0,0 +1,94 @@
+"""
+Background dependency checks for the readiness probe.
+"""
+
+import asyncio
+from asyncio import CancelledError, Task, create_task
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from logging import getLogger
+from time import perf_counter
+
+from ..types.common import DependencyStatus
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+HealthCheck = Callable[[], Awaitable[object]]
+
+
+class HealthMonitor:
+    """
+    Runs every check on an interval and caches the results,
+    so reading readiness doesn't touch any dependency.
+    """
+
+    def __init__(self, setting: Setting, checks: dict[str, HealthCheck]) -> None:
+        self._setting = setting
+        self._checks = checks
+        self._statuses: dict[str, DependencyStatus] = {
+            name: DependencyStatus(ok=False, error="not checked yet") for name in checks
+        }
+        self._task: Task | None = None
+
+    @property
+    def statuses(self) -> dict[str, DependencyStatus]:
+        return self._statuses
+
+    @property
+    def ready(self) -> bool:
+        """
+        All dependencies passed their latest check, and the check is not stale
+        """
+        now = datetime.now(UTC)
+        stale_after = self._setting.health_check.stale_after
+        for status in self._statuses.values():
+            if not status.ok or status.checked_at is None:
+                return False
+            if (now - status.checked_at).total_seconds() > stale_after:
+                return False
+        return True
+
+    async def start(self):
+        await self.check_all()
+        self._task = create_task(self._loop(), name="health-monitor")
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+
+    async def check_all(self):
+        await asyncio.gather(
+            *[self._check(name, check) for name, check in self._checks.items()]
+        )
+
+    async def _check(self, name: str, check: HealthCheck):
+        start = perf_counter()
+        try:
+            async with asyncio.timeout(self._setting.health_check.timeout):
+                await check()
+        except Exception as ex:
+            error = str(ex) or type(ex).__name__
+            if self._statuses[name].ok:
+                logger.warning("'%s' check failed, error: %s", name, error)
+            status = DependencyStatus(ok=False, error=error)
+        else:
+            if not self._statuses[name].ok:
+                logger.info("'%s' check passed", name)
+            status = DependencyStatus(ok=True)
+
+        status.latency_ms = (perf_counter() - start) * 1000
+        status.checked_at = datetime.now(UTC)
+        self._statuses[name] = status
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._setting.health_check.interval)
+            await self.check_all()
@@ -0,0 +1,154 @@
+"""
+Pre-created games for the first player of a lobby.
+"""
+
+import asyncio
+from asyncio import CancelledError, Event, Task, create_task
+from collections.abc import Awaitable, Callable
+from logging import getLogger
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..orm.game import Game, GameStatus
+from ..repositories.game import GameRepo
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+ArmStep = Callable[[], Awaitable[None]]
+
+
+class LobbyPool:
+    """
+    Keeps 'lobby_pool.size' games in 'POOL' status, the first player of a lobby
+    claims one instead of inserting it. Every node tops up the same pool, so it
+    may briefly hold a few more games than the size.
+
+    The timers of a claimed game are armed here once the claim is committed,
+    off the first player's path. Failed steps are retried every
+    'lobby_pool.refill_interval', up to 'lobby_pool.arm_retries' times and only
+    while the game is still in the lobby.
+    """
+
+    def __init__(
+        self, setting: Setting, sessionmaker: async_sessionmaker[AsyncSession]
+    ) -> None:
+        self._setting = setting
+        self._sessionmaker = sessionmaker
+        self._claimed = Event()
+        self._task: Task | None = None
+        self._arming: set[Task] = set()
+
+    @property
+    def arming_count(self) -> int:
+        return len(self._arming)
+
+    async def start(self):
+        await self.refill()
+        self._task = create_task(self._loop(), name="lobby-pool")
+
+    async def stop(self):
+        """
+        Wait up to 'lobby_pool.refill_interval' for the pending armings then
+        stop
+        """
+        if self._arming:
+            _, pending = await asyncio.wait(
+                self._arming, timeout=self._setting.lobby_pool.refill_interval
+            )
+            if pending:
+                logger.warning("%s lobbies left without timers", len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+
+    async def claim(
+        self, game_repo: GameRepo, skill_bucket: int | None = None
+    ) -> Game | None:
+        """
+        Returns:
+            - None if the pool is empty
+        """
+        game = await game_repo.claim_pool(skill_bucket=skill_bucket)
+        self._claimed.set()
+        if game is None:
+            logger.warning("lobby pool is empty")
+        return game
+
+    def arm(self, game_id: int, steps: list[ArmStep]):
+        """
+        Arm a committed claim in background, steps are independent and retried
+        one by one
+        """
+        task = create_task(self._arm(game_id, steps), name=f"lobby-arm-{game_id}")
+        self._arming.add(task)
+        task.add_done_callback(self._arming.discard)
+
+    async def _in_lobby(self, game_id: int) -> bool:
+        async with self._sessionmaker() as session:
+            game = await GameRepo(session).get(game_id)
+            return game is not None and game.status == GameStatus.LOBBY
+
+    async def _arm(self, game_id: int, steps: list[ArmStep]):
+        for attempt in range(self._setting.lobby_pool.arm_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._setting.lobby_pool.refill_interval)
+                if not await self._in_lobby(game_id):
+                    logger.info(
+                        "game left the lobby, stop arming, game_id: %s", game_id
+                    )
+                    return
+
+            results = await asyncio.gather(
+                *[step() for step in steps], return_exceptions=True
+            )
+            failed: list[ArmStep] = []
+            for step, ret in zip(steps, results):
+                if isinstance(ret, Exception):
+                    logger.error(
+                        "arming failed, game_id: %s, error: %s", game_id, repr(ret)
+                    )
+                    failed.append(step)
+            if not failed:
+                return
+            steps = failed
+
+        logger.error(
+            "arming gave up, game_id: %s, failed steps: %s", game_id, len(steps)
+        )
+
+    async def refill(self):
+        async with self._sessionmaker() as session:
+            game_repo = GameRepo(session)
+            missing = self._setting.lobby_pool.size - await game_repo.count_pool()
+            if missing <= 0:
+                return
+
+            await game_repo.create_pool(missing)
+            await session.commit()
+
+        logger.debug("added %s games to the pool", missing)
+
+    async def _loop(self):
+        while True:
+            try:
+                async with asyncio.timeout(self._setting.lobby_pool.refill_interval):
+                    await self._claimed.wait()
+            except TimeoutError:
+                pass
+            self._claimed.clear()
+
+            try:
+                await self.refill()
+            except Exception:
+                logger.exception("refill failed")
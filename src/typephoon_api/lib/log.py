@@ -0,0 +1,32 @@
+"""
+Logging helpers for hot paths.
+
+'logger.debug("%s", msg)' already formats lazily, but the call itself and any
+argument computed up front (ex: 'model_dump_json()') are paid on every call
+even when the level is off. On per-message paths:
+- guard with 'if logger.isEnabledFor(DEBUG):' when arguments are expensive to
+  compute or format, a constant message is not worth the extra branch
+- wrap expensive arguments with 'Lazy'
+"""
+
+from collections.abc import Callable
+from typing import Any
+
+
+class Lazy:
+    """
+    Defers computing a log argument until the record is formatted
+
+        logger.debug("statistics: %s", Lazy(statistics.model_dump_json))
+    """
+
+    __slots__ = ("_func", "_args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any) -> None:
+        self._func = func
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+    __repr__ = __str__
@@ -0,0 +1,309 @@
+"""
+In-process stand-in for the RabbitMQ connection.
+
+Exchanges, queues, bindings, prefetch and the dead-letter wait queues used as
+timers behave like the broker, for the calls made by 'AMQPManager', the
+consumers and the publishers. Messages are never persisted, and only
+connections sharing a 'MemoryBroker' can reach each other.
+"""
+
+import asyncio
+from asyncio import Task, TimerHandle
+from collections import deque
+from collections.abc import Awaitable, Callable
+from itertools import count
+from logging import getLogger
+
+from aio_pika import ExchangeType, Message
+from aio_pika.exceptions import ChannelNotFoundEntity
+from pamqp.commands import Basic
+
+logger = getLogger(__name__)
+
+ConsumerCallback = Callable[["MemoryIncomingMessage"], Awaitable[None]]
+
+
+class MemoryIncomingMessage:
+    def __init__(
+        self,
+        queue: "MemoryQueue",
+        message: Message,
+        routing_key: str,
+        redelivered: bool = False,
+    ) -> None:
+        self._queue = queue
+        self._message = message
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+        self._settled = False
+
+    @property
+    def body(self) -> bytes:
+        return self._message.body
+
+    @property
+    def headers(self) -> dict:
+        return self._message.headers
+
+    def _settle(self) -> bool:
+        if self._settled:
+            return False
+        self._settled = True
+        self._queue._settle()
+        return True
+
+    async def ack(self, multiple: bool = False):
+        self._settle()
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        if self._settle() and requeue:
+            self._queue.put(self._message, self.routing_key, redelivered=True)
+
+    async def reject(self, requeue: bool = False):
+        await self.nack(requeue=requeue)
+
+
+class MemoryQueue:
+    def __init__(
+        self, broker: "MemoryBroker", name: str, arguments: dict | None = None
+    ) -> None:
+        self._broker = broker
+        self.name = name
+        self.arguments = arguments or {}
+        self._pending: deque[tuple[Message, str, bool]] = deque()
+        self._consumers: dict[str, tuple[ConsumerCallback, int]] = {}
+        self._turn: deque[str] = deque()
+        self._unacked = 0
+
+    @property
+    def message_count(self) -> int:
+        return len(self._pending)
+
+    def put(self, message: Message, routing_key: str, redelivered: bool = False):
+        entry = (message, routing_key, redelivered)
+        self._pending.append(entry)
+
+        ttl = self.arguments.get("x-message-ttl")
+        if ttl is not None and not redelivered:
+            self._broker._call_later(ttl / 1000, self._expire, entry)
+
+        self._dispatch()
+
+    def _expire(self, entry: tuple[Message, str, bool]):
+        try:
+            self._pending.remove(entry)
+        except ValueError:
+            # consumed already
+            return
+
+        exchange = self.arguments.get("x-dead-letter-exchange")
+        if exchange is None:
+            return
+        message, routing_key, _ = entry
+        routing_key = self.arguments.get("x-dead-letter-routing-key", routing_key)
+        self._broker.exchange(exchange).route(message, routing_key)
+
+    def _settle(self):
+        self._unacked -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._pending and self._turn:
+            for _ in range(len(self._turn)):
+                tag = self._turn[0]
+                self._turn.rotate(-1)
+                callback, prefetch_count = self._consumers[tag]
+                if not prefetch_count or self._unacked < prefetch_count:
+                    break
+            else:
+                # every consumer is at its prefetch limit
+                return
+
+            message, routing_key, redelivered = self._pending.popleft()
+            self._unacked += 1
+            incoming = MemoryIncomingMessage(
+                self, message, routing_key, redelivered=redelivered
+            )
+            self._broker._spawn(self._deliver(callback, incoming))
+
+    async def _deliver(
+        self, callback: ConsumerCallback, incoming: MemoryIncomingMessage
+    ):
+        try:
+            await callback(incoming)
+        except Exception:
+            logger.exception("consumer error, queue: %s", self.name)
+            await incoming.nack()
+
+    def consume(self, callback: ConsumerCallback, prefetch_count: int) -> str:
+        tag = f"ctag.{self.name}.{next(self._broker._tags)}"
+        self._consumers[tag] = (callback, prefetch_count)
+        self._turn.append(tag)
+        self._dispatch()
+        return tag
+
+    def cancel(self, consumer_tag: str):
+        self._consumers.pop(consumer_tag, None)
+        if consumer_tag in self._turn:
+            self._turn.remove(consumer_tag)
+
+
+class MemoryExchange:
+    def __init__(self, broker: "MemoryBroker", name: str, type: ExchangeType) -> None:
+        if type not in (ExchangeType.DIRECT, ExchangeType.FANOUT):
+            raise NotImplementedError(f"exchange type '{type}' is not supported")
+
+        self._broker = broker
+        self.name = name
+        self.type = type
+        self._bindings: list[tuple[MemoryQueue, str]] = []
+
+    def bind(self, queue: MemoryQueue, routing_key: str):
+        if (queue, routing_key) not in self._bindings:
+            self._bindings.append((queue, routing_key))
+
+    def route(self, message: Message, routing_key: str):
+        # default exchange, routes to the queue named by the routing key
+        if not self.name:
+            queue = self._broker.queues.get(routing_key)
+            if queue is not None:
+                queue.put(message, routing_key)
+            return
+
+        for queue, key in self._bindings:
+            if self.type == ExchangeType.FANOUT or key == routing_key:
+                queue.put(message, routing_key)
+
+    async def publish(self, message: Message, routing_key: str, **_) -> Basic.Ack:
+        """
+        Unroutable messages are dropped and still acknowledged, like the broker does
+        """
+        self.route(message, routing_key)
+        return Basic.Ack()
+
+
+class MemoryQueueRef:
+    """
+    A queue as seen from a channel, consumers get the channel's prefetch count
+    """
+
+    def __init__(self, channel: "MemoryChannel", queue: MemoryQueue) -> None:
+        self._channel = channel
+        self._queue = queue
+
+    @property
+    def name(self) -> str:
+        return self._queue.name
+
+    async def bind(
+        self, exchange: MemoryExchange | str, routing_key: str | None = None, **_
+    ):
+        if isinstance(exchange, str):
+            exchange = self._channel._broker.exchange(exchange)
+        exchange.bind(self._queue, routing_key or self._queue.name)
+
+    async def consume(self, callback: ConsumerCallback, **_) -> str:
+        return self._queue.consume(callback, self._channel.prefetch_count)
+
+    async def cancel(self, consumer_tag: str, **_):
+        self._queue.cancel(consumer_tag)
+
+
+class MemoryChannel:
+    def __init__(self, broker: "MemoryBroker") -> None:
+        self._broker = broker
+        self.prefetch_count = 0
+        self.is_closed = False
+
+    @property
+    def default_exchange(self) -> MemoryExchange:
+        return self._broker.exchange("")
+
+    async def set_qos(self, prefetch_count: int = 0, **_):
+        self.prefetch_count = prefetch_count
+
+    async def declare_exchange(
+        self, name: str, type: ExchangeType = ExchangeType.DIRECT, **_
+    ) -> MemoryExchange:
+        if name not in self._broker.exchanges:
+            self._broker.exchanges[name] = MemoryExchange(self._broker, name, type)
+        return self._broker.exchanges[name]
+
+    async def get_exchange(self, name: str, **_) -> MemoryExchange:
+        return self._broker.exchange(name)
+
+    async def declare_queue(
+        self, name: str, arguments: dict | None = None, **_
+    ) -> MemoryQueueRef:
+        if name not in self._broker.queues:
+            self._broker.queues[name] = MemoryQueue(self._broker, name, arguments)
+        return MemoryQueueRef(self, self._broker.queues[name])
+
+    async def get_queue(self, name: str, **_) -> MemoryQueueRef:
+        queue = self._broker.queues.get(name)
+        if queue is None:
+            raise ChannelNotFoundEntity(f"queue '{name}' not found")
+        return MemoryQueueRef(self, queue)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class MemoryBroker:
+    def __init__(self) -> None:
+        self.exchanges: dict[str, MemoryExchange] = {}
+        self.queues: dict[str, MemoryQueue] = {}
+        self.exchanges[""] = MemoryExchange(self, "", ExchangeType.DIRECT)
+        self._tags = count()
+        self._tasks: set[Task] = set()
+        self._timers: set[TimerHandle] = set()
+
+    def exchange(self, name: str) -> MemoryExchange:
+        exchange = self.exchanges.get(name)
+        if exchange is None:
+            raise ChannelNotFoundEntity(f"exchange '{name}' not found")
+        return exchange
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _call_later(self, delay: float, callback: Callable, *args):
+        def run():
+            self._timers.discard(handle)
+            callback(*args)
+
+        handle = asyncio.get_running_loop().call_later(delay, run)
+        self._timers.add(handle)
+
+    async def close(self):
+        """
+        Cancel pending timers and deliveries
+        """
+        for handle in self._timers:
+            handle.cancel()
+        self._timers.clear()
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class MemoryConnection:
+    def __init__(self, broker: MemoryBroker | None = None) -> None:
+        self.broker = broker or MemoryBroker()
+        self.is_closed = False
+
+    async def channel(self, **_) -> MemoryChannel:
+        return MemoryChannel(self.broker)
+
+    async def ready(self):
+        pass
+
+    async def close(self):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        await self.broker.close()
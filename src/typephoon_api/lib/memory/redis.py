@@ -0,0 +1,289 @@
+"""
+In-process stand-in for the redis client.
+
+Only the commands used by the repositories are implemented, values are
+returned as bytes like the real client. None of the commands suspend, so a
+pipeline or a script runs without being interleaved with other tasks, the
+same guarantee redis gives for 'MULTI' and scripts.
+"""
+
+import json
+from collections.abc import Awaitable, Callable
+from time import time as now
+from typing import Any
+
+from ...repositories.game_cache import (
+    POPULATE_SCRIPT,
+    UPDATE_PLAYER_SCRIPT,
+    encode_player,
+)
+from ...types.common import GameUserInfo, LobbyUserInfo
+
+# expired keys are removed on access, and by a sweep at most once per interval
+SWEEP_INTERVAL = 1
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (int, float)):
+        return str(value).encode()
+    raise TypeError(f"unsupported value type: {type(value).__name__}")
+
+
+class MemoryLock:
+    def __init__(self) -> None:
+        self._locked = False
+
+    async def acquire(self, blocking: bool = True) -> bool:
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    async def release(self):
+        self._locked = False
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.release()
+
+
+class MemoryPipeline:
+    """
+    Commands are queued and run in order on 'execute'
+    """
+
+    def __init__(self, redis: "MemoryRedis") -> None:
+        self._redis = redis
+        self._commands: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [
+            await getattr(self._redis, name)(*args, **kwargs)
+            for name, args, kwargs in commands
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        self._commands = []
+
+
+MemoryScriptFunc = Callable[["MemoryRedis", list, list], Awaitable[Any]]
+
+
+async def _update_player(redis: "MemoryRedis", keys: list, args: list) -> int:
+    players, players_version, player_versions = keys
+    user_id, encoded, expire_time = args
+    await redis.hset(players, user_id, encoded)
+    version = await redis.incr(players_version)
+    await redis.hset(player_versions, user_id, version)
+    for key in keys:
+        await redis.expire(key, int(expire_time))
+    return version
+
+
+async def _populate(redis: "MemoryRedis", keys: list, args: list) -> list[int]:
+    lobby_players, lobby_countdown, players, lobby_end = keys
+    expire_time, auto_clean = args
+
+    fields: dict[str, str] = {}
+    raw = await redis.get(lobby_players)
+    if raw is not None:
+        for user_id, info in json.loads(raw).items():
+            fields[user_id] = encode_player(
+                GameUserInfo.from_lobby_cache(LobbyUserInfo.model_validate(info))
+            )
+    if fields:
+        await redis.delete(players)
+        await redis.hset(players, mapping=fields)
+        await redis.expire(players, int(expire_time))
+
+    lobby_end_value = await redis.get(lobby_countdown)
+    if lobby_end_value is not None:
+        await redis.set(lobby_end, lobby_end_value, ex=int(expire_time))
+
+    if str(auto_clean) == "1":
+        await redis.delete(lobby_players, lobby_countdown)
+    return [len(fields), 1 if lobby_end_value is not None else 0]
+
+
+# lua scripts of the repositories and their equivalents
+SCRIPTS: dict[str, MemoryScriptFunc] = {
+    UPDATE_PLAYER_SCRIPT: _update_player,
+    POPULATE_SCRIPT: _populate,
+}
+
+
+class MemoryScript:
+    def __init__(self, redis: "MemoryRedis", func: MemoryScriptFunc) -> None:
+        self._redis = redis
+        self._func = func
+
+    async def __call__(self, keys: list | None = None, args: list | None = None):
+        return await self._func(self._redis, keys or [], args or [])
+
+
+class MemoryRedis:
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        self._expires: dict[str, float] = {}
+        self._next_sweep = now() + SWEEP_INTERVAL
+
+    def _alive(self, key: str) -> bool:
+        expire_at = self._expires.get(key)
+        if expire_at is not None and expire_at <= now():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return key in self._data
+
+    def _sweep(self):
+        current = now()
+        if current < self._next_sweep:
+            return
+        self._next_sweep = current + SWEEP_INTERVAL
+        for key in [k for k, v in self._expires.items() if v <= current]:
+            self._data.pop(key, None)
+            del self._expires[key]
+
+    def _store(self, key: str, value: Any, ex: int | None = None):
+        self._sweep()
+        self._data[key] = value
+        if ex is not None:
+            self._expires[key] = now() + ex
+        else:
+            self._expires.pop(key, None)
+
+    def _hash(self, name: str, create: bool = False) -> dict[bytes, bytes]:
+        if self._alive(name):
+            value = self._data[name]
+            if not isinstance(value, dict):
+                raise TypeError(f"'{name}' is not a hash")
+            return value
+        if not create:
+            return {}
+        value: dict[bytes, bytes] = {}
+        self._data[name] = value
+        return value
+
+    async def ping(self) -> bool:
+        return True
+
+    async def aclose(self):
+        pass
+
+    async def flushdb(self):
+        self._data.clear()
+        self._expires.clear()
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+    def register_script(self, script: str) -> MemoryScript:
+        if script not in SCRIPTS:
+            raise NotImplementedError("script has no in-memory equivalent")
+        return MemoryScript(self, SCRIPTS[script])
+
+    def lock(self, name: str) -> MemoryLock:
+        return MemoryLock()
+
+    async def get(self, name: str) -> bytes | None:
+        if not self._alive(name):
+            return None
+        return self._data[name]
+
+    async def set(
+        self, name: str, value: Any, ex: int | None = None, nx: bool = False
+    ) -> bool | None:
+        if nx and self._alive(name):
+            return None
+        self._store(name, _encode(value), ex)
+        return True
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        return [await self.get(key) for key in keys]
+
+    async def getdel(self, name: str) -> bytes | None:
+        value = await self.get(name)
+        await self.delete(name)
+        return value
+
+    async def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._alive(name):
+                deleted += 1
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return deleted
+
+    async def exists(self, *names: str) -> int:
+        return sum(self._alive(name) for name in names)
+
+    async def expire(self, name: str, time: int) -> bool:
+        if not self._alive(name):
+            return False
+        self._expires[name] = now() + time
+        return True
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        value = int(self._data[name]) + amount if self._alive(name) else amount
+        self._data[name] = _encode(value)
+        return value
+
+    async def hset(
+        self,
+        name: str,
+        key: str | None = None,
+        value: Any = None,
+        mapping: dict | None = None,
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+
+        self._sweep()
+        data = self._hash(name, create=True)
+        added = 0
+        for k, v in items.items():
+            field = _encode(k)
+            added += field not in data
+            data[field] = _encode(v)
+        return added
+
+    async def hgetall(self, name: str) -> dict[bytes, bytes]:
+        return dict(self._hash(name))
+
+    async def hlen(self, name: str) -> int:
+        return len(self._hash(name))
+
+    async def hexists(self, name: str, key: str) -> bool:
+        return _encode(key) in self._hash(name)
+
+    async def hmget(self, name: str, keys: list[str]) -> list[bytes | None]:
+        data = self._hash(name)
+        return [data.get(_encode(k)) for k in keys]
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        data = self._hash(name)
+        deleted = 0
+        for k in keys:
+            deleted += data.pop(_encode(k), None) is not None
+        if not data:
+            await self.delete(name)
+        return deleted
@@ -0,0 +1,394 @@
+"""
+In-process metrics, exposed in Prometheus text format on '/metrics'.
+
+Metrics are plain python objects updated on the event loop, there are no locks
+and no background work. Label values are resolved to a child once with
+'labels(...)', callers on hot paths can keep the child around.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+class Registry:
+    """
+    - const labels: added to every sample, ex: the worker serving the scrape
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._const_names: tuple[str, ...] = ()
+        self._const_values: tuple[str, ...] = ()
+
+    def set_const_labels(self, **labels: str):
+        self._const_names = tuple(labels.keys())
+        self._const_values = tuple(labels.values())
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(self._const_names, self._const_values))
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric[C]:
+    type: str
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry | None = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], C] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self) -> C:
+        raise NotImplementedError()
+
+    def labels(self, *values: str) -> C:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _child_samples(self, labels: str, child: C) -> Iterator[str]:
+        raise NotImplementedError()
+
+    def samples(
+        self, const_names: Sequence[str] = (), const_values: Sequence[str] = ()
+    ) -> Iterator[str]:
+        names = (*const_names, *self.labelnames)
+        for values, child in list(self._children.items()):
+            yield from self._child_samples(
+                _format_labels(names, (*const_values, *values)), child
+            )
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric[CounterChild]):
+    type = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _child_samples(self, labels: str, child: CounterChild) -> Iterator[str]:
+        yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class GaugeChild:
+    """
+    A gauge either holds a value or reads it from a function on collect
+    """
+
+    __slots__ = ("value", "_function")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self.value
+
+
+class Gauge(Metric[GaugeChild]):
+    type = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _child_samples(self, labels: str, child: GaugeChild) -> Iterator[str]:
+        yield f"{self.name}{labels} {_format_value(child.get())}"
+
+
+class HistogramChild:
+    """
+    - counts: observations per bucket, not cumulative, the last one is '+Inf'
+    """
+
+    __slots__ = ("_bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+
+class Histogram(Metric[HistogramChild]):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Registry | None = REGISTRY,
+    ) -> None:
+        self._bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self._bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _child_samples(self, labels: str, child: HistogramChild) -> Iterator[str]:
+        # 'le' goes along with the other labels
+        prefix = labels[:-1] + "," if labels else "{"
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float("inf"),), child.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{prefix}le="{_format_value(bound)}"}} {cumulative}'
+        yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+        yield f"{self.name}_count{labels} {child.count}"
+
+
+# queue in
+QUEUE_IN_PHASE_SECONDS = Histogram(
+    "typephoon_queue_in_phase_seconds",
+    "Time spent in each queue in phase (token, match, join, register, publish, start)",
+    ["phase"],
+)
+
+# websockets
+BG_CONNECTIONS = Gauge(
+    "typephoon_bg_connections",
+    "Open websocket connections",
+    ["kind"],
+)
+BG_GAMES = Gauge(
+    "typephoon_bg_games",
+    "Games with at least one open websocket connection",
+    ["kind"],
+)
+BG_QUEUED_MESSAGES = Gauge(
+    "typephoon_bg_queued_messages",
+    "Messages waiting to be sent, summed over connections",
+    ["kind"],
+)
+BG_QUEUE_DEPTH_MAX = Gauge(
+    "typephoon_bg_queue_depth_max",
+    "Deepest send queue of a single connection",
+    ["kind"],
+)
+KEYSTROKE_DELIVER_SECONDS = Histogram(
+    "typephoon_keystroke_deliver_seconds",
+    "Time from a keystroke being published to it being queued for the other players",
+)
+KEYSTROKE_ROUTES = Counter(
+    "typephoon_keystroke_routes_total",
+    "Keystrokes delivered on this node only (local) or published to every node (broker)",
+    ["route"],
+)
+
+# node affinity
+AFFINITY_NODES = Gauge(
+    "typephoon_affinity_nodes",
+    "Live nodes on the hash ring",
+)
+AFFINITY_REDIRECTS = Counter(
+    "typephoon_affinity_redirects_total",
+    "Websockets sent to the node owning their game (lobby, game, rebalance)",
+    ["kind"],
+)
+
+# consumers
+CONSUMER_SECONDS = Histogram(
+    "typephoon_consumer_seconds",
+    "Time spent processing a message",
+    ["consumer"],
+)
+CONSUMER_ERRORS = Counter(
+    "typephoon_consumer_errors_total",
+    "Messages that failed processing",
+    ["consumer"],
+)
+
+# write-behind for game results
+RESULT_WRITER_RESULTS = Gauge(
+    "typephoon_result_writer_results",
+    "Game results flushed to database since start",
+)
+RESULT_WRITER_BATCHES = Gauge(
+    "typephoon_result_writer_batches",
+    "Batches flushed (ok) or given up and left in the journal (failed) since start",
+    ["status"],
+)
+RESULT_WRITER_PENDING = Gauge(
+    "typephoon_result_writer_pending",
+    "Game results queued for the next batch",
+)
+RESULT_WRITER_LATENCY_SECONDS = Gauge(
+    "typephoon_result_writer_latency_seconds",
+    "Time spent writing a batch (last, avg, max)",
+    ["stat"],
+)
+
+# repositories
+REPOSITORY_SECONDS = Histogram(
+    "typephoon_repository_seconds",
+    "Time spent in repository calls (postgres / redis)",
+    ["repository", "method"],
+)
+
+
+def observe_consumer(func: Callable):
+    """
+    Time a consumer's '_process' and count its errors
+    """
+    children: dict[type, tuple[HistogramChild, CounterChild]] = {}
+
+    @wraps(func)
+    async def wrapped(self, *args, **kwargs):
+        cls = type(self)
+        if cls not in children:
+            children[cls] = (
+                CONSUMER_SECONDS.labels(cls.__name__),
+                CONSUMER_ERRORS.labels(cls.__name__),
+            )
+        seconds, errors = children[cls]
+
+        start = perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        except:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(perf_counter() - start)
+
+    return wrapped
+
+
+def _timed(repository: str, func: Callable):
+    child = REPOSITORY_SECONDS.labels(repository, func.__name__)
+
+    @wraps(func)
+    async def wrapped(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            child.observe(perf_counter() - start)
+
+    return wrapped
+
+
+def timed_repository[T: type](cls: T) -> T:
+    """
+    Class decorator, times every public coroutine method of a repository
+    """
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not iscoroutinefunction(attr):
+            continue
+        setattr(cls, name, _timed(cls.__name__, attr))
+    return cls
@@ -0,0 +1,166 @@
+"""
+Game to node affinity, so the websockets of a game land on one node.
+"""
+
+import asyncio
+from asyncio import CancelledError, Task, create_task
+from collections.abc import Awaitable, Callable
+from logging import getLogger
+
+from redis.asyncio import Redis
+
+from ..repositories.node_registry import NodeRegistryRepo
+from ..types.common import NodeInfo
+from ..types.setting import Setting
+from .hash_ring import HashRing
+from .metrics import AFFINITY_NODES
+
+logger = getLogger(__name__)
+
+RebalanceCallback = Callable[[], Awaitable[None]]
+
+
+class NodeAffinity:
+    """
+    Keeps this node registered with heartbeats and maps games to live nodes.
+    The ring is refreshed with every heartbeat, 'on_change' runs after nodes
+    join or leave.
+    """
+
+    def __init__(
+        self,
+        setting: Setting,
+        redis_conn: Redis,
+        on_change: RebalanceCallback | None = None,
+    ) -> None:
+        assert setting.server_name
+        self._setting = setting
+        self._registry = NodeRegistryRepo(redis_conn=redis_conn, setting=setting)
+        self._node = NodeInfo(name=setting.server_name, url=setting.affinity.url)
+        self._ring = HashRing(vnodes=setting.affinity.vnodes)
+        self._urls: dict[str, str] = {}
+        self._on_change = on_change
+        self._task: Task | None = None
+        self._releasing: set[Task] = set()
+
+    @property
+    def node(self) -> NodeInfo:
+        return self._node
+
+    @property
+    def node_count(self) -> int:
+        return len(self._urls)
+
+    @property
+    def releasing_count(self) -> int:
+        return len(self._releasing)
+
+    def owner(self, game_id: int) -> NodeInfo:
+        """
+        This node owns every game until the ring is loaded
+        """
+        name = self._ring.get(game_id)
+        if name is None or name == self._node.name:
+            return self._node
+        return NodeInfo(name=name, url=self._urls[name])
+
+    def remote_owner(self, game_id: int) -> NodeInfo | None:
+        """
+        Returns:
+            - None if the game belongs to this node
+        """
+        owner = self.owner(game_id)
+        if owner.name == self._node.name:
+            return None
+        return owner
+
+    async def start(self):
+        await self.refresh()
+        AFFINITY_NODES.labels().set_function(lambda: self.node_count)
+        self._task = create_task(self._loop(), name="node-affinity")
+
+    def release_later(
+        self, game_id: int, user_id: str, release: Callable[[], Awaitable[None]]
+    ):
+        """
+        Run 'release' in background after 'affinity.redirect_timeout', pending
+        ones are cancelled on 'stop'
+        """
+        task = create_task(
+            self._release_later(game_id, user_id, release),
+            name=f"redirect-release-{game_id}-{user_id}",
+        )
+        self._releasing.add(task)
+        task.add_done_callback(self._releasing.discard)
+
+    async def _release_later(
+        self, game_id: int, user_id: str, release: Callable[[], Awaitable[None]]
+    ):
+        await asyncio.sleep(self._setting.affinity.redirect_timeout)
+        try:
+            await release()
+        except Exception:
+            logger.exception(
+                "release redirected failed, game_id: %s, user_id: %s",
+                game_id,
+                user_id,
+            )
+
+    async def stop(self):
+        """
+        Leave the ring, other nodes take over this node's games on their next refresh.
+        Pending releases are dropped, their lobbies are left to the game cleaner
+        """
+        for task in self._releasing:
+            task.cancel()
+        await asyncio.gather(*self._releasing, return_exceptions=True)
+
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+
+        try:
+            await self._registry.remove(self._node.name)
+        except Exception as ex:
+            logger.warning("leave ring failed, error: %s", str(ex))
+
+    async def refresh(self):
+        await self._registry.heartbeat(self._node)
+        urls = {node.name: node.url for node in await self._registry.get_live()}
+        # just sent a heartbeat, this node is live even if the read raced its expiry
+        urls[self._node.name] = self._node.url
+        self._urls = urls
+
+        current = self._ring.nodes
+        joined = urls.keys() - current
+        left = current - urls.keys()
+        if not joined and not left:
+            return
+
+        for name in joined:
+            self._ring.add(name)
+        for name in left:
+            self._ring.remove(name)
+        logger.info(
+            "ring changed, joined: %s, left: %s, nodes: %s",
+            sorted(joined),
+            sorted(left),
+            len(urls),
+        )
+
+        if self._on_change is not None:
+            await self._on_change()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._setting.affinity.heartbeat_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("refresh failed")
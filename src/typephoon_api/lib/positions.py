@@ -0,0 +1,106 @@
+"""
+Latest keystroke position of every player, for reconnect snapshots.
+"""
+
+import asyncio
+from asyncio import CancelledError, Task, create_task
+from collections import defaultdict
+from logging import getLogger
+
+from ..repositories.game_cache import GameCacheRepo, Position
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+
+class PositionTable:
+    """
+    Kept for the games with connections on this node, every keystroke of such a
+    game reaches it. Positions of the players connected here are mirrored to
+    the game cache every 'game.position_flush_interval', a player reconnecting
+    to another node gets them from there.
+    """
+
+    def __init__(self, setting: Setting, game_cache_repo: GameCacheRepo) -> None:
+        self._setting = setting
+        self._game_cache_repo = game_cache_repo
+        self._positions: defaultdict[int, dict[str, Position]] = defaultdict(dict)
+        self._pending: defaultdict[int, dict[str, Position]] = defaultdict(dict)
+        self._task: Task | None = None
+
+    @property
+    def game_count(self) -> int:
+        return len(self._positions)
+
+    async def start(self):
+        self._task = create_task(self._loop(), name="position-table")
+
+    async def stop(self):
+        """
+        Mirror pending positions then stop
+        """
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def update(
+        self,
+        game_id: int,
+        user_id: str,
+        word_index: int,
+        char_index: int,
+        mirror: bool = False,
+    ):
+        """
+        - mirror: the player is connected here, write it to the game cache
+        """
+        position = (word_index, char_index)
+        self._positions[game_id][user_id] = position
+        if mirror:
+            self._pending[game_id][user_id] = position
+
+    def forget(self, game_id: int):
+        """
+        Drop a game without connections here, its pending positions are still
+        mirrored
+        """
+        self._positions.pop(game_id, None)
+
+    async def snapshot(self, game_id: int) -> dict[str, Position]:
+        """
+        The mirrored positions, overridden by the ones not mirrored yet and
+        the ones seen here, which are never older
+        """
+        positions = await self._game_cache_repo.get_positions(game_id)
+        positions.update(self._pending.get(game_id, {}))
+        positions.update(self._positions.get(game_id, {}))
+        return positions
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        pending = self._pending
+        self._pending = defaultdict(dict)
+        try:
+            await self._game_cache_repo.update_positions(pending)
+        except:
+            # keep them for the next flush, newer positions win
+            for game_id, players in pending.items():
+                self._pending[game_id] = players | self._pending[game_id]
+            raise
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._setting.game.position_flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("flush failed")
@@ -0,0 +1,155 @@
+"""
+Sampling profiler for the event loop thread.
+
+While running, a thread samples the event loop thread's stack every 'interval'
+seconds and counts identical stacks. The result is written in the collapsed
+stack format ('frame;frame;frame count' per line), which flamegraph.pl and
+speedscope read directly.
+Nothing is installed or running while the profiler is stopped.
+"""
+
+import sys
+from collections import Counter
+from datetime import UTC, datetime
+from logging import getLogger
+from pathlib import Path
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter
+from types import FrameType
+
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}:{code.co_qualname}"
+
+
+def collapse(frame: FrameType | None) -> list[str]:
+    """
+    frame names from outermost to innermost
+    """
+    names: list[str] = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class SamplingProfiler:
+    """
+    - focus: only keep samples with a frame whose qualified name ends with one of these,
+             ex: 'QueueInService.queue_in'. Empty keeps every sample.
+    """
+
+    def __init__(self, setting: Setting) -> None:
+        self._setting = setting
+        self._lock = Lock()
+        self._thread: Thread | None = None
+        self._stop = Event()
+        self._samples: Counter[str] = Counter()
+        self._target: int | None = None
+        self.last_output: Path | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float | None = None) -> bool:
+        """
+        Start sampling the calling thread, which should be the event loop thread.
+        Returns False if the profiler is already running.
+        Samples are written when 'duration' (capped by 'max_duration') passes or on 'stop'.
+        """
+        with self._lock:
+            if self.running:
+                return False
+
+            setting = self._setting.profiler
+            duration = min(duration or setting.duration, setting.max_duration)
+
+            self._target = get_ident()
+            self._samples = Counter()
+            self._stop.clear()
+            self._thread = Thread(
+                target=self._run,
+                args=(duration,),
+                name="sampling-profiler",
+                daemon=True,
+            )
+            self._thread.start()
+
+        logger.info("profiler started, duration: %ss", duration)
+        return True
+
+    def stop(self) -> Path | None:
+        """
+        Stop sampling and wait for the output to be written.
+        Returns the latest output, if any.
+        """
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return self.last_output
+            self._stop.set()
+
+        thread.join()
+        return self.last_output
+
+    def toggle(self):
+        """
+        For signal handlers on the event loop, stopping does not wait for the
+        output, the sampling thread writes it
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._stop.set()
+                return
+        self.start()
+
+    def _keep(self, stack: list[str]) -> bool:
+        focus = self._setting.profiler.focus
+        if not focus:
+            return True
+        return any(name.endswith(i) for name in stack for i in focus)
+
+    def _run(self, duration: float):
+        interval = self._setting.profiler.interval
+        deadline = perf_counter() + duration
+
+        while not self._stop.wait(interval) and perf_counter() < deadline:
+            frame = sys._current_frames().get(self._target)  # type: ignore
+            if frame is None:
+                break
+            stack = collapse(frame)
+            if self._keep(stack):
+                self._samples[";".join(stack)] += 1
+            del frame
+
+        self.last_output = self._write()
+        with self._lock:
+            self._thread = None
+
+    def _write(self) -> Path | None:
+        if not self._samples:
+            logger.info("profiler stopped, no samples")
+            return None
+
+        output_dir = Path(self._setting.profiler.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        ts = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+        path = output_dir / f"profile-{self._setting.server_name or 'default'}-{ts}.txt"
+
+        with path.open("w") as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        logger.info(
+            "profiler stopped, %s samples written to %s",
+            self._samples.total(),
+            path,
+        )
+        return path
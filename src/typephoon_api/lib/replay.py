@@ -0,0 +1,336 @@
+"""
+Keystroke replay logs.
+
+A log holds the keystrokes of one game seen by one node, encoded column by
+column, every number as a varint:
+
+    version, started_at (unix ms), keystroke count,
+    player count, then each user id (length, utf-8) in slot order,
+    4 columns (byte length, values):
+    - times: ms since the previous keystroke, the first one since 'started_at'
+    - slots: index of the player in the user ids
+    - words / chars: word_index / char_index
+
+The replay endpoint serves every log of a game, each prefixed by its length.
+"""
+
+from asyncio import (
+    CancelledError,
+    Queue,
+    Task,
+    TimerHandle,
+    create_task,
+    get_running_loop,
+)
+from collections.abc import Iterator
+from dataclasses import dataclass
+from logging import getLogger
+from time import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..repositories.game_replay import GameReplayRepo
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+REPLAY_VERSION = 1
+# max bytes per chunk of the replay endpoint
+REPLAY_CHUNK_SIZE = 64 * 1024
+
+
+def write_varint(buf: bytearray, value: int):
+    """
+    unsigned LEB128, 7 bits per byte, values below 128 take one byte
+    """
+    while value > 0x7F:
+        buf.append(value & 0x7F | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_varint(data: bytes | memoryview, offset: int) -> tuple[int, int]:
+    """
+    Returns:
+        - (value, offset after it)
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+@dataclass(slots=True)
+class Keystroke:
+    """
+    - at: unix ms
+    """
+
+    at: int
+    user_id: str
+    word_index: int
+    char_index: int
+
+
+@dataclass(slots=True)
+class ReplaySegment:
+    """
+    - started_at: unix ms
+    """
+
+    started_at: int
+    players: list[str]
+    keystrokes: list[Keystroke]
+
+
+class ReplayLog:
+    """
+    Keystrokes of one game, appended to one buffer per column
+    """
+
+    __slots__ = (
+        "started_at",
+        "count",
+        "_last",
+        "_players",
+        "_times",
+        "_slots",
+        "_words",
+        "_chars",
+    )
+
+    def __init__(self, started_at: float) -> None:
+        """
+        - started_at: unix seconds
+        """
+        self.started_at = int(started_at * 1000)
+        self.count = 0
+        self._last = self.started_at
+        self._players: dict[str, int] = {}
+        self._times = bytearray()
+        self._slots = bytearray()
+        self._words = bytearray()
+        self._chars = bytearray()
+
+    @property
+    def size(self) -> int:
+        """
+        bytes buffered
+        """
+        return len(self._times) + len(self._slots) + len(self._words) + len(self._chars)
+
+    def append(self, user_id: str, word_index: int, char_index: int, at: float):
+        """
+        - at: unix seconds, a clock going back counts as no time passed
+        """
+        at_ms = int(at * 1000)
+        slot = self._players.get(user_id)
+        if slot is None:
+            slot = self._players[user_id] = len(self._players)
+
+        write_varint(self._times, max(at_ms - self._last, 0))
+        write_varint(self._slots, slot)
+        write_varint(self._words, word_index)
+        write_varint(self._chars, char_index)
+        self._last = max(at_ms, self._last)
+        self.count += 1
+
+    def encode(self) -> bytes:
+        buf = bytearray()
+        write_varint(buf, REPLAY_VERSION)
+        write_varint(buf, self.started_at)
+        write_varint(buf, self.count)
+
+        write_varint(buf, len(self._players))
+        for user_id in self._players:
+            encoded = user_id.encode()
+            write_varint(buf, len(encoded))
+            buf += encoded
+
+        for column in (self._times, self._slots, self._words, self._chars):
+            write_varint(buf, len(column))
+            buf += column
+        return bytes(buf)
+
+
+def decode_segment(data: bytes | memoryview) -> ReplaySegment:
+    version, offset = read_varint(data, 0)
+    if version != REPLAY_VERSION:
+        raise ValueError(f"unknown replay version: {version}")
+
+    started_at, offset = read_varint(data, offset)
+    count, offset = read_varint(data, offset)
+
+    player_count, offset = read_varint(data, offset)
+    players: list[str] = []
+    for _ in range(player_count):
+        size, offset = read_varint(data, offset)
+        players.append(bytes(data[offset : offset + size]).decode())
+        offset += size
+
+    columns: list[list[int]] = []
+    for _ in range(4):
+        size, offset = read_varint(data, offset)
+        end = offset + size
+        values: list[int] = []
+        while offset < end:
+            value, offset = read_varint(data, offset)
+            values.append(value)
+        columns.append(values)
+
+    times, slots, words, chars = columns
+    if not len(times) == len(slots) == len(words) == len(chars) == count:
+        raise ValueError("corrupted replay, column lengths differ")
+
+    keystrokes: list[Keystroke] = []
+    at = started_at
+    for delta, slot, word_index, char_index in zip(times, slots, words, chars):
+        at += delta
+        keystrokes.append(Keystroke(at, players[slot], word_index, char_index))
+    return ReplaySegment(started_at=started_at, players=players, keystrokes=keystrokes)
+
+
+def frame_segment(data: bytes) -> bytes:
+    """
+    length prefix, segments of a game are served back to back
+    """
+    buf = bytearray()
+    write_varint(buf, len(data))
+    return bytes(buf) + data
+
+
+def decode_replay(data: bytes) -> Iterator[ReplaySegment]:
+    """
+    Decode a replay endpoint response
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        size, offset = read_varint(view, offset)
+        yield decode_segment(view[offset : offset + size])
+        offset += size
+
+
+class ReplayRecorder:
+    """
+    Buffers the keystrokes of the players connected here, one 'ReplayLog' per
+    game, fed by 'GameBGManager.broadcast'. Keystrokes are timed by when they
+    were sent, not when they got here. A game's log is written
+    'replay.close_delay' after its last connection here closed, a reconnect
+    meanwhile keeps it open. A player typing on several nodes leaves one log
+    per node. Writes are batched in background, replays are best effort, a
+    failed batch is dropped.
+    """
+
+    def __init__(
+        self, setting: Setting, sessionmaker: async_sessionmaker[AsyncSession]
+    ) -> None:
+        self._setting = setting
+        self._sessionmaker = sessionmaker
+        self._logs: dict[int, ReplayLog] = {}
+        self._closing: dict[int, TimerHandle] = {}
+        self._closed: Queue[tuple[int, bytes]] = Queue()
+        self._task: Task | None = None
+
+    @property
+    def game_count(self) -> int:
+        return len(self._logs)
+
+    @property
+    def buffered_bytes(self) -> int:
+        return sum(log.size for log in self._logs.values())
+
+    async def start(self):
+        self._task = create_task(self._loop(), name="replay-recorder")
+
+    async def stop(self):
+        """
+        Write every open log then stop
+        """
+        if self._task is None:
+            return
+
+        for game_id in list(self._logs):
+            self.close(game_id)
+        await self._closed.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+
+    def record(
+        self,
+        game_id: int,
+        user_id: str,
+        word_index: int,
+        char_index: int,
+        at: float | None = None,
+    ):
+        """
+        - at: unix seconds the keystroke was sent, now if unknown
+        """
+        if at is None:
+            at = time()
+        log = self._logs.get(game_id)
+        if log is None:
+            log = self._logs[game_id] = ReplayLog(started_at=at)
+        elif log.count >= self._setting.replay.max_keystrokes:
+            return
+        log.append(user_id=user_id, word_index=word_index, char_index=char_index, at=at)
+
+    def close_later(self, game_id: int):
+        """
+        Close a game's log after 'replay.close_delay', unless kept open
+        """
+        if game_id not in self._logs or game_id in self._closing:
+            return
+        self._closing[game_id] = get_running_loop().call_later(
+            self._setting.replay.close_delay, self.close, game_id
+        )
+
+    def keep(self, game_id: int):
+        """
+        A connection to the game opened here, its log goes on
+        """
+        handle = self._closing.pop(game_id, None)
+        if handle is not None:
+            handle.cancel()
+
+    def close(self, game_id: int):
+        """
+        Queue a game's log to be written
+        """
+        self.keep(game_id)
+        log = self._logs.pop(game_id, None)
+        if log is None or not log.count:
+            return
+        self._closed.put_nowait((game_id, log.encode()))
+
+    async def _write(self, batch: list[tuple[int, bytes]]):
+        async with self._sessionmaker() as session:
+            await GameReplayRepo(session).add_many(batch)
+            await session.commit()
+
+    async def _loop(self):
+        while True:
+            batch = [await self._closed.get()]
+            while (
+                len(batch) < self._setting.replay.batch_size
+                and not self._closed.empty()
+            ):
+                batch.append(self._closed.get_nowait())
+
+            try:
+                await self._write(batch)
+            except Exception:
+                logger.exception("dropped %s replays", len(batch))
+            finally:
+                for _ in batch:
+                    self._closed.task_done()
@@ -0,0 +1,16 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class PydanticResponse(JSONResponse):
+    """
+    JSON response serialized by pydantic-core in a single pass.
+
+    Pydantic models are written straight to bytes, skipping 'jsonable_encoder'
+    and the stdlib json encoder. Plain python objects are accepted as well.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -0,0 +1,190 @@
+"""
+Write-behind buffer for game results.
+"""
+
+import asyncio
+from asyncio import CancelledError, Queue, Task, create_task
+from dataclasses import dataclass
+from logging import getLogger
+from time import perf_counter
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..repositories.game_result import GameResultRepo
+from ..repositories.result_journal import ResultJournalRepo
+from ..types.common import PendingGameResult
+from ..types.setting import Setting
+from .metrics import (
+    RESULT_WRITER_BATCHES,
+    RESULT_WRITER_LATENCY_SECONDS,
+    RESULT_WRITER_PENDING,
+    RESULT_WRITER_RESULTS,
+)
+
+logger = getLogger(__name__)
+
+
+@dataclass(slots=True)
+class FlushStats:
+    """
+    - *_latency: (seconds) time spent on writing a batch
+    """
+
+    batches: int = 0
+    results: int = 0
+    failed_batches: int = 0
+    last_latency: float = 0
+    max_latency: float = 0
+    total_latency: float = 0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.batches if self.batches else 0
+
+    def __str__(self) -> str:
+        return (
+            f"batches: {self.batches}, results: {self.results}, "
+            f"failed batches: {self.failed_batches}, "
+            f"avg latency: {self.avg_latency:.4f}s, max latency: {self.max_latency:.4f}s"
+        )
+
+
+class ResultWriter:
+    """
+    Results are journaled in redis, queued in memory and written to database
+    in batches. Journaled results left by a crash are replayed on 'start'.
+    """
+
+    def __init__(
+        self,
+        setting: Setting,
+        sessionmaker: async_sessionmaker[AsyncSession],
+        redis_conn: Redis,
+    ) -> None:
+        self._setting = setting
+        self._sessionmaker = sessionmaker
+        self._journal_repo = ResultJournalRepo(redis_conn=redis_conn, setting=setting)
+
+        self._queue: Queue[PendingGameResult] = Queue(
+            maxsize=setting.write_behind.queue_size
+        )
+        self._task: Task | None = None
+        self.stats = FlushStats()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self):
+        self._register_metrics()
+        await self.replay()
+        self._task = create_task(self._flush_loop(), name="result-writer")
+
+    def _register_metrics(self):
+        RESULT_WRITER_RESULTS.labels().set_function(lambda: self.stats.results)
+        RESULT_WRITER_BATCHES.labels("ok").set_function(lambda: self.stats.batches)
+        RESULT_WRITER_BATCHES.labels("failed").set_function(
+            lambda: self.stats.failed_batches
+        )
+        RESULT_WRITER_PENDING.labels().set_function(lambda: self.pending)
+        RESULT_WRITER_LATENCY_SECONDS.labels("last").set_function(
+            lambda: self.stats.last_latency
+        )
+        RESULT_WRITER_LATENCY_SECONDS.labels("avg").set_function(
+            lambda: self.stats.avg_latency
+        )
+        RESULT_WRITER_LATENCY_SECONDS.labels("max").set_function(
+            lambda: self.stats.max_latency
+        )
+
+    async def stop(self):
+        """
+        Flush pending results then stop
+        """
+        if self._task is None:
+            return
+
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+        logger.info("stopped, %s", self.stats)
+
+    async def submit(self, result: PendingGameResult):
+        """
+        Journal a result and queue it for the next batch.
+        Waits for space when the queue is full.
+        """
+        await self._journal_repo.add(result)
+        await self._queue.put(result)
+
+    async def replay(self):
+        results = await self._journal_repo.get_all()
+        if not results:
+            return
+
+        logger.info("replaying %s journaled results", len(results))
+        batch_size = self._setting.write_behind.batch_size
+        for idx in range(0, len(results), batch_size):
+            await self._flush(results[idx : idx + batch_size])
+        logger.info("replayed journaled results, %s", self.stats)
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._setting.write_behind.flush_interval
+
+            while len(batch) < self._setting.write_behind.batch_size:
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), wait))
+                except TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: list[PendingGameResult]):
+        for attempt in range(self._setting.write_behind.flush_retries + 1):
+            start = perf_counter()
+            try:
+                await self._write(batch)
+                await self._journal_repo.remove(batch)
+            except Exception as ex:
+                logger.warning(
+                    "failed to flush %s results, attempt: %s, error: %s",
+                    len(batch),
+                    attempt,
+                    str(ex),
+                )
+                if attempt < self._setting.write_behind.flush_retries:
+                    await asyncio.sleep(min(2**attempt * 0.1, 5))
+                continue
+
+            latency = perf_counter() - start
+            self.stats.batches += 1
+            self.stats.results += len(batch)
+            self.stats.last_latency = latency
+            self.stats.max_latency = max(self.stats.max_latency, latency)
+            self.stats.total_latency += latency
+            logger.debug("flushed %s results in %.4fs", len(batch), latency)
+            return
+
+        # keep results in the journal, they are replayed on next start
+        self.stats.failed_batches += 1
+        logger.error("gave up flushing %s results", len(batch))
+
+    async def _write(self, batch: list[PendingGameResult]):
+        async with self._sessionmaker() as session:
+            await GameResultRepo(session).create_many(batch)
+            await session.commit()
@@ -0,0 +1,43 @@
+"""
+Event loop and HTTP parser used by uvicorn.
+"""
+
+from dataclasses import dataclass
+from importlib.util import find_spec
+from logging import getLogger
+
+from ..types.enums import EventLoopType, HTTPImplType
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+
+@dataclass(slots=True)
+class RuntimeProfile:
+    loop: EventLoopType
+    http: HTTPImplType
+
+
+def _installed(module: str) -> bool:
+    return find_spec(module) is not None
+
+
+def _resolve[T: (EventLoopType, HTTPImplType)](requested: T, fast: T, fallback: T) -> T:
+    if requested == fallback:
+        return fallback
+
+    if _installed(fast.value):
+        return fast
+
+    if requested == fast:
+        logger.warning("%s is not installed, falling back to %s", fast, fallback)
+    return fallback
+
+
+def resolve_runtime(setting: Setting) -> RuntimeProfile:
+    profile = RuntimeProfile(
+        loop=_resolve(setting.server.loop, EventLoopType.UVLOOP, EventLoopType.ASYNCIO),
+        http=_resolve(setting.server.http, HTTPImplType.HTTPTOOLS, HTTPImplType.H11),
+    )
+    logger.info("runtime profile, loop: %s, http: %s", profile.loop, profile.http)
+    return profile
@@ -1,24 +1,45 @@
+import asyncio
+import signal
 from asyncio import timeout
 from logging import getLogger
 
-from aio_pika import connect_robust
 from aio_pika.abc import AbstractExchange
 from fastapi import FastAPI
 from redis.asyncio import Redis
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ..consumers.game_cleaner import GameCleanerConsumer
+from ..consumers.game_result import GameResultConsumer
 from ..consumers.game_start import GameStartConsumer
 from ..consumers.keystroke import KeystrokeConsumer
 from ..consumers.lobby_countdown import LobbyCountdownConsumer
 from ..consumers.lobby_notify import LobbyNotifyConsumer
+from ..repositories.game import GameRepo
+from ..repositories.game_cache import GameCacheRepo
+from ..repositories.lobby_cache import LobbyCacheRepo
+from ..types.enums import BackendType
 from ..types.errors import AMQPNotReady
 from ..types.setting import Setting
 from .amqp_manager import AMQPManager
+from .backends import connect_amqp, create_redis, create_sessionmaker
 from .background_tasks.base import BGManager
-from .background_tasks.game import GameBG, GameBGMsg
-from .background_tasks.lobby import LobbyBG, LobbyBGMsg
+from .background_tasks.game import GameBGManager
+from .background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from .health_monitor import HealthCheck, HealthMonitor
+from .lobby_pool import LobbyPool
+from .metrics import (
+    AFFINITY_REDIRECTS,
+    BG_CONNECTIONS,
+    BG_GAMES,
+    BG_QUEUE_DEPTH_MAX,
+    BG_QUEUED_MESSAGES,
+)
+from .node_affinity import NodeAffinity
+from .positions import PositionTable
+from .profiler import SamplingProfiler
+from .replay import ReplayRecorder
+from .result_writer import ResultWriter
 from .word_generator import WordGenerator
 
 logger = getLogger(__name__)
@@ -28,38 +49,55 @@ class TypephoonServer(FastAPI):
     def __init__(self, setting: Setting, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._setting = setting
+        self._draining = False
 
     async def prepare(self):
+        # profiler, SIGUSR2 toggles it
+        self._profiler = SamplingProfiler(self._setting)
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR2, self._profiler.toggle
+            )
+        except (NotImplementedError, RuntimeError, ValueError) as ex:
+            logger.warning("profiler signal handler not installed, error: %s", str(ex))
+
         # Word Generator
         self._word_generator = WordGenerator(self._setting)
         self._word_generator.load_words()
 
         # database
-        self._engine = create_async_engine(
-            url=self._setting.db.async_dsn,
-            echo=self._setting.db.echo,
-            pool_size=self._setting.db.pool_size,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            isolation_level="READ COMMITTED",
-        )
-        self._sessionmaker = async_sessionmaker(self._engine)
+        self._engine, self._sessionmaker = create_sessionmaker(self._setting)
 
         # cache (redis)
-        self._redis_conn = Redis(
-            host=self._setting.redis.host,
-            port=self._setting.redis.port,
-            db=self._setting.redis.db,
-        )
+        self._redis_conn = create_redis(self._setting)
+
+        # lobby and game timers live in the broker, an in-process one loses them
+        if (
+            self._setting.amqp.backend == BackendType.MEMORY
+            and self._setting.db.backend == BackendType.EXTERNAL
+        ):
+            await self._finish_orphaned_games()
+
+        # write-behind for game results
+        self._result_writer: ResultWriter | None = None
+        if self._setting.write_behind.enabled:
+            self._result_writer = ResultWriter(
+                setting=self._setting,
+                sessionmaker=self._sessionmaker,
+                redis_conn=self._redis_conn,
+            )
+            await self._result_writer.start()
+
+        # games waiting for the first player of a lobby
+        self._lobby_pool: LobbyPool | None = None
+        if self._setting.lobby_pool.size > 0:
+            self._lobby_pool = LobbyPool(
+                setting=self._setting, sessionmaker=self._sessionmaker
+            )
+            await self._lobby_pool.start()
 
         # amqp
-        self._amqp_conn = await connect_robust(
-            host=self._setting.amqp.host,
-            login=self._setting.amqp.user,
-            password=self._setting.amqp.password,
-            virtualhost=self._setting.amqp.vhost,
-            client_properties={"connection_name": "typephoon"},
-        )
+        self._amqp_conn = await connect_amqp(self._setting)
 
         updated_queue_names = await AMQPManager(
             setting=self._setting, amqp_conn=self._amqp_conn
@@ -77,6 +115,7 @@ class TypephoonServer(FastAPI):
         self._default_channel = await self._amqp_conn.channel()
         self._notify_channel = await self._amqp_conn.channel()
         self._keystroke_channel = await self._amqp_conn.channel()
+        self._result_channel = await self._amqp_conn.channel()
 
         self._default_exchange = self._default_channel.default_exchange
         self._notify_exchange = await self._notify_channel.get_exchange(
@@ -85,9 +124,42 @@ class TypephoonServer(FastAPI):
         self._keystroke_exchange = await self._keystroke_channel.get_exchange(
             self._setting.amqp.game_keystroke_fanout_exchange
         )
+        self._result_exchange = await self._result_channel.get_exchange(
+            self._setting.amqp.game_result_fanout_exchange
+        )
 
         self._lobby_bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
-        self._game_bg_manager = BGManager[GameBGMsg, GameBG]()
+        # latest keystroke positions, sent to reconnecting players
+        self._position_table = PositionTable(
+            setting=self._setting,
+            game_cache_repo=GameCacheRepo(
+                redis_conn=self._redis_conn, setting=self._setting
+            ),
+        )
+        await self._position_table.start()
+
+        # keystroke logs for replays
+        self._replay_recorder: ReplayRecorder | None = None
+        if self._setting.replay.enabled:
+            self._replay_recorder = ReplayRecorder(
+                setting=self._setting, sessionmaker=self._sessionmaker
+            )
+            await self._replay_recorder.start()
+
+        self._game_bg_manager = GameBGManager(
+            positions=self._position_table, recorder=self._replay_recorder
+        )
+        self._register_bg_metrics()
+
+        # game to node affinity
+        self._node_affinity: NodeAffinity | None = None
+        if self._setting.affinity.enabled:
+            self._node_affinity = NodeAffinity(
+                setting=self._setting,
+                redis_conn=self._redis_conn,
+                on_change=self._rebalance_lobbies,
+            )
+            await self._node_affinity.start()
 
         # consumers
         self._lobby_countdown_consumer = LobbyCountdownConsumer(
@@ -133,42 +205,163 @@ class TypephoonServer(FastAPI):
         await self._game_start_consumer.prepare()
         await self._game_start_consumer.start()
 
+        self._game_result_consumer = GameResultConsumer(
+            setting=self._setting,
+            amqp_conn=self._amqp_conn,
+            bg_manager=self._game_bg_manager,
+        )
+        await self._game_result_consumer.prepare()
+        await self._game_result_consumer.start()
+
+        # dependency checks for readiness, in-process backends are not checked
+        checks: dict[str, HealthCheck] = {}
+        if self._setting.db.backend == BackendType.EXTERNAL:
+            checks["db"] = self._check_db
+        if self._setting.redis.backend == BackendType.EXTERNAL:
+            checks["redis"] = self._redis_conn.ping
+        if self._setting.amqp.backend == BackendType.EXTERNAL:
+            checks["amqp"] = self._check_amqp
+        self._health_monitor = HealthMonitor(setting=self._setting, checks=checks)
+        await self._health_monitor.start()
+
+    async def _finish_orphaned_games(self):
+        """
+        Finish the games left by the previous run, their countdowns and cleanup
+        were queued in memory and will never fire
+        """
+        async with self._sessionmaker() as session:
+            game_ids = await GameRepo(session).finish_unfinished()
+            await session.commit()
+
+        lobby_cache_repo = LobbyCacheRepo(
+            redis_conn=self._redis_conn, setting=self._setting
+        )
+        game_cache_repo = GameCacheRepo(
+            redis_conn=self._redis_conn, setting=self._setting
+        )
+        for game_id in game_ids:
+            await lobby_cache_repo.clear_cache(game_id)
+            await game_cache_repo.clear_cache(game_id)
+
+        if game_ids:
+            logger.warning("finished %s orphaned games", len(game_ids))
+
+    async def _rebalance_lobbies(self):
+        """
+        Lobbies now owned by another node are sent there, players keep their seats
+        until 'affinity.redirect_timeout'. Games already started stay where they are.
+        """
+        assert self._node_affinity is not None
+        lobby_cache_repo = LobbyCacheRepo(
+            redis_conn=self._redis_conn, setting=self._setting
+        )
+        for game_id in self._lobby_bg_manager.game_ids():
+            owner = self._node_affinity.remote_owner(game_id)
+            if owner is None:
+                continue
+
+            logger.info("move lobby, game_id: %s, node: %s", game_id, owner.name)
+            AFFINITY_REDIRECTS.labels("rebalance").inc()
+            await lobby_cache_repo.add_redirects(
+                game_id=game_id, user_ids=self._lobby_bg_manager.user_ids(game_id)
+            )
+            await self._lobby_bg_manager.remove_game(
+                game_id=game_id,
+                final_msg=LobbyBGMsg(
+                    event=LobbyBGMsgEvent.REDIRECT, game_id=game_id, node=owner.url
+                ),
+            )
+
+    def _register_bg_metrics(self):
+        managers: dict[str, BGManager] = {
+            "lobby": self._lobby_bg_manager,
+            "game": self._game_bg_manager,
+        }
+        for kind, manager in managers.items():
+            BG_CONNECTIONS.labels(kind).set_function(
+                lambda m=manager: m.connection_count
+            )
+            BG_GAMES.labels(kind).set_function(lambda m=manager: m.game_count)
+            BG_QUEUED_MESSAGES.labels(kind).set_function(
+                lambda m=manager: sum(m.queue_depths())
+            )
+            BG_QUEUE_DEPTH_MAX.labels(kind).set_function(
+                lambda m=manager: max(m.queue_depths(), default=0)
+            )
+
+    def drain(self):
+        """
+        Stop reporting ready, the server is shutting down
+        """
+        if not self._draining:
+            logger.info("draining, server_name: %s", self._setting.server_name)
+        self._draining = True
+
     async def cleanup(self):
+        self.drain()
+        await self._health_monitor.stop()
+
+        # new games go to other nodes
+        if self._node_affinity is not None:
+            await self._node_affinity.stop()
+
+        # close remaining websockets before their consumers are gone
+        await self._lobby_bg_manager.cleanup()
+        await self._game_bg_manager.cleanup()
+
         await self._lobby_notify_consumer.stop()
         await self._lobby_countdown_consumer.stop()
         await self._keystroke_consumer.stop()
         await self._game_cleaner_consumer.stop()
         await self._game_start_consumer.stop()
+        await self._game_result_consumer.stop()
+
+        await self._position_table.stop()
+        if self._replay_recorder is not None:
+            await self._replay_recorder.stop()
+
+        if self._result_writer is not None:
+            await self._result_writer.stop()
 
-        await self._engine.dispose()
+        if self._lobby_pool is not None:
+            await self._lobby_pool.stop()
+
+        if self._profiler.running:
+            await asyncio.to_thread(self._profiler.stop)
+
+        if self._engine is not None:
+            await self._engine.dispose()
         await self._redis_conn.aclose()
         await self._default_channel.close()
         await self._notify_channel.close()
         await self._keystroke_channel.close()
+        await self._result_channel.close()
         await self._amqp_conn.close()
 
-    async def ready(self) -> bool:
+    async def _check_db(self):
+        async with self._sessionmaker() as session:
+            await session.execute(text("SELECT 1"))
+
+    async def _check_amqp(self):
         try:
-            # database
-            async with self._sessionmaker() as session:
-                await session.execute(text("SELECT 1"))
-
-            # redis
-            await self._redis_conn.ping()
-
-            # amqp
-            try:
-                async with timeout(0.1):
-                    await self._amqp_conn.ready()
-            except TimeoutError:
-                raise AMQPNotReady("amqp_conn not ready")
-
-        except Exception as ex:
-            logger.warning("failed 'ready' check, error: %s", str(ex))
+            async with timeout(0.1):
+                await self._amqp_conn.ready()
+        except TimeoutError:
+            raise AMQPNotReady("amqp_conn not ready")
+
+    def ready(self) -> bool:
+        """
+        Reads the health monitor's cached result, no dependency is touched here
+        """
+        if self._draining:
+            logger.debug("not ready, draining")
             return False
 
-        else:
-            return True
+        return self._health_monitor.ready
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
 
     @property
     def word_generator(self) -> WordGenerator:
@@ -186,6 +379,26 @@ class TypephoonServer(FastAPI):
     def setting(self) -> Setting:
         return self._setting
 
+    @property
+    def health_monitor(self) -> HealthMonitor:
+        return self._health_monitor
+
+    @property
+    def profiler(self) -> SamplingProfiler:
+        return self._profiler
+
+    @property
+    def result_writer(self) -> ResultWriter | None:
+        return self._result_writer
+
+    @property
+    def lobby_pool(self) -> LobbyPool | None:
+        return self._lobby_pool
+
+    @property
+    def node_affinity(self) -> NodeAffinity | None:
+        return self._node_affinity
+
     @property
     def lobby_bg_manager(self) -> BGManager[LobbyBGMsg, LobbyBG]:
         return self._lobby_bg_manager
@@ -203,5 +416,17 @@ class TypephoonServer(FastAPI):
         return self._keystroke_exchange
 
     @property
-    def game_bg_manager(self) -> BGManager[GameBGMsg, GameBG]:
+    def amqp_result_exchange(self) -> AbstractExchange:
+        return self._result_exchange
+
+    @property
+    def game_bg_manager(self) -> GameBGManager:
         return self._game_bg_manager
+
+    @property
+    def replay_recorder(self) -> ReplayRecorder | None:
+        return self._replay_recorder
+
+    @property
+    def position_table(self) -> PositionTable:
+        return self._position_table
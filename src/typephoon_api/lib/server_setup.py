@@ -2,30 +2,32 @@ from contextlib import asynccontextmanager
 from logging import Filter, LogRecord, getLogger
 
 from fastapi import APIRouter, Request
-from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 
+from ..api.admin import router as admin_router
 from ..api.auth import router as auth_router
 from ..api.game import router as game_router
 from ..api.healthcheck import router as healthcheck_router
 from ..api.lobby import router as lobby_router
+from ..api.metrics import router as metrics_router
 from ..api.profile import router as profile_router
 from ..types.common import ErrorContext
 from ..types.enums import ErrorCode
 from ..types.responses.base import ErrorResponse
 from ..types.setting import Setting
+from .response import PydanticResponse
 from .server import TypephoonServer
 
 logger = getLogger(__name__)
 
 
 class HealthCheckFilter(Filter):
-    """disable access log for health check endpoints"""
+    """disable access log for health check and metrics endpoints"""
 
     def filter(self, record: LogRecord):
-        return record.getMessage().find("/healthcheck") == -1
+        message = record.getMessage()
+        return message.find("/healthcheck") == -1 and message.find("/metrics") == -1
 
 
 @asynccontextmanager
@@ -42,16 +44,16 @@ async def lifespan(app: TypephoonServer):
 
 async def validation_error_handler(_: Request, exc: Exception):
     logger.error("validation error: %s", exc)
-    msg = jsonable_encoder(
-        ErrorResponse(
-            error=ErrorContext(code=ErrorCode.VALIDATION_ERROR, message=str(exc))
-        )
+    msg = ErrorResponse(
+        error=ErrorContext(code=ErrorCode.VALIDATION_ERROR, message=str(exc))
     )
-    return JSONResponse(status_code=422, content=msg)
+    return PydanticResponse(status_code=422, content=msg)
 
 
 def create_server(setting: Setting) -> TypephoonServer:
-    app = TypephoonServer(setting=setting, lifespan=lifespan)
+    app = TypephoonServer(
+        setting=setting, lifespan=lifespan, default_response_class=PydanticResponse
+    )
     app.add_middleware(
         CORSMiddleware,
         allow_origins=setting.cors.allow_origins,
@@ -70,8 +72,10 @@ def create_server(setting: Setting) -> TypephoonServer:
     v1_router.include_router(lobby_router)
     v1_router.include_router(game_router)
     v1_router.include_router(profile_router)
+    v1_router.include_router(admin_router)
 
     app.include_router(healthcheck_router)
+    app.include_router(metrics_router)
     app.include_router(v1_router)
 
     return app
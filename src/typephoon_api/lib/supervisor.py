@@ -0,0 +1,216 @@
+"""
+Prefork supervisor, runs multiple servers (workers) on one node.
+
+Each worker is a separate process with its own 'SERVER_NAME', so it gets its
+own per-server queues and keeps its websockets (BG state) to itself, exactly
+like running one server per pod. Workers listen on the same port with
+'SO_REUSEPORT' and the kernel balances connections between them.
+"""
+
+import os
+import signal
+from logging import getLogger
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from socket import (
+    AF_INET,
+    SO_REUSEADDR,
+    SO_REUSEPORT,
+    SOCK_STREAM,
+    SOL_SOCKET,
+    gethostname,
+    socket,
+)
+from threading import Event
+from time import monotonic
+from typing import Callable
+
+import uvicorn
+
+from ..types.setting import Setting
+from .metrics import REGISTRY
+from .runtime import resolve_runtime
+from .server import TypephoonServer
+from .server_setup import create_server
+from .util import init_logger, load_setting
+
+logger = getLogger(__name__)
+
+# (seconds) workers that exit sooner than this after starting are restarted with a delay
+RESTART_DELAY = 1
+# (seconds) extra time on top of 'graceful_timeout' for workers to run cleanups
+CLEANUP_TIMEOUT = 10
+
+
+def worker_name(base: str, index: int) -> str:
+    return f"{base}-w{index}"
+
+
+def bind_socket(port: int) -> socket:
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind(("0.0.0.0", port))
+    return sock
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    Marks the app as draining as soon as a shutdown signal arrives,
+    so readiness fails while connections are being closed.
+    """
+
+    def __init__(self, config: uvicorn.Config, app: TypephoonServer) -> None:
+        super().__init__(config)
+        self._app = app
+
+    def handle_exit(self, sig: int, frame) -> None:
+        self._app.drain()
+        super().handle_exit(sig, frame)
+
+
+def serve(setting: Setting, sock: socket | None = None):
+    app = create_server(setting)
+    runtime = resolve_runtime(setting)
+    config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=setting.server.port,
+        log_config=setting.logger,
+        loop=runtime.loop.value,
+        http=runtime.http.value,
+        timeout_graceful_shutdown=setting.server.graceful_timeout,
+    )
+    server = DrainingServer(config, app)
+    server.run(sockets=[sock] if sock else None)
+
+
+def run_worker(setting_path: str):
+    """
+    Worker process entry.
+    Setting is loaded again in the worker so queue names pick up the worker's 'SERVER_NAME'.
+    """
+    setting = load_setting(setting_path)
+    init_logger(setting)
+    logger.info("worker started, server_name: %s", setting.server_name)
+    # every worker answers scrapes with its own metrics
+    REGISTRY.set_const_labels(worker=setting.server_name or "")
+    serve(setting, bind_socket(setting.server.port))
+
+
+class Supervisor:
+    """
+    Starts 'setting.server.workers' workers and restarts the ones that crash.
+    SIGTERM / SIGINT are forwarded to workers as SIGTERM, workers still running
+    after 'graceful_timeout' + 'CLEANUP_TIMEOUT' are killed. SIGUSR2 (profiler
+    toggle) is forwarded to every worker.
+    """
+
+    def __init__(
+        self,
+        setting: Setting,
+        setting_path: str,
+        target: Callable[[str], None] = run_worker,
+    ) -> None:
+        self._setting = setting
+        self._setting_path = setting_path
+        self._target = target
+        self._base_name = setting.server_name or gethostname()
+
+        self._ctx = get_context("spawn")
+        self._workers: dict[int, BaseProcess] = {}
+        self._started_at: dict[int, float] = {}
+        self._restart_at: dict[int, float] = {}
+        self._should_exit = Event()
+
+    @property
+    def workers(self) -> dict[int, BaseProcess]:
+        return self._workers
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_exit)
+        signal.signal(signal.SIGUSR2, self._forward)
+
+        logger.info(
+            "starting %s workers, base name: %s",
+            self._setting.server.workers,
+            self._base_name,
+        )
+        self.start()
+        try:
+            while not self._should_exit.wait(0.5):
+                self.check_workers()
+        finally:
+            self.stop()
+
+    def start(self):
+        for index in range(self._setting.server.workers):
+            self._spawn(index)
+
+    def check_workers(self):
+        """
+        Restart workers that exited
+        """
+        now = monotonic()
+        for index, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+
+            if index not in self._restart_at:
+                logger.warning(
+                    "worker %s exited, exitcode: %s", process.name, process.exitcode
+                )
+                crashed_early = now - self._started_at[index] < RESTART_DELAY
+                self._restart_at[index] = now + (RESTART_DELAY if crashed_early else 0)
+
+            if now >= self._restart_at[index]:
+                self._restart_at.pop(index)
+                self._spawn(index)
+
+    def stop(self):
+        logger.info("stopping workers")
+        for process in self._workers.values():
+            if process.is_alive() and process.pid:
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = monotonic() + self._setting.server.graceful_timeout + CLEANUP_TIMEOUT
+        for process in self._workers.values():
+            process.join(max(deadline - monotonic(), 0))
+            if process.is_alive():
+                logger.warning("worker %s did not stop in time, killing", process.name)
+                process.kill()
+                process.join()
+
+        self._workers.clear()
+
+    def _handle_exit(self, sig: int, _):
+        logger.info("received signal %s", signal.Signals(sig).name)
+        self._should_exit.set()
+
+    def _forward(self, sig: int, _):
+        logger.info("forwarding signal %s to workers", signal.Signals(sig).name)
+        for process in self._workers.values():
+            if process.is_alive() and process.pid:
+                os.kill(process.pid, sig)
+
+    def _spawn(self, index: int):
+        name = worker_name(self._base_name, index)
+
+        # 'SERVER_NAME' is read on import, the spawned worker inherits the environment
+        original = os.environ.get("SERVER_NAME")
+        os.environ["SERVER_NAME"] = name
+        try:
+            process = self._ctx.Process(
+                target=self._target, args=(self._setting_path,), name=name
+            )
+            process.start()
+        finally:
+            if original is None:
+                os.environ.pop("SERVER_NAME")
+            else:
+                os.environ["SERVER_NAME"] = original
+
+        logger.info("worker %s started, pid: %s", name, process.pid)
+        self._workers[index] = process
+        self._started_at[index] = monotonic()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from dataclasses import dataclass
 from functools import wraps
@@ -9,18 +10,20 @@ from uuid import uuid4
 
 from alembic import command
 from alembic.config import Config
-from fastapi.responses import JSONResponse
 from jwt.exceptions import ExpiredSignatureError, PyJWTError
 from pydantic_core import Url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from typephoon_api.types.errors import TokenNotProvided
 
+from ..repositories.user_stats import UserStatsRepo
 from ..types.common import LobbyUserInfo
-from ..types.enums import ErrorCode
+from ..types.enums import BackendType, ErrorCode
 from ..types.log import TRACE
 from ..types.responses.base import ErrorContext, ErrorResponse
 from ..types.setting import Setting
 from .oauth_providers.base import OAuthProviders
+from .response import PydanticResponse
 
 logger = getLogger(__name__)
 
@@ -41,6 +44,10 @@ def sanitized_dsn(dsn: str) -> Url:
 
 
 def db_migration(setting: Setting):
+    if setting.db.backend == BackendType.MEMORY:
+        logger.info("memory db backend, no migration needed")
+        return
+
     logger.info("running migration on %s", sanitized_dsn(setting.db.dsn))
     config = Config()
     config.set_main_option("script_location", "migration")
@@ -49,6 +56,29 @@ def db_migration(setting: Setting):
     logger.info("finish migration")
 
 
+async def _backfill_user_stats(setting: Setting):
+    engine = create_async_engine(url=setting.db.async_dsn, echo=setting.db.echo)
+    try:
+        async with async_sessionmaker(engine)() as session:
+            await UserStatsRepo(session).backfill()
+            await session.commit()
+    finally:
+        await engine.dispose()
+
+
+def backfill_user_stats(setting: Setting):
+    """
+    Rebuild 'user_stats' from existing 'game_results'
+    """
+    if setting.db.backend == BackendType.MEMORY:
+        logger.info("memory db backend, nothing to backfill")
+        return
+
+    logger.info("running user stats backfill on %s", sanitized_dsn(setting.db.dsn))
+    asyncio.run(_backfill_user_stats(setting))
+    logger.info("finish user stats backfill")
+
+
 def init_logger(setting: Setting):
     dictConfig(setting.logger)
     logger.info("logger initialized")
@@ -69,26 +99,26 @@ def catch_error_async(func: Callable):
         except TokenNotProvided as ex:
             logger.warning("token not provided: %s", str(ex))
             error = ErrorContext(code=ErrorCode.TOKEN_NOT_PROVIDED, message=str(ex))
-            msg = ErrorResponse(error=error).model_dump()
-            return JSONResponse(msg, status_code=401)
+            msg = ErrorResponse(error=error)
+            return PydanticResponse(msg, status_code=401)
 
         except ExpiredSignatureError as ex:
             logger.warning("token expired: %s", str(ex))
             error = ErrorContext(code=ErrorCode.TOKEN_EXPIRED, message=str(ex))
-            msg = ErrorResponse(error=error).model_dump()
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=error)
+            return PydanticResponse(msg, status_code=400)
 
         except PyJWTError as ex:
             logger.warning("token error: %s", str(ex))
             error = ErrorContext(code=ErrorCode.INVALID_TOKEN, message=str(ex))
-            msg = ErrorResponse(error=error).model_dump()
-            return JSONResponse(msg, status_code=400)
+            msg = ErrorResponse(error=error)
+            return PydanticResponse(msg, status_code=400)
 
         except Exception:
             logger.exception("something went wrong")
             # error = ErrorContext(message=str(ex))
-            msg = ErrorResponse().model_dump()
-            return JSONResponse(msg, status_code=500)
+            msg = ErrorResponse()
+            return PydanticResponse(msg, status_code=500)
 
     return wrapped
 
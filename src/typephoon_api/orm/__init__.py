@@ -1,4 +1,6 @@
 from .base import Base
 from .game import Game
+from .game_replay import GameReplay
 from .game_result import GameResult
 from .user import User
+from .user_stats import UserStats
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import IntEnum
 
-from sqlalchemy import DateTime, Text, func, text
+from sqlalchemy import DateTime, Index, Text, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -15,9 +15,14 @@ class GameType(IntEnum):
 
 
 class GameStatus(IntEnum):
+    """
+    - POOL: created ahead of time, waiting for its first player to claim it
+    """
+
     LOBBY = 0
     IN_GAME = 1
     FINISHED = 2
+    POOL = 3
 
 
 class Game(Base):
@@ -39,6 +44,8 @@ class Game(Base):
 
     player_count: Mapped[int] = mapped_column(server_default=text("0"))
     finish_count: Mapped[int] = mapped_column(server_default=text("0"))
+    # recent WPM bucket of the player who opened the lobby, see 'MatchmakingSetting'
+    skill_bucket: Mapped[int | None] = mapped_column()
 
     game_results = relationship(
         "GameResult",
@@ -46,3 +53,26 @@ class Game(Base):
         passive_deletes=True,
         uselist=True,
     )
+
+
+# match making, only open lobbies are indexed
+Index(
+    "ix_games_lobby_player_count",
+    Game.player_count,
+    postgresql_where=Game.status == GameStatus.LOBBY,
+)
+
+# skill bucketed match making, closest bucket then oldest lobby
+Index(
+    "ix_games_lobby_skill_bucket",
+    Game.skill_bucket,
+    Game.created_at,
+    postgresql_where=Game.status == GameStatus.LOBBY,
+)
+
+# lobby pool, claimed one at a time
+Index(
+    "ix_games_pool",
+    Game.id,
+    postgresql_where=Game.status == GameStatus.POOL,
+)
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+from .custom import BigSerial
+
+
+class GameReplay(Base):
+    """
+    Keystroke log of a game seen by one node, see 'lib.replay'
+    """
+
+    __tablename__ = "game_replays"
+
+    id: Mapped[int] = mapped_column(
+        BigSerial(),
+        primary_key=True,
+    )
+    game_id: Mapped[int] = mapped_column(
+        BigInteger(),
+        ForeignKey("games.id", ondelete="CASCADE"),
+    )
+    data: Mapped[bytes] = mapped_column(LargeBinary())
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.current_timestamp(),
+    )
+
+
+# replay endpoint, logs of a game in write order
+Index("ix_game_replays_game_id", GameReplay.game_id, GameReplay.id)
@@ -1,6 +1,13 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, PrimaryKeyConstraint, Text
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    PrimaryKeyConstraint,
+    Text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -38,3 +45,21 @@ class GameResult(Base):
         foreign_keys=user_id,
         back_populates="game_results",
     )
+
+
+# profile history / averages, ordered by ('finished_at', 'game_id')
+Index(
+    "ix_game_results_user_id_finished_at_game_id",
+    GameResult.user_id,
+    GameResult.finished_at.desc(),
+    GameResult.game_id.desc(),
+    postgresql_include=["rank", "wpm_raw", "wpm_correct", "accuracy"],
+)
+
+# best game
+Index(
+    "ix_game_results_user_id_wpm_correct",
+    GameResult.user_id,
+    GameResult.wpm_correct.desc(),
+    postgresql_include=["accuracy"],
+)
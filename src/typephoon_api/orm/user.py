@@ -33,3 +33,9 @@ class User(Base):
         passive_deletes=True,
         uselist=True,
     )
+    stats = relationship(
+        "UserStats",
+        back_populates="user",
+        passive_deletes=True,
+        uselist=False,
+    )
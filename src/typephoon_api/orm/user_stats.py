@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from sqlalchemy import ARRAY, DateTime, Float, ForeignKey, Text, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from .base import Base
+
+
+class UserStats(Base):
+    """
+    Incrementally maintained statistics (per user)
+
+    Attributes:
+        total_games: Number of recorded game results
+        wpm_sum, wpm_raw_sum, acc_sum: Running sums over all recorded games
+        wpm_best: Highest 'wpm_correct' over all recorded games
+        acc_best: Accuracy of the game with the highest 'wpm_correct', the
+            earliest finished one on ties
+        recent_*: Ring of the last N results, newest first, 'recent_finished_at'
+            holds when each of them finished
+    """
+
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[str] = mapped_column(
+        Text(),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_games: Mapped[int] = mapped_column(server_default=text("0"))
+
+    wpm_sum: Mapped[float] = mapped_column(server_default=text("0"))
+    wpm_raw_sum: Mapped[float] = mapped_column(server_default=text("0"))
+    acc_sum: Mapped[float] = mapped_column(server_default=text("0"))
+
+    wpm_best: Mapped[float] = mapped_column(server_default=text("0"))
+    acc_best: Mapped[float] = mapped_column(server_default=text("0"))
+
+    recent_finished_at: Mapped[list[datetime]] = mapped_column(
+        ARRAY(DateTime(timezone=True)), server_default=text("'{}'")
+    )
+    recent_wpm: Mapped[list[float]] = mapped_column(
+        ARRAY(Float()), server_default=text("'{}'")
+    )
+    recent_wpm_raw: Mapped[list[float]] = mapped_column(
+        ARRAY(Float()), server_default=text("'{}'")
+    )
+    recent_acc: Mapped[list[float]] = mapped_column(
+        ARRAY(Float()), server_default=text("'{}'")
+    )
+
+    user = relationship(
+        "User",
+        foreign_keys=user_id,
+        back_populates="stats",
+    )
@@ -0,0 +1,37 @@
+from typing import Any
+
+
+class InMemorySession:
+    """
+    Base of the in-memory database session, see 'repositories.memory'
+    """
+
+
+# database repository -> its in-memory counterpart
+MEMORY_REPOS: dict[type, type] = {}
+
+
+def memory_repo_of(repo: type):
+    """
+    Class decorator, registers the in-memory counterpart of a database repository
+    """
+
+    def register[T: type](cls: T) -> T:
+        MEMORY_REPOS[repo] = cls
+        return cls
+
+    return register
+
+
+class SessionRepo:
+    """
+    Base of the repositories working on a database session.
+    When the session is an 'InMemorySession', the registered in-memory
+    counterpart is built instead, so callers don't need to know the backend.
+    """
+
+    def __new__(cls, *args: Any, **kwargs: Any):
+        session = kwargs["session"] if "session" in kwargs else args[0]
+        if isinstance(session, InMemorySession):
+            cls = MEMORY_REPOS.get(cls, cls)
+        return super().__new__(cls)
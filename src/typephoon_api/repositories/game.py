@@ -1,14 +1,17 @@
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 
-from sqlalchemy import and_, update
+from sqlalchemy import Select, and_, func, literal, union_all, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import select
 
+from ..lib.metrics import timed_repository
 from ..orm.game import Game, GameStatus, GameType
+from .base import SessionRepo
 
 
-class GameRepo:
+@timed_repository
+class GameRepo(SessionRepo):
     def __init__(self, session: AsyncSession, player_limit: int = 5) -> None:
         self._session = session
         self._player_limit = player_limit
@@ -37,10 +40,28 @@ class GameRepo:
 
         await self._session.execute(query)
 
-    async def create(self, game_type: GameType, status: GameStatus) -> Game:
+    async def finish_unfinished(self) -> list[int]:
+        """
+        Set every lobby and started game to FINISHED, returns their ids.
+        Pooled games are kept, they have no timers.
+        """
+        query = (
+            update(Game)
+            .values({"status": GameStatus.FINISHED, "end_at": datetime.now(UTC)})
+            .where(Game.status.in_([GameStatus.LOBBY, GameStatus.IN_GAME]))
+            .returning(Game.id)
+        )
+
+        return list(await self._session.scalars(query))
+
+    async def create(
+        self, game_type: GameType, status: GameStatus, skill_bucket: int | None = None
+    ) -> Game:
         query = (
             insert(Game)
-            .values({"game_type": game_type, "status": status})
+            .values(
+                {"game_type": game_type, "status": status, "skill_bucket": skill_bucket}
+            )
             .returning(Game)
         )
 
@@ -49,17 +70,104 @@ class GameRepo:
 
         return ret
 
-    async def get_one_available(self, lock: bool = False) -> Game | None:
+    async def create_pool(self, count: int):
+        """
+        Create games waiting to be claimed as lobbies
+        """
+        query = insert(Game).values(
+            [{"game_type": GameType.MULTI, "status": GameStatus.POOL}] * count
+        )
+
+        await self._session.execute(query)
+
+    async def count_pool(self) -> int:
         query = (
-            select(Game)
-            .where(
-                and_(
-                    Game.status == GameStatus.LOBBY,
-                    Game.player_count < self._player_limit,
-                )
-            )
+            select(func.count()).select_from(Game).where(Game.status == GameStatus.POOL)
+        )
+
+        return await self._session.scalar(query) or 0
+
+    async def claim_pool(self, skill_bucket: int | None = None) -> Game | None:
+        """
+        Turn one pooled game into a lobby, concurrent claims get different games
+        """
+        pooled = (
+            select(Game.id)
+            .where(Game.status == GameStatus.POOL)
             .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
         )
+        query = (
+            update(Game)
+            .where(Game.id == pooled)
+            .values(
+                {
+                    "status": GameStatus.LOBBY,
+                    "created_at": func.now(),
+                    "skill_bucket": skill_bucket,
+                }
+            )
+            .returning(Game)
+        )
+
+        return await self._session.scalar(query)
+
+    async def get_one_available(
+        self,
+        lock: bool = False,
+        skill_bucket: int | None = None,
+        widen_interval: float = 0,
+        max_distance: int = 0,
+    ) -> Game | None:
+        """
+        - skill_bucket: only lobbies of nearby buckets, a lobby accepts buckets
+          one further away every 'widen_interval' seconds it waited, up to
+          'max_distance'. The closest bucket wins, then the oldest lobby.
+
+        With a skill bucket, the oldest lobby of each bucket in range is found
+        by its own lookup on '(skill_bucket, created_at)', then the closest one
+        is picked among them
+        """
+        is_open = and_(
+            Game.status == GameStatus.LOBBY,
+            Game.player_count < self._player_limit,
+        )
+        query = select(Game).where(is_open)
+
+        if skill_bucket is not None:
+            oldest: list[Select] = []
+            for distance in range(max_distance + 1):
+                created_before = func.now() - timedelta(
+                    seconds=distance * widen_interval
+                )
+                for bucket in sorted(
+                    {skill_bucket - distance, skill_bucket + distance}
+                ):
+                    oldest.append(
+                        select(
+                            Game.id,
+                            literal(distance).label("distance"),
+                            Game.created_at,
+                        )
+                        .where(
+                            is_open,
+                            Game.skill_bucket == bucket,
+                            Game.created_at <= created_before,
+                        )
+                        .order_by(Game.created_at)
+                        .limit(1)
+                    )
+            candidates = union_all(*oldest).subquery()
+            closest = (
+                select(candidates.c.id)
+                .order_by(candidates.c.distance, candidates.c.created_at)
+                .limit(1)
+                .scalar_subquery()
+            )
+            query = query.where(Game.id == closest)
+
+        query = query.limit(1)
 
         if lock:
             query = query.with_for_update()
@@ -85,15 +193,17 @@ class GameRepo:
 
         return await self._session.scalar(query)
 
-    async def increase_finish_count(self, id: int) -> Game | None:
+    async def update_finish_count(self, id: int, finish_count: int):
+        """
+        Persist a finish count assigned elsewhere, never decreases the current value
+        """
         query = (
             update(Game)
             .where(Game.id == id)
-            .values({"finish_count": Game.finish_count + 1})
-            .returning(Game)
+            .values({"finish_count": func.greatest(Game.finish_count, finish_count)})
         )
 
-        return await self._session.scalar(query)
+        await self._session.execute(query)
 
     async def increase_player_count(self, id: int) -> Game | None:
         query = (
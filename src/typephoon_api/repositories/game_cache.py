@@ -1,13 +1,13 @@
 import json
-from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from enum import StrEnum
 from logging import getLogger
 
-from pydantic import Field, RootModel
+from pydantic import BaseModel, Field, RootModel
 from redis.asyncio import Redis
 
-from ..types.common import GameUserInfo
+from ..lib.metrics import timed_repository
+from ..types.common import UNDEFINED_RANK, GameUserInfo, LobbyUserInfo
 from ..types.setting import Setting
 from .lobby_cache import LobbyCacheRepo
 
@@ -15,72 +15,341 @@ logger = getLogger(__name__)
 
 
 class GameCacheType(StrEnum):
+    """
+    - COUNTDOWN: game start time, replaced by 'LOBBY_END'. Only read for the
+      games populated before the rename
+    """
+
     PLAYERS = "players"
+    LOBBY_END = "lobby-end"
     COUNTDOWN = "countdown"
     WORDS = "words"
+    FINISH_COUNT = "finish-count"
+    PLAYERS_VERSION = "players-version"
+    PLAYER_VERSIONS = "player-versions"
+    POSITIONS = "positions"
+
+
+# KEYS: players, players version, player versions
+# ARGV: user id, encoded player, expire time
+UPDATE_PLAYER_SCRIPT = """
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+local version = redis.call("INCR", KEYS[2])
+redis.call("HSET", KEYS[3], ARGV[1], version)
+for i = 1, 3 do
+    redis.call("EXPIRE", KEYS[i], ARGV[3])
+end
+return version
+"""
+
+# KEYS: lobby players, lobby countdown, players, lobby end
+# ARGV: expire time, "1" to delete the lobby cache
+# players are encoded to the bytes 'encode_player' gives a new one, the '\/'
+# cjson writes for '/' is undone. The lobby countdown is copied as is, the start
+# countdown is added on read
+POPULATE_SCRIPT = """
+local fields = {}
+local raw = redis.call("GET", KEYS[1])
+if raw then
+    for user_id, info in pairs(cjson.decode(raw)) do
+        local name = string.gsub(cjson.encode(info.name), [[\\/]], "/")
+        table.insert(fields, user_id)
+        table.insert(fields, '{"n":' .. name .. '}')
+    end
+end
+if #fields > 0 then
+    redis.call("DEL", KEYS[3])
+    redis.call("HSET", KEYS[3], unpack(fields))
+    redis.call("EXPIRE", KEYS[3], ARGV[1])
+end
+
+local lobby_end = redis.call("GET", KEYS[2])
+if lobby_end then
+    redis.call("SET", KEYS[4], lobby_end, "EX", ARGV[1])
+end
+
+if ARGV[2] == "1" then
+    redis.call("DEL", KEYS[1], KEYS[2])
+end
+return {#fields / 2, lobby_end and 1 or 0}
+"""
+
+
+# (word_index, char_index)
+Position = tuple[int, int]
+
+
+class PlayersWithVersion(BaseModel):
+    """
+    - version: pass back as 'since' to only get players updated after it
+    """
+
+    version: int = 0
+    players: dict[str, GameUserInfo] = Field(default_factory=dict)
+
 
+def encode_player(data: GameUserInfo) -> str:
+    """
+    compact encoding for a single player, unset fields are omitted.
+    Kept in sync with 'POPULATE_SCRIPT', which encodes new players in Lua
+    """
+    encoded: dict = {"n": data.name}
+    if data.finished is not None:
+        encoded["f"] = data.finished
+    if data.rank != UNDEFINED_RANK:
+        encoded["r"] = data.rank
+    if data.wpm is not None:
+        encoded["w"] = data.wpm
+    if data.wpm_raw is not None:
+        encoded["wr"] = data.wpm_raw
+    if data.acc is not None:
+        encoded["a"] = data.acc
+    return json.dumps(encoded, separators=(",", ":"), ensure_ascii=False)
 
+
+def decode_player(user_id: str, raw: bytes | str) -> GameUserInfo:
+    """
+    entries are written by this repo only, so validation is skipped
+    """
+    encoded: dict = json.loads(raw)
+    return GameUserInfo.model_construct(
+        id=user_id,
+        name=encoded["n"],
+        finished=encoded.get("f"),
+        rank=encoded.get("r", UNDEFINED_RANK),
+        wpm=encoded.get("w"),
+        wpm_raw=encoded.get("wr"),
+        acc=encoded.get("a"),
+    )
+
+
+@timed_repository
 class GameCacheRepo:
     def __init__(self, redis_conn: Redis, setting: Setting) -> None:
         self._redis_conn = redis_conn
         self._setting = setting
+        self._update_player_script = redis_conn.register_script(UPDATE_PLAYER_SCRIPT)
+        self._populate_script = redis_conn.register_script(POPULATE_SCRIPT)
 
     def _gen_cache_key(self, game_id: int, cache_type: GameCacheType) -> str:
         return f"game-cache-{cache_type}-{game_id}"
 
-    def _gen_lock_key(self, game_id: str) -> str:
-        return f"game-cache-{game_id}-lock"
-
-    @asynccontextmanager
-    async def lock(self, game_id: int):
-        lock_key = self._gen_lock_key(str(game_id))
-        lock = self._redis_conn.lock(name=lock_key)
-        yield lock
-
     async def clear_cache(self, game_id: int):
         player_key = self._gen_cache_key(
             game_id=game_id, cache_type=GameCacheType.PLAYERS
         )
+        lobby_end_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.LOBBY_END
+        )
         countdown_key = self._gen_cache_key(
             game_id=game_id, cache_type=GameCacheType.COUNTDOWN
         )
         words_key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.WORDS)
+        finish_count_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.FINISH_COUNT
+        )
+        players_version_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.PLAYERS_VERSION
+        )
+        player_versions_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.PLAYER_VERSIONS
+        )
 
-        await self._redis_conn.delete(player_key, countdown_key, words_key)
+        positions_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.POSITIONS
+        )
+
+        await self._redis_conn.delete(
+            player_key,
+            lobby_end_key,
+            countdown_key,
+            words_key,
+            finish_count_key,
+            players_version_key,
+            player_versions_key,
+            positions_key,
+        )
 
-    async def update_player_cache(self, data: GameUserInfo, game_id: int):
+    async def update_player_cache(self, data: GameUserInfo, game_id: int) -> int:
         """
         update cache for a single player
+        Returns:
+            - players version after this update
         """
-        key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS)
+        ret = await self._update_player_script(
+            keys=[
+                self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS),
+                self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.PLAYERS_VERSION
+                ),
+                self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.PLAYER_VERSIONS
+                ),
+            ],
+            args=[
+                data.id,
+                encode_player(data),
+                self._setting.redis.result_cache_expire_time,
+            ],
+        )
+        return int(ret)
 
-        raw_data: bytes | None = await self._redis_conn.get(key)
-        if raw_data is not None:
-            current_data: dict[str, dict] = json.loads(raw_data)
-        else:
-            current_data: dict[str, dict] = {}
+    async def increase_finish_count(self, game_id: int) -> int:
+        """
+        Atomically assign the next finishing rank of a game
+        """
+        key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.FINISH_COUNT
+        )
+        async with self._redis_conn.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, self._setting.redis.result_cache_expire_time)
+            rank, _ = await pipe.execute()
 
-        current_data[data.id] = data.model_dump()
+        return rank
 
-        await self._redis_conn.set(
-            name=key,
-            value=json.dumps(current_data),
-            ex=self._setting.redis.result_cache_expire_time,
+    async def get_finish_count(self, game_id: int) -> int | None:
+        key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.FINISH_COUNT
         )
+        ret: bytes | None = await self._redis_conn.get(key)
+        if ret is None:
+            return
+
+        return int(ret)
 
     async def get_players(self, game_id: int) -> dict[str, GameUserInfo] | None:
         key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS)
-        ret: bytes | None = await self._redis_conn.get(key)
-        if ret is None:
+        ret: dict[bytes, bytes] = await self._redis_conn.hgetall(key)
+        if not ret:
+            logger.warning("cache not found, game_id: %s", game_id)
+            return
+
+        return {
+            user_id.decode(): decode_player(user_id.decode(), raw)
+            for user_id, raw in ret.items()
+        }
+
+    async def get_player_count(self, game_id: int) -> int:
+        key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS)
+        return await self._redis_conn.hlen(key)
+
+    async def has_player(self, game_id: int, user_id: str) -> bool | None:
+        """
+        Returns:
+            - None if the game is not found
+        """
+        key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS)
+        async with self._redis_conn.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.hexists(key, user_id)
+            exists, has_player = await pipe.execute()
+
+        if not exists:
             logger.warning("cache not found, game_id: %s", game_id)
             return
 
-        data: dict = json.loads(ret)
-        result: dict[str, GameUserInfo] = {}
-        for user_id, user_info in data.items():
-            result[user_id] = GameUserInfo.model_validate(user_info)
+        return bool(has_player)
 
-        return result
+    async def get_players_with_version(
+        self, game_id: int, since: int | None = None
+    ) -> PlayersWithVersion | None:
+        """
+        - since: only return players updated after this version, None equals 'ALL'
+        """
+        player_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.PLAYERS
+        )
+        players_version_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.PLAYERS_VERSION
+        )
+        player_versions_key = self._gen_cache_key(
+            game_id=game_id, cache_type=GameCacheType.PLAYER_VERSIONS
+        )
+
+        async with self._redis_conn.pipeline(transaction=True) as pipe:
+            if since is None:
+                pipe.hgetall(player_key)
+            else:
+                pipe.exists(player_key)
+                pipe.hgetall(player_versions_key)
+            pipe.get(players_version_key)
+            ret = await pipe.execute()
+
+        version = int(ret[-1]) if ret[-1] is not None else 0
+
+        if since is None:
+            raw_players: dict[bytes, bytes] = ret[0]
+            if not raw_players:
+                logger.warning("cache not found, game_id: %s", game_id)
+                return
+
+            return PlayersWithVersion(
+                version=version,
+                players={
+                    user_id.decode(): decode_player(user_id.decode(), raw)
+                    for user_id, raw in raw_players.items()
+                },
+            )
+
+        if not ret[0]:
+            logger.warning("cache not found, game_id: %s", game_id)
+            return
+
+        player_versions: dict[bytes, bytes] = ret[1]
+        updated = [
+            user_id.decode()
+            for user_id, player_version in player_versions.items()
+            if int(player_version) > since
+        ]
+        if not updated:
+            return PlayersWithVersion(version=version)
+
+        raw_updated: list[bytes | None] = await self._redis_conn.hmget(
+            player_key, updated
+        )
+        return PlayersWithVersion(
+            version=version,
+            players={
+                user_id: decode_player(user_id, raw)
+                for user_id, raw in zip(updated, raw_updated)
+                if raw is not None
+            },
+        )
+
+    async def update_positions(self, positions: dict[int, dict[str, Position]]):
+        """
+        Latest keystroke positions of several games in one round trip, stored as
+        "word_index:char_index" per player
+
+        - positions: {game_id: {user_id: (word_index, char_index)}}
+        """
+        if not positions:
+            return
+
+        async with self._redis_conn.pipeline(transaction=False) as pipe:
+            for game_id, players in positions.items():
+                key = self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.POSITIONS
+                )
+                pipe.hset(
+                    key,
+                    mapping={
+                        user_id: f"{word_index}:{char_index}"
+                        for user_id, (word_index, char_index) in players.items()
+                    },
+                )
+                pipe.expire(key, self._setting.redis.in_game_cache_expire_time)
+            await pipe.execute()
+
+    async def get_positions(self, game_id: int) -> dict[str, Position]:
+        key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.POSITIONS)
+        ret: dict[bytes, bytes] = await self._redis_conn.hgetall(key)
+        positions: dict[str, Position] = {}
+        for user_id, raw in ret.items():
+            word_index, char_index = raw.split(b":")
+            positions[user_id.decode()] = (int(word_index), int(char_index))
+        return positions
 
     async def get_words(self, game_id: int) -> str | None:
         key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.WORDS)
@@ -100,61 +369,53 @@ class GameCacheRepo:
         )
 
     async def get_start_time(self, game_id: int) -> datetime | None:
-        key = self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.COUNTDOWN)
-        ret: bytes | None = await self._redis_conn.get(key)
-        if ret is None:
-            logger.warning("cache not found, game_id: %s", game_id)
-            return
+        """
+        Games populated before the 'LOBBY_END' key stored the start time itself
+        """
+        lobby_end, start_time = await self._redis_conn.mget(
+            [
+                self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.LOBBY_END
+                ),
+                self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.COUNTDOWN
+                ),
+            ]
+        )
+        if lobby_end is not None:
+            return datetime.fromisoformat(lobby_end.decode()) + timedelta(
+                seconds=self._setting.game.start_countdown
+            )
+        if start_time is not None:
+            return datetime.fromisoformat(start_time.decode())
 
-        data = ret.decode()
-        return datetime.fromisoformat(data)
+        logger.warning("cache not found, game_id: %s", game_id)
 
     async def populate_with_lobby_cache(
         self, game_id: int, lobby_cache_repo: LobbyCacheRepo, auto_clean: bool = False
     ):
         """
+        Done by one script, atomically and in one round trip
+
         - auto_clean: clean up lobby cache after populating game cache
         """
-        # player cache
-        lobby_players = await lobby_cache_repo.get_players(game_id)
-        if lobby_players is not None:
-            game_players: dict[str, dict] = {}
-
-            for user_id, user_info in lobby_players.items():
-                game_players[user_id] = GameUserInfo.from_lobby_cache(
-                    user_info
-                ).model_dump()
-
-            player_key = self._gen_cache_key(
-                game_id=game_id, cache_type=GameCacheType.PLAYERS
-            )
-            await self._redis_conn.set(
-                name=player_key,
-                value=json.dumps(game_players),
-                ex=self._setting.redis.in_game_cache_expire_time,
-            )
+        lobby_keys = lobby_cache_repo.cache_keys(game_id)
+        player_count, has_lobby_end = await self._populate_script(
+            keys=[
+                lobby_keys.players,
+                lobby_keys.countdown,
+                self._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS),
+                self._gen_cache_key(
+                    game_id=game_id, cache_type=GameCacheType.LOBBY_END
+                ),
+            ],
+            args=[
+                self._setting.redis.in_game_cache_expire_time,
+                1 if auto_clean else 0,
+            ],
+        )
 
-        else:
+        if not player_count:
             logger.warning("lobby player cache not found")
-
-        # countdown cache
-        lobby_start_time = await lobby_cache_repo.get_start_time(game_id)
-        if lobby_start_time is not None:
-            game_start_time = lobby_start_time + timedelta(
-                seconds=self._setting.game.start_countdown
-            )
-
-            start_time_key = self._gen_cache_key(
-                game_id=game_id, cache_type=GameCacheType.COUNTDOWN
-            )
-
-            await self._redis_conn.set(
-                name=start_time_key,
-                value=game_start_time.isoformat(),
-                ex=self._setting.redis.in_game_cache_expire_time,
-            )
-        else:
+        if not has_lobby_end:
             logger.warning("lobby start time cache not found")
-
-        if auto_clean:
-            await lobby_cache_repo.clear_cache(game_id)
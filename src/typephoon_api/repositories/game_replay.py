@@ -0,0 +1,43 @@
+from collections.abc import AsyncIterator
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..lib.metrics import timed_repository
+from ..orm.game_replay import GameReplay
+from .base import SessionRepo
+
+
+@timed_repository
+class GameReplayRepo(SessionRepo):
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    async def add_many(self, replays: list[tuple[int, bytes]]):
+        """
+        - replays: [(game_id, encoded log), ...]
+        """
+        if not replays:
+            return
+
+        await self._session.execute(
+            insert(GameReplay),
+            [{"game_id": game_id, "data": data} for game_id, data in replays],
+        )
+
+    async def count(self, game_id: int) -> int:
+        query = select(func.count()).where(GameReplay.game_id == game_id)
+        return await self._session.scalar(query) or 0
+
+    async def stream(self, game_id: int) -> AsyncIterator[bytes]:
+        """
+        Logs of a game in write order, fetched one by one
+        """
+        query = (
+            select(GameReplay.data)
+            .where(GameReplay.game_id == game_id)
+            .order_by(GameReplay.id)
+            .execution_options(yield_per=1)
+        )
+        async for data in await self._session.stream_scalars(query):
+            yield data
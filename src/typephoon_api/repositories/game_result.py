@@ -1,12 +1,17 @@
 from datetime import datetime
 
 from pydantic import BaseModel
-from sqlalchemy import func, insert, select
+from sqlalchemy import ColumnElement, and_, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
+from ..lib.metrics import timed_repository
 from ..orm.game import GameType
 from ..orm.game_result import GameResult
+from ..types.common import PendingGameResult
+from .base import SessionRepo
+from .user_stats import UserStatsRepo
 
 
 class GameResultWithGameType(BaseModel):
@@ -25,10 +30,50 @@ class AvgLastNGamesRet(BaseModel):
     acc: float
 
 
-class GameResultRepo:
+def _older_than(
+    finished_at: datetime | ColumnElement[datetime], game_id: int | ColumnElement[int]
+) -> ColumnElement[bool]:
+    """
+    Results after ('finished_at', 'game_id') in descent order. 'finished_at <='
+    is kept as a separate condition so it can be used as an index condition,
+    ties are resolved by 'game_id'
+    """
+    return and_(
+        GameResult.finished_at <= finished_at,
+        or_(GameResult.finished_at < finished_at, GameResult.game_id < game_id),
+    )
+
+
+@timed_repository
+class GameResultRepo(SessionRepo):
     def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
+    async def create_many(self, results: list[PendingGameResult]) -> list[GameResult]:
+        """
+        Insert multiple game results with a single statement and fold them into
+        user statistics. Results already recorded are skipped, so replaying a
+        batch is safe.
+        Returns:
+            - newly inserted results
+        """
+        if not results:
+            return []
+
+        query = (
+            insert(GameResult)
+            .values([item.model_dump() for item in results])
+            .on_conflict_do_nothing(
+                index_elements=[GameResult.game_id, GameResult.user_id]
+            )
+            .returning(GameResult)
+        )
+        inserted = list(await self._session.scalars(query))
+
+        await UserStatsRepo(self._session).add_results(inserted)
+
+        return inserted
+
     async def get_total_games(self, user_id: str) -> int:
         query = select(func.count(GameResult.game_id)).where(
             GameResult.user_id == user_id
@@ -44,20 +89,58 @@ class GameResultRepo:
         self,
         user_id: str,
         size: int = 50,
-        page: int = 1,
     ) -> list[GameResultWithGameType]:
         """
         Returns:
             - A list of game result ordered in descent on 'finish_ts'
         """
+        return await self.get_games_with_game_type_before(user_id=user_id, size=size)
+
+    async def get_games_with_game_type_before(
+        self,
+        user_id: str,
+        size: int = 50,
+        before: tuple[datetime, int] | None = None,
+        skip: int = 0,
+    ) -> list[GameResultWithGameType]:
+        """
+        Keyset pagination on ('finished_at', 'game_id')
+        Arguments:
+            - before: ('finished_at', 'game_id') of the last item of the previous page,
+                      None equals 'first page'
+            - skip: number of items to skip after 'before', for page numbers.
+                    The key of the last skipped item is looked up on the covering
+                    index only, the results are still fetched by keyset
+        Returns:
+            - A list of game result ordered in descent on ('finished_at', 'game_id')
+        """
         query = (
             select(GameResult)
             .options(joinedload(GameResult.game))
             .where(GameResult.user_id == user_id)
             .limit(size)
-            .offset((page - 1) * size)
-            .order_by(GameResult.finished_at.desc())
+            .order_by(GameResult.finished_at.desc(), GameResult.game_id.desc())
         )
+
+        if before is not None:
+            query = query.where(_older_than(*before))
+
+        if skip > 0:
+            boundary = (
+                select(GameResult.finished_at, GameResult.game_id)
+                .where(GameResult.user_id == user_id)
+                .order_by(GameResult.finished_at.desc(), GameResult.game_id.desc())
+                .offset(skip - 1)
+                .limit(1)
+            )
+            if before is not None:
+                boundary = boundary.where(_older_than(*before))
+            boundary = boundary.subquery("boundary")
+            query = query.join(
+                boundary,
+                _older_than(boundary.c.finished_at, boundary.c.game_id),
+            )
+
         ret = await self._session.scalars(query)
 
         result: list[GameResultWithGameType] = []
@@ -127,6 +210,10 @@ class GameResultRepo:
         accuracy: float,
         finished_at: datetime,
     ) -> GameResult:
+        """
+        Insert a game result, and fold it into the user's statistics
+        within the same transaction
+        """
         query = (
             insert(GameResult)
             .values(
@@ -145,4 +232,13 @@ class GameResultRepo:
 
         ret = await self._session.scalar(query)
         assert ret
+
+        await UserStatsRepo(self._session).add_result(
+            user_id=user_id,
+            wpm_raw=wpm_raw,
+            wpm_correct=wpm_correct,
+            accuracy=accuracy,
+            finished_at=finished_at,
+        )
+
         return ret
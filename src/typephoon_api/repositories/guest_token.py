@@ -3,9 +3,11 @@ from uuid import uuid4
 
 from redis.asyncio import Redis
 
+from ..lib.metrics import timed_repository
 from ..types.setting import Setting
 
 
+@timed_repository
 class GuestTokenRepo:
     def __init__(self, redis_conn: Redis, setting: Setting) -> None:
         self._redis_conn = redis_conn
@@ -3,9 +3,11 @@ from contextlib import asynccontextmanager
 from datetime import datetime
 from enum import StrEnum
 from logging import getLogger
+from typing import NamedTuple
 
 from redis.asyncio import Redis
 
+from ..lib.metrics import timed_repository
 from ..types.common import LobbyUserInfo
 from ..types.setting import Setting
 
@@ -17,6 +19,12 @@ class LobbyCacheType(StrEnum):
     COUNTDOWN = "countdown"
 
 
+class LobbyCacheKeys(NamedTuple):
+    players: str
+    countdown: str
+
+
+@timed_repository
 class LobbyCacheRepo:
     def __init__(self, redis_conn: Redis, setting: Setting) -> None:
         self._redis_conn = redis_conn
@@ -25,6 +33,9 @@ class LobbyCacheRepo:
     def _gen_cache_key(self, game_id: int, cache_type: LobbyCacheType) -> str:
         return f"lobby-cache-{cache_type}-{game_id}"
 
+    def _gen_redirect_key(self, game_id: int) -> str:
+        return f"lobby-cache-redirect-{game_id}"
+
     def _gen_lock_key(self, game_id: str) -> str:
         return f"lobby-cache-{game_id}-lock"
 
@@ -121,18 +132,49 @@ class LobbyCacheRepo:
 
         return datetime.fromisoformat(ret.decode())
 
+    def cache_keys(self, game_id: int) -> LobbyCacheKeys:
+        """
+        Every key of the game's lobby cache
+        """
+        return LobbyCacheKeys(
+            players=self._gen_cache_key(
+                game_id=game_id, cache_type=LobbyCacheType.PLAYERS
+            ),
+            countdown=self._gen_cache_key(
+                game_id=game_id, cache_type=LobbyCacheType.COUNTDOWN
+            ),
+        )
+
     async def clear_cache(self, game_id: int):
         """
         Clear all cache for the game
         """
-        player_cache_key = self._gen_cache_key(
-            game_id=game_id, cache_type=LobbyCacheType.PLAYERS
-        )
-        countdown_cache_key = self._gen_cache_key(
-            game_id=game_id, cache_type=LobbyCacheType.COUNTDOWN
+        await self._redis_conn.delete(
+            *self.cache_keys(game_id), self._gen_redirect_key(game_id)
         )
 
-        await self._redis_conn.delete(player_cache_key, countdown_cache_key)
+    async def add_redirects(self, game_id: int, user_ids: list[str]):
+        """
+        Mark the seats kept for players sent to the node owning the game
+        """
+        if not user_ids:
+            return
+
+        key = self._gen_redirect_key(game_id)
+        pipeline = self._redis_conn.pipeline()
+        pipeline.hset(key, mapping={user_id: 1 for user_id in user_ids})
+        pipeline.expire(key, time=self._setting.redis.expire_time)
+        await pipeline.execute()
+
+    async def claim_redirect(self, game_id: int, user_id: str) -> bool:
+        """
+        Remove a player's mark, either the owning node seeing them arrive or
+        the sending node giving up on them gets it, never both
+        Returns:
+            - True if the mark was still there
+        """
+        key = self._gen_redirect_key(game_id)
+        return await self._redis_conn.hdel(key, user_id) > 0
 
     async def remove_player(self, game_id: int, user_id: str) -> bool:
         key = self._gen_cache_key(game_id=game_id, cache_type=LobbyCacheType.PLAYERS)
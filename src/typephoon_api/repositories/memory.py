@@ -0,0 +1,480 @@
+"""
+In-memory database for the 'memory' db backend.
+
+Rows are kept as ORM objects in a 'MemoryStore' shared by every session.
+Writes are applied right away, 'commit' and 'rollback' only release the lock
+taken by 'lock=True' reads, which stands in for 'SELECT ... FOR UPDATE'.
+The lock covers the whole store, it's held until the session ends.
+"""
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from itertools import count
+from statistics import fmean
+
+from ..lib.metrics import timed_repository
+from ..orm.game import Game, GameStatus, GameType
+from ..orm.game_result import GameResult
+from ..orm.user import User
+from ..orm.user_stats import UserStats
+from ..types.common import PendingGameResult
+from .base import InMemorySession, memory_repo_of
+from .game import GameRepo
+from .game_replay import GameReplayRepo
+from .game_result import AvgLastNGamesRet, GameResultRepo, GameResultWithGameType
+from .token import TokenRepo
+from .user import UserRepo
+from .user_stats import RECENT_COLUMNS, RECENT_SIZE, UserStatsRepo, UserStatsRet
+
+
+class MemoryStore:
+    """
+    - lobbies: games in 'LOBBY' status, the match making index
+    - lobby_buckets: lobbies by skill bucket, in creation order
+    - pool: games in 'POOL' status
+    - user_results: game results of each user, in insertion order
+    - game_replays: encoded replay logs of each game, in insertion order
+    """
+
+    def __init__(self) -> None:
+        self.games: dict[int, Game] = {}
+        self.lobbies: dict[int, Game] = {}
+        self.lobby_buckets: defaultdict[int, dict[int, Game]] = defaultdict(dict)
+        self.pool: dict[int, Game] = {}
+        self.game_results: dict[tuple[int, str], GameResult] = {}
+        self.user_results: defaultdict[str, list[GameResult]] = defaultdict(list)
+        self.users: dict[str, User] = {}
+        self.user_stats: dict[str, UserStats] = {}
+        self.game_replays: defaultdict[int, list[bytes]] = defaultdict(list)
+        self.lock = asyncio.Lock()
+        self._game_ids = count(1)
+
+    def next_game_id(self) -> int:
+        return next(self._game_ids)
+
+
+class MemorySession(InMemorySession):
+    def __init__(self, store: MemoryStore) -> None:
+        self.store = store
+        self._locked = False
+
+    async def lock(self):
+        if not self._locked:
+            await self.store.lock.acquire()
+            self._locked = True
+
+    def _release(self):
+        if self._locked:
+            self._locked = False
+            self.store.lock.release()
+
+    async def commit(self):
+        self._release()
+
+    async def rollback(self):
+        self._release()
+
+    async def close(self):
+        self._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class MemorySessionmaker:
+    """
+    Drop-in for 'async_sessionmaker', every session shares the same store
+    """
+
+    def __init__(self, store: MemoryStore | None = None) -> None:
+        self.store = store or MemoryStore()
+
+    def __call__(self) -> MemorySession:
+        return MemorySession(self.store)
+
+
+@memory_repo_of(GameRepo)
+@timed_repository
+class MemoryGameRepo(GameRepo):
+    def __init__(self, session: MemorySession, player_limit: int = 5) -> None:
+        super().__init__(session, player_limit)  # type: ignore
+        self._memory_session = session
+        self._store = session.store
+
+    def _set_status(self, game: Game, status: GameStatus):
+        game.status = status
+        if status == GameStatus.LOBBY and game.skill_bucket is not None:
+            self._store.lobby_buckets[game.skill_bucket][game.id] = game
+        elif game.skill_bucket is not None:
+            bucket = self._store.lobby_buckets.get(game.skill_bucket, {})
+            bucket.pop(game.id, None)
+        for index_status, index in (
+            (GameStatus.LOBBY, self._store.lobbies),
+            (GameStatus.POOL, self._store.pool),
+        ):
+            if status == index_status:
+                index[game.id] = game
+            else:
+                index.pop(game.id, None)
+
+    async def get(self, id: int, lock: bool = False) -> Game | None:
+        if lock:
+            await self._memory_session.lock()
+        return self._store.games.get(id)
+
+    async def start_game(self, id: int):
+        game = self._store.games.get(id)
+        if game is not None:
+            self._set_status(game, GameStatus.IN_GAME)
+            game.start_at = datetime.now(UTC)
+
+    async def set_finish(self, id: int):
+        game = self._store.games.get(id)
+        if game is not None:
+            self._set_status(game, GameStatus.FINISHED)
+            game.end_at = datetime.now(UTC)
+
+    async def finish_unfinished(self) -> list[int]:
+        ids = [
+            i.id
+            for i in self._store.games.values()
+            if i.status in (GameStatus.LOBBY, GameStatus.IN_GAME)
+        ]
+        for id in ids:
+            await self.set_finish(id)
+        return ids
+
+    async def create(
+        self, game_type: GameType, status: GameStatus, skill_bucket: int | None = None
+    ) -> Game:
+        game = Game(
+            id=self._store.next_game_id(),
+            created_at=datetime.now(UTC),
+            game_type=game_type,
+            player_count=0,
+            finish_count=0,
+            skill_bucket=skill_bucket,
+        )
+        self._store.games[game.id] = game
+        self._set_status(game, status)
+        return game
+
+    async def create_pool(self, count: int):
+        for _ in range(count):
+            await self.create(GameType.MULTI, GameStatus.POOL)
+
+    async def count_pool(self) -> int:
+        return len(self._store.pool)
+
+    async def claim_pool(self, skill_bucket: int | None = None) -> Game | None:
+        game = next(iter(self._store.pool.values()), None)
+        if game is not None:
+            game.skill_bucket = skill_bucket
+            game.created_at = datetime.now(UTC)
+            self._set_status(game, GameStatus.LOBBY)
+        return game
+
+    async def get_one_available(
+        self,
+        lock: bool = False,
+        skill_bucket: int | None = None,
+        widen_interval: float = 0,
+        max_distance: int = 0,
+    ) -> Game | None:
+        if lock:
+            await self._memory_session.lock()
+
+        if skill_bucket is None:
+            for game in self._store.lobbies.values():
+                if game.player_count < self._player_limit:
+                    return game
+            return
+
+        # buckets from the closest, lobbies in creation order
+        now = datetime.now(UTC)
+        for distance in range(max_distance + 1):
+            found: Game | None = None
+            for bucket in {skill_bucket - distance, skill_bucket + distance}:
+                for game in self._store.lobby_buckets.get(bucket, {}).values():
+                    if game.player_count >= self._player_limit:
+                        continue
+                    if (now - game.created_at).total_seconds() < (
+                        distance * widen_interval
+                    ):
+                        # later lobbies waited even less
+                        break
+                    if found is None or game.created_at < found.created_at:
+                        found = game
+                    break
+            if found is not None:
+                return found
+
+    async def is_available(
+        self, id: int, lock: bool = False, new_player: bool = False
+    ) -> Game | None:
+        if lock:
+            await self._memory_session.lock()
+        game = self._store.lobbies.get(id)
+        if game is None:
+            return None
+
+        if new_player:
+            available = game.player_count < self._player_limit
+        else:
+            available = game.player_count <= self._player_limit
+        return game if available else None
+
+    async def update_finish_count(self, id: int, finish_count: int):
+        game = self._store.games.get(id)
+        if game is not None:
+            game.finish_count = max(game.finish_count, finish_count)
+
+    async def increase_player_count(self, id: int) -> Game | None:
+        game = self._store.games.get(id)
+        if game is not None:
+            game.player_count += 1
+        return game
+
+    async def decrease_player_count(self, id: int) -> Game | None:
+        game = self._store.games.get(id)
+        if game is not None:
+            game.player_count -= 1
+        return game
+
+
+@memory_repo_of(GameReplayRepo)
+@timed_repository
+class MemoryGameReplayRepo(GameReplayRepo):
+    def __init__(self, session: MemorySession) -> None:
+        super().__init__(session)  # type: ignore
+        self._store = session.store
+
+    async def add_many(self, replays: list[tuple[int, bytes]]):
+        for game_id, data in replays:
+            self._store.game_replays[game_id].append(data)
+
+    async def count(self, game_id: int) -> int:
+        return len(self._store.game_replays.get(game_id, []))
+
+    async def stream(self, game_id: int) -> AsyncIterator[bytes]:
+        for data in list(self._store.game_replays.get(game_id, [])):
+            yield data
+
+
+@memory_repo_of(GameResultRepo)
+@timed_repository
+class MemoryGameResultRepo(GameResultRepo):
+    def __init__(self, session: MemorySession) -> None:
+        super().__init__(session)  # type: ignore
+        self._store = session.store
+
+    def _insert(self, result: PendingGameResult) -> GameResult | None:
+        key = (result.game_id, result.user_id)
+        if key in self._store.game_results:
+            return None
+
+        row = GameResult(**result.model_dump())
+        self._store.game_results[key] = row
+        self._store.user_results[result.user_id].append(row)
+        return row
+
+    def _with_game_type(self, item: GameResult) -> GameResultWithGameType:
+        return GameResultWithGameType(
+            game_type=self._store.games[item.game_id].game_type,
+            game_id=item.game_id,
+            wpm=item.wpm_correct,
+            wpm_raw=item.wpm_raw,
+            accuracy=item.accuracy,
+            finished_at=item.finished_at,
+            rank=item.rank,
+        )
+
+    def _latest_first(self, user_id: str) -> list[GameResult]:
+        return sorted(
+            self._store.user_results.get(user_id, []),
+            key=lambda x: (x.finished_at, x.game_id),
+            reverse=True,
+        )
+
+    async def create_many(self, results: list[PendingGameResult]) -> list[GameResult]:
+        inserted = [row for i in results if (row := self._insert(i)) is not None]
+        await UserStatsRepo(self._session).add_results(inserted)
+        return inserted
+
+    async def get_total_games(self, user_id: str) -> int:
+        return len(self._store.user_results.get(user_id, []))
+
+    async def get_last_n_games_with_game_type(
+        self,
+        user_id: str,
+        size: int = 50,
+    ) -> list[GameResultWithGameType]:
+        return [self._with_game_type(i) for i in self._latest_first(user_id)[:size]]
+
+    async def get_games_with_game_type_before(
+        self,
+        user_id: str,
+        size: int = 50,
+        before: tuple[datetime, int] | None = None,
+        skip: int = 0,
+    ) -> list[GameResultWithGameType]:
+        results = self._latest_first(user_id)
+        if before is not None:
+            results = [i for i in results if (i.finished_at, i.game_id) < before]
+        return [self._with_game_type(i) for i in results[skip : skip + size]]
+
+    async def get_best(self, user_id: str) -> GameResult | None:
+        return max(
+            self._store.user_results.get(user_id, []),
+            key=lambda x: x.wpm_correct,
+            default=None,
+        )
+
+    async def get_avg_last_n_games(
+        self, user_id: str, last_n: int | None = None
+    ) -> AvgLastNGamesRet:
+        results = self._latest_first(user_id)
+        if last_n is not None:
+            results = results[:last_n]
+        if not results:
+            return AvgLastNGamesRet(wpm_raw=0, wpm=0, acc=0)
+
+        return AvgLastNGamesRet(
+            wpm_raw=fmean(i.wpm_raw for i in results),
+            wpm=fmean(i.wpm_correct for i in results),
+            acc=fmean(i.accuracy for i in results),
+        )
+
+    async def create(
+        self,
+        game_id: int,
+        user_id: str,
+        rank: int,
+        wpm_raw: float,
+        wpm_correct: float,
+        accuracy: float,
+        finished_at: datetime,
+    ) -> GameResult:
+        row = self._insert(
+            PendingGameResult(
+                game_id=game_id,
+                user_id=user_id,
+                rank=rank,
+                wpm_raw=wpm_raw,
+                wpm_correct=wpm_correct,
+                accuracy=accuracy,
+                finished_at=finished_at,
+            )
+        )
+        if row is None:
+            raise ValueError(
+                f"game result already exists, game_id: {game_id}, user_id: {user_id}"
+            )
+
+        await UserStatsRepo(self._session).add_result(
+            user_id=user_id,
+            wpm_raw=wpm_raw,
+            wpm_correct=wpm_correct,
+            accuracy=accuracy,
+            finished_at=finished_at,
+        )
+        return row
+
+
+@memory_repo_of(UserStatsRepo)
+@timed_repository
+class MemoryUserStatsRepo(UserStatsRepo):
+    def __init__(self, session: MemorySession) -> None:
+        super().__init__(session)  # type: ignore
+        self._store = session.store
+
+    async def _upsert(self, rows: list[dict]):
+        for row in rows:
+            stats = self._store.user_stats.get(row["user_id"])
+            if stats is None:
+                self._store.user_stats[row["user_id"]] = UserStats(**row)
+                continue
+
+            stats.total_games += row["total_games"]
+            stats.wpm_sum += row["wpm_sum"]
+            stats.wpm_raw_sum += row["wpm_raw_sum"]
+            stats.acc_sum += row["acc_sum"]
+            if row["wpm_best"] > stats.wpm_best:
+                stats.wpm_best = row["wpm_best"]
+                stats.acc_best = row["acc_best"]
+
+            stored = zip(*(getattr(stats, i) for i in RECENT_COLUMNS))
+            new = zip(*(row[i] for i in RECENT_COLUMNS))
+            # merged by 'finished_at' like the 'ON CONFLICT' clause
+            merged = sorted([*stored, *new], key=lambda x: x[0], reverse=True)
+            merged = merged[:RECENT_SIZE]
+            for idx, column in enumerate(RECENT_COLUMNS):
+                setattr(stats, column, [i[idx] for i in merged])
+
+    async def get(self, user_id: str) -> UserStatsRet:
+        return self._to_ret(self._store.user_stats.get(user_id))
+
+    async def get_recent_wpm(self, user_id: str) -> float | None:
+        stats = self._store.user_stats.get(user_id)
+        if stats is None or not stats.recent_wpm:
+            return None
+        return fmean(stats.recent_wpm)
+
+    async def get_total_games(self, user_id: str) -> int:
+        stats = self._store.user_stats.get(user_id)
+        return stats.total_games if stats is not None else 0
+
+    async def backfill(self, user_id: str | None = None):
+        if user_id is None:
+            user_ids = set(self._store.user_results) | set(self._store.user_stats)
+        else:
+            user_ids = [user_id]
+
+        for i in user_ids:
+            self._store.user_stats.pop(i, None)
+            await self.add_results(self._store.user_results.get(i, []))
+
+
+@memory_repo_of(UserRepo)
+@timed_repository
+class MemoryUserRepo(UserRepo):
+    def __init__(self, session: MemorySession) -> None:
+        super().__init__(session)  # type: ignore
+        self._store = session.store
+
+    async def register(self, id: str, name: str) -> User:
+        user = self._store.users.get(id)
+        if user is None:
+            user = User(id=id, name=name, registered_at=datetime.now(UTC))
+            self._store.users[id] = user
+        return user
+
+    async def get(self, id: str) -> User | None:
+        return self._store.users.get(id)
+
+
+@memory_repo_of(TokenRepo)
+@timed_repository
+class MemoryTokenRepo(TokenRepo):
+    def __init__(self, session: MemorySession) -> None:
+        super().__init__(session)  # type: ignore
+        self._store = session.store
+
+    async def set_refresh_token(self, user_id: str, refresh_token: str):
+        user = self._store.users.get(user_id)
+        if user is not None:
+            user.refresh_token = refresh_token
+
+    async def remove_refresh_token(self, user_id: str):
+        user = self._store.users.get(user_id)
+        if user is not None:
+            user.refresh_token = None
+
+    async def get_refresh_token(self, user_id: str) -> str | None:
+        user = self._store.users.get(user_id)
+        return user.refresh_token if user is not None else None
@@ -0,0 +1,55 @@
+import json
+from logging import getLogger
+from time import time
+
+from redis.asyncio import Redis
+
+from ..lib.metrics import timed_repository
+from ..types.common import NodeInfo
+from ..types.setting import Setting
+
+logger = getLogger(__name__)
+
+NODES_KEY = "nodes"
+
+
+@timed_repository
+class NodeRegistryRepo:
+    """
+    Live API nodes, one hash field per node holding its url and when it expires
+    """
+
+    def __init__(self, redis_conn: Redis, setting: Setting) -> None:
+        self._redis_conn = redis_conn
+        self._setting = setting
+
+    async def heartbeat(self, node: NodeInfo):
+        value = json.dumps(
+            {"url": node.url, "expire_at": time() + self._setting.affinity.node_ttl}
+        )
+        await self._redis_conn.hset(NODES_KEY, node.name, value)
+
+    async def remove(self, name: str):
+        await self._redis_conn.hdel(NODES_KEY, name)
+
+    async def get_live(self) -> list[NodeInfo]:
+        """
+        Nodes that missed their heartbeats are removed on the way
+        """
+        ret: dict[bytes, bytes] = await self._redis_conn.hgetall(NODES_KEY)
+
+        now = time()
+        nodes: list[NodeInfo] = []
+        expired: list[str] = []
+        for name, raw in ret.items():
+            value = json.loads(raw)
+            if value["expire_at"] <= now:
+                expired.append(name.decode())
+            else:
+                nodes.append(NodeInfo(name=name.decode(), url=value["url"]))
+
+        if expired:
+            logger.info("remove expired nodes: %s", expired)
+            await self._redis_conn.hdel(NODES_KEY, *expired)
+
+        return nodes
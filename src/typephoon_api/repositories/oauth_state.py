@@ -4,12 +4,14 @@ from os import urandom
 
 from redis.asyncio import Redis
 
+from ..lib.metrics import timed_repository
 from ..lib.util import get_state_key
 from ..types.setting import Setting
 
 logger = getLogger(__name__)
 
 
+@timed_repository
 class OAuthStateRepo:
     def __init__(self, setting: Setting, redis_conn: Redis) -> None:
         self._setting = setting
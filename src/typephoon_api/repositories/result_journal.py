@@ -0,0 +1,45 @@
+from redis.asyncio import Redis
+
+from ..lib.metrics import timed_repository
+from ..types.common import PendingGameResult
+from ..types.setting import Setting
+
+
+@timed_repository
+class ResultJournalRepo:
+    """
+    Journal of game results buffered by the write-behind writer.
+    Entries are removed once committed to database and replayed on startup.
+    """
+
+    def __init__(self, redis_conn: Redis, setting: Setting) -> None:
+        assert setting.server_name
+        self._redis_conn = redis_conn
+        self._setting = setting
+
+    def _gen_journal_key(self) -> str:
+        return f"game-result-journal-{self._setting.server_name}"
+
+    def _gen_field(self, result: PendingGameResult) -> str:
+        return f"{result.game_id}-{result.user_id}"
+
+    async def add(self, result: PendingGameResult):
+        await self._redis_conn.hset(
+            self._gen_journal_key(),
+            self._gen_field(result),
+            result.model_dump_json(),
+        )
+
+    async def remove(self, results: list[PendingGameResult]):
+        if not results:
+            return
+
+        await self._redis_conn.hdel(
+            self._gen_journal_key(), *[self._gen_field(i) for i in results]
+        )
+
+    async def get_all(self) -> list[PendingGameResult]:
+        ret: dict[bytes, bytes] = await self._redis_conn.hgetall(
+            self._gen_journal_key()
+        )
+        return [PendingGameResult.model_validate_json(i) for i in ret.values()]
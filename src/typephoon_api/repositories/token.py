@@ -1,10 +1,13 @@
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..lib.metrics import timed_repository
 from ..orm.user import User
+from .base import SessionRepo
 
 
-class TokenRepo:
+@timed_repository
+class TokenRepo(SessionRepo):
     def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
@@ -2,10 +2,13 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import select
 
+from ..lib.metrics import timed_repository
 from ..orm.user import User
+from .base import SessionRepo
 
 
-class UserRepo:
+@timed_repository
+class UserRepo(SessionRepo):
     def __init__(self, session: AsyncSession) -> None:
         self._session = session
 
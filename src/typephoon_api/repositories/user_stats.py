@@ -0,0 +1,268 @@
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import datetime
+from statistics import fmean
+
+from pydantic import BaseModel
+from sqlalchemy import case, delete, exists, func, select, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..lib.metrics import timed_repository
+from ..orm.game_result import GameResult
+from ..orm.user_stats import UserStats
+from .base import SessionRepo
+
+# size of the 'recent_*' rings, this is the 'N' in 'average of last N games'
+RECENT_SIZE = 10
+RECENT_COLUMNS = ("recent_finished_at", "recent_wpm", "recent_wpm_raw", "recent_acc")
+
+
+class UserStatsRet(BaseModel):
+    total: int = 0
+
+    wpm_best: float = 0
+    wpm_avg_recent: float = 0
+    wpm_avg_all: float = 0
+
+    acc_best: float = 0
+    acc_avg_recent: float = 0
+    acc_avg_all: float = 0
+
+
+@timed_repository
+class UserStatsRepo(SessionRepo):
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    def _merge_recent(self, excluded, column: str):
+        """
+        Merge the stored ring of 'column' with the new one by 'finished_at' and keep
+        the newest ones, so results replayed from the journal after newer ones were
+        written don't push those out
+        """
+        stored = (
+            func.unnest(UserStats.recent_finished_at, getattr(UserStats, column))
+            .table_valued("finished_at", "value")
+            .render_derived()
+        )
+        new = (
+            func.unnest(excluded.recent_finished_at, getattr(excluded, column))
+            .table_valued("finished_at", "value")
+            .render_derived()
+        )
+        merged = union_all(
+            select(stored.c.finished_at, stored.c.value),
+            select(new.c.finished_at, new.c.value),
+        ).subquery()
+        return func.array(
+            select(merged.c.value)
+            .order_by(merged.c.finished_at.desc().nulls_last())
+            .limit(RECENT_SIZE)
+            .scalar_subquery()
+        )
+
+    async def _upsert(self, rows: list[dict]):
+        """
+        Each row carries the aggregated values of a user's new results,
+        'recent_*' are ordered newest first
+        """
+        # rows are locked in the same order by every writer, concurrent flushes
+        # sharing users wait for each other instead of deadlocking
+        rows = sorted(rows, key=lambda x: x["user_id"])
+        query = insert(UserStats).values(rows)
+        query = query.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={
+                "total_games": UserStats.total_games + query.excluded.total_games,
+                "wpm_sum": UserStats.wpm_sum + query.excluded.wpm_sum,
+                "wpm_raw_sum": UserStats.wpm_raw_sum + query.excluded.wpm_raw_sum,
+                "acc_sum": UserStats.acc_sum + query.excluded.acc_sum,
+                "wpm_best": func.greatest(UserStats.wpm_best, query.excluded.wpm_best),
+                "acc_best": case(
+                    (
+                        query.excluded.wpm_best > UserStats.wpm_best,
+                        query.excluded.acc_best,
+                    ),
+                    else_=UserStats.acc_best,
+                ),
+                **{
+                    column: self._merge_recent(query.excluded, column)
+                    for column in RECENT_COLUMNS
+                },
+            },
+        )
+
+        await self._session.execute(query)
+
+    async def add_result(
+        self,
+        user_id: str,
+        wpm_raw: float,
+        wpm_correct: float,
+        accuracy: float,
+        finished_at: datetime,
+    ):
+        """
+        Fold a single game result into the user's statistics.
+        Should be called in the same transaction that inserts the game result.
+        """
+        await self._upsert(
+            [
+                {
+                    "user_id": user_id,
+                    "total_games": 1,
+                    "wpm_sum": wpm_correct,
+                    "wpm_raw_sum": wpm_raw,
+                    "acc_sum": accuracy,
+                    "wpm_best": wpm_correct,
+                    "acc_best": accuracy,
+                    "recent_finished_at": [finished_at],
+                    "recent_wpm": [wpm_correct],
+                    "recent_wpm_raw": [wpm_raw],
+                    "recent_acc": [accuracy],
+                }
+            ]
+        )
+
+    async def add_results(self, results: Sequence[GameResult]):
+        """
+        Fold multiple game results into statistics with a single statement.
+        Should be called in the same transaction that inserts the game results.
+        """
+        grouped: defaultdict[str, list[GameResult]] = defaultdict(list)
+        for result in results:
+            grouped[result.user_id].append(result)
+
+        rows: list[dict] = []
+        for user_id, user_results in grouped.items():
+            user_results.sort(key=lambda x: x.finished_at, reverse=True)
+            # the earliest on ties, like '_upsert' keeping the current best
+            best = min(user_results, key=lambda x: (-x.wpm_correct, x.finished_at))
+            recent = user_results[:RECENT_SIZE]
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "total_games": len(user_results),
+                    "wpm_sum": sum(i.wpm_correct for i in user_results),
+                    "wpm_raw_sum": sum(i.wpm_raw for i in user_results),
+                    "acc_sum": sum(i.accuracy for i in user_results),
+                    "wpm_best": best.wpm_correct,
+                    "acc_best": best.accuracy,
+                    "recent_finished_at": [i.finished_at for i in recent],
+                    "recent_wpm": [i.wpm_correct for i in recent],
+                    "recent_wpm_raw": [i.wpm_raw for i in recent],
+                    "recent_acc": [i.accuracy for i in recent],
+                }
+            )
+
+        if rows:
+            await self._upsert(rows)
+
+    async def get(self, user_id: str) -> UserStatsRet:
+        query = select(UserStats).where(UserStats.user_id == user_id)
+        stats = await self._session.scalar(query)
+        return self._to_ret(stats)
+
+    def _to_ret(self, stats: UserStats | None) -> UserStatsRet:
+        if stats is None or stats.total_games == 0:
+            return UserStatsRet()
+
+        return UserStatsRet(
+            total=stats.total_games,
+            wpm_best=stats.wpm_best,
+            wpm_avg_recent=fmean(stats.recent_wpm) if stats.recent_wpm else 0,
+            wpm_avg_all=stats.wpm_sum / stats.total_games,
+            acc_best=stats.acc_best,
+            acc_avg_recent=fmean(stats.recent_acc) if stats.recent_acc else 0,
+            acc_avg_all=stats.acc_sum / stats.total_games,
+        )
+
+    async def get_recent_wpm(self, user_id: str) -> float | None:
+        """
+        Average WPM of the last N games
+
+        Returns:
+            - None if the user has no results
+        """
+        query = select(UserStats.recent_wpm).where(UserStats.user_id == user_id)
+        recent = await self._session.scalar(query)
+        return fmean(recent) if recent else None
+
+    async def get_total_games(self, user_id: str) -> int:
+        query = select(UserStats.total_games).where(UserStats.user_id == user_id)
+        ret = await self._session.scalar(query)
+        if ret is None:
+            return 0
+
+        return ret
+
+    async def backfill(self, user_id: str | None = None):
+        """
+        Rebuild statistics from 'game_results', users without results are reset.
+        Arguments:
+            - user_id: user to rebuild, None equals 'ALL'
+        """
+        stale = delete(UserStats).where(
+            ~exists().where(GameResult.user_id == UserStats.user_id)
+        )
+        if user_id is not None:
+            stale = stale.where(UserStats.user_id == user_id)
+        await self._session.execute(stale)
+
+        aggregated = select(
+            GameResult.user_id,
+            func.count(GameResult.game_id),
+            func.sum(GameResult.wpm_correct),
+            func.sum(GameResult.wpm_raw),
+            func.sum(GameResult.accuracy),
+            func.max(GameResult.wpm_correct),
+            array_agg(
+                aggregate_order_by(
+                    GameResult.accuracy,
+                    GameResult.wpm_correct.desc(),
+                    GameResult.finished_at,
+                )
+            )[1],
+            array_agg(
+                aggregate_order_by(
+                    GameResult.finished_at, GameResult.finished_at.desc()
+                )
+            )[1:RECENT_SIZE],
+            array_agg(
+                aggregate_order_by(
+                    GameResult.wpm_correct, GameResult.finished_at.desc()
+                )
+            )[1:RECENT_SIZE],
+            array_agg(
+                aggregate_order_by(GameResult.wpm_raw, GameResult.finished_at.desc())
+            )[1:RECENT_SIZE],
+            array_agg(
+                aggregate_order_by(GameResult.accuracy, GameResult.finished_at.desc())
+            )[1:RECENT_SIZE],
+        ).group_by(GameResult.user_id)
+
+        if user_id is not None:
+            aggregated = aggregated.where(GameResult.user_id == user_id)
+
+        columns = [
+            "user_id",
+            "total_games",
+            "wpm_sum",
+            "wpm_raw_sum",
+            "acc_sum",
+            "wpm_best",
+            "acc_best",
+            *RECENT_COLUMNS,
+        ]
+        query = insert(UserStats).from_select(columns, aggregated)
+        query = query.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={
+                column: getattr(query.excluded, column)
+                for column in columns
+                if column != "user_id"
+            },
+        )
+
+        await self._session.execute(query)
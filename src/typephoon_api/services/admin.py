@@ -0,0 +1,61 @@
+import asyncio
+from dataclasses import dataclass
+from secrets import compare_digest
+
+from ..lib.server import TypephoonServer
+from ..types.common import ErrorContext
+from ..types.enums import ErrorCode
+from .base import ServiceRet
+
+
+@dataclass(slots=True)
+class ProfilerStatus:
+    running: bool
+    output: str | None = None
+
+
+class AdminService:
+    def __init__(self, app: TypephoonServer) -> None:
+        self._app = app
+        self._setting = app.setting
+
+    def _check_token(self, token: str | None) -> ServiceRet | None:
+        if not self._setting.profiler.admin_token:
+            return ServiceRet(
+                ok=False, error=ErrorContext(code=ErrorCode.PROFILER_DISABLED)
+            )
+
+        if token is None or not compare_digest(
+            token, self._setting.profiler.admin_token
+        ):
+            return ServiceRet(
+                ok=False, error=ErrorContext(code=ErrorCode.INVALID_TOKEN)
+            )
+
+        return None
+
+    async def start_profiler(
+        self, token: str | None, duration: float | None = None
+    ) -> ServiceRet[ProfilerStatus]:
+        if error := self._check_token(token):
+            return error
+
+        # started from the event loop thread, that's the thread being sampled
+        if not self._app.profiler.start(duration):
+            return ServiceRet(
+                ok=False, error=ErrorContext(code=ErrorCode.PROFILER_RUNNING)
+            )
+
+        return ServiceRet(ok=True, data=ProfilerStatus(running=True))
+
+    async def stop_profiler(self, token: str | None) -> ServiceRet[ProfilerStatus]:
+        if error := self._check_token(token):
+            return error
+
+        output = await asyncio.to_thread(self._app.profiler.stop)
+        return ServiceRet(
+            ok=True,
+            data=ProfilerStatus(
+                running=False, output=str(output) if output is not None else None
+            ),
+        )
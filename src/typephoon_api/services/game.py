@@ -1,14 +1,25 @@
+from collections.abc import AsyncIterator
 from dataclasses import dataclass, field
 from datetime import UTC, datetime
 from logging import getLogger
 
+from aio_pika import Message
+from aio_pika.abc import AbstractExchange
+from pamqp.commands import Basic
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from ..lib.log import Lazy
+from ..lib.replay import REPLAY_CHUNK_SIZE, frame_segment
+from ..lib.result_writer import ResultWriter
+from ..orm.game import GameStatus
 from ..repositories.game import GameRepo
 from ..repositories.game_cache import GameCacheRepo
+from ..repositories.game_replay import GameReplayRepo
 from ..repositories.game_result import GameResultRepo
-from ..types.common import ErrorContext, GameUserInfo
+from ..types.amqp import GameResultMsg
+from ..types.common import ErrorContext, GameUserInfo, PendingGameResult
 from ..types.enums import ErrorCode, UserType
+from ..types.errors import PublishNotAcknowledged
 from ..types.requests.game import GameStatistics
 from .base import ServiceRet
 
@@ -19,9 +30,11 @@ logger = getLogger(__name__)
 class GetResultRet:
     """
     players are sorted by their ranking
+    - version: players version of this result
     """
 
     ranking: list[GameUserInfo] = field(default_factory=list)
+    version: int = 0
 
     def __post_init__(self):
         self.ranking = sorted(self.ranking, key=lambda x: x.rank)
@@ -38,9 +51,17 @@ class GameService:
         self,
         game_cache_repo: GameCacheRepo,
         sessionmaker: async_sessionmaker[AsyncSession],
+        result_exchange: AbstractExchange,
+        result_writer: ResultWriter | None = None,
     ):
+        """
+        - result_exchange: pushes finished players to all servers
+        - result_writer: write results behind, None equals 'write synchronously'
+        """
         self._game_cache_repo = game_cache_repo
         self._sessionmaker = sessionmaker
+        self._result_exchange = result_exchange
+        self._result_writer = result_writer
 
     async def get_countdown(self, game_id: int) -> ServiceRet[float]:
         logger.debug("game_id: %s", game_id)
@@ -64,20 +85,22 @@ class GameService:
     ) -> ServiceRet:
         logger.debug(
             "statistics: %s, user_id: %s, username: %s, user_type: %s",
-            statistics.model_dump_json(),
+            Lazy(statistics.model_dump_json),
             user_id,
             username,
-            str(user_type),
+            user_type,
         )
 
-        players = await self._game_cache_repo.get_players(statistics.game_id)
-        if players is None:
+        is_participant = await self._game_cache_repo.has_player(
+            game_id=statistics.game_id, user_id=user_id
+        )
+        if is_participant is None:
             logger.warning("game not found, game_id: %s", statistics.game_id)
             return ServiceRet(
                 ok=False, error=ErrorContext(code=ErrorCode.GAME_NOT_FOUND)
             )
 
-        if user_id not in players:
+        if not is_participant:
             logger.warning(
                 "not a participant, game_id: %s, user_id: %s",
                 statistics.game_id,
@@ -87,52 +110,72 @@ class GameService:
                 ok=False, error=ErrorContext(code=ErrorCode.NOT_A_PARTICIPANT)
             )
 
-        # write to database
-        async with self._sessionmaker() as session:
-            # get ranking
-            game_repo = GameRepo(session)
-            game = await game_repo.increase_finish_count(id=statistics.game_id)
-            if not game:
-                logger.warning("game not found, game_id: %s", game)
-                return ServiceRet(
-                    ok=False, error=ErrorContext(code=ErrorCode.GAME_NOT_FOUND)
-                )
+        # ranks are assigned in cache, 'finish_count' is persisted on cleanup
+        rank = await self._game_cache_repo.increase_finish_count(statistics.game_id)
+        finished_at = datetime.now(UTC)
 
-            finished_at = datetime.now(UTC)
-            rank = game.finish_count
+        # record result for registered user
+        if user_type == UserType.REGISTERED:
+            result = PendingGameResult(
+                game_id=statistics.game_id,
+                user_id=user_id,
+                rank=rank,
+                wpm_raw=statistics.wpm_raw,
+                wpm_correct=statistics.wpm,
+                accuracy=statistics.acc,
+                finished_at=finished_at,
+            )
+            if self._result_writer is not None:
+                await self._result_writer.submit(result)
+            else:
+                async with self._sessionmaker() as session:
+                    result_repo = GameResultRepo(session)
+                    await result_repo.create(**result.model_dump())
+                    await session.commit()
+
+        # update cache
+        version = await self._game_cache_repo.update_player_cache(
+            game_id=statistics.game_id,
+            data=GameUserInfo(
+                id=user_id,
+                name=username,
+                finished=finished_at.isoformat(),
+                rank=rank,
+                wpm=statistics.wpm,
+                wpm_raw=statistics.wpm_raw,
+                acc=statistics.acc,
+            ),
+        )
 
-            # record result for registered user
-            if user_type == UserType.REGISTERED:
-                result_repo = GameResultRepo(session)
-                await result_repo.create(
+        # the result is already recorded, clients can still fall back to polling
+        try:
+            await self._notify_result(
+                GameResultMsg(
                     game_id=statistics.game_id,
                     user_id=user_id,
                     rank=rank,
-                    wpm_raw=statistics.wpm_raw,
-                    wpm_correct=statistics.wpm,
-                    accuracy=statistics.acc,
-                    finished_at=finished_at,
-                )
-
-            await session.commit()
-
-        # update cache
-        async with self._game_cache_repo.lock(game_id=statistics.game_id):
-            await self._game_cache_repo.update_player_cache(
-                game_id=statistics.game_id,
-                data=GameUserInfo(
-                    id=user_id,
-                    name=username,
-                    finished=finished_at.isoformat(),
-                    rank=rank,
                     wpm=statistics.wpm,
                     wpm_raw=statistics.wpm_raw,
                     acc=statistics.acc,
-                ),
+                    finished=finished_at.isoformat(),
+                    version=version,
+                )
+            )
+        except Exception as ex:
+            logger.warning(
+                "failed to push result, game_id: %s, error: %s",
+                statistics.game_id,
+                str(ex),
             )
 
         return ServiceRet(ok=True)
 
+    async def _notify_result(self, msg: GameResultMsg):
+        amqp_msg = Message(msg.model_dump_json().encode())
+        confirm = await self._result_exchange.publish(message=amqp_msg, routing_key="")
+        if not isinstance(confirm, Basic.Ack):
+            raise PublishNotAcknowledged("publish result message failed")
+
     async def get_players(
         self, game_id: int, user_id: str
     ) -> ServiceRet[GetPlayersRet]:
@@ -156,21 +199,27 @@ class GameService:
 
         return ServiceRet(ok=True, data=GetPlayersRet(me=me, others=players))
 
-    async def get_result(self, game_id: int) -> ServiceRet[GetResultRet]:
-        logger.debug("game_id: %s", game_id)
+    async def get_result(
+        self, game_id: int, since: int | None = None
+    ) -> ServiceRet[GetResultRet]:
+        """
+        - since: only return players updated after this version, None equals 'ALL'
+        """
+        logger.debug("game_id: %s, since: %s", game_id, since)
 
-        players = await self._game_cache_repo.get_players(game_id)
-        if not players:
+        ret = await self._game_cache_repo.get_players_with_version(
+            game_id=game_id, since=since
+        )
+        if ret is None:
             logger.warning("players not found, game_id: %s", game_id)
             return ServiceRet(
                 ok=False, error=ErrorContext(code=ErrorCode.GAME_NOT_FOUND)
             )
 
-        temp_list: list[GameUserInfo] = []
-        for _, player_info in players.items():
-            temp_list.append(player_info)
-
-        return ServiceRet(ok=True, data=GetResultRet(ranking=temp_list))
+        return ServiceRet(
+            ok=True,
+            data=GetResultRet(ranking=list(ret.players.values()), version=ret.version),
+        )
 
     async def get_words(self, game_id: int) -> ServiceRet[str]:
         """
@@ -187,3 +236,39 @@ class GameService:
             )
 
         return ServiceRet(ok=True, data=words)
+
+    async def get_replay(self, game_id: int) -> ServiceRet[AsyncIterator[bytes]]:
+        """
+        Keystroke logs of a finished game, see 'lib.replay', in chunks of at
+        most 'REPLAY_CHUNK_SIZE' bytes
+        """
+        logger.debug("game_id: %s", game_id)
+
+        async with self._sessionmaker() as session:
+            game = await GameRepo(session).get(game_id)
+            if game is None:
+                logger.warning("game not found, game_id: %s", game_id)
+                return ServiceRet(
+                    ok=False, error=ErrorContext(code=ErrorCode.GAME_NOT_FOUND)
+                )
+            if game.status != GameStatus.FINISHED:
+                logger.warning("game not finished, game_id: %s", game_id)
+                return ServiceRet(
+                    ok=False, error=ErrorContext(code=ErrorCode.GAME_NOT_FINISHED)
+                )
+
+            count = await GameReplayRepo(session).count(game_id)
+        if not count:
+            logger.warning("replay not found, game_id: %s", game_id)
+            return ServiceRet(
+                ok=False, error=ErrorContext(code=ErrorCode.REPLAY_NOT_FOUND)
+            )
+
+        return ServiceRet(ok=True, data=self._stream_replay(game_id))
+
+    async def _stream_replay(self, game_id: int) -> AsyncIterator[bytes]:
+        async with self._sessionmaker() as session:
+            async for data in GameReplayRepo(session).stream(game_id):
+                framed = frame_segment(data)
+                for idx in range(0, len(framed), REPLAY_CHUNK_SIZE):
+                    yield framed[idx : idx + REPLAY_CHUNK_SIZE]
@@ -1,3 +1,4 @@
+from datetime import UTC, datetime
 from logging import getLogger
 
 from aio_pika.abc import AbstractExchange
@@ -5,9 +6,13 @@ from fastapi import WebSocket
 from jwt.exceptions import ExpiredSignatureError, PyJWTError
 
 from ..lib.background_tasks.base import BGManager
-from ..lib.background_tasks.game import GameBG, GameBGMsg
+from ..lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from ..lib.metrics import AFFINITY_REDIRECTS
+from ..lib.node_affinity import NodeAffinity
+from ..lib.positions import PositionTable
 from ..lib.token_validator import TokenValidator
 from ..repositories.game_cache import GameCacheRepo
+from ..types.common import NodeInfo
 from ..types.enums import CookieNames, WSCloseReason
 from ..types.setting import Setting
 
@@ -22,17 +27,29 @@ class GameEventService:
         bg_manager: BGManager[GameBGMsg, GameBG],
         keystroke_exchange: AbstractExchange,
         setting: Setting,
+        node_affinity: NodeAffinity | None = None,
+        position_table: PositionTable | None = None,
     ) -> None:
         self._token_validator = token_validator
         self._game_cache_repo = game_cache_repo
         self._bg_manager = bg_manager
         self._keystroke_exchange = keystroke_exchange
         self._setting = setting
+        self._node_affinity = node_affinity
+        self._position_table = position_table
+
+    async def _redirect(self, websocket: WebSocket, game_id: int, owner: NodeInfo):
+        logger.debug("redirect, game_id: %s, node: %s", game_id, owner.name)
+        AFFINITY_REDIRECTS.labels("game").inc()
+        msg = GameBGMsg(event=GameBGMsgEvent.REDIRECT, game_id=game_id, node=owner.url)
+        await websocket.send_text(msg.slim_dump_json())
+        await websocket.close(reason=WSCloseReason.REDIRECT)
 
     async def subscribe(
         self,
         websocket: WebSocket,
         game_id: int,
+        redirected: bool = False,
     ) -> GameBG | None:
         logger.debug("in game ws connection, game_id: %s", game_id)
 
@@ -57,23 +74,37 @@ class GameEventService:
             return
 
         # check if user is in this game
-        players = await self._game_cache_repo.get_players(game_id)
-        if players is None:
+        user_id = current_user.sub
+        is_participant = await self._game_cache_repo.has_player(
+            game_id=game_id, user_id=user_id
+        )
+        if is_participant is None:
             logger.warning("game not found, game_id: %s", game_id)
             await websocket.close(reason=WSCloseReason.GAME_NOT_FOUND)
             return
 
-        user_id = current_user.sub
-        if user_id not in players:
+        if not is_participant:
             logger.warning(
-                "user does not participant in this game, game_id: %s, user_id: %s, users in this game: %s",
+                "user does not participant in this game, game_id: %s, user_id: %s",
                 game_id,
                 user_id,
-                players.keys(),
             )
             await websocket.close(reason=WSCloseReason.NOT_A_PARTICIPANT)
             return
 
+        # keep the websockets of a game on the node owning it, a redirected
+        # player stays even if the owner changed meanwhile
+        local_pool: BGManager[GameBGMsg, GameBG] | None = None
+        player_count = 0
+        if self._node_affinity is not None:
+            owner = self._node_affinity.remote_owner(game_id)
+            if owner is not None and not redirected:
+                await self._redirect(websocket=websocket, game_id=game_id, owner=owner)
+                return
+
+            local_pool = self._bg_manager
+            player_count = await self._game_cache_repo.get_player_count(game_id)
+
         # add to background task
         bg = GameBG(
             ws=websocket,
@@ -82,8 +113,40 @@ class GameEventService:
             setting=self._setting,
             game_id=game_id,
             server_name=self._setting.server_name,
+            local_pool=local_pool,
+            player_count=player_count,
+        )
+
+        # a reconnecting player gets everyone's position first, then the
+        # countdown, clients no longer need to poll for it
+        init_msgs: list[GameBGMsg] = []
+        if self._position_table is not None:
+            positions = await self._position_table.snapshot(game_id)
+            if positions:
+                init_msgs.append(
+                    GameBGMsg(
+                        event=GameBGMsgEvent.SNAPSHOT,
+                        game_id=game_id,
+                        positions=positions,
+                    )
+                )
+
+        start_time = await self._game_cache_repo.get_start_time(game_id)
+        if start_time is not None:
+            init_msgs.append(
+                GameBGMsg(
+                    event=GameBGMsgEvent.COUNTDOWN,
+                    game_id=game_id,
+                    start_at=start_time.isoformat(),
+                    server_time=datetime.now(UTC).isoformat(),
+                )
+            )
+
+        await self._bg_manager.add(
+            game_id=game_id, bg=bg, init_msg=init_msgs[0] if init_msgs else None
         )
-        await self._bg_manager.add(game_id=game_id, bg=bg)
+        for msg in init_msgs[1:]:
+            await bg.put_msg(msg)
         return bg
 
     async def close_wait(self, bg: GameBG):
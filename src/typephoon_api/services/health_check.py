@@ -1,7 +1,16 @@
+from dataclasses import dataclass
+
 from ..lib.server import TypephoonServer
+from ..types.common import DependencyStatus
 from .base import ServiceRet
 
 
+@dataclass(slots=True)
+class ReadyRet:
+    draining: bool
+    dependencies: dict[str, DependencyStatus]
+
+
 class HealthCheckService:
     def __init__(self, app: TypephoonServer) -> None:
         self._app = app
@@ -9,6 +18,11 @@ class HealthCheckService:
     async def alive(self) -> ServiceRet:
         return ServiceRet(ok=True)
 
-    async def ready(self) -> ServiceRet:
-        result = await self._app.ready()
-        return ServiceRet(ok=result)
+    async def ready(self) -> ServiceRet[ReadyRet]:
+        return ServiceRet(
+            ok=self._app.ready(),
+            data=ReadyRet(
+                draining=self._app.draining,
+                dependencies=self._app.health_monitor.statuses,
+            ),
+        )
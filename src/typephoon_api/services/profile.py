@@ -7,7 +7,9 @@ from ..repositories.game_result import (
     GameResultRepo,
     GameResultWithGameType,
 )
-from ..types.enums import UserType
+from ..repositories.user_stats import UserStatsRepo
+from ..types.common import ErrorContext, HistoryCursor
+from ..types.enums import ErrorCode, UserType
 from .base import ServiceRet
 
 logger = getLogger(__name__)
@@ -18,6 +20,7 @@ class HistoryRet:
     total: int = 0
     has_prev_page: bool = False
     has_next_page: bool = False
+    next_cursor: str | None = None
     data: list[GameResultWithGameType] = field(default_factory=list)
 
 
@@ -47,22 +50,18 @@ class ProfileService:
             return ServiceRet(ok=True, data=StatisticsRet())
 
         async with self._sessionmaker() as session:
-            repo = GameResultRepo(session)
-            avg_all = await repo.get_avg_last_n_games(user_id=user_id)
-            avg_last_10 = await repo.get_avg_last_n_games(user_id=user_id, last_n=10)
-            best_game = await repo.get_best(user_id)
-            total_games = await repo.get_total_games(user_id)
+            stats = await UserStatsRepo(session).get(user_id)
 
         return ServiceRet(
             ok=True,
             data=StatisticsRet(
-                total=total_games,
-                wpm_best=best_game.wpm_correct if best_game else 0,
-                wpm_avg_10=avg_last_10.wpm,
-                wpm_avg_all=avg_all.wpm,
-                acc_best=best_game.accuracy if best_game else 0,
-                acc_avg_10=avg_last_10.acc,
-                acc_avg_all=avg_all.acc,
+                total=stats.total,
+                wpm_best=stats.wpm_best,
+                wpm_avg_10=stats.wpm_avg_recent,
+                wpm_avg_all=stats.wpm_avg_all,
+                acc_best=stats.acc_best,
+                acc_avg_10=stats.acc_avg_recent,
+                acc_avg_all=stats.acc_avg_all,
             ),
         )
 
@@ -83,21 +82,55 @@ class ProfileService:
             )
 
     async def history(
-        self, user_id: str, user_type: UserType, size: int, page: int
+        self,
+        user_id: str,
+        user_type: UserType,
+        size: int,
+        page: int = 1,
+        cursor: str | None = None,
     ) -> ServiceRet[HistoryRet]:
+        """
+        Arguments:
+            - cursor: 'next_cursor' from the previous page, takes precedence over 'page'
+        """
         if user_type == UserType.GUEST:
             logger.debug("ignore guest user")
             return ServiceRet(ok=True, data=HistoryRet())
 
+        before: HistoryCursor | None = None
+        if cursor is not None:
+            try:
+                before = HistoryCursor.decode(cursor)
+            except ValueError:
+                logger.debug("invalid cursor: %s", cursor)
+                return ServiceRet(
+                    ok=False, error=ErrorContext(code=ErrorCode.INVALID_CURSOR)
+                )
+
         async with self._sessionmaker() as session:
             repo = GameResultRepo(session)
-            results = await repo.get_last_n_games_with_game_type(
-                user_id=user_id, size=size, page=page
+            total = await UserStatsRepo(session).get_total_games(user_id)
+
+            # fetch one extra row to know whether there is a next page,
+            # page numbers skip on the index instead of 'OFFSET' on the rows
+            results = await repo.get_games_with_game_type_before(
+                user_id=user_id,
+                size=size + 1,
+                before=(
+                    (before.finished_at, before.game_id) if before is not None else None
+                ),
+                skip=0 if before is not None else (page - 1) * size,
             )
-            total = await repo.get_total_games(user_id)
+            has_prev_page = before is not None or page > 1
+            has_next_page = len(results) > size
+            results = results[:size]
 
-        has_prev_page = True if page > 1 else False
-        has_next_page = True if total > (page * size) else False
+        next_cursor: str | None = None
+        if has_next_page and results:
+            last = results[-1]
+            next_cursor = HistoryCursor(
+                finished_at=last.finished_at, game_id=last.game_id
+            ).encode()
 
         return ServiceRet(
             ok=True,
@@ -105,6 +138,7 @@ class ProfileService:
                 total=total,
                 has_prev_page=has_prev_page,
                 has_next_page=has_next_page,
+                next_cursor=next_cursor,
                 data=results,
             ),
         )
@@ -1,6 +1,9 @@
+import asyncio
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
+from functools import partial
 from logging import getLogger
+from math import ceil
 
 from aio_pika import Message
 from aio_pika.abc import AbstractExchange, DeliveryMode
@@ -11,6 +14,9 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ..lib.background_tasks.base import BGManager
 from ..lib.background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from ..lib.lobby_pool import ArmStep, LobbyPool
+from ..lib.metrics import AFFINITY_REDIRECTS, QUEUE_IN_PHASE_SECONDS
+from ..lib.node_affinity import NodeAffinity
 from ..lib.token_generator import TokenGenerator, UserType
 from ..lib.token_validator import TokenValidator
 from ..lib.util import gen_guest_user_info
@@ -19,12 +25,13 @@ from ..repositories.game import GameRepo
 from ..repositories.game_cache import GameCacheRepo
 from ..repositories.guest_token import GuestTokenRepo
 from ..repositories.lobby_cache import LobbyCacheRepo
+from ..repositories.user_stats import UserStatsRepo
 from ..types.amqp import (
     GameCleanupMsg,
     LobbyCountdownMsg,
     LobbyNotifyMsg,
 )
-from ..types.common import LobbyUserInfo
+from ..types.common import LobbyUserInfo, NodeInfo
 from ..types.enums import CookieNames, QueueInType, WSCloseReason
 from ..types.errors import PublishNotAcknowledged
 from ..types.setting import Setting
@@ -36,6 +43,7 @@ logger = getLogger(__name__)
 class ProcessTokenRet:
     user_info: LobbyUserInfo
     guest_token_key: str | None = None
+    guest: bool = False
 
 
 class QueueInService:
@@ -55,6 +63,8 @@ class QueueInService:
         amqp_default_exchange: AbstractExchange,
         lobby_cache_repo: LobbyCacheRepo,
         game_cache_repo: GameCacheRepo,
+        node_affinity: NodeAffinity | None = None,
+        lobby_pool: LobbyPool | None = None,
     ) -> None:
         self._setting = setting
         self._token_generator = token_generator
@@ -66,6 +76,8 @@ class QueueInService:
         self._amqp_notify_exchange = amqp_notify_exchange
         self._lobby_cache_repo = lobby_cache_repo
         self._game_cache_repo = game_cache_repo
+        self._node_affinity = node_affinity
+        self._lobby_pool = lobby_pool
 
     async def _process_token(self, access_token: str | None) -> ProcessTokenRet:
         """
@@ -79,13 +91,34 @@ class QueueInService:
                 user_id=user_info.id, username=user_info.name, user_type=UserType.GUEST
             )
             guest_token_key = await self._guest_token_repo.store(token)
-            return ProcessTokenRet(user_info=user_info, guest_token_key=guest_token_key)
+            return ProcessTokenRet(
+                user_info=user_info, guest_token_key=guest_token_key, guest=True
+            )
 
         else:
             assert access_token
             info = self._token_validator.validate(access_token)
             user_info = LobbyUserInfo(id=info.sub, name=info.name)
-            return ProcessTokenRet(user_info=user_info)
+            return ProcessTokenRet(
+                user_info=user_info, guest=info.user_type == UserType.GUEST
+            )
+
+    async def _skill_bucket(
+        self, session: AsyncSession, user_id: str, guest: bool
+    ) -> int | None:
+        """
+        Returns:
+            - None if skill buckets are off
+        """
+        setting = self._setting.matchmaking
+        if not setting.skill_buckets:
+            return None
+
+        # guests have no results
+        wpm = None if guest else await UserStatsRepo(session).get_recent_wpm(user_id)
+        if wpm is None:
+            wpm = setting.default_wpm
+        return int(wpm // setting.bucket_width)
 
     async def _find_game(
         self,
@@ -93,6 +126,7 @@ class QueueInService:
         queue_in_type: QueueInType,
         prev_game_id: int | None,
         user_info: LobbyUserInfo,
+        skill_bucket: int | None = None,
     ) -> Game | None:
         logger.debug(
             "queue_in_type: %s, prev_game_id: %s, user_info: %s",
@@ -114,8 +148,18 @@ class QueueInService:
             return game
 
         else:
-            logger.debug("get_one_available")
-            game = await game_repo.get_one_available(lock=True)
+            logger.debug("get_one_available, skill_bucket: %s", skill_bucket)
+            setting = self._setting.matchmaking
+            # lobbies don't wait longer than the countdown
+            max_distance = ceil(
+                self._setting.game.lobby_countdown / setting.widen_interval
+            )
+            game = await game_repo.get_one_available(
+                lock=True,
+                skill_bucket=skill_bucket,
+                widen_interval=setting.widen_interval,
+                max_distance=max_distance,
+            )
             return game
 
     async def _join_game(
@@ -143,10 +187,14 @@ class QueueInService:
 
         return False
 
-    async def _send_cleanup_signal(self, game_id: int):
+    async def _send_cleanup_signal(self, game_id: int, claimed_at: datetime):
         logger.debug("game_id: %s", game_id)
 
-        msg = GameCleanupMsg(game_id=game_id).model_dump_json().encode()
+        msg = (
+            GameCleanupMsg(game_id=game_id, claimed_at=claimed_at.isoformat())
+            .model_dump_json()
+            .encode()
+        )
         amqp_msg = Message(msg)
 
         confirm = await self._amqp_default_exchange.publish(
@@ -157,10 +205,14 @@ class QueueInService:
         if not isinstance(confirm, Basic.Ack):
             raise PublishNotAcknowledged("publish cleanup message failed")
 
-    async def _send_countdown_signal(self, game_id: int):
+    async def _send_countdown_signal(self, game_id: int, claimed_at: datetime):
         logger.debug("game_id: %s", game_id)
 
-        msg = LobbyCountdownMsg(game_id=game_id).model_dump_json().encode()
+        msg = (
+            LobbyCountdownMsg(game_id=game_id, claimed_at=claimed_at.isoformat())
+            .model_dump_json()
+            .encode()
+        )
         amqp_msg = Message(msg)
 
         confirm = await self._amqp_default_exchange.publish(
@@ -171,29 +223,79 @@ class QueueInService:
         if not isinstance(confirm, Basic.Ack):
             raise PublishNotAcknowledged("publish countdown message failed")
 
-    async def _set_start_ts_cache(self, game_id: int):
+    async def _set_start_ts_cache(self, game_id: int, start_time: datetime):
         logger.debug("game_id: %s", game_id)
 
-        start_time = datetime.now(UTC) + timedelta(
-            seconds=self._setting.game.lobby_countdown
-        )
         await self._lobby_cache_repo.set_start_time(
             game_id=game_id, start_time=start_time
         )
+        await self._notify_countdown(game_id=game_id, start_time=start_time)
 
-    async def _create_game(self, game_repo: GameRepo) -> int:
-        game = await game_repo.create(game_type=GameType.MULTI, status=GameStatus.LOBBY)
-
-        logger.debug("id: %s", game.id)
+    async def _notify_countdown(self, game_id: int, start_time: datetime):
+        """
+        Push the start time to the players already connected, on every server
+        """
+        logger.debug("game_id: %s, start_time: %s", game_id, start_time)
 
-        # send signals
-        await self._send_countdown_signal(game.id)
-        await self._send_cleanup_signal(game.id)
+        msg = (
+            LobbyNotifyMsg(
+                notify_type=LobbyBGMsgEvent.COUNTDOWN,
+                game_id=game_id,
+                start_at=start_time.isoformat(),
+            )
+            .slim_dump_json()
+            .encode()
+        )
+        amqp_msg = Message(msg)
+        confirm = await self._amqp_notify_exchange.publish(
+            message=amqp_msg, routing_key=""
+        )
+        if not isinstance(confirm, Basic.Ack):
+            raise PublishNotAcknowledged("publish countdown notify failed")
 
-        # set start time in redis for user countdown pooling
-        await self._set_start_ts_cache(game.id)
+    def _arm_steps(self, game_id: int, claimed_at: datetime) -> list[ArmStep]:
+        """
+        Lobby timers, the messages carry the claim so the consumers ignore them
+        once the game went back to the pool. The start time is fixed here, so a
+        step run again doesn't move it
+        """
+        start_time = datetime.now(UTC) + timedelta(
+            seconds=self._setting.game.lobby_countdown
+        )
+        return [
+            partial(self._send_countdown_signal, game_id, claimed_at),
+            partial(self._send_cleanup_signal, game_id, claimed_at),
+            # start time in redis for user countdown pooling
+            partial(self._set_start_ts_cache, game_id, start_time),
+        ]
+
+    async def _arm_game(self, game_id: int, claimed_at: datetime):
+        await asyncio.gather(*[step() for step in self._arm_steps(game_id, claimed_at)])
+
+    async def _create_game(
+        self, game_repo: GameRepo, skill_bucket: int | None = None
+    ) -> tuple[int, datetime | None]:
+        """
+        Returns:
+            - (game id, claim time of a pooled game)
 
-        return game.id
+        A claimed game is armed by the pool once the claim is committed, an
+        inserted one is armed now and a failure rolls it back
+        """
+        if self._lobby_pool is not None:
+            game = await self._lobby_pool.claim(game_repo, skill_bucket=skill_bucket)
+            if game is not None:
+                logger.debug("claimed id: %s", game.id)
+                return game.id, game.created_at
+
+        game = await game_repo.create(
+            game_type=GameType.MULTI,
+            status=GameStatus.LOBBY,
+            skill_bucket=skill_bucket,
+        )
+        logger.debug("id: %s", game.id)
+        await self._arm_game(game.id, game.created_at)
+        return game.id, None
 
     async def _add_bg_event_loop(
         self,
@@ -217,6 +319,19 @@ class QueueInService:
             init_msg=LobbyBGMsg(event=LobbyBGMsgEvent.INIT, game_id=game_id),
         )
 
+        # push countdown, clients no longer need to poll for it. Later changes
+        # are pushed by 'LobbyNotifyConsumer'
+        start_time = await self._lobby_cache_repo.get_start_time(game_id)
+        if start_time is not None:
+            await bg.put_msg(
+                LobbyBGMsg(
+                    event=LobbyBGMsgEvent.COUNTDOWN,
+                    game_id=game_id,
+                    start_at=start_time.isoformat(),
+                    server_time=datetime.now(UTC).isoformat(),
+                )
+            )
+
         # notify guest user to get their token
         if guest_token_key:
             logger.debug(
@@ -235,6 +350,23 @@ class QueueInService:
 
         return bg
 
+    def _remote_owner(self, game_id: int, redirected: bool) -> NodeInfo | None:
+        """
+        A redirected player stays even if the owner changed meanwhile
+        """
+        if self._node_affinity is None or redirected:
+            return
+        return self._node_affinity.remote_owner(game_id)
+
+    async def _redirect(self, websocket: WebSocket, game_id: int, owner: NodeInfo):
+        logger.debug("redirect, game_id: %s, node: %s", game_id, owner.name)
+        AFFINITY_REDIRECTS.labels("lobby").inc()
+        msg = LobbyBGMsg(
+            event=LobbyBGMsgEvent.REDIRECT, game_id=game_id, node=owner.url
+        )
+        await websocket.send_text(msg.slim_dump_json())
+        await websocket.close(reason=WSCloseReason.REDIRECT)
+
     async def _notify_user_join(self, game_id: int):
         logger.debug("game_id: %s", game_id)
 
@@ -304,12 +436,19 @@ class QueueInService:
         websocket: WebSocket,
         queue_in_type: QueueInType,
         prev_game_id: int | None = None,
+        redirected: bool = False,
     ) -> LobbyBG | None:
-        logger.debug("queue_in_type: %s, prev_game_id: %s", queue_in_type, prev_game_id)
+        logger.debug(
+            "queue_in_type: %s, prev_game_id: %s, redirected: %s",
+            queue_in_type,
+            prev_game_id,
+            redirected,
+        )
 
         try:
-            access_token = websocket.cookies.get(CookieNames.ACCESS_TOKEN, None)
-            process_token_ret = await self._process_token(access_token)
+            with QUEUE_IN_PHASE_SECONDS.labels("token").time():
+                access_token = websocket.cookies.get(CookieNames.ACCESS_TOKEN, None)
+                process_token_ret = await self._process_token(access_token)
             await websocket.accept()
         except ExpiredSignatureError as ex:
             logger.warning("expired token: %s", str(ex))
@@ -327,68 +466,205 @@ class QueueInService:
             )
             game_id: int | None = None
 
-            game = await self._find_game(
-                game_repo=game_repo,
-                queue_in_type=queue_in_type,
-                prev_game_id=prev_game_id,
-                user_info=process_token_ret.user_info,
-            )
-
-            if game:
-                game_id = game.id
-                game_full = await self._join_game(
+            with QUEUE_IN_PHASE_SECONDS.labels("match").time():
+                # a reconnect goes back to its game, the bucket is only looked
+                # up if it has to create one
+                skill_bucket = None
+                if queue_in_type != QueueInType.RECONNECT:
+                    skill_bucket = await self._skill_bucket(
+                        session=session,
+                        user_id=process_token_ret.user_info.id,
+                        guest=process_token_ret.guest,
+                    )
+                game = await self._find_game(
                     game_repo=game_repo,
-                    game_id=game_id,
+                    queue_in_type=queue_in_type,
+                    prev_game_id=prev_game_id,
                     user_info=process_token_ret.user_info,
+                    skill_bucket=skill_bucket,
                 )
-            else:
-                game_id = await self._create_game(game_repo=game_repo)
-                game_full = await self._join_game(
-                    game_repo=game_repo,
-                    game_id=game_id,
-                    user_info=process_token_ret.user_info,
+                created = game is None
+                claimed_at: datetime | None = None
+                if game:
+                    game_id = game.id
+                else:
+                    if queue_in_type == QueueInType.RECONNECT:
+                        skill_bucket = await self._skill_bucket(
+                            session=session,
+                            user_id=process_token_ret.user_info.id,
+                            guest=process_token_ret.guest,
+                        )
+                    game_id, claimed_at = await self._create_game(
+                        game_repo=game_repo, skill_bucket=skill_bucket
+                    )
+
+            # the game lives on another node, send the player there. Players
+            # take no seat before, except the creator of a new game, so it is
+            # never left with timers and no players
+            owner = self._remote_owner(game_id=game_id, redirected=redirected)
+            game_full = False
+            if owner is None or created:
+                with QUEUE_IN_PHASE_SECONDS.labels("join").time():
+                    game_full = await self._join_game(
+                        game_repo=game_repo,
+                        game_id=game_id,
+                        user_info=process_token_ret.user_info,
+                    )
+            if owner is not None and created:
+                await self._lobby_cache_repo.add_redirects(
+                    game_id=game_id, user_ids=[process_token_ret.user_info.id]
                 )
-
             await session.commit()
 
-        try:
+        if claimed_at is not None:
+            assert self._lobby_pool is not None
+            self._lobby_pool.arm(
+                game_id=game_id, steps=self._arm_steps(game_id, claimed_at)
+            )
+
+        if owner is not None:
+            await self._redirect(websocket=websocket, game_id=game_id, owner=owner)
+            if created:
+                self._release_later(
+                    game_id=game_id, user_id=process_token_ret.user_info.id
+                )
+            return
+
+        # arrived from another node, the seat kept there is taken here
+        if redirected:
+            await self._lobby_cache_repo.claim_redirect(
+                game_id=game_id, user_id=process_token_ret.user_info.id
+            )
+
+        return await self._enter_lobby(
+            websocket=websocket,
+            user_info=process_token_ret.user_info,
+            game_id=game_id,
+            guest_token_key=process_token_ret.guest_token_key,
+            game_full=game_full,
+        )
+
+    async def _register(
+        self,
+        websocket: WebSocket,
+        user_info: LobbyUserInfo,
+        game_id: int,
+        guest_token_key: str | None,
+    ) -> LobbyBG:
+        """
+        USER_JOINED follows the registration, so the player receives it too
+        """
+        with QUEUE_IN_PHASE_SECONDS.labels("register").time():
             bg = await self._add_bg_event_loop(
                 websocket=websocket,
-                user_info=process_token_ret.user_info,
+                user_info=user_info,
                 game_id=game_id,
-                guest_token_key=process_token_ret.guest_token_key,
+                guest_token_key=guest_token_key,
             )
-        except Exception as ex:
-            logger.error("add event loop failed. error: %s", str(ex))
-            await self._leave(user_id=process_token_ret.user_info.id, game_id=game_id)
-            return
 
-        await self._notify_user_join(game_id)
+        with QUEUE_IN_PHASE_SECONDS.labels("publish").time():
+            await self._notify_user_join(game_id)
 
-        if game_full:
-            logger.debug("game full, game_id: %s", game_id)
+        return bg
 
-            # set game status
+    async def _prepare_start(self, game_repo: GameRepo, game_id: int):
+        """
+        Game status and game cache, the lobby cache is kept for the registration
+        running alongside
+        """
+        with QUEUE_IN_PHASE_SECONDS.labels("start").time():
+            await asyncio.gather(
+                game_repo.start_game(game_id),
+                self._game_cache_repo.populate_with_lobby_cache(
+                    game_id=game_id, lobby_cache_repo=self._lobby_cache_repo
+                ),
+            )
+
+    async def _enter_lobby(
+        self,
+        websocket: WebSocket,
+        user_info: LobbyUserInfo,
+        game_id: int,
+        guest_token_key: str | None,
+        game_full: bool,
+    ) -> LobbyBG | None:
+        """
+        Side effects of taking a seat, independent ones run concurrently:
+        - registration, then USER_JOINED
+        - when the lobby is full: game status and game cache
+
+        If any of them fails the others are cancelled, the game status is
+        rolled back and the seat is given back. GAME_START is published once
+        all of them are done.
+        """
+        try:
             async with self._sessionmaker() as session:
                 game_repo = GameRepo(
                     session=session, player_limit=self._setting.game.player_limit
                 )
-                await game_repo.start_game(game_id)
+                async with asyncio.TaskGroup() as tg:
+                    register = tg.create_task(
+                        self._register(
+                            websocket=websocket,
+                            user_info=user_info,
+                            game_id=game_id,
+                            guest_token_key=guest_token_key,
+                        )
+                    )
+                    if game_full:
+                        logger.debug("game full, game_id: %s", game_id)
+                        tg.create_task(self._prepare_start(game_repo, game_id))
                 await session.commit()
-
-            # populate game cache
-            await self._game_cache_repo.populate_with_lobby_cache(
-                game_id=game_id,
-                lobby_cache_repo=self._lobby_cache_repo,
-                auto_clean=True,
+        except ExceptionGroup as eg:
+            logger.error(
+                "enter lobby failed, game_id: %s, user_id: %s, errors: %s",
+                game_id,
+                user_info.id,
+                [repr(ex) for ex in eg.exceptions],
             )
+            await self._bg_manager.remove_user(game_id=game_id, user_id=user_info.id)
+            await self._leave(user_id=user_info.id, game_id=game_id)
+            return
 
-            await self._send_start_msg(game_id)
+        if game_full:
+            with QUEUE_IN_PHASE_SECONDS.labels("publish").time():
+                await asyncio.gather(
+                    self._lobby_cache_repo.clear_cache(game_id),
+                    self._send_start_msg(game_id),
+                )
 
-        return bg
+        return register.result()
 
     async def close_wait(self, bg: LobbyBG):
         # wait for disconnection
         await bg.close_wait()
         await self._bg_manager.remove_user(game_id=bg.game_id, user_id=bg.user_id)
+
+        # moved to the game's new node, the seat is kept for the reconnect there
+        if bg.redirected:
+            self._release_later(game_id=bg.game_id, user_id=bg.user_id)
+            return
         await self._leave(user_id=bg.user_id, game_id=bg.game_id)
+
+    def _release_later(self, game_id: int, user_id: str):
+        """
+        Give back the seat of a player sent to another node, unless they
+        reconnected there within 'affinity.redirect_timeout'
+        """
+        assert self._node_affinity is not None
+        self._node_affinity.release_later(
+            game_id=game_id,
+            user_id=user_id,
+            release=partial(self._release_redirected, game_id, user_id),
+        )
+
+    async def _release_redirected(self, game_id: int, user_id: str):
+        if await self._lobby_cache_repo.claim_redirect(
+            game_id=game_id, user_id=user_id
+        ):
+            logger.debug(
+                "redirected player never arrived, game_id: %s, user_id: %s",
+                game_id,
+                user_id,
+            )
+            await self._leave(user_id=user_id, game_id=game_id)
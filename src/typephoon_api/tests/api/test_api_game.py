@@ -3,10 +3,12 @@ from datetime import timedelta
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...lib.replay import ReplayLog, decode_replay
 from ...lib.token_generator import TokenGenerator
 from ...orm.game import GameStatus, GameType
 from ...repositories.game import GameRepo
 from ...repositories.game_cache import GameCacheRepo
+from ...repositories.game_replay import GameReplayRepo
 from ...repositories.lobby_cache import LobbyCacheRepo
 from ...repositories.user import UserRepo
 from ...types.common import LobbyUserInfo
@@ -280,3 +282,104 @@ async def test_game_result(
         assert user_result.acc == acc
 
         count += 1
+
+    # nothing changed since the last result
+    ret = await client.get(
+        f"{API_PREFIX}/game/result",
+        params={"game_id": game_id, "since": data.version},
+    )
+    assert ret.status_code == 200
+    since_data = GameResultResponse.model_validate(ret.json())
+    assert since_data.version == data.version
+    assert since_data.ranking == []
+
+    # only the last finisher
+    ret = await client.get(
+        f"{API_PREFIX}/game/result",
+        params={"game_id": game_id, "since": data.version - 1},
+    )
+    assert ret.status_code == 200
+    since_data = GameResultResponse.model_validate(ret.json())
+    assert since_data.ranking == data.ranking[-1:]
+
+
+@pytest.mark.asyncio
+async def test_game_replay(
+    client: AsyncClient,
+    setting: Setting,
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    access_token = TokenGenerator(setting).gen_access_token(
+        user_id="123", username="123-name"
+    )
+    cookies = {CookieNames.ACCESS_TOKEN: access_token}
+    async with sessionmaker() as session:
+        game_repo = GameRepo(session)
+        game = await game_repo.create(
+            game_type=GameType.MULTI, status=GameStatus.FINISHED
+        )
+        game_id = game.id
+        lobby = await game_repo.create(
+            game_type=GameType.MULTI, status=GameStatus.LOBBY
+        )
+        lobby_id = lobby.id
+        await session.commit()
+
+    # bad token
+    ret = await client.get(
+        f"{API_PREFIX}/game/replay",
+        params={"game_id": game_id},
+        cookies={CookieNames.ACCESS_TOKEN: "qqq.bbb.ccc"},
+    )
+    assert ret.status_code == 400
+    data = ErrorResponse.model_validate(ret.json())
+    assert data.error.code == ErrorCode.INVALID_TOKEN
+
+    # game not found
+    ret = await client.get(
+        f"{API_PREFIX}/game/replay", params={"game_id": 999999}, cookies=cookies
+    )
+    assert ret.status_code == 404
+    data = ErrorResponse.model_validate(ret.json())
+    assert data.error.code == ErrorCode.GAME_NOT_FOUND
+
+    # still being played
+    ret = await client.get(
+        f"{API_PREFIX}/game/replay", params={"game_id": lobby_id}, cookies=cookies
+    )
+    assert ret.status_code == 400
+    data = ErrorResponse.model_validate(ret.json())
+    assert data.error.code == ErrorCode.GAME_NOT_FINISHED
+
+    ret = await client.get(
+        f"{API_PREFIX}/game/replay", params={"game_id": game_id}, cookies=cookies
+    )
+    assert ret.status_code == 404
+    data = ErrorResponse.model_validate(ret.json())
+    assert data.error.code == ErrorCode.REPLAY_NOT_FOUND
+
+    # one log per server
+    logs: list[bytes] = []
+    for user_id in ("a", "b"):
+        log = ReplayLog(started_at=NOW.timestamp())
+        for char_index in range(1000):
+            log.append(
+                user_id=user_id,
+                word_index=char_index // 5,
+                char_index=char_index % 5,
+                at=NOW.timestamp() + char_index / 10,
+            )
+        logs.append(log.encode())
+
+    async with sessionmaker() as session:
+        await GameReplayRepo(session).add_many([(game_id, i) for i in logs])
+        await session.commit()
+
+    ret = await client.get(
+        f"{API_PREFIX}/game/replay", params={"game_id": game_id}, cookies=cookies
+    )
+    assert ret.status_code == 200
+    assert ret.headers["content-type"] == "application/octet-stream"
+    segments = list(decode_replay(ret.content))
+    assert [i.players for i in segments] == [["a"], ["b"]]
+    assert all(len(i.keystrokes) == 1000 for i in segments)
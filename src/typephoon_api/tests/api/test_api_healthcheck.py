@@ -2,6 +2,7 @@ import pytest
 from httpx import AsyncClient
 
 from ...types.responses.base import SuccessResponse
+from ...types.responses.health_check import ReadyResponse
 from ..helper import *
 
 
@@ -13,4 +14,17 @@ async def test_api_healthcheck(client: AsyncClient):
 
     ret = await client.get("/healthcheck/ready")
     ret.raise_for_status()
-    assert ret.json() == SuccessResponse().model_dump()
+    data = ReadyResponse.model_validate(ret.json())
+    assert data.ok
+    assert not data.draining
+    assert set(data.dependencies) == {"db", "redis", "amqp"}
+    assert all(i.ok and i.latency_ms is not None for i in data.dependencies.values())
+
+
+@pytest.mark.asyncio
+async def test_api_healthcheck_memory_backends(memory_client: AsyncClient):
+    ret = await memory_client.get("/healthcheck/ready")
+    ret.raise_for_status()
+    data = ReadyResponse.model_validate(ret.json())
+    assert data.ok
+    assert data.dependencies == {}
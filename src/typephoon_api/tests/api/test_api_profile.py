@@ -274,3 +274,89 @@ async def test_api_profile_history(
     assert ret_data.data == sorted(
         games[10:20], key=lambda x: x.finished_at, reverse=True
     )
+
+
+@pytest.mark.asyncio
+async def test_api_profile_history_cursor(
+    client: AsyncClient,
+    setting: Setting,
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    # prepare data, pairs of games share the same 'finished_at'
+    user_id = "dummy-id"
+    username = "dummy-username"
+    games: list[GameResultWithGameType] = []
+    for i in range(25):
+        games.append(
+            GameResultWithGameType(
+                game_type=GameType.MULTI,
+                game_id=-1,
+                rank=1,
+                wpm_raw=(i + 2) * 10,
+                wpm=(i + 1) * 10,
+                accuracy=100 - i,
+                finished_at=NOW + timedelta(minutes=i // 2),
+            )
+        )
+
+    async with sessionmaker() as session:
+        user_repo = UserRepo(session)
+        game_result_repo = GameResultRepo(session)
+        game_repo = GameRepo(session)
+        await user_repo.register(id=user_id, name=username)
+        for game in games:
+            new_game = await game_repo.create(
+                game_type=game.game_type, status=GameStatus.FINISHED
+            )
+            game.game_id = new_game.id
+            await game_result_repo.create(
+                game_id=game.game_id,
+                user_id=user_id,
+                rank=1,
+                wpm_raw=game.wpm_raw,
+                wpm_correct=game.wpm,
+                accuracy=game.accuracy,
+                finished_at=game.finished_at,
+            )
+
+        await session.commit()
+
+    token_generator = TokenGenerator(setting)
+    token = token_generator.gen_access_token(
+        user_id=user_id, username=username, user_type=UserType.REGISTERED
+    )
+
+    # walk through all pages
+    pages: list[ProfileHistoryResponse] = []
+    cursor: str | None = None
+    while True:
+        params: dict = {"size": 10}
+        if cursor is not None:
+            params["cursor"] = cursor
+        ret = await client.get(
+            f"{API_PREFIX}/profile/history",
+            cookies={CookieNames.ACCESS_TOKEN: token},
+            params=params,
+        )
+        assert ret.status_code == 200
+        ret_data = ProfileHistoryResponse.model_validate(ret.json())
+        pages.append(ret_data)
+        cursor = ret_data.next_cursor
+        if cursor is None:
+            break
+
+    assert [len(i.data) for i in pages] == [10, 10, 5]
+    assert [i.has_prev_page for i in pages] == [False, True, True]
+    assert [i.has_next_page for i in pages] == [True, True, False]
+    assert all(i.total == len(games) for i in pages)
+    assert [j for i in pages for j in i.data] == sorted(
+        games, key=lambda x: (x.finished_at, x.game_id), reverse=True
+    )
+
+    # malformed cursor
+    ret = await client.get(
+        f"{API_PREFIX}/profile/history",
+        cookies={CookieNames.ACCESS_TOKEN: token},
+        params={"size": 10, "cursor": "not-a-cursor"},
+    )
+    assert ret.status_code == 400
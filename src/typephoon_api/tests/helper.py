@@ -10,6 +10,7 @@ from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from ..lib.server_setup import create_server
+from ..types.enums import BackendType
 from ..types.setting import Setting
 
 API_PREFIX = "/api/v1"
@@ -24,6 +25,17 @@ def setting() -> Setting:
     return setting
 
 
+@pytest.fixture
+def memory_setting(setting: Setting) -> Setting:
+    """
+    every backend runs in process, no external service is needed
+    """
+    setting.db.backend = BackendType.MEMORY
+    setting.redis.backend = BackendType.MEMORY
+    setting.amqp.backend = BackendType.MEMORY
+    return setting
+
+
 @pytest.fixture
 def db_migration(setting: Setting):
     config = Config()
@@ -74,3 +86,14 @@ async def client(db_migration, setting):
         base_url = f"http://localhost:{setting.server.port}"
         async with AsyncClient(transport=transport, base_url=base_url) as client:
             yield client
+
+
+@pytest_asyncio.fixture
+async def memory_client(memory_setting: Setting):
+    app = create_server(memory_setting)
+
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        base_url = f"http://localhost:{memory_setting.server.port}"
+        async with AsyncClient(transport=transport, base_url=base_url) as client:
+            yield client
@@ -1,8 +1,11 @@
-from unittest.mock import AsyncMock
+import asyncio
+from asyncio import Future
+from unittest.mock import AsyncMock, MagicMock
 
 from aio_pika import Message
 from pamqp.commands import Basic
 
+from ...lib.background_tasks.base import BGManager
 from ...lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
 from ...types.amqp import KeystrokeHeader, KeystrokeMsg
 from ..helper import *
@@ -30,7 +33,48 @@ async def test_game_bg_send(setting: Setting):
     await bg._send(msg)
 
     assert ws.send_text.called
-    assert ws.send_text.call_args.args == (msg.model_dump_json(),)
+    assert ws.send_text.call_args.args == (msg.slim_dump_json(),)
+
+    await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_game_bg_send_skip_own(setting: Setting):
+    ws = AsyncMock()
+    user_id = "123"
+    exchange = AsyncMock()
+    game_id = 123
+    bg = GameBG(
+        ws=ws, user_id=user_id, exchange=exchange, setting=setting, game_id=game_id
+    )
+    await bg.start()
+
+    # own keystrokes are skipped
+    await bg._send(
+        GameBGMsg(
+            event=GameBGMsgEvent.KEY_STOKE,
+            user_id=user_id,
+            word_index=20,
+            char_index=4,
+            game_id=game_id,
+        )
+    )
+    assert not ws.send_text.called
+
+    # own results are not
+    msg = GameBGMsg(
+        event=GameBGMsgEvent.RESULT_UPDATE,
+        user_id=user_id,
+        rank=1,
+        wpm=100,
+        wpm_raw=120,
+        acc=95,
+        finished=NOW.isoformat(),
+        version=1,
+        game_id=game_id,
+    )
+    await bg._send(msg)
+    assert ws.send_text.call_args.args == (msg.slim_dump_json(),)
 
     await bg.stop()
 
@@ -69,7 +113,57 @@ async def test_game_bg_recv(setting: Setting):
 
     assert exchange.publish.called
     amqp_msg: Message = exchange.publish.call_args.kwargs["message"]
-    assert amqp_msg.body == answer.model_dump_json().encode()
+    published = KeystrokeMsg.model_validate_json(amqp_msg.body)
+    assert published.sent_at is not None
+    assert published.model_copy(update={"sent_at": None}) == answer
     assert KeystrokeHeader.model_validate(amqp_msg.headers).source == server_name
 
     await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_game_bg_recv_local(setting: Setting):
+    game_id = 123
+    exchange = AsyncMock()
+    exchange.publish = AsyncMock(return_value=Basic.Ack())
+    bg_manager = BGManager[GameBGMsg, GameBG]()
+
+    bgs: list[GameBG] = []
+    sockets: list[AsyncMock] = []
+    for user_id in ("1", "2"):
+        ws = AsyncMock()
+        ws.receive_text = MagicMock(return_value=Future())
+        sockets.append(ws)
+        bg = GameBG(
+            ws=ws,
+            user_id=user_id,
+            exchange=exchange,
+            setting=setting,
+            game_id=game_id,
+            local_pool=bg_manager,
+            player_count=2,
+        )
+        bgs.append(bg)
+
+    msg = GameBGMsg(
+        event=GameBGMsgEvent.KEY_STOKE, word_index=1, char_index=2, game_id=game_id
+    )
+
+    # the other player is not here yet, keystrokes go through the broker
+    await bg_manager.add(game_id=game_id, bg=bgs[0])
+    await bgs[0]._recv(msg)
+    assert exchange.publish.call_count == 1
+
+    # every player is on this node
+    await bg_manager.add(game_id=game_id, bg=bgs[1])
+    await bgs[0]._recv(msg)
+    assert exchange.publish.call_count == 1
+    await asyncio.sleep(0.01)
+    raw = sockets[1].send_text.call_args.args[0]
+    sent = GameBGMsg.model_validate_json(raw)
+    assert sent.event == GameBGMsgEvent.KEY_STOKE
+    assert sent.user_id == "1"
+    # the send time is for the replay only
+    assert "sent_at" not in raw
+
+    await bg_manager.cleanup()
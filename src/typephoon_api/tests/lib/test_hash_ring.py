@@ -0,0 +1,42 @@
+from collections import Counter
+
+from ...lib.hash_ring import HashRing
+from ..helper import *
+
+KEYS = range(10000)
+
+
+def test_hash_ring_empty():
+    assert HashRing().get(1) is None
+
+
+def test_hash_ring_spread():
+    ring = HashRing(nodes=["a", "b", "c", "d"])
+    counts = Counter(ring.get(key) for key in KEYS)
+    assert counts.keys() == {"a", "b", "c", "d"}
+    # 64 points per node keep every node within a rough share
+    for count in counts.values():
+        assert len(KEYS) / 4 * 0.5 < count < len(KEYS) / 4 * 1.5
+
+
+def test_hash_ring_moves_few_keys():
+    ring = HashRing(nodes=["a", "b", "c", "d"])
+    before = {key: ring.get(key) for key in KEYS}
+
+    # keys only move to the new node
+    ring.add("e")
+    moved = [key for key in KEYS if ring.get(key) != before[key]]
+    assert all(ring.get(key) == "e" for key in moved)
+    assert len(moved) < len(KEYS) / 5 * 1.5
+
+    # and come back once it leaves
+    ring.remove("e")
+    assert {key: ring.get(key) for key in KEYS} == before
+
+    # keys of a leaving node are spread, the others stay
+    ring.remove("a")
+    for key in KEYS:
+        if before[key] != "a":
+            assert ring.get(key) == before[key]
+        else:
+            assert ring.get(key) in {"b", "c", "d"}
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from ...lib.health_monitor import HealthMonitor
+from ...types.setting import HealthCheckSetting, Setting
+
+
+@pytest.mark.asyncio
+async def test_health_monitor():
+    setting = Setting(health_check=HealthCheckSetting(interval=0.01, timeout=0.05))
+    calls = {"ok": 0, "failed": 0, "slow": 0}
+
+    async def ok():
+        calls["ok"] += 1
+
+    async def failed():
+        calls["failed"] += 1
+        raise ConnectionError("connection refused")
+
+    async def slow():
+        calls["slow"] += 1
+        await asyncio.sleep(1)
+
+    monitor = HealthMonitor(setting, checks={"ok": ok, "failed": failed})
+    assert not monitor.ready
+
+    await monitor.start()
+    assert not monitor.ready
+    assert monitor.statuses["ok"].ok
+    assert monitor.statuses["ok"].latency_ms is not None
+    assert monitor.statuses["failed"].error == "connection refused"
+
+    # checks keep running in background, reading status doesn't trigger them
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    assert calls["ok"] > 1
+    assert calls["ok"] == calls["failed"]
+
+    monitor = HealthMonitor(setting, checks={"ok": ok, "slow": slow})
+    await monitor.check_all()
+    assert not monitor.ready
+    assert monitor.statuses["slow"].error == "TimeoutError"
+
+
+@pytest.mark.asyncio
+async def test_health_monitor_stale():
+    setting = Setting(health_check=HealthCheckSetting(stale_after=0.01))
+
+    async def ok():
+        pass
+
+    monitor = HealthMonitor(setting, checks={"ok": ok})
+    await monitor.check_all()
+    assert monitor.ready
+
+    await asyncio.sleep(0.02)
+    assert not monitor.ready
@@ -1,8 +1,12 @@
+import asyncio
 from unittest.mock import AsyncMock
 
 import pytest
 
+from ...consumers.lobby_notify import LobbyNotifyConsumer
+from ...lib.background_tasks.base import BGManager
 from ...lib.background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from ...types.amqp import LobbyNotifyMsg
 from ..helper import *
 
 
@@ -28,3 +32,35 @@ async def test_lobby_background():
     assert ws.close.called
 
     await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_lobby_notify_countdown():
+    ws = AsyncMock()
+    ws.send_text = AsyncMock()
+
+    game_id = 123
+    bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+    await bg_manager.add(
+        game_id=game_id, bg=LobbyBG(ws=ws, user_id="123", game_id=game_id)
+    )
+    consumer = LobbyNotifyConsumer(
+        setting=Setting(), amqp_conn=AsyncMock(), bg_manager=bg_manager
+    )
+
+    # a changed start time reaches the players already connected
+    start_at = datetime.now(UTC).isoformat()
+    await consumer._process(
+        LobbyNotifyMsg(
+            notify_type=LobbyBGMsgEvent.COUNTDOWN, game_id=game_id, start_at=start_at
+        )
+    )
+    await asyncio.sleep(0.1)
+
+    assert ws.send_text.called
+    msg = LobbyBGMsg.model_validate_json(ws.send_text.call_args.args[0])
+    assert msg.event == LobbyBGMsgEvent.COUNTDOWN
+    assert msg.start_at == start_at
+    assert msg.server_time
+
+    await bg_manager.cleanup()
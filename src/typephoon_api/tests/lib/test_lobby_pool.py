@@ -0,0 +1,117 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ...consumers.lobby_countdown import LobbyCountdownConsumer
+from ...lib.lobby_pool import LobbyPool
+from ...orm.game import GameStatus
+from ...repositories.game import GameRepo
+from ...repositories.memory import MemorySessionmaker
+from ...types.setting import LobbyPoolSetting, Setting
+
+
+@pytest.mark.asyncio
+async def test_lobby_pool():
+    setting = Setting(lobby_pool=LobbyPoolSetting(size=3, refill_interval=10))
+    sessionmaker = MemorySessionmaker()
+    pool = LobbyPool(setting, sessionmaker)  # type: ignore
+
+    await pool.start()
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        assert await repo.count_pool() == 3
+
+        game = await pool.claim(repo)
+        assert game is not None
+        assert game.status == GameStatus.LOBBY
+
+    # a claim refills without waiting for the interval
+    await asyncio.sleep(0.01)
+    async with sessionmaker() as session:
+        assert await GameRepo(session=session).count_pool() == 3
+
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_lobby_pool_empty():
+    setting = Setting(lobby_pool=LobbyPoolSetting(size=0))
+    sessionmaker = MemorySessionmaker()
+    pool = LobbyPool(setting, sessionmaker)  # type: ignore
+
+    await pool.refill()
+    async with sessionmaker() as session:
+        assert await pool.claim(GameRepo(session=session)) is None
+
+
+@pytest.mark.asyncio
+async def test_lobby_pool_arm():
+    setting = Setting(
+        lobby_pool=LobbyPoolSetting(size=3, refill_interval=0.01, arm_retries=2)
+    )
+    sessionmaker = MemorySessionmaker()
+    pool = LobbyPool(setting, sessionmaker)  # type: ignore
+    await pool.refill()
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        games = [await pool.claim(repo) for _ in range(3)]
+        await session.commit()
+    assert all(games)
+
+    # only the failed step is retried
+    ok = AsyncMock()
+    flaky = AsyncMock(side_effect=[Exception("nack"), None])
+    pool.arm(game_id=games[0].id, steps=[ok, flaky])  # type: ignore
+    assert pool.arming_count == 1
+    await asyncio.sleep(0.05)
+    assert ok.await_count == 1
+    assert flaky.await_count == 2
+    assert pool.arming_count == 0
+
+    # given up after the retries
+    failing = AsyncMock(side_effect=Exception("nack"))
+    pool.arm(game_id=games[1].id, steps=[failing])  # type: ignore
+    await asyncio.sleep(0.1)
+    assert failing.await_count == 3
+    assert pool.arming_count == 0
+
+    # the game left the lobby meanwhile
+    failing = AsyncMock(side_effect=Exception("nack"))
+    pool.arm(game_id=games[2].id, steps=[failing])  # type: ignore
+    async with sessionmaker() as session:
+        await GameRepo(session=session).start_game(games[2].id)  # type: ignore
+        await session.commit()
+    await asyncio.sleep(0.05)
+    assert failing.await_count == 1
+    assert pool.arming_count == 0
+
+    # given up on stop
+    pool.arm(game_id=games[0].id, steps=[failing])  # type: ignore
+    await pool.stop()
+    assert pool.arming_count == 0
+
+
+@pytest.mark.asyncio
+async def test_lobby_pool_stale_timer():
+    setting = Setting(lobby_pool=LobbyPoolSetting(size=1))
+    sessionmaker = MemorySessionmaker()
+    pool = LobbyPool(setting, sessionmaker)  # type: ignore
+    consumer = LobbyCountdownConsumer(
+        setting=setting,
+        amqp_conn=AsyncMock(),
+        sessionmaker=sessionmaker,  # type: ignore
+        redis_conn=AsyncMock(),
+        word_generator=MagicMock(),
+    )
+
+    await pool.refill()
+    async with sessionmaker() as session:
+        game = await pool.claim(GameRepo(session=session))
+        assert game is not None
+
+    # armed for an earlier claim, before the game went back to the pool
+    stale = (game.created_at - timedelta(seconds=1)).isoformat()
+    assert not await consumer._set_game_status(game.id, stale)
+    assert await consumer._set_game_status(game.id, game.created_at.isoformat())
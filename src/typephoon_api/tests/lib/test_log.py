@@ -0,0 +1,30 @@
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from ...lib.log import Lazy
+
+
+def test_lazy_level_off(caplog: pytest.LogCaptureFixture):
+    logger = logging.getLogger("test_lazy_level_off")
+    caplog.set_level(logging.INFO, logger=logger.name)
+    func = MagicMock(return_value="expensive")
+
+    logger.debug("value: %s", Lazy(func, 1, 2))
+
+    assert not func.called
+    assert not caplog.records
+
+
+def test_lazy_level_on(caplog: pytest.LogCaptureFixture):
+    logger = logging.getLogger("test_lazy_level_on")
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+    func = MagicMock(return_value="expensive")
+
+    logger.debug("value: %s", Lazy(func, 1, 2))
+
+    # computed by each handler formatting the record
+    func.assert_called_with(1, 2)
+    assert caplog.records[0].getMessage() == "value: expensive"
+    assert repr(Lazy(lambda: 3)) == str(Lazy(lambda: 3)) == "3"
@@ -0,0 +1,100 @@
+import asyncio
+
+from aio_pika import ExchangeType, Message
+from pamqp.commands import Basic
+
+from ...lib.amqp_manager import AMQPManager
+from ...lib.memory.amqp import MemoryConnection, MemoryIncomingMessage
+from ..helper import *
+
+
+class Collector:
+    def __init__(self, ack: bool = True) -> None:
+        self.bodies: list[bytes] = []
+        self.messages: list[MemoryIncomingMessage] = []
+        self.received = asyncio.Event()
+        self._ack = ack
+
+    async def __call__(self, msg: MemoryIncomingMessage):
+        self.bodies.append(msg.body)
+        self.messages.append(msg)
+        self.received.set()
+        if self._ack:
+            await msg.ack()
+
+
+@pytest.mark.asyncio
+async def test_memory_amqp_routing():
+    conn = MemoryConnection()
+    channel = await conn.channel()
+
+    fanout = await channel.declare_exchange("fanout", type=ExchangeType.FANOUT)
+    direct = await channel.declare_exchange("direct", type=ExchangeType.DIRECT)
+    collectors: dict[str, Collector] = {}
+    for name in ("a", "b", "c"):
+        queue = await channel.declare_queue(name)
+        collectors[name] = Collector()
+        await queue.consume(collectors[name])
+    await (await channel.get_queue("a")).bind(fanout)
+    await (await channel.get_queue("b")).bind(fanout)
+    await (await channel.get_queue("c")).bind(direct, routing_key="key")
+
+    assert isinstance(await fanout.publish(Message(b"1"), routing_key=""), Basic.Ack)
+    await direct.publish(Message(b"2"), routing_key="key")
+    await direct.publish(Message(b"3"), routing_key="other")
+    await channel.default_exchange.publish(Message(b"4"), routing_key="a")
+    await asyncio.sleep(0)
+
+    assert collectors["a"].bodies == [b"1", b"4"]
+    assert collectors["b"].bodies == [b"1"]
+    assert collectors["c"].bodies == [b"2"]
+
+    await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_amqp_prefetch_and_requeue():
+    conn = MemoryConnection()
+    channel = await conn.channel()
+    await channel.set_qos(prefetch_count=1)
+    queue = await channel.declare_queue("q")
+    collector = Collector(ack=False)
+    await queue.consume(collector)
+
+    await channel.default_exchange.publish(Message(b"1"), routing_key="q")
+    await channel.default_exchange.publish(Message(b"2"), routing_key="q")
+    await asyncio.sleep(0)
+    assert collector.bodies == [b"1"]
+
+    # requeued behind the waiting message
+    await collector.messages[0].nack()
+    await asyncio.sleep(0)
+    assert collector.bodies == [b"1", b"2"]
+
+    await collector.messages[1].ack()
+    await asyncio.sleep(0)
+    assert collector.bodies == [b"1", b"2", b"1"]
+    assert collector.messages[2].redelivered
+
+    await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_amqp_wait_queues(setting: Setting):
+    setting.game.lobby_countdown = 0
+    conn = MemoryConnection()
+    names = await AMQPManager(setting=setting, amqp_conn=conn).setup()  # type: ignore
+
+    channel = await conn.channel()
+    queue = await channel.get_queue(setting.amqp.lobby_countdown_queue)
+    collector = Collector()
+    await queue.consume(collector)
+
+    # dead-lettered to the countdown exchange once the ttl passes
+    await channel.default_exchange.publish(
+        Message(b"countdown"), routing_key=names.lobby_multi_wait
+    )
+    await asyncio.wait_for(collector.received.wait(), timeout=1)
+    assert collector.bodies == [b"countdown"]
+
+    await conn.close()
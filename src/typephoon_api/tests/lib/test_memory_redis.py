@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+import time_machine
+
+from ...lib.memory.redis import MemoryRedis
+from ...repositories.game_cache import GameCacheRepo, GameCacheType
+from ...repositories.lobby_cache import LobbyCacheRepo
+from ...types.common import GameUserInfo, LobbyUserInfo
+from ..helper import *
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_strings():
+    redis_conn = MemoryRedis()
+
+    assert await redis_conn.set("a", "1") is True
+    assert await redis_conn.set("a", "2", nx=True) is None
+    assert await redis_conn.get("a") == b"1"
+    assert await redis_conn.incr("a") == 2
+    assert await redis_conn.getdel("a") == b"2"
+    assert await redis_conn.get("a") is None
+
+    await redis_conn.set("b", 3)
+    assert await redis_conn.exists("a", "b") == 1
+    assert await redis_conn.delete("a", "b") == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_expire():
+    redis_conn = MemoryRedis()
+
+    with time_machine.travel(NOW, tick=False) as traveller:
+        await redis_conn.set("a", "1", ex=10)
+        await redis_conn.hset("h", "k", "v")
+        await redis_conn.expire("h", 10)
+
+        traveller.shift(9)
+        assert await redis_conn.get("a") == b"1"
+        assert await redis_conn.hexists("h", "k")
+
+        traveller.shift(2)
+        assert await redis_conn.get("a") is None
+        assert await redis_conn.hgetall("h") == {}
+        assert await redis_conn.exists("a", "h") == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_hash_and_pipeline():
+    redis_conn = MemoryRedis()
+
+    async with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.hset("h", mapping={"a": "1", "b": "2"})
+        pipe.hdel("h", "a")
+        pipe.hexists("h", "b")
+        ret = await pipe.execute()
+
+    assert ret == [2, 1, True]
+    assert await redis_conn.hgetall("h") == {b"b": b"2"}
+    assert await redis_conn.hmget("h", ["a", "b"]) == [None, b"2"]
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_update_player_script(setting: Setting):
+    repo = GameCacheRepo(redis_conn=MemoryRedis(), setting=setting)  # type: ignore
+    game_id = 1
+
+    assert await repo.get_players_with_version(game_id) is None
+
+    first = GameUserInfo(id="1", name="one")
+    second = GameUserInfo(id="2", name="two", rank=1, wpm=100, wpm_raw=110, acc=98)
+    assert await repo.update_player_cache(first, game_id) == 1
+    assert await repo.update_player_cache(second, game_id) == 2
+
+    ret = await repo.get_players_with_version(game_id)
+    assert ret is not None
+    assert ret.version == 2
+    assert ret.players == {"1": first, "2": second}
+
+    ret = await repo.get_players_with_version(game_id, since=1)
+    assert ret is not None
+    assert ret.players == {"2": second}
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_populate_script(setting: Setting):
+    redis_conn = MemoryRedis()
+    lobby_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    game_id = 1
+
+    # nothing to populate from
+    await repo.populate_with_lobby_cache(game_id=game_id, lobby_cache_repo=lobby_repo)
+    assert await repo.get_players(game_id) is None
+    assert await repo.get_start_time(game_id) is None
+
+    players = [LobbyUserInfo(id=f"{i}", name=f"player-{i}") for i in range(3)]
+    for player in players:
+        await lobby_repo.add_player(game_id=game_id, user_info=player)
+    await lobby_repo.set_start_time(game_id=game_id, start_time=NOW)
+
+    await repo.populate_with_lobby_cache(
+        game_id=game_id, lobby_cache_repo=lobby_repo, auto_clean=True
+    )
+    assert await repo.get_players(game_id) == {
+        i.id: GameUserInfo(id=i.id, name=i.name) for i in players
+    }
+    assert await repo.get_start_time(game_id) == NOW + timedelta(
+        seconds=setting.game.start_countdown
+    )
+    assert await redis_conn.exists(*lobby_repo.cache_keys(game_id)) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_populate_script_encoding(setting: Setting):
+    redis_conn = MemoryRedis()
+    lobby_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    game_id = 1
+    player = LobbyUserInfo(id="1", name="玩家/1")
+    await lobby_repo.add_player(game_id=game_id, user_info=player)
+
+    # same bytes as 'update_player_cache' writes for a new player
+    await repo.populate_with_lobby_cache(game_id=game_id, lobby_cache_repo=lobby_repo)
+    key = repo._gen_cache_key(game_id=game_id, cache_type=GameCacheType.PLAYERS)
+    assert await redis_conn.hgetall(key) == {b"1": '{"n":"玩家/1"}'.encode()}
+
+
+@pytest.mark.asyncio
+async def test_memory_redis_start_time_before_rename(setting: Setting):
+    redis_conn = MemoryRedis()
+    repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    game_id = 1
+
+    # populated before the 'lobby-end' key, the start time itself
+    await redis_conn.set(
+        repo._gen_cache_key(game_id=game_id, cache_type=GameCacheType.COUNTDOWN),
+        NOW.isoformat(),
+    )
+    assert await repo.get_start_time(game_id) == NOW
+
+    await repo.clear_cache(game_id)
+    assert await repo.get_start_time(game_id) is None
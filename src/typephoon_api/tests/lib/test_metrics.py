@@ -0,0 +1,80 @@
+import pytest
+
+from ...lib.metrics import Counter, Gauge, Histogram, Registry, timed_repository
+
+
+def test_metrics_render():
+    registry = Registry()
+    counter = Counter("test_total", "counter", ["consumer"], registry=registry)
+    gauge = Gauge("test_gauge", "gauge", registry=registry)
+    histogram = Histogram(
+        "test_seconds", "histogram", ["phase"], buckets=[0.1, 1], registry=registry
+    )
+
+    counter.labels("Keystroke").inc()
+    counter.labels("Keystroke").inc(2)
+    gauge.labels().set_function(lambda: 5)
+    histogram.labels("token").observe(0.05)
+    histogram.labels("token").observe(0.1)
+    histogram.labels("token").observe(3)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_total counter",
+        "# TYPE test_total counter",
+        'test_total{consumer="Keystroke"} 3.0',
+        "# HELP test_gauge gauge",
+        "# TYPE test_gauge gauge",
+        "test_gauge 5.0",
+        "# HELP test_seconds histogram",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{phase="token",le="0.1"} 2',
+        'test_seconds_bucket{phase="token",le="1.0"} 2',
+        'test_seconds_bucket{phase="token",le="+Inf"} 3',
+        'test_seconds_sum{phase="token"} 3.15',
+        'test_seconds_count{phase="token"} 3',
+    ]
+
+
+def test_metrics_render_const_labels():
+    registry = Registry()
+    registry.set_const_labels(worker="node-w1")
+    counter = Counter("test_total", "counter", registry=registry)
+    histogram = Histogram(
+        "test_seconds", "histogram", ["phase"], buckets=[1], registry=registry
+    )
+
+    counter.inc()
+    histogram.labels("register").observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_total counter",
+        "# TYPE test_total counter",
+        'test_total{worker="node-w1"} 1.0',
+        "# HELP test_seconds histogram",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{worker="node-w1",phase="register",le="1.0"} 1',
+        'test_seconds_bucket{worker="node-w1",phase="register",le="+Inf"} 1',
+        'test_seconds_sum{worker="node-w1",phase="register"} 0.5',
+        'test_seconds_count{worker="node-w1",phase="register"} 1',
+    ]
+
+
+def test_metrics_labels_mismatch():
+    counter = Counter("test_total", "counter", ["consumer"], registry=None)
+    with pytest.raises(ValueError):
+        counter.labels()
+
+
+@pytest.mark.asyncio
+async def test_metrics_timed_repository():
+    @timed_repository
+    class DummyRepo:
+        async def get(self, value: int) -> int:
+            return value
+
+        async def _private(self):
+            pass
+
+    assert await DummyRepo().get(1) == 1
+    assert DummyRepo.get.__wrapped__
+    assert not hasattr(DummyRepo._private, "__wrapped__")
@@ -0,0 +1,189 @@
+import asyncio
+from functools import partial
+from unittest.mock import AsyncMock
+
+import time_machine
+
+from ...lib.background_tasks.base import BGManager
+from ...lib.background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from ...lib.memory.redis import MemoryRedis
+from ...lib.node_affinity import NodeAffinity
+from ...lib.server import TypephoonServer
+from ...repositories.lobby_cache import LobbyCacheRepo
+from ...repositories.node_registry import NodeRegistryRepo
+from ..helper import *
+
+
+def node_setting(setting: Setting, name: str) -> Setting:
+    setting = setting.model_copy(deep=True)
+    setting.server_name = name
+    setting.affinity.enabled = True
+    setting.affinity.url = f"ws://{name}:8080"
+    return setting
+
+
+@pytest.mark.asyncio
+async def test_node_affinity_owner(setting: Setting):
+    redis_conn = MemoryRedis()
+    changes: list[str] = []
+
+    async def on_change():
+        changes.append("a")
+
+    node_a = NodeAffinity(
+        setting=node_setting(setting, "a"),
+        redis_conn=redis_conn,  # type: ignore
+        on_change=on_change,
+    )
+    node_b = NodeAffinity(
+        setting=node_setting(setting, "b"),
+        redis_conn=redis_conn,  # type: ignore
+    )
+
+    # alone on the ring
+    await node_a.refresh()
+    assert changes == ["a"]
+    assert all(node_a.remote_owner(game_id) is None for game_id in range(100))
+
+    await node_b.refresh()
+    await node_a.refresh()
+    assert changes == ["a", "a"]
+    assert node_a.node_count == node_b.node_count == 2
+
+    # both nodes agree on the owner
+    owners = {node_a.owner(game_id).name for game_id in range(100)}
+    assert owners == {"a", "b"}
+    for game_id in range(100):
+        assert node_a.owner(game_id) == node_b.owner(game_id)
+        remote = node_a.remote_owner(game_id)
+        if remote is not None:
+            assert remote.name == "b"
+            assert remote.url == "ws://b:8080"
+
+    # unchanged ring
+    await node_a.refresh()
+    assert changes == ["a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_node_affinity_leave(setting: Setting):
+    redis_conn = MemoryRedis()
+    node_a = NodeAffinity(
+        setting=node_setting(setting, "a"), redis_conn=redis_conn  # type: ignore
+    )
+    node_b = NodeAffinity(
+        setting=node_setting(setting, "b"), redis_conn=redis_conn  # type: ignore
+    )
+    await node_a.start()
+    await node_b.start()
+    await node_a.refresh()
+    assert node_a.node_count == 2
+
+    # graceful leave
+    await node_b.stop()
+    await node_a.refresh()
+    assert node_a.node_count == 1
+    assert all(node_a.remote_owner(game_id) is None for game_id in range(100))
+
+    await node_a.stop()
+    assert await NodeRegistryRepo(redis_conn, setting).get_live() == []  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_node_affinity_missed_heartbeats(setting: Setting):
+    redis_conn = MemoryRedis()
+    node_a = NodeAffinity(
+        setting=node_setting(setting, "a"), redis_conn=redis_conn  # type: ignore
+    )
+    node_b = NodeAffinity(
+        setting=node_setting(setting, "b"), redis_conn=redis_conn  # type: ignore
+    )
+
+    with time_machine.travel(NOW, tick=False) as traveller:
+        await node_b.refresh()
+        await node_a.refresh()
+        assert node_a.node_count == 2
+
+        # 'b' stopped sending heartbeats
+        traveller.shift(setting.affinity.node_ttl + 1)
+        await node_a.refresh()
+        assert node_a.node_count == 1
+
+
+@pytest.mark.asyncio
+async def test_node_affinity_release_later(setting: Setting):
+    setting = node_setting(setting, "a")
+    setting.affinity.redirect_timeout = 0.05
+    node = NodeAffinity(setting=setting, redis_conn=MemoryRedis())  # type: ignore
+    await node.start()
+    released: list[str] = []
+
+    async def release(user_id: str):
+        released.append(user_id)
+
+    node.release_later(game_id=1, user_id="a", release=partial(release, "a"))
+    assert node.releasing_count == 1
+    await asyncio.sleep(0.1)
+    assert released == ["a"]
+    assert node.releasing_count == 0
+
+    # pending releases don't hold the shutdown
+    node.release_later(game_id=1, user_id="b", release=partial(release, "b"))
+    await node.stop()
+    assert node.releasing_count == 0
+    assert released == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_server_rebalance_lobbies(setting: Setting):
+    redis_conn = MemoryRedis()
+    setting = node_setting(setting, "a")
+    node_a = NodeAffinity(setting=setting, redis_conn=redis_conn)  # type: ignore
+    await node_a.refresh()
+
+    server = TypephoonServer(setting)
+    server._redis_conn = redis_conn  # type: ignore
+    server._node_affinity = node_a
+    server._lobby_bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+
+    # one lobby per node once 'b' joins
+    websockets: dict[int, AsyncMock] = {}
+    for game_id in range(1, 3):
+        websockets[game_id] = AsyncMock()
+        await server._lobby_bg_manager.add(
+            game_id=game_id,
+            bg=LobbyBG(
+                ws=websockets[game_id], user_id=f"user-{game_id}", game_id=game_id
+            ),
+        )
+
+    # alone on the ring, nothing moves
+    await server._rebalance_lobbies()
+    assert server._lobby_bg_manager.game_ids() == [1, 2]
+
+    node_b = NodeAffinity(
+        setting=node_setting(setting, "b"), redis_conn=redis_conn  # type: ignore
+    )
+    await node_b.refresh()
+    await node_a.refresh()
+    moved = [i for i in websockets if node_a.remote_owner(i) is not None]
+    stays = [i for i in websockets if node_a.remote_owner(i) is None]
+    if not moved or not stays:
+        pytest.skip("both lobbies hashed to the same node")
+
+    await server._rebalance_lobbies()
+    assert server._lobby_bg_manager.game_ids() == stays
+
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    for game_id in moved:
+        msg = LobbyBGMsg.model_validate_json(
+            websockets[game_id].send_text.call_args.args[0]
+        )
+        assert msg.event == LobbyBGMsgEvent.REDIRECT
+        assert msg.node == "ws://b:8080"
+        # the seat is kept for the reconnect on 'b'
+        assert await lobby_cache_repo.claim_redirect(game_id, f"user-{game_id}")
+    for game_id in stays:
+        assert not await lobby_cache_repo.claim_redirect(game_id, f"user-{game_id}")
+
+    await server._lobby_bg_manager.cleanup()
@@ -0,0 +1,78 @@
+from asyncio import Future
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ...lib.background_tasks.game import (
+    GameBG,
+    GameBGManager,
+    GameBGMsg,
+    GameBGMsgEvent,
+)
+from ...lib.memory.redis import MemoryRedis
+from ...lib.positions import PositionTable
+from ...repositories.game_cache import GameCacheRepo
+from ...types.setting import Setting
+
+
+def keystroke(game_id: int, user_id: str, word_index: int, char_index: int):
+    return GameBGMsg(
+        event=GameBGMsgEvent.KEY_STOKE,
+        game_id=game_id,
+        user_id=user_id,
+        word_index=word_index,
+        char_index=char_index,
+    )
+
+
+@pytest.mark.asyncio
+async def test_position_table():
+    setting = Setting()
+    game_id = 123
+    game_cache_repo = GameCacheRepo(redis_conn=MemoryRedis(), setting=setting)  # type: ignore
+    positions = PositionTable(setting=setting, game_cache_repo=game_cache_repo)
+    bg_manager = GameBGManager(positions=positions)
+
+    ws = AsyncMock()
+    ws.receive_text = MagicMock(return_value=Future())
+    bg = GameBG(
+        ws=ws, user_id="local", exchange=AsyncMock(), setting=setting, game_id=game_id
+    )
+    await bg_manager.add(game_id=game_id, bg=bg)
+
+    # games without connections here are not tracked
+    await bg_manager.broadcast(game_id=456, msg=keystroke(456, "other", 1, 1))
+    assert positions.game_count == 0
+    assert await positions.snapshot(456) == {}
+
+    await bg_manager.broadcast(game_id=game_id, msg=keystroke(game_id, "local", 1, 2))
+    await bg_manager.broadcast(game_id=game_id, msg=keystroke(game_id, "remote", 3, 4))
+    await bg_manager.broadcast(game_id=game_id, msg=keystroke(game_id, "local", 2, 0))
+    assert await positions.snapshot(game_id) == {"local": (2, 0), "remote": (3, 4)}
+
+    # only the player connected here is mirrored
+    await positions.flush()
+    assert await game_cache_repo.get_positions(game_id) == {"local": (2, 0)}
+
+    # the game is forgotten with its last connection, the mirror is left
+    await bg.stop()
+    await bg_manager.remove_user(game_id=game_id, user_id="local")
+    assert positions.game_count == 0
+    assert await positions.snapshot(game_id) == {"local": (2, 0)}
+
+
+@pytest.mark.asyncio
+async def test_position_table_flush_on_stop():
+    setting = Setting()
+    game_id = 123
+    game_cache_repo = GameCacheRepo(redis_conn=MemoryRedis(), setting=setting)  # type: ignore
+    positions = PositionTable(setting=setting, game_cache_repo=game_cache_repo)
+
+    await positions.start()
+    positions.update(game_id, "player", word_index=5, char_index=1, mirror=True)
+    positions.forget(game_id)
+
+    # pending positions outlive the game
+    assert await positions.snapshot(game_id) == {"player": (5, 1)}
+    await positions.stop()
+    assert await game_cache_repo.get_positions(game_id) == {"player": (5, 1)}
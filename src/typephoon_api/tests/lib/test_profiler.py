@@ -0,0 +1,89 @@
+from pathlib import Path
+from time import perf_counter
+
+from ...lib.profiler import SamplingProfiler
+from ...types.setting import ProfilerSetting, Setting
+
+
+def busy_loop(seconds: float):
+    deadline = perf_counter() + seconds
+    while perf_counter() < deadline:
+        pass
+
+
+def idle_loop(seconds: float):
+    busy_loop(seconds)
+
+
+def test_profiler_collapsed_stacks(tmp_path: Path):
+    setting = Setting(
+        profiler=ProfilerSetting(interval=0.001, output_dir=str(tmp_path))
+    )
+    profiler = SamplingProfiler(setting)
+
+    assert profiler.start()
+    assert not profiler.start()
+    busy_loop(0.2)
+    output = profiler.stop()
+
+    assert not profiler.running
+    assert output is not None and output.parent == tmp_path
+    lines = output.read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert stack.split(";")[-1] == "test_profiler:busy_loop"
+
+
+def test_profiler_focus(tmp_path: Path):
+    setting = Setting(
+        profiler=ProfilerSetting(
+            interval=0.001, output_dir=str(tmp_path), focus=["idle_loop"]
+        )
+    )
+    profiler = SamplingProfiler(setting)
+
+    profiler.start()
+    busy_loop(0.1)
+    idle_loop(0.1)
+    output = profiler.stop()
+
+    assert output is not None
+    for line in output.read_text().splitlines():
+        assert "test_profiler:idle_loop" in line
+
+
+def test_profiler_duration(tmp_path: Path):
+    setting = Setting(
+        profiler=ProfilerSetting(interval=0.001, output_dir=str(tmp_path))
+    )
+    profiler = SamplingProfiler(setting)
+
+    profiler.start(duration=0.01)
+    thread = profiler._thread
+    assert thread is not None
+
+    # nothing asks it to stop, it ends on its own
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert not profiler._stop.is_set()
+    assert not profiler.running
+    assert profiler.last_output is not None
+
+
+def test_profiler_toggle(tmp_path: Path):
+    setting = Setting(
+        profiler=ProfilerSetting(interval=0.001, output_dir=str(tmp_path))
+    )
+    profiler = SamplingProfiler(setting)
+
+    profiler.toggle()
+    thread = profiler._thread
+    assert thread is not None and profiler.running
+    busy_loop(0.05)
+
+    # only asks the sampling thread to stop, which writes the output
+    profiler.toggle()
+    thread.join(timeout=30)
+    assert not profiler.running
+    assert profiler.last_output is not None
@@ -0,0 +1,143 @@
+import asyncio
+from asyncio import Future
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ...lib.background_tasks.game import (
+    GameBG,
+    GameBGManager,
+    GameBGMsg,
+    GameBGMsgEvent,
+)
+from ...lib.replay import (
+    ReplayLog,
+    ReplayRecorder,
+    decode_replay,
+    decode_segment,
+    frame_segment,
+    read_varint,
+    write_varint,
+)
+from ...repositories.game_replay import GameReplayRepo
+from ...repositories.memory import MemorySessionmaker
+from ...types.setting import ReplaySetting, Setting
+
+
+def test_varint():
+    for value in (0, 1, 127, 128, 300, 16383, 16384, 2**40 + 5):
+        buf = bytearray()
+        write_varint(buf, value)
+        assert read_varint(buf, 0) == (value, len(buf))
+
+    buf = bytearray()
+    write_varint(buf, 127)
+    write_varint(buf, 128)
+    assert bytes(buf) == b"\x7f\x80\x01"
+
+
+def test_replay_log():
+    log = ReplayLog(started_at=1000)
+    log.append("a", word_index=0, char_index=1, at=1000.120)
+    log.append("b", word_index=0, char_index=1, at=1000.250)
+    log.append("a", word_index=300, char_index=2, at=1000.300)
+    # clock going back
+    log.append("b", word_index=0, char_index=2, at=1000.200)
+    assert log.count == 4
+
+    data = log.encode()
+    segment = decode_segment(data)
+    assert segment.started_at == 1_000_000
+    assert segment.players == ["a", "b"]
+    assert [
+        (i.at, i.user_id, i.word_index, i.char_index) for i in segment.keystrokes
+    ] == [
+        (1_000_120, "a", 0, 1),
+        (1_000_250, "b", 0, 1),
+        (1_000_300, "a", 300, 2),
+        (1_000_300, "b", 0, 2),
+    ]
+
+    # segments back to back
+    segments = list(decode_replay(frame_segment(data) + frame_segment(data)))
+    assert len(segments) == 2
+    assert segments[1] == segment
+
+
+@pytest.mark.asyncio
+async def test_replay_recorder():
+    setting = Setting(
+        replay=ReplaySetting(enabled=True, max_keystrokes=3, close_delay=0.05)
+    )
+    sessionmaker = MemorySessionmaker()
+    recorder = ReplayRecorder(setting=setting, sessionmaker=sessionmaker)  # type: ignore
+    bg_manager = GameBGManager(recorder=recorder)
+    await recorder.start()
+
+    game_id = 123
+
+    def connect() -> GameBG:
+        ws = AsyncMock()
+        ws.receive_text = MagicMock(return_value=Future())
+        return GameBG(
+            ws=ws,
+            user_id="local",
+            exchange=AsyncMock(),
+            setting=setting,
+            game_id=game_id,
+        )
+
+    async def disconnect(bg: GameBG):
+        await bg.stop()
+        await bg_manager.remove_user(game_id=game_id, user_id="local")
+
+    async def keystroke(user_id: str, char_index: int):
+        await bg_manager.broadcast(
+            game_id=game_id,
+            msg=GameBGMsg(
+                event=GameBGMsgEvent.KEY_STOKE,
+                game_id=game_id,
+                user_id=user_id,
+                word_index=0,
+                char_index=char_index,
+                sent_at=1_000 + char_index / 10,
+            ),
+        )
+
+    bg = connect()
+    await bg_manager.add(game_id=game_id, bg=bg)
+
+    # only keystrokes of players connected here are recorded, timed by when
+    # they were sent
+    await keystroke("local", 1)
+    await keystroke("remote", 1)
+    assert recorder.game_count == 1
+
+    # a reconnect within the delay continues the same log
+    await disconnect(bg)
+    await asyncio.sleep(0.01)
+    bg = connect()
+    await bg_manager.add(game_id=game_id, bg=bg)
+    await asyncio.sleep(0.06)
+    assert recorder.game_count == 1
+
+    # up to the limit
+    for char_index in range(2, 5):
+        await keystroke("local", char_index)
+
+    # written once the last connection of the game is gone for the delay
+    await disconnect(bg)
+    assert recorder.game_count == 1
+    await asyncio.sleep(0.06)
+    assert recorder.game_count == 0
+    await recorder.stop()
+
+    async with sessionmaker() as session:
+        repo = GameReplayRepo(session)  # type: ignore
+        assert await repo.count(game_id) == 1
+        logs = [data async for data in repo.stream(game_id)]
+
+    segment = decode_segment(logs[0])
+    assert segment.players == ["local"]
+    assert [i.char_index for i in segment.keystrokes] == [1, 2, 3]
+    assert [i.at for i in segment.keystrokes] == [1_000_100, 1_000_200, 1_000_300]
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from logging import INFO
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...lib import result_writer
+from ...lib.metrics import RESULT_WRITER_BATCHES, RESULT_WRITER_RESULTS
+from ...lib.result_writer import ResultWriter
+from ...orm.game import GameStatus, GameType
+from ...orm.game_result import GameResult
+from ...repositories.game import GameRepo
+from ...repositories.result_journal import ResultJournalRepo
+from ...repositories.user import UserRepo
+from ...repositories.user_stats import UserStatsRepo
+from ...types.common import PendingGameResult
+from ..helper import *
+
+
+async def prepare_game(
+    sessionmaker: async_sessionmaker[AsyncSession], user_ids: list[str]
+) -> int:
+    async with sessionmaker() as session:
+        user_repo = UserRepo(session)
+        for user_id in user_ids:
+            await user_repo.register(id=user_id, name=f"{user_id}-name")
+        game = await GameRepo(session).create(
+            game_type=GameType.MULTI, status=GameStatus.IN_GAME
+        )
+        await session.commit()
+        return game.id
+
+
+def gen_results(game_id: int, user_ids: list[str]) -> list[PendingGameResult]:
+    return [
+        PendingGameResult(
+            game_id=game_id,
+            user_id=user_id,
+            rank=idx + 1,
+            wpm_raw=100 - idx,
+            wpm_correct=90 - idx,
+            accuracy=99 - idx,
+            finished_at=NOW + timedelta(seconds=idx),
+        )
+        for idx, user_id in enumerate(user_ids)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_result_writer(
+    sessionmaker: async_sessionmaker[AsyncSession],
+    redis_conn: Redis,
+    setting: Setting,
+    caplog: pytest.LogCaptureFixture,
+):
+    caplog.set_level(INFO, logger=result_writer.__name__)
+    setting.server_name = "test-server"
+    setting.write_behind.batch_size = 3
+    user_ids = [f"user-{i}" for i in range(5)]
+    game_id = await prepare_game(sessionmaker, user_ids)
+    results = gen_results(game_id, user_ids)
+
+    writer = ResultWriter(
+        setting=setting, sessionmaker=sessionmaker, redis_conn=redis_conn
+    )
+    await writer.start()
+    for result in results:
+        await writer.submit(result)
+    await writer.stop()
+
+    assert writer.stats.results == len(results)
+    assert writer.stats.batches == 2
+    assert writer.stats.failed_batches == 0
+    assert f"stopped, {writer.stats}" in caplog.text
+    assert RESULT_WRITER_RESULTS.labels().get() == len(results)
+    assert RESULT_WRITER_BATCHES.labels("ok").get() == 2
+
+    async with sessionmaker() as session:
+        rows = list(
+            await session.scalars(
+                select(GameResult)
+                .where(GameResult.game_id == game_id)
+                .order_by(GameResult.rank)
+            )
+        )
+        assert [i.user_id for i in rows] == user_ids
+
+        stats = await UserStatsRepo(session).get(user_ids[0])
+        assert stats.total == 1
+        assert stats.wpm_best == results[0].wpm_correct
+
+    journal = ResultJournalRepo(redis_conn=redis_conn, setting=setting)
+    assert await journal.get_all() == []
+
+
+@pytest.mark.asyncio
+async def test_result_writer_replay(
+    sessionmaker: async_sessionmaker[AsyncSession], redis_conn: Redis, setting: Setting
+):
+    setting.server_name = "test-server"
+    user_ids = [f"user-{i}" for i in range(3)]
+    game_id = await prepare_game(sessionmaker, user_ids)
+    results = gen_results(game_id, user_ids)
+
+    writer = ResultWriter(
+        setting=setting, sessionmaker=sessionmaker, redis_conn=redis_conn
+    )
+    journal = ResultJournalRepo(redis_conn=redis_conn, setting=setting)
+    await journal.add(results[0])
+    await writer.replay()
+
+    # first result was written before the crash, but not removed from the journal
+    for result in results:
+        await journal.add(result)
+
+    await writer.start()
+    await writer.stop()
+    assert await journal.get_all() == []
+
+    async with sessionmaker() as session:
+        rows = list(
+            await session.scalars(
+                select(GameResult).where(GameResult.game_id == game_id)
+            )
+        )
+        assert len(rows) == len(user_ids)
+
+        # replayed results are not counted twice
+        stats = await UserStatsRepo(session).get(user_ids[0])
+        assert stats.total == 1
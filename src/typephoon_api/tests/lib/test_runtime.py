@@ -0,0 +1,47 @@
+import pytest
+
+from ...lib import runtime
+from ...lib.runtime import RuntimeProfile, resolve_runtime
+from ...types.enums import EventLoopType, HTTPImplType
+from ...types.setting import ServerSetting, Setting
+
+
+@pytest.mark.parametrize(
+    "loop, http, installed, expected",
+    [
+        (
+            EventLoopType.AUTO,
+            HTTPImplType.AUTO,
+            True,
+            RuntimeProfile(EventLoopType.UVLOOP, HTTPImplType.HTTPTOOLS),
+        ),
+        (
+            EventLoopType.AUTO,
+            HTTPImplType.AUTO,
+            False,
+            RuntimeProfile(EventLoopType.ASYNCIO, HTTPImplType.H11),
+        ),
+        (
+            EventLoopType.UVLOOP,
+            HTTPImplType.HTTPTOOLS,
+            False,
+            RuntimeProfile(EventLoopType.ASYNCIO, HTTPImplType.H11),
+        ),
+        (
+            EventLoopType.ASYNCIO,
+            HTTPImplType.H11,
+            True,
+            RuntimeProfile(EventLoopType.ASYNCIO, HTTPImplType.H11),
+        ),
+    ],
+)
+def test_resolve_runtime(
+    monkeypatch,
+    loop: EventLoopType,
+    http: HTTPImplType,
+    installed: bool,
+    expected: RuntimeProfile,
+):
+    monkeypatch.setattr(runtime, "_installed", lambda _: installed)
+    setting = Setting(server=ServerSetting(loop=loop, http=http))
+    assert resolve_runtime(setting) == expected
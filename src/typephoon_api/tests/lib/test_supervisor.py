@@ -0,0 +1,89 @@
+import os
+import signal
+from pathlib import Path
+from threading import Event
+from time import monotonic, sleep
+
+from ...lib import supervisor
+from ...lib.supervisor import Supervisor
+from ...types.setting import ServerSetting, Setting
+
+
+def record_name(path: str):
+    Path(path, f"{os.environ['SERVER_NAME']}.{os.getpid()}").touch()
+
+
+def crash(path: str):
+    record_name(path)
+    raise SystemExit(1)
+
+
+def wait_usr2(path: str):
+    received = Event()
+    signal.signal(signal.SIGUSR2, lambda *_: received.set())
+    Path(path, f"{os.environ['SERVER_NAME']}.ready").touch()
+    if received.wait(30):
+        Path(path, f"{os.environ['SERVER_NAME']}.usr2").touch()
+
+
+def wait_files(path: Path, suffix: str, count: int):
+    deadline = monotonic() + 30
+    while len(list(path.glob(f"*.{suffix}"))) < count:
+        assert monotonic() < deadline
+        sleep(0.01)
+
+
+def recorded_names(path: Path) -> list[str]:
+    return sorted(i.name.split(".")[0] for i in path.iterdir())
+
+
+def test_supervisor_worker_names(tmp_path: Path):
+    setting = Setting(server=ServerSetting(workers=3), server_name="node")
+    original = os.environ.get("SERVER_NAME")
+
+    sup = Supervisor(setting=setting, setting_path=str(tmp_path), target=record_name)
+    sup.start()
+    for process in sup.workers.values():
+        process.join(30)
+        assert process.exitcode == 0
+
+    assert recorded_names(tmp_path) == ["node-w0", "node-w1", "node-w2"]
+    assert os.environ.get("SERVER_NAME") == original
+
+
+def test_supervisor_restart_crashed(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(supervisor, "RESTART_DELAY", 0)
+    setting = Setting(server=ServerSetting(workers=1), server_name="node")
+
+    sup = Supervisor(setting=setting, setting_path=str(tmp_path), target=crash)
+    sup.start()
+    first = sup.workers[0]
+    first.join(30)
+    assert first.exitcode == 1
+
+    sup.check_workers()
+    second = sup.workers[0]
+    assert second is not first
+    second.join(30)
+    sup.stop()
+
+    assert recorded_names(tmp_path) == ["node-w0", "node-w0"]
+
+
+def test_supervisor_forward_usr2(tmp_path: Path):
+    setting = Setting(server=ServerSetting(workers=2), server_name="node")
+
+    sup = Supervisor(setting=setting, setting_path=str(tmp_path), target=wait_usr2)
+    sup.start()
+    wait_files(tmp_path, "ready", 2)
+
+    sup._forward(signal.SIGUSR2, None)
+    for process in sup.workers.values():
+        process.join(30)
+        assert process.exitcode == 0
+    sup.stop()
+
+    assert sorted(i.name for i in tmp_path.glob("*.usr2")) == [
+        "node-w0.usr2",
+        "node-w1.usr2",
+    ]
@@ -76,3 +76,95 @@ async def test_game_cache_repo_populate_with_lobby_cache_auto_clean(
 
     assert not await lobby_repo.get_players(dummy_game_id)
     assert not await lobby_repo.get_start_time(dummy_game_id)
+
+
+@pytest.mark.asyncio
+async def test_game_cache_repo_increase_finish_count(
+    redis_conn: Redis, setting: Setting
+):
+    dummy_game_id = 123123
+    game_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+
+    ranks = [await game_repo.increase_finish_count(dummy_game_id) for _ in range(3)]
+    assert ranks == [1, 2, 3]
+
+    await game_repo.clear_cache(dummy_game_id)
+    assert await game_repo.increase_finish_count(dummy_game_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_game_cache_repo_players_with_version(
+    redis_conn: Redis, setting: Setting
+):
+    dummy_game_id = 123123
+    players = [
+        LobbyUserInfo(id=f"{i}", name=f"player-{i}")
+        for i in range(setting.game.player_limit)
+    ]
+    lobby_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    for player in players:
+        await lobby_repo.add_player(game_id=dummy_game_id, user_info=player)
+
+    game_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    assert await game_repo.get_players_with_version(dummy_game_id) is None
+    assert await game_repo.has_player(dummy_game_id, players[0].id) is None
+
+    await game_repo.populate_with_lobby_cache(
+        game_id=dummy_game_id, lobby_cache_repo=lobby_repo
+    )
+    assert await game_repo.has_player(dummy_game_id, players[0].id) is True
+    assert await game_repo.has_player(dummy_game_id, "not-a-player") is False
+
+    ret = await game_repo.get_players_with_version(dummy_game_id)
+    assert ret
+    assert ret.version == 0
+    assert len(ret.players) == len(players)
+
+    # finish two players
+    finished: list[GameUserInfo] = []
+    for rank, player in enumerate(players[:2], start=1):
+        info = GameUserInfo(
+            id=player.id,
+            name=player.name,
+            finished=NOW.isoformat(),
+            rank=rank,
+            wpm=100,
+            wpm_raw=110,
+            acc=90,
+        )
+        version = await game_repo.update_player_cache(data=info, game_id=dummy_game_id)
+        assert version == rank
+        finished.append(info)
+
+    ret = await game_repo.get_players_with_version(dummy_game_id, since=1)
+    assert ret
+    assert ret.version == 2
+    assert ret.players == {finished[1].id: finished[1]}
+
+    ret = await game_repo.get_players_with_version(dummy_game_id, since=2)
+    assert ret
+    assert ret.version == 2
+    assert ret.players == {}
+
+    ret = await game_repo.get_players_with_version(dummy_game_id)
+    assert ret
+    assert ret.players[finished[0].id] == finished[0]
+    assert ret.players[players[-1].id] == GameUserInfo(
+        id=players[-1].id, name=players[-1].name
+    )
+
+
+@pytest.mark.asyncio
+async def test_game_cache_repo_positions(redis_conn: Redis, setting: Setting):
+    game_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    assert await game_repo.get_positions(123) == {}
+
+    await game_repo.update_positions(
+        {123: {"a": (1, 2), "b": (3, 4)}, 456: {"c": (0, 1)}}
+    )
+    await game_repo.update_positions({123: {"a": (2, 0)}})
+    assert await game_repo.get_positions(123) == {"a": (2, 0), "b": (3, 4)}
+    assert await game_repo.get_positions(456) == {"c": (0, 1)}
+
+    await game_repo.clear_cache(123)
+    assert await game_repo.get_positions(123) == {}
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...orm.game import GameStatus, GameType
+from ...repositories.game import GameRepo
+from ...repositories.game_replay import GameReplayRepo
+from ..helper import *
+
+
+@pytest.mark.asyncio
+async def test_game_replay_repo(sessionmaker: async_sessionmaker[AsyncSession]):
+    async with sessionmaker() as session:
+        game = await GameRepo(session=session).create(GameType.MULTI, GameStatus.LOBBY)
+        game_id = game.id
+        repo = GameReplayRepo(session)
+        assert await repo.count(game_id) == 0
+
+        await repo.add_many([(game_id, b"first"), (game_id, b"second")])
+        await session.commit()
+
+    async with sessionmaker() as session:
+        repo = GameReplayRepo(session)
+        assert await repo.count(game_id) == 2
+        assert [data async for data in repo.stream(game_id)] == [b"first", b"second"]
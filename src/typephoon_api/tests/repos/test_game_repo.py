@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 import pytest
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...orm.game import Game, GameStatus, GameType
@@ -104,6 +107,40 @@ async def test_game_repo_get_one_available(
         assert game.player_count == 0
 
 
+@pytest.mark.asyncio
+async def test_game_repo_get_one_available_skill_bucket(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        far = await repo.create(GameType.MULTI, GameStatus.LOBBY, skill_bucket=5)
+        near = await repo.create(GameType.MULTI, GameStatus.LOBBY, skill_bucket=3)
+        far_id, near_id = far.id, near.id
+        await session.commit()
+
+    options = {"skill_bucket": 2, "widen_interval": 10, "max_distance": 3}
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        # lobbies of other buckets didn't wait long enough
+        assert await repo.get_one_available(**options) is None
+
+        # waited for three widenings, the closest bucket wins
+        await session.execute(
+            update(Game).values(created_at=Game.created_at - timedelta(seconds=35))
+        )
+        game = await repo.get_one_available(**options)
+        assert game is not None
+        assert game.id == near_id
+
+        # out of range
+        await repo.start_game(near_id)
+        game = await repo.get_one_available(**{**options, "max_distance": 2})
+        assert game is None
+        game = await repo.get_one_available(**options)
+        assert game is not None
+        assert game.id == far_id
+
+
 @pytest.mark.asyncio
 async def test_game_repo_start_game(sessionmaker: async_sessionmaker[AsyncSession]):
     async with sessionmaker() as session:
@@ -119,3 +156,77 @@ async def test_game_repo_start_game(sessionmaker: async_sessionmaker[AsyncSessio
         assert game is not None
         assert game.status == GameStatus.IN_GAME
         assert game.start_at is not None
+
+
+@pytest.mark.asyncio
+async def test_game_repo_update_finish_count(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        game = await repo.create(GameType.MULTI, GameStatus.IN_GAME)
+        game_id = game.id
+        await repo.update_finish_count(id=game_id, finish_count=3)
+        # never decreases
+        await repo.update_finish_count(id=game_id, finish_count=1)
+        await session.commit()
+
+    async with sessionmaker() as session:
+        game = await session.get(Game, game_id)
+        assert game is not None
+        assert game.finish_count == 3
+
+
+@pytest.mark.asyncio
+async def test_game_repo_finish_unfinished(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        lobby = await repo.create(GameType.MULTI, GameStatus.LOBBY)
+        in_game = await repo.create(GameType.MULTI, GameStatus.IN_GAME)
+        finished = await repo.create(GameType.MULTI, GameStatus.FINISHED)
+        game_ids = [lobby.id, in_game.id]
+        finished_id = finished.id
+        await session.commit()
+
+    async with sessionmaker() as session:
+        assert sorted(await GameRepo(session=session).finish_unfinished()) == game_ids
+        await session.commit()
+
+    async with sessionmaker() as session:
+        for game_id in game_ids:
+            game = await session.get(Game, game_id)
+            assert game is not None
+            assert game.status == GameStatus.FINISHED
+            assert game.end_at is not None
+
+        game = await session.get(Game, finished_id)
+        assert game is not None
+        assert game.end_at is None
+
+
+@pytest.mark.asyncio
+async def test_game_repo_pool(sessionmaker: async_sessionmaker[AsyncSession]):
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        assert await repo.claim_pool() is None
+
+        await repo.create_pool(2)
+        await session.commit()
+        assert await repo.count_pool() == 2
+
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        game = await repo.claim_pool()
+        assert game is not None
+        assert game.status == GameStatus.LOBBY
+        await session.commit()
+
+        assert await repo.count_pool() == 1
+        assert await repo.get_one_available() is not None
+
+        # pooled games survive a restart
+        assert await repo.finish_unfinished() == [game.id]
+        await session.commit()
+        assert await repo.count_pool() == 1
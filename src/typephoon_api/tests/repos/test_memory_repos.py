@@ -0,0 +1,242 @@
+import asyncio
+from datetime import timedelta
+
+from ...orm.game import GameStatus, GameType
+from ...orm.game_result import GameResult
+from ...repositories.game import GameRepo
+from ...repositories.game_result import GameResultRepo
+from ...repositories.memory import MemoryGameRepo, MemorySessionmaker
+from ...repositories.user import UserRepo
+from ...repositories.user_stats import RECENT_SIZE, UserStatsRepo, UserStatsRet
+from ...types.common import PendingGameResult
+from ..helper import *
+
+
+@pytest.mark.asyncio
+async def test_memory_game_repo_match_making():
+    sessionmaker = MemorySessionmaker()
+
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session, player_limit=2)
+        assert isinstance(repo, MemoryGameRepo)
+        assert await repo.get_one_available() is None
+
+        game = await repo.create(GameType.MULTI, GameStatus.LOBBY)
+        await repo.increase_player_count(game.id)
+        assert await repo.get_one_available() is game
+        assert await repo.is_available(game.id, new_player=True) is game
+
+        await repo.increase_player_count(game.id)
+        assert await repo.get_one_available() is None
+        assert await repo.is_available(game.id, new_player=True) is None
+        assert await repo.is_available(game.id) is game
+
+        await repo.start_game(game.id)
+        assert game.status == GameStatus.IN_GAME
+        assert game.start_at is not None
+        assert await repo.is_available(game.id) is None
+
+        await repo.update_finish_count(game.id, 2)
+        await repo.update_finish_count(game.id, 1)
+        assert game.finish_count == 2
+
+        lobby = await repo.create(GameType.MULTI, GameStatus.LOBBY)
+        assert await repo.finish_unfinished() == [game.id, lobby.id]
+        assert lobby.status == GameStatus.FINISHED
+        assert await repo.get_one_available() is None
+        assert await repo.finish_unfinished() == []
+
+
+@pytest.mark.asyncio
+async def test_memory_game_repo_skill_bucket():
+    sessionmaker = MemorySessionmaker()
+    options = {"skill_bucket": 2, "widen_interval": 10, "max_distance": 3}
+
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session, player_limit=2)
+        far = await repo.create(GameType.MULTI, GameStatus.LOBBY, skill_bucket=5)
+        near = await repo.create(GameType.MULTI, GameStatus.LOBBY, skill_bucket=3)
+        assert await repo.get_one_available(**options) is None
+
+        # waited for three widenings, the closest bucket wins
+        for game in (far, near):
+            game.created_at -= timedelta(seconds=35)
+        assert await repo.get_one_available(**options) is near
+
+        same = await repo.create(GameType.MULTI, GameStatus.LOBBY, skill_bucket=2)
+        assert await repo.get_one_available(**options) is same
+        await repo.increase_player_count(same.id)
+        await repo.increase_player_count(same.id)
+        assert await repo.get_one_available(**options) is near
+
+        await repo.start_game(near.id)
+        assert await repo.get_one_available(**{**options, "max_distance": 2}) is None
+        assert await repo.get_one_available(**options) is far
+
+        # the bucket goes with a claimed game
+        await repo.create_pool(1)
+        claimed = await repo.claim_pool(skill_bucket=2)
+        assert claimed is not None
+        assert await repo.get_one_available(**options) is claimed
+
+
+@pytest.mark.asyncio
+async def test_memory_game_repo_pool():
+    sessionmaker = MemorySessionmaker()
+
+    async with sessionmaker() as session:
+        repo = GameRepo(session=session)
+        assert await repo.claim_pool() is None
+
+        await repo.create_pool(2)
+        assert await repo.count_pool() == 2
+        assert await repo.get_one_available() is None
+
+        game = await repo.claim_pool()
+        assert game is not None
+        assert game.status == GameStatus.LOBBY
+        assert await repo.count_pool() == 1
+        assert await repo.get_one_available() is game
+
+        assert await repo.finish_unfinished() == [game.id]
+        assert await repo.count_pool() == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_game_repo_lock():
+    sessionmaker = MemorySessionmaker()
+    order: list[str] = []
+
+    async def match(name: str):
+        async with sessionmaker() as session:
+            await GameRepo(session).get_one_available(lock=True)
+            order.append(f"{name}-locked")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}-commit")
+            await session.commit()
+
+    await asyncio.gather(match("a"), match("b"))
+    assert order == ["a-locked", "a-commit", "b-locked", "b-commit"]
+
+
+@pytest.mark.asyncio
+async def test_memory_game_result_repo():
+    sessionmaker = MemorySessionmaker()
+    user_id = "user"
+
+    async with sessionmaker() as session:
+        await UserRepo(session).register(id=user_id, name="name")
+        game_repo = GameRepo(session)
+        game_ids = [
+            (await game_repo.create(GameType.MULTI, GameStatus.IN_GAME)).id
+            for _ in range(3)
+        ]
+
+        results = [
+            PendingGameResult(
+                game_id=game_id,
+                user_id=user_id,
+                rank=1,
+                wpm_raw=wpm + 10,
+                wpm_correct=wpm,
+                accuracy=90 + idx,
+                finished_at=NOW + timedelta(minutes=idx),
+            )
+            for idx, (game_id, wpm) in enumerate(zip(game_ids, [80, 100, 90]))
+        ]
+        repo = GameResultRepo(session)
+        assert len(await repo.create_many(results)) == 3
+        # replaying is safe
+        assert await repo.create_many(results) == []
+
+        assert await repo.get_total_games(user_id) == 3
+        best = await repo.get_best(user_id)
+        assert best is not None and best.wpm_correct == 100
+
+        page = await repo.get_games_with_game_type_before(user_id, size=2)
+        assert [i.game_id for i in page] == [game_ids[2], game_ids[1]]
+        last = page[-1]
+        page = await repo.get_games_with_game_type_before(
+            user_id, size=2, before=(last.finished_at, last.game_id)
+        )
+        assert [i.game_id for i in page] == [game_ids[0]]
+        page = await repo.get_games_with_game_type_before(user_id, size=2, skip=1)
+        assert [i.game_id for i in page] == [game_ids[1], game_ids[0]]
+
+        avg = await repo.get_avg_last_n_games(user_id, last_n=2)
+        assert avg.wpm == 95
+
+        stats = await UserStatsRepo(session).get(user_id)
+        assert stats.total == 3
+        assert stats.wpm_best == 100
+        assert stats.acc_best == 91
+        assert stats.wpm_avg_all == 90
+
+        await UserStatsRepo(session).backfill()
+        assert await UserStatsRepo(session).get(user_id) == stats
+
+
+@pytest.mark.asyncio
+async def test_memory_user_stats_repo_out_of_order():
+    sessionmaker = MemorySessionmaker()
+    results = [
+        GameResult(
+            game_id=idx,
+            user_id="user",
+            rank=1,
+            wpm_raw=idx + 10,
+            wpm_correct=idx,
+            accuracy=idx,
+            finished_at=NOW + timedelta(minutes=idx),
+        )
+        for idx in range(RECENT_SIZE + 5)
+    ]
+
+    async with sessionmaker() as session:
+        # newer results are written first, older ones are replayed from the journal
+        repo = UserStatsRepo(session)
+        await repo.add_results(results[5:])
+        await repo.add_results(results[:5])
+
+        stats = session.store.user_stats["user"]
+        newest = results[::-1][:RECENT_SIZE]
+        assert stats.recent_wpm == [i.wpm_correct for i in newest]
+        assert stats.recent_finished_at == [i.finished_at for i in newest]
+
+
+@pytest.mark.asyncio
+async def test_memory_user_stats_repo_backfill_ties_and_reset():
+    sessionmaker = MemorySessionmaker()
+
+    async with sessionmaker() as session:
+        await UserRepo(session).register(id="user", name="name")
+        await UserRepo(session).register(id="other", name="other-name")
+        game_repo = GameRepo(session)
+        result_repo = GameResultRepo(session)
+        for idx, accuracy in enumerate([90, 95]):
+            game = await game_repo.create(GameType.MULTI, GameStatus.IN_GAME)
+            # one by one, folded incrementally
+            await result_repo.create_many(
+                [
+                    PendingGameResult(
+                        game_id=game.id,
+                        user_id="user",
+                        rank=1,
+                        wpm_raw=110,
+                        wpm_correct=100,
+                        accuracy=accuracy,
+                        finished_at=NOW + timedelta(minutes=idx),
+                    )
+                ]
+            )
+        # stats without results
+        await UserStatsRepo(session).add_result(
+            user_id="other", wpm_raw=50, wpm_correct=40, accuracy=80, finished_at=NOW
+        )
+
+        # the earliest game wins a tie, incrementally and rebuilt
+        repo = UserStatsRepo(session)
+        assert (await repo.get("user")).acc_best == 90
+        await repo.backfill()
+        assert (await repo.get("user")).acc_best == 90
+        assert await repo.get("other") == UserStatsRet()
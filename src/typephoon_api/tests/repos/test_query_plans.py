@@ -0,0 +1,316 @@
+"""
+Query plan regression tests.
+
+Hot repository queries are captured while running against a realistically
+sized dataset, then re-run with 'EXPLAIN' to make sure they are served by
+indexes instead of sequential scans.
+"""
+
+import json
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from ...repositories.game import GameRepo
+from ...repositories.game_result import GameResultRepo
+from ..helper import *
+
+USER_COUNT = 500
+FINISHED_GAME_COUNT = 100_000
+HEAVY_USER_GAME_COUNT = 20_000
+LOBBY_GAME_COUNT = 200
+POOL_GAME_COUNT = 50
+
+TARGET_USER = "user-42"
+HEAVY_USER = "heavy-user"
+
+HISTORY_INDEX = "ix_game_results_user_id_finished_at_game_id"
+
+
+@dataclass(slots=True)
+class CapturedStatement:
+    statement: str
+    parameters: tuple = field(default_factory=tuple)
+
+
+@dataclass(slots=True)
+class PlanNode:
+    node_type: str
+    relation: str | None = None
+    index: str | None = None
+
+
+def flatten_plan(plan: dict) -> list[PlanNode]:
+    result = [
+        PlanNode(
+            node_type=plan["Node Type"],
+            relation=plan.get("Relation Name"),
+            index=plan.get("Index Name"),
+        )
+    ]
+    for sub_plan in plan.get("Plans", []):
+        result.extend(flatten_plan(sub_plan))
+    return result
+
+
+def get_engine(sessionmaker: async_sessionmaker[AsyncSession]) -> AsyncEngine:
+    return sessionmaker.kw["bind"]
+
+
+@asynccontextmanager
+async def capture_statements(engine: AsyncEngine):
+    captured: list[CapturedStatement] = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append(CapturedStatement(statement, tuple(parameters or ())))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+
+
+async def explain(engine: AsyncEngine, captured: CapturedStatement) -> list[PlanNode]:
+    async with engine.connect() as conn:
+        ret = await conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {captured.statement}", captured.parameters
+        )
+        raw = ret.scalar_one()
+
+    plan = json.loads(raw) if isinstance(raw, str) else raw
+    return flatten_plan(plan[0]["Plan"])
+
+
+def assert_index_used(plan: list[PlanNode], relation: str, index: str):
+    scans = [node for node in plan if node.relation == relation]
+    assert scans, plan
+    assert all(node.node_type != "Seq Scan" for node in scans), plan
+    assert any(node.index == index for node in plan), plan
+
+
+@pytest_asyncio.fixture
+async def dataset(sessionmaker: async_sessionmaker[AsyncSession]):
+    async with sessionmaker() as session:
+        await session.execute(
+            text("""
+                INSERT INTO users (id, name)
+                SELECT 'user-' || i, 'name-' || i FROM generate_series(1, :count) i
+                """),
+            {"count": USER_COUNT},
+        )
+        await session.execute(
+            text("INSERT INTO users (id, name) VALUES (:id, :id)"),
+            {"id": HEAVY_USER},
+        )
+
+        # finished games, one result each
+        await session.execute(
+            text("""
+                INSERT INTO games (status, game_type, player_count, finish_count)
+                SELECT 2, 1, 5, 5 FROM generate_series(1, :count)
+                """),
+            {"count": FINISHED_GAME_COUNT + HEAVY_USER_GAME_COUNT},
+        )
+        await session.execute(
+            text("""
+                INSERT INTO game_results
+                    (game_id, user_id, rank, wpm_raw, wpm_correct, accuracy, finished_at)
+                SELECT
+                    id,
+                    CASE
+                        WHEN id <= :heavy THEN :heavy_user
+                        ELSE 'user-' || (id % :users + 1)
+                    END,
+                    1,
+                    random() * 150,
+                    random() * 150,
+                    random() * 100,
+                    now() - id * interval '1 second'
+                FROM games
+                """),
+            {
+                "heavy": HEAVY_USER_GAME_COUNT,
+                "heavy_user": HEAVY_USER,
+                "users": USER_COUNT,
+            },
+        )
+
+        # open lobbies, most of them full
+        await session.execute(
+            text("""
+                INSERT INTO games (status, game_type, player_count, skill_bucket)
+                SELECT 0, 1, CASE WHEN i % 10 = 0 THEN 1 ELSE 5 END, i % 8
+                FROM generate_series(1, :count) i
+                """),
+            {"count": LOBBY_GAME_COUNT},
+        )
+
+        # pre-created games waiting to be claimed
+        await session.execute(
+            text("""
+                INSERT INTO games (status, game_type)
+                SELECT 3, 1 FROM generate_series(1, :count)
+                """),
+            {"count": POOL_GAME_COUNT},
+        )
+        await session.commit()
+
+    async with get_engine(sessionmaker).begin() as conn:
+        await conn.execute(text("ANALYZE users, games, game_results"))
+
+    yield
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id", [TARGET_USER, HEAVY_USER])
+async def test_query_plan_last_n_games(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession], user_id: str
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            await GameResultRepo(session).get_last_n_games_with_game_type(
+                user_id=user_id, size=50
+            )
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "game_results", HISTORY_INDEX)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id", [TARGET_USER, HEAVY_USER])
+@pytest.mark.parametrize("skip", [0, 100])
+async def test_query_plan_games_before(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession], user_id: str, skip: int
+):
+    engine = get_engine(sessionmaker)
+    async with sessionmaker() as session:
+        first = await GameResultRepo(session).get_last_n_games_with_game_type(
+            user_id=user_id, size=1
+        )
+    assert first
+
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            page = await GameResultRepo(session).get_games_with_game_type_before(
+                user_id=user_id,
+                size=50,
+                before=(first[0].finished_at, first[0].game_id),
+                skip=skip,
+            )
+            assert len(page) == 50
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "game_results", HISTORY_INDEX)
+    # pages are read in index order, never sorted
+    assert all(node.node_type != "Sort" for node in plan), plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id", [TARGET_USER, HEAVY_USER])
+async def test_query_plan_avg_last_n_games(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession], user_id: str
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            await GameResultRepo(session).get_avg_last_n_games(
+                user_id=user_id, last_n=10
+            )
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "game_results", HISTORY_INDEX)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id", [TARGET_USER, HEAVY_USER])
+async def test_query_plan_best(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession], user_id: str
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            await GameResultRepo(session).get_best(user_id)
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "game_results", "ix_game_results_user_id_wpm_correct")
+
+
+@pytest.mark.asyncio
+async def test_query_plan_total_games(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession]
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            await GameResultRepo(session).get_total_games(TARGET_USER)
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    scans = [node for node in plan if node.relation == "game_results"]
+    assert scans
+    assert all(node.node_type != "Seq Scan" for node in scans), plan
+
+
+@pytest.mark.asyncio
+async def test_query_plan_get_one_available(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession]
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            game = await GameRepo(session).get_one_available(lock=True)
+            assert game is not None
+            await session.rollback()
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "games", "ix_games_lobby_player_count")
+
+
+@pytest.mark.asyncio
+async def test_query_plan_get_one_available_skill_bucket(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession]
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            await GameRepo(session).get_one_available(
+                lock=True, skill_bucket=3, widen_interval=1, max_distance=5
+            )
+            await session.rollback()
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "games", "ix_games_lobby_skill_bucket")
+    # one lookup per bucket, then the lobby picked by its primary key
+    assert all(
+        node.index in ("ix_games_lobby_skill_bucket", "games_pkey")
+        for node in plan
+        if node.relation == "games"
+    ), plan
+
+
+@pytest.mark.asyncio
+async def test_query_plan_claim_pool(
+    dataset, sessionmaker: async_sessionmaker[AsyncSession]
+):
+    engine = get_engine(sessionmaker)
+    async with capture_statements(engine) as captured:
+        async with sessionmaker() as session:
+            game = await GameRepo(session).claim_pool()
+            assert game is not None
+            await session.rollback()
+
+    assert len(captured) == 1
+    plan = await explain(engine, captured[0])
+    assert_index_used(plan, "games", "ix_games_pool")
@@ -0,0 +1,185 @@
+from datetime import timedelta
+from statistics import mean
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...orm.game import GameStatus, GameType
+from ...orm.game_result import GameResult
+from ...orm.user_stats import UserStats
+from ...repositories.game import GameRepo
+from ...repositories.game_result import GameResultRepo
+from ...repositories.user import UserRepo
+from ...repositories.user_stats import RECENT_SIZE, UserStatsRepo, UserStatsRet
+from ..helper import *
+
+
+async def prepare_results(
+    sessionmaker: async_sessionmaker[AsyncSession], user_id: str, count: int
+) -> list[dict]:
+    games: list[dict] = []
+    for i in range(count):
+        games.append(
+            {
+                "game_id": -1,
+                "user_id": user_id,
+                "rank": 1,
+                "wpm_raw": (i + 2) * 10,
+                "wpm_correct": (i + 1) * 10,
+                "accuracy": 100 - i,
+                "finished_at": NOW + timedelta(minutes=i),
+            }
+        )
+
+    async with sessionmaker() as session:
+        await UserRepo(session).register(id=user_id, name=f"{user_id}-name")
+        game_repo = GameRepo(session)
+        game_result_repo = GameResultRepo(session)
+        for game in games:
+            new_game = await game_repo.create(
+                game_type=GameType.MULTI, status=GameStatus.FINISHED
+            )
+            game["game_id"] = new_game.id
+            await game_result_repo.create(**game)
+        await session.commit()
+
+    return games
+
+
+def expected_stats(games: list[dict]) -> UserStatsRet:
+    best = max(games, key=lambda x: x["wpm_correct"])
+    recent = games[-RECENT_SIZE:]
+    return UserStatsRet(
+        total=len(games),
+        wpm_best=best["wpm_correct"],
+        wpm_avg_recent=mean([i["wpm_correct"] for i in recent]),
+        wpm_avg_all=mean([i["wpm_correct"] for i in games]),
+        acc_best=best["accuracy"],
+        acc_avg_recent=mean([i["accuracy"] for i in recent]),
+        acc_avg_all=mean([i["accuracy"] for i in games]),
+    )
+
+
+@pytest.mark.asyncio
+async def test_user_stats_repo_empty(sessionmaker: async_sessionmaker[AsyncSession]):
+    async with sessionmaker() as session:
+        stats = await UserStatsRepo(session).get("not-exist")
+        assert stats == UserStatsRet()
+
+
+@pytest.mark.asyncio
+async def test_user_stats_repo_add_result(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    user_id = "dummy-id"
+    games = await prepare_results(sessionmaker, user_id, RECENT_SIZE * 2 + 3)
+
+    async with sessionmaker() as session:
+        row = await session.get_one(UserStats, user_id)
+        assert len(row.recent_wpm) == RECENT_SIZE
+        assert row.recent_wpm[0] == games[-1]["wpm_correct"]
+
+        stats = await UserStatsRepo(session).get(user_id)
+        assert stats == expected_stats(games)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_repo_add_results_out_of_order(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    user_id = "dummy-id"
+    async with sessionmaker() as session:
+        await UserRepo(session).register(id=user_id, name=f"{user_id}-name")
+        await session.commit()
+
+    results = [
+        GameResult(
+            game_id=idx,
+            user_id=user_id,
+            rank=1,
+            wpm_raw=idx + 10,
+            wpm_correct=idx,
+            accuracy=idx,
+            finished_at=NOW + timedelta(minutes=idx),
+        )
+        for idx in range(RECENT_SIZE + 5)
+    ]
+
+    # newer results are written first, older ones are replayed from the journal
+    async with sessionmaker() as session:
+        repo = UserStatsRepo(session)
+        await repo.add_results(results[5:])
+        await repo.add_results(results[:5])
+        await session.commit()
+
+    async with sessionmaker() as session:
+        row = await session.get_one(UserStats, user_id)
+        newest = results[::-1][:RECENT_SIZE]
+        assert row.recent_wpm == [i.wpm_correct for i in newest]
+        assert row.recent_finished_at == [i.finished_at for i in newest]
+
+
+@pytest.mark.asyncio
+async def test_user_stats_repo_backfill(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    user_id = "dummy-id"
+    games = await prepare_results(sessionmaker, user_id, RECENT_SIZE + 5)
+
+    # drop incrementally maintained stats, then rebuild
+    async with sessionmaker() as session:
+        await session.execute(delete(UserStats))
+        await session.commit()
+
+    async with sessionmaker() as session:
+        repo = UserStatsRepo(session)
+        assert await repo.get(user_id) == UserStatsRet()
+        await repo.backfill()
+        await session.commit()
+
+    async with sessionmaker() as session:
+        stats = await UserStatsRepo(session).get(user_id)
+        assert stats == expected_stats(games)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_repo_backfill_ties_and_reset(
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    user_id = "dummy-id"
+    other_id = "other-id"
+    async with sessionmaker() as session:
+        await UserRepo(session).register(id=user_id, name=f"{user_id}-name")
+        await UserRepo(session).register(id=other_id, name=f"{other_id}-name")
+        game_repo = GameRepo(session)
+        for idx, accuracy in enumerate([90, 95]):
+            game = await game_repo.create(
+                game_type=GameType.MULTI, status=GameStatus.FINISHED
+            )
+            await GameResultRepo(session).create(
+                game_id=game.id,
+                user_id=user_id,
+                rank=1,
+                wpm_raw=110,
+                wpm_correct=100,
+                accuracy=accuracy,
+                finished_at=NOW + timedelta(minutes=idx),
+            )
+        # stats without results
+        await UserStatsRepo(session).add_result(
+            user_id=other_id, wpm_raw=50, wpm_correct=40, accuracy=80, finished_at=NOW
+        )
+        await session.commit()
+
+    # the earliest game wins a tie, incrementally and rebuilt
+    async with sessionmaker() as session:
+        repo = UserStatsRepo(session)
+        assert (await repo.get(user_id)).acc_best == 90
+        await repo.backfill()
+        await session.commit()
+
+    async with sessionmaker() as session:
+        repo = UserStatsRepo(session)
+        assert (await repo.get(user_id)).acc_best == 90
+        assert await repo.get(other_id) == UserStatsRet()
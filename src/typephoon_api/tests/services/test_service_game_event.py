@@ -1,8 +1,12 @@
+import asyncio
 from asyncio import Future
+from datetime import timedelta
 from unittest.mock import AsyncMock, MagicMock
 
 from ...lib.background_tasks.base import BGManager
-from ...lib.background_tasks.game import GameBG, GameBGMsg
+from ...lib.background_tasks.game import GameBG, GameBGMsg, GameBGMsgEvent
+from ...lib.node_affinity import NodeAffinity
+from ...lib.positions import PositionTable
 from ...lib.token_generator import TokenGenerator
 from ...lib.token_validator import TokenValidator
 from ...repositories.game_cache import GameCacheRepo
@@ -200,3 +204,179 @@ async def test_service_game_event_success(setting: Setting, redis_conn: Redis):
     assert game_connections.get(user_id, None)
 
     await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_service_game_event_countdown(setting: Setting, redis_conn: Redis):
+    game_id = 123
+    user_id = "123"
+    username = "123-name"
+    token_generator = TokenGenerator(setting)
+    token_validator = TokenValidator(setting)
+    game_cache_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    bg_manager = BGManager[GameBGMsg, GameBG]()
+
+    access_token = token_generator.gen_access_token(
+        user_id=user_id, username=username, user_type=UserType.REGISTERED
+    )
+
+    websocket = AsyncMock()
+    websocket.cookies = {CookieNames.ACCESS_TOKEN: access_token}
+    websocket.receive_text = MagicMock(return_value=Future())
+
+    service = GameEventService(
+        token_validator=token_validator,
+        game_cache_repo=game_cache_repo,
+        bg_manager=bg_manager,
+        keystroke_exchange=AsyncMock(),
+        setting=setting,
+    )
+
+    # prepare cache
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    await lobby_cache_repo.add_player(
+        game_id=game_id,
+        user_info=LobbyUserInfo(id=user_id, name=username),
+    )
+    await lobby_cache_repo.set_start_time(game_id=game_id, start_time=NOW)
+    await game_cache_repo.populate_with_lobby_cache(
+        game_id=game_id, lobby_cache_repo=lobby_cache_repo, auto_clean=True
+    )
+
+    bg = await service.subscribe(websocket=websocket, game_id=game_id)
+    assert bg is not None
+
+    assert websocket.send_text.call_count == 1
+    msg = GameBGMsg.model_validate_json(websocket.send_text.call_args.args[0])
+    assert msg.event == GameBGMsgEvent.COUNTDOWN
+    assert msg.start_at
+    assert datetime.fromisoformat(msg.start_at) == NOW + timedelta(
+        seconds=setting.game.start_countdown
+    )
+    assert msg.server_time
+
+    await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_service_game_event_snapshot(setting: Setting, redis_conn: Redis):
+    game_id = 123
+    user_id = "123"
+    username = "123-name"
+    token_generator = TokenGenerator(setting)
+    token_validator = TokenValidator(setting)
+    game_cache_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    position_table = PositionTable(setting=setting, game_cache_repo=game_cache_repo)
+
+    access_token = token_generator.gen_access_token(
+        user_id=user_id, username=username, user_type=UserType.REGISTERED
+    )
+
+    websocket = AsyncMock()
+    websocket.cookies = {CookieNames.ACCESS_TOKEN: access_token}
+    websocket.receive_text = MagicMock(return_value=Future())
+
+    service = GameEventService(
+        token_validator=token_validator,
+        game_cache_repo=game_cache_repo,
+        bg_manager=BGManager[GameBGMsg, GameBG](),
+        keystroke_exchange=AsyncMock(),
+        setting=setting,
+        position_table=position_table,
+    )
+
+    # prepare cache, positions mirrored by another node
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    await lobby_cache_repo.add_player(
+        game_id=game_id,
+        user_info=LobbyUserInfo(id=user_id, name=username),
+    )
+    await lobby_cache_repo.set_start_time(game_id=game_id, start_time=NOW)
+    await game_cache_repo.populate_with_lobby_cache(
+        game_id=game_id, lobby_cache_repo=lobby_cache_repo, auto_clean=True
+    )
+    await game_cache_repo.update_positions({game_id: {user_id: (3, 1), "456": (2, 5)}})
+    position_table.update(game_id, "456", word_index=4, char_index=0)
+
+    bg = await service.subscribe(websocket=websocket, game_id=game_id)
+    assert bg is not None
+
+    # the snapshot comes first, then the countdown
+    msg = GameBGMsg.model_validate_json(websocket.send_text.call_args_list[0].args[0])
+    assert msg.event == GameBGMsgEvent.SNAPSHOT
+    assert msg.positions == {user_id: (3, 1), "456": (4, 0)}
+
+    await asyncio.sleep(0.01)
+    msg = GameBGMsg.model_validate_json(websocket.send_text.call_args_list[1].args[0])
+    assert msg.event == GameBGMsgEvent.COUNTDOWN
+
+    await bg.stop()
+
+
+@pytest.mark.asyncio
+async def test_service_game_event_redirect(setting: Setting, redis_conn: Redis):
+    user_id = "123"
+    username = "123-name"
+    token_generator = TokenGenerator(setting)
+    token_validator = TokenValidator(setting)
+    game_cache_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+    bg_manager = BGManager[GameBGMsg, GameBG]()
+    keystroke_exchange = AsyncMock()
+
+    # two nodes on the ring
+    nodes: list[NodeAffinity] = []
+    for name in ("a", "b"):
+        node_setting = setting.model_copy(deep=True)
+        node_setting.server_name = name
+        node_setting.affinity.enabled = True
+        node_setting.affinity.url = f"ws://{name}:8080"
+        nodes.append(NodeAffinity(setting=node_setting, redis_conn=redis_conn))
+    for node in nodes + nodes:
+        await node.refresh()
+    node_a = nodes[0]
+
+    # a game owned by node 'b'
+    game_id = next(i for i in range(1, 1000) if node_a.remote_owner(i) is not None)
+
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    await lobby_cache_repo.add_player(
+        game_id=game_id,
+        user_info=LobbyUserInfo(id=user_id, name=username),
+    )
+    await game_cache_repo.populate_with_lobby_cache(
+        game_id=game_id, lobby_cache_repo=lobby_cache_repo, auto_clean=True
+    )
+
+    access_token = token_generator.gen_access_token(
+        user_id=user_id, username=username, user_type=UserType.REGISTERED
+    )
+    service = GameEventService(
+        token_validator=token_validator,
+        game_cache_repo=game_cache_repo,
+        bg_manager=bg_manager,
+        keystroke_exchange=keystroke_exchange,
+        setting=setting,
+        node_affinity=node_a,
+    )
+
+    websocket = AsyncMock()
+    websocket.cookies = {CookieNames.ACCESS_TOKEN: access_token}
+    websocket.receive_text = MagicMock(return_value=Future())
+
+    bg = await service.subscribe(websocket=websocket, game_id=game_id)
+    assert bg is None
+    assert websocket.close.call_args.kwargs["reason"] == WSCloseReason.REDIRECT
+    msg = GameBGMsg.model_validate_json(websocket.send_text.call_args.args[0])
+    assert msg.event == GameBGMsgEvent.REDIRECT
+    assert msg.node == "ws://b:8080"
+
+    # followed the redirect, stays even if it landed on the wrong node
+    websocket = AsyncMock()
+    websocket.cookies = {CookieNames.ACCESS_TOKEN: access_token}
+    websocket.receive_text = MagicMock(return_value=Future())
+
+    bg = await service.subscribe(websocket=websocket, game_id=game_id, redirected=True)
+    assert bg is not None
+    assert websocket.close.called is False
+
+    await bg.stop()
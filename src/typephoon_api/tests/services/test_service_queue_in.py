@@ -1,3 +1,4 @@
+import asyncio
 from asyncio import Future
 from datetime import timedelta
 from unittest.mock import AsyncMock, MagicMock
@@ -11,13 +12,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...lib.background_tasks.base import BGManager
 from ...lib.background_tasks.lobby import LobbyBG, LobbyBGMsg, LobbyBGMsgEvent
+from ...lib.lobby_pool import LobbyPool
+from ...lib.memory.redis import MemoryRedis
+from ...lib.node_affinity import NodeAffinity
 from ...lib.token_generator import TokenGenerator
 from ...lib.token_validator import TokenValidator
-from ...orm.game import GameStatus
+from ...orm.game import GameStatus, GameType
 from ...repositories.game import GameRepo
 from ...repositories.game_cache import GameCacheRepo
 from ...repositories.guest_token import GuestTokenRepo
 from ...repositories.lobby_cache import LobbyCacheRepo
+from ...repositories.memory import MemorySessionmaker
 from ...services.queue_in import QueueInService
 from ...types.amqp import LobbyCountdownMsg, LobbyNotifyMsg
 from ...types.common import LobbyUserInfo
@@ -98,6 +103,18 @@ async def test_service_queue_in(
 
     game_id = p1_notify_msg.game_id
 
+    # the start time is pushed to every server
+    countdown_notify_msg = LobbyNotifyMsg.model_validate_json(
+        amqp_notify_exchange.publish.call_args_list[0].kwargs["message"].body
+    )
+    assert countdown_notify_msg == LobbyNotifyMsg(
+        notify_type=LobbyBGMsgEvent.COUNTDOWN,
+        game_id=game_id,
+        start_at=(
+            datetime.now(UTC) + timedelta(seconds=setting.game.lobby_countdown)
+        ).isoformat(),
+    )
+
     # check countdown exchange
     assert amqp_default_exchange.publish.call_count == 2
     assert (
@@ -121,6 +138,7 @@ async def test_service_queue_in(
 
     assert game
     assert game.player_count == 1
+    assert p1_countdown_msg.claimed_at == game.created_at.isoformat()
     ret = await lobby_cache_repo.get_players(game_id)
     assert ret
     assert player_1 == ret[player_1.id]
@@ -314,3 +332,357 @@ async def test_service_queue_in_game_full(
 
     # clean up
     await bg_manager.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_enter_lobby_failed(
+    setting: Setting,
+    redis_conn: Redis,
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    token_generator = TokenGenerator(setting)
+    token_validator = TokenValidator(setting)
+
+    bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+
+    guest_token_repo = GuestTokenRepo(redis_conn=redis_conn, setting=setting)
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+    game_cache_repo = GameCacheRepo(redis_conn=redis_conn, setting=setting)
+
+    amqp_notify_exchange: AbstractExchange = AsyncMock()
+    amqp_default_exchange: AbstractExchange = AsyncMock()
+
+    websocket: WebSocket = AsyncMock()
+    websocket.receive_bytes = MagicMock(return_value=Future())
+
+    service = QueueInService(
+        setting=setting,
+        token_generator=token_generator,
+        token_validator=token_validator,
+        bg_manager=bg_manager,
+        guest_token_repo=guest_token_repo,
+        sessionmaker=sessionmaker,
+        amqp_notify_exchange=amqp_notify_exchange,
+        amqp_default_exchange=amqp_default_exchange,
+        game_cache_repo=game_cache_repo,
+        lobby_cache_repo=lobby_cache_repo,
+    )
+
+    websocket.cookies = {}
+    # USER_JOINED is not acknowledged, COUNTDOWN and USER_LEFT are
+    amqp_notify_exchange.publish = AsyncMock(
+        side_effect=[Basic.Ack(), Basic.Nack(), Basic.Ack()]
+    )
+    amqp_default_exchange.publish = AsyncMock(return_value=Basic.Ack())
+
+    # run
+    bg = await service.queue_in(websocket=websocket, queue_in_type=QueueInType.NEW)
+    assert bg is None
+
+    # the seat is given back
+    notify_msg = LobbyNotifyMsg.model_validate_json(
+        amqp_notify_exchange.publish.call_args.kwargs["message"].body
+    )
+    assert notify_msg.notify_type == LobbyBGMsgEvent.USER_LEFT
+    game_id = notify_msg.game_id
+
+    assert bg_manager.connections(game_id) == 0
+    assert not await lobby_cache_repo.get_players(game_id)
+    async with sessionmaker() as session:
+        game = await GameRepo(session).get(game_id)
+        assert game
+        assert game.player_count == 0
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_countdown_on_connect(
+    setting: Setting,
+    redis_conn: Redis,
+    sessionmaker: async_sessionmaker[AsyncSession],
+):
+    bg_manager = BGManager[LobbyBGMsg, LobbyBG]()
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)
+
+    amqp_notify_exchange: AbstractExchange = AsyncMock()
+    amqp_notify_exchange.publish = AsyncMock(return_value=Basic.Ack())
+    amqp_default_exchange: AbstractExchange = AsyncMock()
+    amqp_default_exchange.publish = AsyncMock(return_value=Basic.Ack())
+
+    websocket: WebSocket = AsyncMock()
+    websocket.receive_bytes = MagicMock(return_value=Future())
+    websocket.cookies = {}
+    websocket.send_text = AsyncMock()
+
+    service = QueueInService(
+        setting=setting,
+        token_generator=TokenGenerator(setting),
+        token_validator=TokenValidator(setting),
+        bg_manager=bg_manager,
+        guest_token_repo=GuestTokenRepo(redis_conn=redis_conn, setting=setting),
+        sessionmaker=sessionmaker,
+        amqp_notify_exchange=amqp_notify_exchange,
+        amqp_default_exchange=amqp_default_exchange,
+        game_cache_repo=GameCacheRepo(redis_conn=redis_conn, setting=setting),
+        lobby_cache_repo=lobby_cache_repo,
+    )
+
+    bg = await service.queue_in(websocket=websocket, queue_in_type=QueueInType.NEW)
+    assert bg
+    start_time = await lobby_cache_repo.get_start_time(bg.game_id)
+    assert start_time
+
+    # let the send loop drain
+    await asyncio.sleep(0.1)
+    sent = [
+        LobbyBGMsg.model_validate_json(i.args[0])
+        for i in websocket.send_text.call_args_list
+    ]
+    assert [i.event for i in sent][:2] == [
+        LobbyBGMsgEvent.INIT,
+        LobbyBGMsgEvent.COUNTDOWN,
+    ]
+    assert sent[1].start_at == start_time.isoformat()
+    assert sent[1].server_time
+
+    await bg_manager.cleanup()
+
+
+async def affinity_nodes(
+    setting: Setting, redis_conn: MemoryRedis
+) -> tuple[Setting, NodeAffinity, NodeAffinity]:
+    setting = setting.model_copy(deep=True)
+    setting.affinity.enabled = True
+    setting.affinity.redirect_timeout = 0.1
+
+    nodes: list[NodeAffinity] = []
+    for name in ["a", "b"]:
+        node_setting = setting.model_copy(deep=True)
+        node_setting.server_name = name
+        node_setting.affinity.url = f"ws://{name}:8080"
+        nodes.append(NodeAffinity(setting=node_setting, redis_conn=redis_conn))  # type: ignore
+    for node in nodes + nodes:
+        await node.refresh()
+    return setting, nodes[0], nodes[1]
+
+
+def memory_service(
+    setting: Setting,
+    redis_conn: MemoryRedis,
+    sessionmaker: MemorySessionmaker,
+    node_affinity: NodeAffinity | None = None,
+    lobby_pool: LobbyPool | None = None,
+) -> QueueInService:
+    amqp_exchange: AbstractExchange = AsyncMock()
+    amqp_exchange.publish = AsyncMock(return_value=Basic.Ack())
+    return QueueInService(
+        setting=setting,
+        token_generator=TokenGenerator(setting),
+        token_validator=TokenValidator(setting),
+        bg_manager=BGManager[LobbyBGMsg, LobbyBG](),
+        guest_token_repo=GuestTokenRepo(redis_conn=redis_conn, setting=setting),  # type: ignore
+        sessionmaker=sessionmaker,
+        amqp_notify_exchange=amqp_exchange,
+        amqp_default_exchange=amqp_exchange,
+        game_cache_repo=GameCacheRepo(redis_conn=redis_conn, setting=setting),  # type: ignore
+        lobby_cache_repo=LobbyCacheRepo(redis_conn=redis_conn, setting=setting),  # type: ignore
+        node_affinity=node_affinity,
+        lobby_pool=lobby_pool,
+    )
+
+
+def player_websocket(setting: Setting, user_id: str) -> WebSocket:
+    token = TokenGenerator(setting).gen_access_token(
+        user_id=user_id, username=f"{user_id}-name", user_type=UserType.REGISTERED
+    )
+    websocket: WebSocket = AsyncMock()
+    websocket.receive_bytes = MagicMock(return_value=Future())
+    websocket.cookies = {CookieNames.ACCESS_TOKEN: token}
+    return websocket
+
+
+async def wait_released(node_affinity: NodeAffinity):
+    while node_affinity.releasing_count:
+        await asyncio.sleep(0.01)
+
+
+async def skip_to_remote_game_id(
+    sessionmaker: MemorySessionmaker, node_affinity: NodeAffinity
+) -> int:
+    """
+    Use up game ids until the next new game is owned by the other node
+    """
+    async with sessionmaker() as session:
+        game_repo = GameRepo(session)
+        game = await game_repo.create(GameType.MULTI, GameStatus.FINISHED)
+        while node_affinity.remote_owner(game.id + 1) is None:
+            game = await game_repo.create(GameType.MULTI, GameStatus.FINISHED)
+    return game.id + 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("arrive", [True, False])
+async def test_service_queue_in_redirect_new_game(setting: Setting, arrive: bool):
+    redis_conn = MemoryRedis()
+    sessionmaker = MemorySessionmaker()
+    setting, node_a, node_b = await affinity_nodes(setting, redis_conn)
+    service_a = memory_service(setting, redis_conn, sessionmaker, node_a)
+    service_b = memory_service(setting, redis_conn, sessionmaker, node_b)
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+    game_id = await skip_to_remote_game_id(sessionmaker, node_a)
+
+    # the creator takes a seat, then is sent to the owner
+    websocket = player_websocket(setting, "player")
+    queue_in = asyncio.create_task(
+        service_a.queue_in(websocket=websocket, queue_in_type=QueueInType.NEW)
+    )
+    await asyncio.sleep(0.01)
+    redirect = LobbyBGMsg.model_validate_json(websocket.send_text.call_args.args[0])
+    assert redirect.event == LobbyBGMsgEvent.REDIRECT
+    assert redirect.game_id == game_id
+    assert redirect.node == "ws://b:8080"
+    assert "player" in (await lobby_cache_repo.get_players(game_id) or {})
+
+    if arrive:
+        bg = await service_b.queue_in(
+            websocket=player_websocket(setting, "player"),
+            queue_in_type=QueueInType.RECONNECT,
+            prev_game_id=game_id,
+            redirected=True,
+        )
+        assert bg is not None and bg.game_id == game_id
+
+    # the handler is done, the release waits in background
+    assert await queue_in is None
+    assert node_a.releasing_count == 1
+    await wait_released(node_a)
+
+    # the seat is given back only if the player never reconnected to the owner
+    players = await lobby_cache_repo.get_players(game_id) or {}
+    assert ("player" in players) is arrive
+    async with sessionmaker() as session:
+        game = await GameRepo(session).get(game_id)
+        assert game and game.player_count == (1 if arrive else 0)
+
+    await service_b._bg_manager.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_redirect_close_wait(setting: Setting):
+    redis_conn = MemoryRedis()
+    sessionmaker = MemorySessionmaker()
+    setting, node_a, _ = await affinity_nodes(setting, redis_conn)
+    service_a = memory_service(setting, redis_conn, sessionmaker, node_a)
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+
+    # a lobby on this node, moved away by a rebalance
+    bg = await service_a.queue_in(
+        websocket=player_websocket(setting, "player"),
+        queue_in_type=QueueInType.NEW,
+        redirected=True,
+    )
+    assert bg is not None
+    await lobby_cache_repo.add_redirects(game_id=bg.game_id, user_ids=["player"])
+    await bg.stop(
+        LobbyBGMsg(event=LobbyBGMsgEvent.REDIRECT, game_id=bg.game_id, node="ws://b")
+    )
+    assert bg.redirected
+
+    # never reconnected, the seat is given back after the timeout
+    await service_a.close_wait(bg)
+    assert "player" in (await lobby_cache_repo.get_players(bg.game_id) or {})
+    await wait_released(node_a)
+    assert "player" not in (await lobby_cache_repo.get_players(bg.game_id) or {})
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_pool_claim(setting: Setting):
+    setting = setting.model_copy(deep=True)
+    setting.lobby_pool.size = 1
+    redis_conn = MemoryRedis()
+    sessionmaker = MemorySessionmaker()
+    lobby_pool = LobbyPool(setting, sessionmaker)  # type: ignore
+    await lobby_pool.refill()
+    service = memory_service(setting, redis_conn, sessionmaker, lobby_pool=lobby_pool)
+    lobby_cache_repo = LobbyCacheRepo(redis_conn=redis_conn, setting=setting)  # type: ignore
+
+    bg = await service.queue_in(
+        websocket=player_websocket(setting, "player"), queue_in_type=QueueInType.NEW
+    )
+    assert bg is not None
+
+    # timers are armed once the claim is committed, off the player's path
+    assert lobby_pool.arming_count == 1
+    await lobby_pool.stop()
+    assert lobby_pool.arming_count == 0
+
+    async with sessionmaker() as session:
+        game = await GameRepo(session).get(bg.game_id)
+    assert game and game.status == GameStatus.LOBBY
+    [countdown_call] = [
+        i
+        for i in service._amqp_default_exchange.publish.call_args_list
+        if i.kwargs["routing_key"] == setting.amqp.lobby_multi_countdown_wait_queue
+    ]
+    countdown_msg = LobbyCountdownMsg.model_validate_json(
+        countdown_call.kwargs["message"].body
+    )
+    assert countdown_msg.claimed_at == game.created_at.isoformat()
+    assert await lobby_cache_repo.get_start_time(bg.game_id) is not None
+
+    await service._bg_manager.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_skill_bucket_guest(setting: Setting):
+    setting = setting.model_copy(deep=True)
+    setting.matchmaking.skill_buckets = True
+    service = memory_service(setting, MemoryRedis(), MemorySessionmaker())
+    expected = int(setting.matchmaking.default_wpm // setting.matchmaking.bucket_width)
+
+    # guests have no results, the database is not queried
+    session = MagicMock()
+    assert (
+        await service._skill_bucket(session=session, user_id="guest", guest=True)
+        == expected
+    )
+    session.execute.assert_not_called()
+    session.scalar.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_service_queue_in_skill_bucket_reconnect(setting: Setting):
+    setting = setting.model_copy(deep=True)
+    setting.matchmaking.skill_buckets = True
+    sessionmaker = MemorySessionmaker()
+    service = memory_service(setting, MemoryRedis(), sessionmaker)
+    bg = await service.queue_in(
+        websocket=player_websocket(setting, "player"), queue_in_type=QueueInType.NEW
+    )
+    assert bg is not None
+
+    # back to its lobby, the bucket is not looked up
+    service._skill_bucket = AsyncMock(return_value=2)
+    reconnected = await service.queue_in(
+        websocket=player_websocket(setting, "player"),
+        queue_in_type=QueueInType.RECONNECT,
+        prev_game_id=bg.game_id,
+    )
+    assert reconnected is not None and reconnected.game_id == bg.game_id
+    service._skill_bucket.assert_not_awaited()
+
+    # the lobby is gone, the new one gets a bucket
+    async with sessionmaker() as session:
+        await GameRepo(session).start_game(bg.game_id)
+        await session.commit()
+    created = await service.queue_in(
+        websocket=player_websocket(setting, "other"),
+        queue_in_type=QueueInType.RECONNECT,
+        prev_game_id=bg.game_id,
+    )
+    assert created is not None and created.game_id != bg.game_id
+    service._skill_bucket.assert_awaited_once()
+    async with sessionmaker() as session:
+        game = await GameRepo(session).get(created.game_id)
+        assert game is not None and game.skill_bucket == 2
+
+    await service._bg_manager.cleanup()
@@ -19,16 +19,43 @@ class KeystrokeHeader(BaseModel):
 
 
 class KeystrokeMsg(BaseModel):
+    """
+    - sent_at: (unix timestamp) when the keystroke was published
+    """
+
     game_id: int
     user_id: str
     word_index: int
     char_index: int
+    sent_at: float | None = None
+
+
+class GameResultMsg(BaseModel):
+    """
+    a player finished the game
+    - finished: ISO 8061 format timestamp
+    - version: players version after this update
+    """
+
+    game_id: int
+    user_id: str
+    rank: int
+    wpm: float
+    wpm_raw: float
+    acc: float
+    finished: str
+    version: int
 
 
 class LobbyNotifyMsg(BaseModel):
+    """
+    - start_at: COUNTDOWN only, ISO 8061 format timestamp
+    """
+
     notify_type: LobbyBGMsgEvent
     game_id: int
     user_id: str | None = None
+    start_at: str | None = None
 
     def slim_dump_json(self) -> str:
         return self.model_dump_json(exclude_none=True)
@@ -38,9 +65,13 @@ class LobbyCountdownMsg(BaseModel):
     """
     This message is basically a trigger to let the server
     know when to start the game.
+    - claimed_at: ISO 8061 format timestamp, the game's 'created_at' when the
+      timer was armed. A pooled game claimed again gets a new one, older
+      timers are ignored
     """
 
     game_id: int
+    claimed_at: str | None = None
 
 
 class GameStartMsg(BaseModel):
@@ -55,6 +86,8 @@ class GameStartMsg(BaseModel):
 class GameCleanupMsg(BaseModel):
     """
     trigger server to cleanup the game
+    - claimed_at: see 'LobbyCountdownMsg'
     """
 
     game_id: int
+    claimed_at: str | None = None
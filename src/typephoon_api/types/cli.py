@@ -8,8 +8,10 @@ class CLIArgs:
     - setting: Path to setting.yaml file.
     - secret_setting: Path to setting.secret.yaml file
     - init: Run init actions such as db migrations.
+    - backfill_user_stats: Rebuild user statistics from existing game results.
     """
 
     setting: str
     secret_setting: str
     init: bool
+    backfill_user_stats: bool
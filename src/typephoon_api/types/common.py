@@ -1,7 +1,9 @@
+import base64
+from datetime import datetime
 from enum import StrEnum
 from typing import Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from ..orm.game import GameType
 from .enums import ErrorCode
@@ -12,6 +14,28 @@ class ErrorContext(BaseModel):
     message: str = ""
 
 
+class DependencyStatus(BaseModel):
+    """
+    Result of the latest health check of a dependency
+    - latency_ms: time the check took
+    """
+
+    ok: bool
+    latency_ms: float | None = None
+    checked_at: datetime | None = None
+    error: str | None = None
+
+
+class NodeInfo(BaseModel):
+    """
+    A live API node
+    - url: base url clients use to reach it directly
+    """
+
+    name: str
+    url: str
+
+
 class LobbyUserInfo(BaseModel):
     id: str
     name: str
@@ -40,6 +64,20 @@ class GameUserInfo(BaseModel):
         return cls(id=inpt.id, name=inpt.name)
 
 
+class PendingGameResult(BaseModel):
+    """
+    Game result waiting to be written to database
+    """
+
+    game_id: int
+    user_id: str
+    rank: int
+    wpm_raw: float
+    wpm_correct: float
+    accuracy: float
+    finished_at: datetime
+
+
 class GameTypeStr(StrEnum):
     SINGLE = "SINGLE"
     MULTI = "MULTI"
@@ -55,3 +93,29 @@ class GameTypeStr(StrEnum):
             return cls.TEAM
         else:
             raise ValueError(f"unknown game type: {inpt}")
+
+
+class HistoryCursor(BaseModel):
+    """
+    Opaque cursor for keyset pagination on game history,
+    points to the last item of the previous page
+    """
+
+    finished_at: datetime
+    game_id: int
+
+    def encode(self) -> str:
+        raw = self.model_dump_json().encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, inpt: str) -> Self:
+        """
+        Raises:
+            - ValueError: malformed cursor
+        """
+        try:
+            raw = base64.urlsafe_b64decode(inpt + "=" * (-len(inpt) % 4))
+            return cls.model_validate_json(raw)
+        except (ValidationError, ValueError) as e:
+            raise ValueError(f"invalid cursor: {inpt}") from e
@@ -13,6 +13,11 @@ class ErrorCode(StrEnum):
     WORDS_NOT_FOUND = "WORDS_NOT_FOUND"
     NOT_A_PARTICIPANT = "NOT_A_PARTICIPANT"
     VALIDATION_ERROR = "VALIDATION_ERROR"
+    INVALID_CURSOR = "INVALID_CURSOR"
+    PROFILER_DISABLED = "PROFILER_DISABLED"
+    PROFILER_RUNNING = "PROFILER_RUNNING"
+    REPLAY_NOT_FOUND = "REPLAY_NOT_FOUND"
+    GAME_NOT_FINISHED = "GAME_NOT_FINISHED"
 
 
 class CookieNames(StrEnum):
@@ -27,6 +32,7 @@ class WSCloseReason(StrEnum):
     ACCESS_TOKEN_NOT_FOUND = "ACCESS_TOKEN_NOT_FOUND"
     GAME_NOT_FOUND = "GAME_NOT_FOUND"
     NOT_A_PARTICIPANT = "NOT_A_PARTICIPANT"
+    REDIRECT = "REDIRECT"
 
 
 class UserType(StrEnum):
@@ -37,3 +43,20 @@ class UserType(StrEnum):
 class QueueInType(StrEnum):
     RECONNECT = "reconnect"
     NEW = "new"
+
+
+class EventLoopType(StrEnum):
+    AUTO = "auto"
+    UVLOOP = "uvloop"
+    ASYNCIO = "asyncio"
+
+
+class HTTPImplType(StrEnum):
+    AUTO = "auto"
+    HTTPTOOLS = "httptools"
+    H11 = "h11"
+
+
+class BackendType(StrEnum):
+    EXTERNAL = "external"
+    MEMORY = "memory"
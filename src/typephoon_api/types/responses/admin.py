@@ -0,0 +1,10 @@
+from .base import SuccessResponse
+
+
+class ProfilerResponse(SuccessResponse):
+    """
+    output: collapsed stack file written when the profiler stopped
+    """
+
+    running: bool
+    output: str | None = None
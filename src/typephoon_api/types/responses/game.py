@@ -11,9 +11,11 @@ class GameCountdownResponse(SuccessResponse):
 class GameResultResponse(SuccessResponse):
     """
     players: sorted by rank
+    version: pass as 'since' to only get players updated after this response
     """
 
     ranking: list[GameUserInfo] = Field(default_factory=list)
+    version: int = 0
 
 
 class GamePlayersResponse(SuccessResponse):
@@ -0,0 +1,13 @@
+from pydantic import Field
+
+from ..common import DependencyStatus
+from .base import SuccessResponse
+
+
+class ReadyResponse(SuccessResponse):
+    """
+    dependencies: result of the latest background check of each dependency
+    """
+
+    draining: bool = False
+    dependencies: dict[str, DependencyStatus] = Field(default_factory=dict)
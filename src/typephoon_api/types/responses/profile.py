@@ -25,6 +25,7 @@ class ProfileHistoryResponse(SuccessResponse):
     total: int
     has_prev_page: bool
     has_next_page: bool
+    next_cursor: str | None = None
     data: list[GameResultWithGameType] = Field(default_factory=list)
 
 
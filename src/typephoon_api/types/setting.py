@@ -7,9 +7,11 @@ from pathlib import Path
 from typing import Any, Self
 
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from .enums import BackendType, EventLoopType, HTTPImplType
+
 SERVER_NAME = getenv("SERVER_NAME", None)
 LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
 
@@ -34,6 +36,12 @@ def default_logger() -> dict:
 
 
 class DBSetting(BaseModel):
+    """
+    - backend: 'memory' keeps games, results and users in process, nothing is
+      persisted and no migration is needed
+    """
+
+    backend: BackendType = BackendType.EXTERNAL
     username: str = "user"
     password: str = "password"
     host: str = "localhost"
@@ -52,6 +60,11 @@ class DBSetting(BaseModel):
 
 
 class RedisSetting(BaseModel):
+    """
+    - backend: 'memory' keeps the cache in process
+    """
+
+    backend: BackendType = BackendType.EXTERNAL
     host: str = "localhost"
     port: int = 6379
     db: int = 0
@@ -65,7 +78,19 @@ class CORSSetting(BaseModel):
 
 
 class ServerSetting(BaseModel):
+    """
+    - workers: number of worker processes, each worker is a separate server with
+      its own SERVER_NAME ('{SERVER_NAME or hostname}-w{index}')
+    - graceful_timeout: (seconds) time given to open connections when shutting down
+    - loop / http: event loop and HTTP parser, 'auto' picks uvloop / httptools when
+      installed. Unavailable choices fall back to asyncio / h11.
+    """
+
     port: int = 8080
+    workers: int = 1
+    graceful_timeout: int = 30
+    loop: EventLoopType = EventLoopType.AUTO
+    http: HTTPImplType = HTTPImplType.AUTO
 
 
 class TokenSetting(BaseModel):
@@ -92,6 +117,12 @@ class GoogleSetting(BaseModel):
 
 
 class AMQPSetting(BaseModel):
+    """
+    - backend: 'memory' routes messages through an in-process broker, only
+      servers in the same process can talk to each other
+    """
+
+    backend: BackendType = BackendType.EXTERNAL
     user: str = "guest"
     password: str = "guest"
     host: str = "localhost"
@@ -104,6 +135,7 @@ class AMQPSetting(BaseModel):
     game_keystroke_fanout_exchange: str = "game.keystroke"
     game_cleanup_direct_exchange: str = "game.cleanup"
     game_start_fanout_exchange: str = "game.start"
+    game_result_fanout_exchange: str = "game.result"
 
     # queues with consumers
     lobby_notify_queue: str = "lobby.notify"
@@ -117,6 +149,8 @@ class AMQPSetting(BaseModel):
     game_start_queue: str = "game.start"
     game_start_queue_routing_key: str = "game.start"
 
+    game_result_queue: str = "game.result"
+
     game_cleanup_queue: str = "game.cleanup"
     game_cleanup_queue_routing_key: str = "game.cleanup"
 
@@ -132,6 +166,7 @@ class AMQPSetting(BaseModel):
             self.lobby_notify_queue = f"{self.lobby_notify_queue}.{SERVER_NAME}"
             self.game_keystroke_queue = f"{self.game_keystroke_queue}.{SERVER_NAME}"
             self.game_start_queue = f"{self.game_start_queue}.{SERVER_NAME}"
+            self.game_result_queue = f"{self.game_result_queue}.{SERVER_NAME}"
 
 
 class GameSetting(BaseModel):
@@ -140,15 +175,137 @@ class GameSetting(BaseModel):
     - start_countdown: seconds
     - lobby_countdown: seconds
     - cleanup_countdown: seconds
+    - position_flush_interval: (seconds) max delay before a keystroke position
+      is mirrored to the game cache for reconnects on other nodes
     """
 
     start_countdown: int = 5
     lobby_countdown: int = 5
     player_limit: int = 5
     cleanup_countdown: int = 60 * 15
+    position_flush_interval: float = 0.2
     word_file: str = "./data/words.txt"
 
 
+class LobbyPoolSetting(BaseModel):
+    """
+    Games created ahead of time, the first player of a lobby claims one and its
+    timers are armed in background then
+    - size: games kept in the pool, 0 disables it
+    - refill_interval: (seconds) max time between pool checks, claims trigger
+      one. Also the delay between arming retries
+    - arm_retries: a timer still failing after these retries is given up, the
+      lobby is left to the game cleaner
+    """
+
+    size: int = 0
+    refill_interval: float = 1
+    arm_retries: int = 5
+
+
+class ReplaySetting(BaseModel):
+    """
+    Keystroke logs of every game, served by the replay endpoint
+    - enabled: record keystrokes, off by default
+    - max_keystrokes: per game and node, later keystrokes are not recorded
+    - batch_size: logs written per statement
+    - close_delay: (seconds) a game's log is written this long after its last
+      connection here closed, a player reconnecting meanwhile continues it
+    """
+
+    enabled: bool = False
+    max_keystrokes: int = 20000
+    batch_size: int = 50
+    close_delay: float = 30
+
+
+class MatchmakingSetting(BaseModel):
+    """
+    Match players with a similar recent average WPM
+    - skill_buckets: match within WPM buckets, otherwise any lobby with a free seat
+    - bucket_width: WPM covered by one bucket
+    - widen_interval: (seconds, > 0) a lobby accepts one more bucket on each
+      side every interval it waits
+    - default_wpm: used for guests and players without results
+    """
+
+    skill_buckets: bool = False
+    bucket_width: float = 20
+    widen_interval: float = Field(default=1, gt=0)
+    default_wpm: float = 40
+
+
+class WriteBehindSetting(BaseModel):
+    """
+    Buffer game results in memory and write them to database in batches
+    - queue_size: max results waiting in memory, writers wait when it's full
+    - batch_size: max results per INSERT
+    - flush_interval: (seconds) max time a result waits for its batch
+    - flush_retries: failed batches stay in the journal after retries run out
+
+    The journal is keyed by SERVER_NAME, a restarted server replays the results of
+    the one with the same name
+    """
+
+    enabled: bool = False
+    queue_size: int = 10000
+    batch_size: int = 500
+    flush_interval: float = 0.2
+    flush_retries: int = 3
+
+
+class HealthCheckSetting(BaseModel):
+    """
+    Dependencies are checked in background, readiness reads the cached result
+    - interval: (seconds) time between checks
+    - timeout: (seconds) a check taking longer fails
+    - stale_after: (seconds) not ready if the latest check is older than this
+    """
+
+    interval: float = 5
+    timeout: float = 2
+    stale_after: float = 15
+
+
+class ProfilerSetting(BaseModel):
+    """
+    Sampling profiler, toggled with SIGUSR2 or the admin endpoints
+    - interval: (seconds) time between samples
+    - duration / max_duration: (seconds) default and longest sampling window
+    - output_dir: collapsed stack files are written here
+    - focus: only keep samples going through these functions (qualified names),
+             ex: ['QueueInService.queue_in', 'GameService.write_statistics']
+    - admin_token: required by the admin endpoints, they are disabled when empty
+    """
+
+    interval: float = 0.005
+    duration: float = 30
+    max_duration: float = 300
+    output_dir: str = "./profiles"
+    focus: list[str] = Field(default_factory=list)
+    admin_token: str = ""
+
+
+class AffinitySetting(BaseModel):
+    """
+    Route every websocket of a game to one node, chosen by consistent hashing of
+    the game id over live nodes
+    - url: base url clients use to reach this node directly, ex: 'wss://node-1.example.com'
+    - heartbeat_interval: (seconds) time between heartbeats and ring refreshes
+    - node_ttl: (seconds) a node missing heartbeats for this long is removed
+    - vnodes: points per node on the ring, more points spread games more evenly
+    - redirect_timeout: (seconds) the lobby seat of a player sent to another node is
+                        given back if they don't reconnect there in time
+    """
+
+    enabled: bool = False
+    url: str = ""
+    heartbeat_interval: float = 2
+    node_ttl: float = 6
+    vnodes: int = 64
+    redirect_timeout: float = 10
+
+
 class Setting(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -166,12 +323,67 @@ class Setting(BaseSettings):
     token: TokenSetting = Field(default_factory=TokenSetting)
     amqp: AMQPSetting = Field(default_factory=AMQPSetting)
     game: GameSetting = Field(default_factory=GameSetting)
+    lobby_pool: LobbyPoolSetting = Field(default_factory=LobbyPoolSetting)
+    matchmaking: MatchmakingSetting = Field(default_factory=MatchmakingSetting)
+    replay: ReplaySetting = Field(default_factory=ReplaySetting)
+    write_behind: WriteBehindSetting = Field(default_factory=WriteBehindSetting)
+    profiler: ProfilerSetting = Field(default_factory=ProfilerSetting)
+    health_check: HealthCheckSetting = Field(default_factory=HealthCheckSetting)
+    affinity: AffinitySetting = Field(default_factory=AffinitySetting)
 
     front_end_endpoint: str = "http://localhost:3000"
     error_redirect: str = "http://localhost:3000/error"
 
     server_name: str | None = SERVER_NAME
 
+    @model_validator(mode="after")
+    def check_memory_backends(self) -> Self:
+        """
+        Memory backends live in one process, workers wouldn't see each other's data
+        """
+        memory = [
+            name
+            for name, backend in (
+                ("db", self.db.backend),
+                ("redis", self.redis.backend),
+                ("amqp", self.amqp.backend),
+            )
+            if backend == BackendType.MEMORY
+        ]
+        if memory and self.server.workers > 1:
+            raise ValueError(
+                f"memory backends ({', '.join(memory)}) require a single worker"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def check_affinity(self) -> Self:
+        """
+        Nodes are told apart by SERVER_NAME and reached by 'affinity.url',
+        workers share one port so they can't be reached one by one
+        """
+        if not self.affinity.enabled:
+            return self
+        if not self.server_name or not self.affinity.url:
+            raise ValueError("affinity requires SERVER_NAME and 'affinity.url'")
+        if self.server.workers > 1:
+            raise ValueError("affinity requires a single worker")
+        return self
+
+    @model_validator(mode="after")
+    def check_write_behind(self) -> Self:
+        """
+        Servers sharing a journal would replay each other's results,
+        workers are named by the supervisor
+        """
+        if (
+            self.write_behind.enabled
+            and not self.server_name
+            and self.server.workers <= 1
+        ):
+            raise ValueError("write-behind requires SERVER_NAME")
+        return self
+
     @classmethod
     def from_file(cls, base: str = "setting.yaml") -> Self:
         base_file = Path(base)